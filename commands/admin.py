@@ -1,9 +1,20 @@
 import discord
 import asyncio
-from const import MOD_ROLE_ID, WHITELIST_ROLE_ID
-from database.queries import get_all_players, bulk_update_history, delete_player, add_player, get_player_stats
+import datetime
+import os
+import logging
+import tempfile
+import pytz
+from const import MOD_ROLE_ID, WHITELIST_ROLE_ID, WORLD_DIR, BACKFILL_DEFAULT_DAYS
+from database import db
+from database.export import EXPORT_TABLES, EXPORT_FORMATS, default_export_path
+from ingest.world_stats import scan_world_stats, diff_world_stats, format_change, change_updates
+from ingest.webhook import message_event, format_backfill_summary
 from utils.discord_helpers import get_discord_user
 from tasks.roles import update_achievement_roles
+from tasks.servers import servers_by_id, default_server
+
+logger = logging.getLogger('nameless_bot')
 
 async def updateroles_command(ctx, bot):
     """Update achievement roles manually."""
@@ -15,6 +26,237 @@ async def updateroles_command(ctx, bot):
     await update_achievement_roles(bot, ctx.guild)
     await ctx.message.add_reaction('✅')
 
+async def rebuildrollups_command(ctx, bot):
+    """Regenerate the weekly/monthly stats rollups from the daily history."""
+    # Check if user has mod role
+    if not any(role.id == MOD_ROLE_ID for role in ctx.author.roles):
+        await ctx.send("You don't have permission to use this command.")
+        return
+
+    await ctx.message.add_reaction('⏳')
+    result = await db.rebuild_rollups()
+    await ctx.message.remove_reaction('⏳', bot.user)
+    if result:
+        weeks, months = result
+        await ctx.message.add_reaction('✅')
+        await ctx.send(f"Rebuilt rollups: {weeks} weekly rows and {months} monthly rows.")
+    else:
+        await ctx.message.add_reaction('❌')
+        await ctx.send("Error rebuilding rollups. Check logs for details.")
+
+async def backup_command(ctx, bot):
+    """Take a database backup now."""
+    # Check if user has mod role
+    if not any(role.id == MOD_ROLE_ID for role in ctx.author.roles):
+        await ctx.send("You don't have permission to use this command.")
+        return
+
+    await ctx.message.add_reaction('⏳')
+    try:
+        result = await db.backup_database()
+    except Exception as e:
+        logger.error(f"Error during manual backup: {e}", exc_info=True)
+        result = None
+    await ctx.message.remove_reaction('⏳', bot.user)
+    if result:
+        await ctx.message.add_reaction('✅')
+        await ctx.send(
+            f"Backup saved to `{os.path.basename(result['path'])}` "
+            f"({result['snapshot_bytes'] / 1024:.0f} KiB compressed, {result['seconds']:.1f}s).\n"
+            f"sha256: `{result['sha256'][:16]}…`"
+        )
+    else:
+        await ctx.message.add_reaction('❌')
+        await ctx.send("Error taking backup. Check logs for details.")
+
+async def export_command(ctx, bot, *args):
+    """Attach stats as a gzipped CSV/JSONL file.
+
+    Arguments can come in any order: a table (players or history, default history),
+    a format (csv or jsonl, default csv), up to two YYYY-MM-DD dates (start, end)
+    and a player name.
+    """
+    # Check if user has mod role
+    if not any(role.id == MOD_ROLE_ID for role in ctx.author.roles):
+        await ctx.send("You don't have permission to use this command.")
+        return
+
+    table, fmt, dates, player = 'history', 'csv', [], None
+    for arg in args:
+        if arg.lower() in EXPORT_TABLES:
+            table = arg.lower()
+        elif arg.lower() in EXPORT_FORMATS:
+            fmt = arg.lower()
+        elif len(arg) == 10 and arg[4] == '-' and arg[7] == '-':
+            dates.append(arg)
+        else:
+            player = await db.canonical_minecraft(arg)
+            if not player:
+                await ctx.send(f"Unknown player '{arg}'. Usage: `!export [players|history] [csv|jsonl] [start] [end] [player]`")
+                return
+    if len(dates) > 2:
+        await ctx.send("Give at most two dates: a start and an end (YYYY-MM-DD).")
+        return
+    start_date = dates[0] if dates else None
+    end_date = dates[1] if len(dates) > 1 else None
+
+    await ctx.message.add_reaction('⏳')
+    with tempfile.TemporaryDirectory() as scratch:
+        try:
+            result = await db.export_stats(table, fmt, default_export_path(table, fmt, scratch),
+                                           start_date, end_date, player)
+        except ValueError as e:
+            result = None
+            await ctx.send(f"Can't export: {e}")
+        except Exception as e:
+            logger.error(f"Error exporting {table}: {e}", exc_info=True)
+            result = None
+            await ctx.send("Error exporting stats. Check logs for details.")
+        await ctx.message.remove_reaction('⏳', bot.user)
+        if not result:
+            await ctx.message.add_reaction('❌')
+            return
+
+        limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+        if result['bytes'] > limit:
+            await ctx.message.add_reaction('❌')
+            await ctx.send(
+                f"The export is {result['bytes'] / 1024 / 1024:.1f} MiB, over the {limit // 1024 // 1024} MiB upload limit. "
+                f"Narrow it with dates or a player, or run `python -m database.export` on the server."
+            )
+            return
+        await ctx.message.add_reaction('✅')
+        await ctx.send(
+            f"Exported {result['rows']} {table} rows.",
+            file=discord.File(result['path'], filename=os.path.basename(result['path']))
+        )
+
+async def importstats_command(ctx, bot, mode=None):
+    """Compare the default server's deaths/playtime with its world stats files; `!importstats apply` writes them."""
+    # Check if user has mod role
+    if not any(role.id == MOD_ROLE_ID for role in ctx.author.roles):
+        await ctx.send("You don't have permission to use this command.")
+        return
+
+    apply = mode is not None and mode.lower() == "apply"
+    await ctx.message.add_reaction('⏳')
+    try:
+        server_id = default_server.server_id # WORLD_DIR is its world
+        scan = await db.run_maintenance(scan_world_stats, WORLD_DIR)
+        changes = diff_world_stats(scan['stats'], (await db.get_leaderboard_snapshot(server_id)).players)
+        success = await db.bulk_update_history(change_updates(changes), server_id) if apply and changes else True
+    except Exception as e:
+        logger.error(f"Error importing world stats from {WORLD_DIR}: {e}", exc_info=True)
+        success, scan = False, None
+    await ctx.message.remove_reaction('⏳', bot.user)
+    if not success:
+        await ctx.message.add_reaction('❌')
+        await ctx.send(f"Error importing world stats from `{WORLD_DIR}`. Check logs for details.")
+        return
+
+    lines = [format_change(change) for change in changes[:20]]
+    if len(changes) > 20:
+        lines.append(f"...and {len(changes) - 20} more")
+    summary = (f"Read {scan['files']} stats files in {scan['seconds']:.1f}s "
+               f"({len(scan['unknown'])} not in the database, {len(scan['errors'])} unreadable). ")
+    if not changes:
+        summary += "Everything already matches."
+    elif apply:
+        summary += f"Updated {len(changes)} players:"
+    else:
+        summary += f"{len(changes)} players would change (`!importstats apply` to write):"
+    await ctx.message.add_reaction('✅')
+    await ctx.send(summary + ("\n```\n" + "\n".join(lines) + "\n```" if lines else ""))
+
+async def backfill_command(ctx, bot, days=None, server_id=None):
+    """Count a server's webhook channel messages from the last `days` days that the bot missed
+    while offline. Messages already counted are skipped. Returns (ServerState, summary dict), or None.
+    """
+    # Check if user has mod role
+    if not any(role.id == MOD_ROLE_ID for role in ctx.author.roles):
+        await ctx.send("You don't have permission to use this command.")
+        return None
+
+    try:
+        days = int(days) if days is not None else BACKFILL_DEFAULT_DAYS
+        if days < 1:
+            raise ValueError
+    except ValueError:
+        await ctx.send(f"Usage: `!backfill [days] [server]` (default {BACKFILL_DEFAULT_DAYS} days, server `{default_server.server_id}`)")
+        return None
+    server = servers_by_id.get(server_id) if server_id else default_server
+    if server is None:
+        await ctx.send(f"Unknown server `{server_id}` (servers: {', '.join(f'`{s}`' for s in servers_by_id)}).")
+        return None
+    channel = bot.get_channel(server.webhook_channel_id)
+    if not channel:
+        await ctx.send(f"Could not find the webhook channel {server.webhook_channel_id} of {server.name}.")
+        return None
+
+    await ctx.message.add_reaction('⏳')
+    try:
+        now = datetime.datetime.now(pytz.utc)
+        events = []
+        # Messages from now on are counted by on_message as usual
+        async for message in channel.history(limit=None, after=now - datetime.timedelta(days=days),
+                                             before=now, oldest_first=True):
+            if message.author == bot.user:
+                continue # Our own death quips
+            event = message_event(message.id, message.created_at.timestamp(), message.content)
+            if event:
+                events.append(event)
+        summary = await db.backfill_webhook_events(events, server_id=server.server_id)
+    except Exception as e:
+        logger.error(f"Error backfilling the webhook channel: {e}", exc_info=True)
+        summary = None
+    await ctx.message.remove_reaction('⏳', bot.user)
+    if summary is None:
+        await ctx.message.add_reaction('❌')
+        await ctx.send("Error backfilling the webhook channel. Check logs for details (running it again is safe).")
+        return None
+    await ctx.message.add_reaction('✅')
+    await ctx.send(f"Backfilled the last {days} days of {server.name}: {format_backfill_summary(summary)}.")
+    return server, summary
+
+async def pipeline_command(ctx, bot, stats, leaderboard_stats, presence_stats):
+    """Show the counters of the event pipeline, leaderboard scheduler and presence manager (see tasks/)."""
+    # Check if user has mod role
+    if not any(role.id == MOD_ROLE_ID for role in ctx.author.roles):
+        await ctx.send("You don't have permission to use this command.")
+        return
+
+    await ctx.send(
+        f"Events: {stats['submitted']} submitted, {stats['persisted']} persisted, "
+        f"{stats['side_effects']} side effects done, {stats['errors']} errors\n"
+        f"Queue: {stats['depth']} waiting (max {stats['max_depth']}), shards {stats['shard_depths']}; "
+        f"on_message waited {stats['blocked_submits']} times, {stats['blocked_seconds']:.1f}s in total\n"
+        f"Latency: persisted avg {stats['persist_latency_avg'] * 1000:.0f}ms / max {stats['persist_latency_max'] * 1000:.0f}ms, "
+        f"done avg {stats['done_latency_avg'] * 1000:.0f}ms / max {stats['done_latency_max'] * 1000:.0f}ms\n"
+        f"Refreshes: {stats['refreshes']} for {stats['refresh_requests']} requests\n"
+        f"Leaderboards: {leaderboard_stats['refreshes']} refreshes for {leaderboard_stats['triggers']} stat changes "
+        f"({leaderboard_stats['saved']} saved{', one pending' if leaderboard_stats['pending'] else ''}), "
+        f"{leaderboard_stats['errors']} errors\n"
+        f"Presence: {presence_stats['sent']} updates sent for {presence_stats['requests']} changes "
+        f"({presence_stats['unchanged']} unchanged, {presence_stats['throttled_seconds']:.0f}s held back by the rate limit), "
+        f"{presence_stats['errors']} errors"
+    )
+
+async def reloadquips_command(ctx, bot, death_quips):
+    """Re-read the death quip file without restarting the bot."""
+    # Check if user has mod role
+    if not any(role.id == MOD_ROLE_ID for role in ctx.author.roles):
+        await ctx.send("You don't have permission to use this command.")
+        return
+
+    try:
+        loaded, skipped = death_quips.load()
+    except (OSError, ValueError) as e:
+        await ctx.send(f"Could not reload death quips, keeping the current {len(death_quips.templates)}: {e}")
+        return
+    await ctx.message.add_reaction('✅')
+    await ctx.send(f"Loaded {loaded} death quips" +
+                   (f" ({skipped} skipped: only {{player}} can be used in a quip)." if skipped else "."))
+
 async def addhistory_command(ctx, bot, subcommand=None, arg=None, *args):
     """Add or update player history with various subcommands.
     
@@ -33,9 +275,8 @@ async def addhistory_command(ctx, bot, subcommand=None, arg=None, *args):
     
     # Handle delete subcommand
     if subcommand and subcommand.lower() == "delete" and arg:
-        player_stats = get_player_stats(minecraft_username=arg)
-        if player_stats:
-            success = delete_player(arg)
+        if await db.canonical_minecraft(arg) == arg:
+            success = await db.delete_player(arg)
             if success:
                 await ctx.send(f"Successfully deleted player {arg} from the database.")
             else:
@@ -46,7 +287,7 @@ async def addhistory_command(ctx, bot, subcommand=None, arg=None, *args):
     
     # Handle get subcommand
     elif subcommand and subcommand.lower() == "get" and arg:
-        player_stats = get_player_stats(minecraft_username=arg)
+        player_stats = await db.get_player_stats(minecraft_username=arg)
         if player_stats:
             mc_username, disc_username, deaths, advancements, playtime = player_stats
             embed = discord.Embed(
@@ -71,8 +312,7 @@ async def addhistory_command(ctx, bot, subcommand=None, arg=None, *args):
     elif subcommand:
         # In this case, subcommand is the username
         username = subcommand
-        player_stats = get_player_stats(minecraft_username=username)
-        if not player_stats:
+        if await db.canonical_minecraft(username) != username:
             await ctx.send(f"Player {username} not found in the database.")
             return
         
@@ -104,7 +344,7 @@ async def addhistory_command(ctx, bot, subcommand=None, arg=None, *args):
         
         # Apply updates
         if updates[username]:
-            success = bulk_update_history(updates)
+            success = await db.bulk_update_history(updates)
             if success:
                 await ctx.send(f"Successfully updated history for {username}!")
             else:
@@ -139,7 +379,7 @@ async def addhistory_command(ctx, bot, subcommand=None, arg=None, *args):
 async def handle_bulk_update(ctx, bot):
     """Handle the bulk update flow for addhistory command."""
     # Get current stats
-    players = get_all_players()
+    players = await db.get_all_players()
     
     embed = discord.Embed(
         title="Bulk Player History Update",
@@ -193,8 +433,7 @@ username2: deaths=2, advancements=15, playtime=7200
             username = username.strip()
             
             # Check if username exists in database
-            player_stats = get_player_stats(minecraft_username=username)
-            if not player_stats:
+            if await db.canonical_minecraft(username) != username:
                 await ctx.send(f"Unknown username: {username}")
                 continue
                 
@@ -217,7 +456,7 @@ username2: deaths=2, advancements=15, playtime=7200
                     await ctx.send(f"Invalid value for {key}: {value}")
         
         # Apply updates
-        success = bulk_update_history(updates)
+        success = await db.bulk_update_history(updates)
         
         if success:
             await ctx.send(f"Successfully updated history for {len(updates)} players!")
@@ -260,7 +499,7 @@ async def whitelist_command(ctx, bot, discord_user_str: str = None, minecraft_us
     # Assuming add_player now returns True (newly added), None (already existed), False (error)
     # And it takes the string discord_user_str (e.g. "User#1234") or member.id if preferred by add_player
     # The original snippet used 'discord_user' (the string from command) for add_player.
-    db_result = add_player(minecraft_username=minecraft_user, discord_username=str(member)) # Use str(member) for "User#Tag" or member.id if DB stores ID
+    db_result = await db.add_player(minecraft_username=minecraft_user, discord_username=str(member)) # Use str(member) for "User#Tag" or member.id if DB stores ID
 
     message_parts = []
     role_assignment_needed = False
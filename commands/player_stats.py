@@ -2,55 +2,45 @@ import discord
 import datetime
 import pytz # Import for timezone
 from const import MINECRAFT_TO_DISCORD
-from database.queries import ( # Ensure all needed functions are imported
-    get_player_stats, get_all_deaths, get_all_advancements, get_all_playtimes,
-    get_stats_for_period, get_connection
-)
-from utils.formatters import format_playtime
-from utils.discord_helpers import get_minecraft_from_discord
+from database import db
+from utils.formatters import format_playtime, sparkline, SPARK_GAP
 import logging # Import logging
 
 logger = logging.getLogger('nameless_bot') # Setup logger
 
+# !history periods: bucket -> (how many buckets/bars to show, title word)
+HISTORY_BUCKETS = {'day': (30, "Daily"), 'week': (12, "Weekly"), 'month': (12, "Monthly")}
+
+async def resolve_player(ctx, username=None):
+    """Work out which Minecraft player a stats command is about.
+    Returns (minecraft_username or None, text to show in a "not found" message).
+    """
+    if username:
+        # Direct Minecraft username first, then Discord name (both case-insensitive)
+        minecraft_username = await db.canonical_minecraft(username) or await db.minecraft_from_discord(username)
+        if not minecraft_username: # Also check MINECRAFT_TO_DISCORD as a fallback if needed
+            for mc_name, disc_name in MINECRAFT_TO_DISCORD.items():
+                if disc_name.lower() == username.lower():
+                    minecraft_username = mc_name
+                    break
+        return minecraft_username, username
+
+    # Use command author's Discord name (full "user#discriminator" or "new_username")
+    return await db.minecraft_from_discord(str(ctx.author)), ctx.author.mention
+
 async def deaths_command(ctx, bot, username=None):
     """Show death count for a player."""
     await ctx.message.add_reaction('💀') # React immediately
 
     # Determine which player to show
-    minecraft_username = None
-    target_display = username # For error messages
-
-    if username:
-        # Check if direct Minecraft username (case-insensitive check recommended)
-        stats_direct = get_player_stats(minecraft_username=username)
-        if stats_direct:
-            minecraft_username = stats_direct[0] # Use the exact case from DB
-        else:
-            # Try to find by Discord name (case-insensitive)
-            stats_discord = get_player_stats(discord_username=username.lower())
-            if stats_discord:
-                 minecraft_username = stats_discord[0]
-            else: # Also check MINECRAFT_TO_DISCORD as a fallback if needed
-                 for mc_name, disc_name in MINECRAFT_TO_DISCORD.items():
-                     if disc_name.lower() == username.lower():
-                         minecraft_username = mc_name
-                         break
-    else:
-        # Use command author's Discord name (case-insensitive)
-        author_discord_name = str(ctx.author).lower() # Use full "user#discriminator" or "new_username"
-        target_display = ctx.author.mention
-        stats_author = get_player_stats(discord_username=author_discord_name)
-        if stats_author:
-            minecraft_username = stats_author[0]
-        else: # Fallback using MINECRAFT_TO_DISCORD map if direct lookup fails
-             minecraft_username = get_minecraft_from_discord(str(ctx.author)) # Uses the old mapping lookup
+    minecraft_username, target_display = await resolve_player(ctx, username)
 
     if not minecraft_username:
         await ctx.send(f"Could not find a matching player for '{target_display}'. Please specify a valid Minecraft or Discord username, or ensure you are linked.")
         return
 
     # Get stats using the determined Minecraft username
-    stats = get_player_stats(minecraft_username=minecraft_username)
+    stats = await db.get_player_stats(minecraft_username=minecraft_username)
 
     if stats:
         embed = discord.Embed(
@@ -67,37 +57,14 @@ async def advancements_command(ctx, bot, username=None):
     """Show advancement count for a player."""
     await ctx.message.add_reaction('⭐') # React immediately
 
-    # Determine which player to show (using similar logic as deaths_command)
-    minecraft_username = None
-    target_display = username
-
-    if username:
-        stats_direct = get_player_stats(minecraft_username=username)
-        if stats_direct:
-            minecraft_username = stats_direct[0]
-        else:
-            stats_discord = get_player_stats(discord_username=username.lower())
-            if stats_discord:
-                 minecraft_username = stats_discord[0]
-            else:
-                 for mc_name, disc_name in MINECRAFT_TO_DISCORD.items():
-                     if disc_name.lower() == username.lower():
-                         minecraft_username = mc_name
-                         break
-    else:
-        author_discord_name = str(ctx.author).lower()
-        target_display = ctx.author.mention
-        stats_author = get_player_stats(discord_username=author_discord_name)
-        if stats_author:
-            minecraft_username = stats_author[0]
-        else:
-             minecraft_username = get_minecraft_from_discord(str(ctx.author))
+    # Determine which player to show
+    minecraft_username, target_display = await resolve_player(ctx, username)
 
     if not minecraft_username:
         await ctx.send(f"Could not find a matching player for '{target_display}'. Please specify a valid Minecraft or Discord username, or ensure you are linked.")
         return
 
-    stats = get_player_stats(minecraft_username=minecraft_username)
+    stats = await db.get_player_stats(minecraft_username=minecraft_username)
 
     if stats:
         embed = discord.Embed(
@@ -113,37 +80,14 @@ async def playtime_command(ctx, bot, username=None):
     """Show playtime for a player."""
     await ctx.message.add_reaction('🕒') # React immediately
 
-    # Determine which player to show (using similar logic as deaths_command)
-    minecraft_username = None
-    target_display = username
-
-    if username:
-        stats_direct = get_player_stats(minecraft_username=username)
-        if stats_direct:
-            minecraft_username = stats_direct[0]
-        else:
-            stats_discord = get_player_stats(discord_username=username.lower())
-            if stats_discord:
-                 minecraft_username = stats_discord[0]
-            else:
-                 for mc_name, disc_name in MINECRAFT_TO_DISCORD.items():
-                     if disc_name.lower() == username.lower():
-                         minecraft_username = mc_name
-                         break
-    else:
-        author_discord_name = str(ctx.author).lower()
-        target_display = ctx.author.mention
-        stats_author = get_player_stats(discord_username=author_discord_name)
-        if stats_author:
-            minecraft_username = stats_author[0]
-        else:
-             minecraft_username = get_minecraft_from_discord(str(ctx.author))
+    # Determine which player to show
+    minecraft_username, target_display = await resolve_player(ctx, username)
 
     if not minecraft_username:
         await ctx.send(f"Could not find a matching player for '{target_display}'. Please specify a valid Minecraft or Discord username, or ensure you are linked.")
         return
 
-    stats = get_player_stats(minecraft_username=minecraft_username)
+    stats = await db.get_player_stats(minecraft_username=minecraft_username)
 
     if stats:
         formatted_time = format_playtime(stats[4])
@@ -160,7 +104,7 @@ async def deathlist_command(ctx, bot):
     """Show death counts for all players."""
     await ctx.message.add_reaction('💀')
 
-    deaths_data = get_all_deaths() # Already sorted lowest to highest
+    deaths_data = await db.get_all_deaths() # Already sorted lowest to highest
 
     if deaths_data:
         embed = discord.Embed(
@@ -205,7 +149,7 @@ async def advancementlist_command(ctx, bot):
     """Show advancement counts for all players."""
     await ctx.message.add_reaction('⭐')
 
-    adv_data = get_all_advancements() # Already sorted highest to lowest
+    adv_data = await db.get_all_advancements() # Already sorted highest to lowest
 
     if adv_data:
         embed = discord.Embed(
@@ -249,7 +193,7 @@ async def playtimelist_command(ctx, bot):
     """Show playtimes for all players."""
     await ctx.message.add_reaction('🕒')
 
-    playtime_data = get_all_playtimes() # Already sorted highest to lowest
+    playtime_data = await db.get_all_playtimes() # Already sorted highest to lowest
 
     if playtime_data:
         embed = discord.Embed(
@@ -289,6 +233,93 @@ async def playtimelist_command(ctx, bot):
     else:
         await ctx.send("No playtime data available.")
 
+async def rank_command(ctx, bot, username=None):
+    """Show where a player stands on each leaderboard, with the players around them."""
+    await ctx.message.add_reaction('🏆')
+
+    minecraft_username, target_display = await resolve_player(ctx, username)
+
+    if not minecraft_username:
+        await ctx.send(f"Could not find a matching player for '{target_display}'. Please specify a valid Minecraft or Discord username, or ensure you are linked.")
+        return
+
+    embed = discord.Embed(
+        title=f"Leaderboard Standing for {minecraft_username}",
+        color=discord.Color.blurple()
+    )
+
+    # (metric, field title, value formatter)
+    boards = (
+        ('deaths', "💀 Least Deaths", lambda v: f"{v} deaths"),
+        ('advancements', "⭐ Most Advancements", lambda v: f"{v} advancements"),
+        ('playtime', "🕒 Most Playtime", format_playtime),
+    )
+    for metric, title, fmt in boards:
+        standing = await db.get_rank(minecraft_username, metric, 2)
+        if not standing:
+            await ctx.send(f"No stats found for {minecraft_username}, even though the user was identified. Please check the database.")
+            return
+        rank, total, value, nearby = standing
+        lines = [f"**#{rank}** of {total} with {fmt(value)}"]
+        for position, mc_name, neighbor_value in nearby:
+            marker = "➤" if mc_name == minecraft_username else "  "
+            lines.append(f"`{marker}{position: >3}.` **`{mc_name}`**: {fmt(neighbor_value)}")
+        embed.add_field(name=title, value="\n".join(lines), inline=False)
+
+    await ctx.send(embed=embed)
+
+async def history_command(ctx, bot, username=None, bucket=None):
+    """Show a player's recent activity as text sparklines (one bar per day, week or month)."""
+    await ctx.message.add_reaction('📈')
+
+    # "!history week" means the author's own weekly history
+    if bucket is None and username and username.lower() in HISTORY_BUCKETS:
+        username, bucket = None, username
+    bucket = (bucket or 'day').lower()
+    if bucket not in HISTORY_BUCKETS:
+        await ctx.send("Invalid period. Use 'day', 'week' or 'month'.")
+        return
+
+    minecraft_username, target_display = await resolve_player(ctx, username)
+
+    if not minecraft_username:
+        await ctx.send(f"Could not find a matching player for '{target_display}'. Please specify a valid Minecraft or Discord username, or ensure you are linked.")
+        return
+
+    today = datetime.datetime.now(pytz.utc).date()
+    count, title = HISTORY_BUCKETS[bucket]
+    if bucket == 'day':
+        start = today - datetime.timedelta(days=count - 1)
+    elif bucket == 'week':
+        start = today - datetime.timedelta(weeks=count - 1)
+    else:
+        months_back = today.year * 12 + today.month - 1 - (count - 1)
+        start = datetime.date(months_back // 12, months_back % 12 + 1, 1)
+
+    timeline = await db.get_player_timeline(minecraft_username, start.isoformat(), today.isoformat(), bucket)
+    if not timeline:
+        await ctx.send("An error occurred while fetching history. Please check the logs.")
+        return
+    keys, series = timeline
+    # Archived days come back as None: only their weeks and months are still known
+    totals = {metric: sum(v for v in values if v is not None) for metric, values in series.items()}
+
+    lines = [
+        f"Playtime     {sparkline(series['playtime'])}  {format_playtime(totals['playtime'])}",
+        f"Deaths       {sparkline(series['deaths'])}  {totals['deaths']}",
+        f"Advancements {sparkline(series['advancements'])}  {totals['advancements']}",
+    ]
+    embed = discord.Embed(
+        title=f"{title} History for {minecraft_username}",
+        description="```\n" + "\n".join(lines) + "\n```",
+        color=discord.Color.teal()
+    )
+    footer = f"{keys[0]} to {keys[-1]} (UTC), one bar per {bucket}"
+    if None in series['deaths']:
+        footer += f"; {SPARK_GAP} = archived day, see !history week"
+    embed.set_footer(text=footer)
+    await ctx.send(embed=embed)
+
 
 async def currentstats_command(ctx, bot):
     """Displays stats accumulated for the current day and current week."""
@@ -297,7 +328,7 @@ async def currentstats_command(ctx, bot):
 
     try:
         # Get Today's Stats (period_days=1 includes only today based on new logic)
-        today_stats = get_stats_for_period(1) # Use 1 day period for today
+        today_stats = await db.get_stats_for_period(1) # Use 1 day period for today
 
         # Get This Week's Stats (Sunday to Now, est based)
         now_est = datetime.datetime.now(pytz.utc)
@@ -312,19 +343,7 @@ async def currentstats_command(ctx, bot):
         logger.debug(f"Fetching week stats from {start_date_str} to {end_date_str}")
 
         # Query specifically for the week range (Sun-Now)
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT minecraft_username,
-                   SUM(deaths) as total_deaths,
-                   SUM(advancements) as total_advancements,
-                   SUM(playtime_seconds) as total_playtime
-            FROM stats_history
-            WHERE date BETWEEN ? AND ?
-            GROUP BY minecraft_username
-        ''', (start_date_str, end_date_str))
-        week_stats = cursor.fetchall()
-        conn.close()
+        week_stats = await db.get_stats_for_range(start_date_str, end_date_str)
 
 
         # --- Create Embed ---
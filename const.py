@@ -1,4 +1,71 @@
 DATABASE_PATH = 'stats.db'
+STORAGE_BACKEND = 'sqlite'           # 'sqlite' (DATABASE_PATH) or 'memory' (nothing saved; load tests/benchmarks)
+
+# Database connection tuning
+DB_READER_POOL_SIZE = 4              # Max pooled reader connections
+DB_MMAP_SIZE = 64 * 1024 * 1024      # Bytes of the database file to memory-map for reads
+DB_CACHED_STATEMENTS = 256           # Prepared statements cached per connection
+DB_BUSY_TIMEOUT_SECONDS = 5.0        # How long to wait on a locked database before failing
+DB_WRITE_QUEUE_SIZE = 256            # Max writes waiting for the writer thread before callers wait
+DB_READER_THREADS = 4                # Threads serving async reads
+
+# Write-behind buffering of death/advancement/playtime increments
+STATS_FLUSH_INTERVAL_SECONDS = 5.0   # Buffered increments are written at least this often
+STATS_MAX_BUFFERED_EVENTS = 100      # ...or as soon as this many increments are waiting
+REPLAY_CHUNK_SIZE = 50000            # Rows streamed per chunk when replaying the events log
+
+# stats_history retention (see database/retention.py)
+HISTORY_HOT_DAYS = 400               # Daily rows older than this (whole months) are compacted into per-week archive rows
+RETENTION_BATCH_ROWS = 5000          # Max history rows removed per retention transaction
+RETENTION_INTERVAL_MINUTES = 60      # How often the retention task runs
+
+# Processed webhook message ledger (see database/message_ledger.py)
+LEDGER_CACHE_SIZE = 4096             # Recent message ids checked without touching the database
+LEDGER_TTL_DAYS = 14                 # processed_messages rows older than this are pruned by the retention task
+
+# Online backups (see database/backup.py)
+BACKUP_DIR = 'backups'               # Where compressed snapshots and their .sha256 files go
+BACKUP_KEEP = 14                     # Snapshots kept; older ones are deleted
+BACKUP_INTERVAL_HOURS = 12           # How often the scheduled backup runs
+BACKUP_PAGES_PER_STEP = 1024         # Pages copied per backup step (4 MiB at the default page size)
+BACKUP_STEP_SLEEP_SECONDS = 0.005    # Pause between steps
+BACKUP_GZIP_LEVEL = 1                # Fastest; level 6 takes ~1.5x as long for ~10% smaller snapshots (python -m database.benchmark backup)
+
+# Exports (see database/export.py)
+EXPORT_CHUNK_ROWS = 5000             # Rows fetched from the cursor per chunk while exporting
+
+# World stats import (see ingest/world_stats.py)
+WORLD_DIR = 'world'                  # The default server's world directory; stats/ inside it, usercache.json next to it
+WORLD_STATS_WORKERS = None           # Parser processes (None = CPU count)
+WORLD_STATS_MIN_PARALLEL_FILES = 256 # Fewer files than this are parsed in-process
+
+# Server log ingestion (see ingest/log_tailer.py)
+SERVER_LOG_PATH = None               # e.g. '/srv/mc/logs/latest.log'; when set it replaces the webhook channel as the event source
+SERVER_LOG_POLL_SECONDS = 2          # How often the log is checked for new lines
+SERVER_LOG_MAX_READ_BYTES = 1 << 20  # Most bytes read per poll (catching up after downtime is spread over polls)
+
+# Event pipeline behind on_message (see tasks/event_pipeline.py)
+EVENT_QUEUE_SIZE = 1000              # Events waiting to be persisted before on_message has to wait
+EVENT_PIPELINE_WORKERS = 4           # Concurrent Discord side effects (one player's always run in order)
+
+# Leaderboard refreshes (see tasks/refresh_scheduler.py)
+LEADERBOARD_REFRESH_WINDOW_SECONDS = 10     # Refresh once stat changes have stopped for this long
+LEADERBOARD_REFRESH_MAX_DELAY_SECONDS = 30  # ...or this long after the first one, whichever comes first
+
+# Bot presence updates (see tasks/presence.py)
+PRESENCE_WINDOW_SECONDS = 5          # Status changes within this long are sent as one update
+PRESENCE_BUDGET = 5                  # Max presence updates...
+PRESENCE_BUDGET_SECONDS = 20         # ...per this many seconds
+
+# Death quips (see tasks/death_quips.py)
+DEATH_QUIPS_PATH = 'death_quips.txt' # One quip per line, {player} for the name; !reloadquips re-reads it
+
+# Minecraft servers (see tasks/servers.py); SERVERS below the channel ids maps each webhook channel to one
+DEFAULT_SERVER_ID = 'main'           # Server of stats recorded before there were several, and of the server log tailer
+
+# Webhook history backfill (see ingest/webhook.py and database/backfill.py)
+BACKFILL_BATCH_SIZE = 2000           # Messages written per transaction
+BACKFILL_DEFAULT_DAYS = 7            # How far back !backfill reads the webhook channel by default
 
 ROLES: list[str] = []
 
@@ -15,6 +82,14 @@ SCOREBOARD_CHANNEL_ID = 1343755601070657566
 LOG_CHANNEL_ID = 1347641109773287444
 WEEKLY_RANKINGS_CHANNEL_ID = 1349557854213898322
 
+# Webhook channel id -> Minecraft server. 'id' namespaces the server's stats (never change it once used);
+# 'scoreboard_channel_id' optionally gets that server's own leaderboards next to the global ones in
+# SCOREBOARD_CHANNEL_ID. Add a server with its own webhook channel, e.g.
+#     1400000000000000000: {'id': 'creative', 'name': "Creative", 'scoreboard_channel_id': 1400000000000000001},
+SERVERS = {
+    WEBHOOK_CHANNEL_ID: {'id': DEFAULT_SERVER_ID, 'name': "Survival", 'scoreboard_channel_id': None},
+}
+
 # Role IDs for achievements and deaths
 MOST_DEATHS_ROLE = "💀 Skill Issue"
 ROLES.append(MOST_DEATHS_ROLE)
@@ -133,4 +208,4 @@ TOKEN_FILE = "token.txt"               # Contains Discord Bot Token
 GOOGLE_API_KEY_FILE = "google_api_key.txt"
 API_KEY_FILE = "apikey.txt"            # Contains Hugging Face User Access Token
 DATABASE_FILE = "assistants.db"        # SQLite database file name
-LOGGING_MODULE_PATH = "utils.logging"  # Path to your logging.py (e.g., 'utils.logging')
\ No newline at end of file
+LOGGING_MODULE_PATH = "utils.logging"  # Path to your logging.py (e.g., 'utils.logging')
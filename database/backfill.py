@@ -0,0 +1,149 @@
+"""Count webhook messages the bot missed while it was offline.
+
+Events parsed from old messages (see ingest/webhook.py) are applied at their
+original timestamps: sessions are measured from the real join/leave times and
+stats land on the day they happened. A leave the bot never saw used to leave an
+online_players row behind that inflated the next session; replaying the gap
+closes it at the right time instead.
+
+Each message id is counted at most once: messages whose id is already in the
+processed message ledger or the events log (recorded live or by an earlier
+backfill) are skipped, so running a backfill twice, or over a range the bot was
+partly online for, changes nothing. Counted ids are added to the ledger.
+"""
+import datetime
+import logging
+import time
+import pytz
+from const import BACKFILL_BATCH_SIZE, DEFAULT_SERVER_ID
+from database.batcher import DEATHS, ADVANCEMENTS, PLAYTIME
+from database.connection import write_connection
+from database.events import (
+    EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_SERVER_STOP, insert_events, reset_player_ids
+)
+from database.message_ledger import message_ledger
+from database.player_registry import registry
+from database.rank_index import rank_index
+from database.queries import flush_pending_stats, mark_stats_changed, _apply_stat_deltas
+
+logger = logging.getLogger('nameless_bot')
+
+
+def fold_events(batch, online, server_id=DEFAULT_SERVER_ID):
+    """Apply chronological (event_type, minecraft_username, ts, message_id) events from one server.
+
+    `online` ({minecraft_username: login_time}, the server's online_players rows) is
+    updated in place. Returns (events table rows, {(player, UTC date, server_id): [deaths,
+    advancements, playtime]}).
+    """
+    rows, deltas = [], {}
+
+    def credit(minecraft_username, ts, index, amount):
+        date = datetime.datetime.fromtimestamp(ts, pytz.utc).strftime("%Y-%m-%d")
+        deltas.setdefault((minecraft_username, date, server_id), [0, 0, 0])[index] += amount
+
+    for event_type, minecraft_username, ts, message_id in batch:
+        value = 0
+        if event_type == EVENT_JOIN:
+            if online.get(minecraft_username, ts) <= ts: # Unless a later session is already open
+                online[minecraft_username] = ts
+        elif event_type == EVENT_LEAVE:
+            login_time = online.get(minecraft_username)
+            if login_time is not None and login_time <= ts:
+                value = ts - login_time
+                del online[minecraft_username]
+                credit(minecraft_username, ts, PLAYTIME, value)
+        elif event_type == EVENT_DEATH:
+            credit(minecraft_username, ts, DEATHS, 1)
+        elif event_type == EVENT_ADVANCEMENT:
+            credit(minecraft_username, ts, ADVANCEMENTS, 1)
+        rows.append((event_type, minecraft_username, ts, message_id, value, server_id))
+
+        if event_type == EVENT_SERVER_STOP:
+            # Close every session open at the time, like clear_online_players()
+            for name, login_time in [(n, t) for n, t in online.items() if t <= ts]:
+                rows.append((EVENT_LEAVE, name, ts, None, ts - login_time, server_id))
+                credit(name, ts, PLAYTIME, ts - login_time)
+                del online[name]
+    return rows, deltas
+
+def new_events(batch, seen, summary):
+    """Drop events whose message was already counted (adding the rest to `seen`) and
+    events for players not in player_stats; names are mapped to their stored spelling.
+    """
+    fresh = []
+    for event_type, minecraft_username, ts, message_id in batch:
+        if message_id is not None:
+            if message_id in seen:
+                summary['duplicates'] += 1
+                continue
+            seen.add(message_id)
+        if minecraft_username is not None:
+            known_username = registry.canonical_minecraft(minecraft_username)
+            if not known_username:
+                summary['unknown'] += 1
+                continue
+            minecraft_username = known_username
+        fresh.append((event_type, minecraft_username, ts, message_id))
+    summary['recorded'] += len(fresh)
+    return fresh
+
+def new_summary(events):
+    return {'messages': len(events), 'recorded': 0, 'duplicates': 0, 'unknown': 0, 'playtime': 0}
+
+def _counted_message_ids(conn, message_ids):
+    seen = set()
+    for i in range(0, len(message_ids), 500):
+        chunk = message_ids[i:i + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        seen.update(row[0] for row in conn.execute(
+            f"SELECT message_id FROM processed_messages WHERE message_id IN ({placeholders}) "
+            f"UNION SELECT message_id FROM events WHERE message_id IN ({placeholders})", chunk + chunk
+        ))
+    return seen
+
+def backfill_webhook_events(events, batch_size=BACKFILL_BATCH_SIZE, server_id=DEFAULT_SERVER_ID):
+    """Record (event_type, minecraft_username, ts, message_id) events from one server's old webhook messages.
+
+    Events are sorted by time and written BACKFILL_BATCH_SIZE per transaction,
+    together with the changes to the server's online_players rows they imply. Returns a summary dict,
+    or None on error (batches already written stay; running again is safe).
+    """
+    started = time.perf_counter()
+    events = sorted(events, key=lambda e: (e[2], e[3] or 0))
+    summary = new_summary(events)
+    try:
+        flush_pending_stats() # Live events must be in the table to be recognized
+        for start in range(0, len(events), batch_size):
+            batch = events[start:start + batch_size]
+            with write_connection() as conn:
+                seen = _counted_message_ids(conn, [e[3] for e in batch if e[3] is not None])
+                online = dict(conn.execute(
+                    "SELECT minecraft_username, login_time FROM online_players WHERE server_id = ?", (server_id,)
+                ))
+                before = dict(online)
+                fresh = new_events(batch, seen, summary)
+                processed = [e[3] for e in fresh if e[3] is not None]
+                rows, deltas = fold_events(fresh, online, server_id)
+                insert_events(conn, rows)
+                conn.executemany("INSERT OR IGNORE INTO processed_messages (message_id, processed_at) VALUES (?, ?)",
+                                 [(message_id, int(time.time())) for message_id in processed])
+                _apply_stat_deltas(conn, deltas)
+                conn.executemany("DELETE FROM online_players WHERE server_id = ? AND minecraft_username = ?",
+                                 [(server_id, name) for name in before if name not in online])
+                conn.executemany("INSERT OR REPLACE INTO online_players (server_id, minecraft_username, login_time) VALUES (?, ?, ?)",
+                                 [(server_id, name, ts) for name, ts in online.items() if before.get(name) != ts])
+            message_ledger.note_written(processed)
+            for (minecraft_username, _, _), (d, a, p) in deltas.items():
+                rank_index.add(minecraft_username, d, a, p)
+                summary['playtime'] += p
+            if deltas:
+                mark_stats_changed()
+    except Exception as e:
+        reset_player_ids() # The failed batch may have created players rows that were rolled back
+        logger.error(f"Error backfilling webhook events: {e}")
+        return None
+    summary['seconds'] = time.perf_counter() - started
+    logger.info(f"Backfilled {summary['recorded']} of {summary['messages']} webhook events from {server_id} in {summary['seconds']:.2f}s "
+                f"({summary['duplicates']} already counted, {summary['unknown']} unknown players)")
+    return summary
@@ -0,0 +1,204 @@
+"""Online backups of stats.db.
+
+Snapshots are taken with SQLite's backup API while the bot keeps running, a
+few pages per step, then gzipped next to a sha256 checksum file. Only the
+newest BACKUP_KEEP snapshots are kept.
+
+    python -m database.backup                   # take a snapshot now
+    python -m database.backup --verify FILE     # check a snapshot's checksum and integrity
+    python -m database.backup --restore FILE    # verify, then swap it in (stop the bot first)
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import pytz
+from const import (
+    DATABASE_PATH, DB_BUSY_TIMEOUT_SECONDS, BACKUP_DIR, BACKUP_KEEP,
+    BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP_SECONDS, BACKUP_GZIP_LEVEL
+)
+from database.connection import close_connections
+
+logger = logging.getLogger('nameless_bot')
+
+SNAPSHOT_PREFIX = "stats-"
+SNAPSHOT_SUFFIX = ".db.gz"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _integrity_error(path):
+    """Return None if the database at `path` passes PRAGMA integrity_check, else the problem."""
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        return str(e)
+    finally:
+        conn.close()
+    return None if result == "ok" else result
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    """Snapshot paths in `backup_dir`, newest first."""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [n for n in os.listdir(backup_dir) if n.startswith(SNAPSHOT_PREFIX) and n.endswith(SNAPSHOT_SUFFIX)]
+    return [os.path.join(backup_dir, n) for n in sorted(names, reverse=True)] # Names sort by timestamp
+
+def _rotate(backup_dir, keep):
+    for path in list_snapshots(backup_dir)[keep:]:
+        for stale in (path, path + ".sha256"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        logger.info(f"Deleted old backup {path}")
+
+def backup_database(source_path=DATABASE_PATH, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP,
+                    pages_per_step=BACKUP_PAGES_PER_STEP, step_sleep=BACKUP_STEP_SLEEP_SECONDS,
+                    gzip_level=BACKUP_GZIP_LEVEL):
+    """Write a new compressed snapshot of the live database. Returns a summary dict.
+
+    The copy runs on its own connection inside one read transaction: under WAL
+    that pins a consistent snapshot, so commits made meanwhile by the bot neither
+    block on the backup nor force it to start over. The lock is released for
+    `step_sleep` seconds between steps of `pages_per_step` pages.
+    """
+    started = time.perf_counter()
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.datetime.now(pytz.utc).strftime("%Y%m%d-%H%M%S")
+    name, n = f"{SNAPSHOT_PREFIX}{stamp}", 1
+    while os.path.exists(os.path.join(backup_dir, name + SNAPSHOT_SUFFIX)):
+        n += 1
+        name = f"{SNAPSHOT_PREFIX}{stamp}-{n}"
+    raw_path = os.path.join(backup_dir, name + ".db.partial")
+    snapshot_path = os.path.join(backup_dir, name + SNAPSHOT_SUFFIX)
+
+    try:
+        source = sqlite3.connect(source_path, timeout=DB_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        try:
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone() # Starts the read transaction
+            dest = sqlite3.connect(raw_path)
+            try:
+                source.backup(dest, pages=pages_per_step, sleep=step_sleep)
+            finally:
+                dest.close()
+            source.execute("COMMIT")
+        finally:
+            source.close()
+        copy_seconds = time.perf_counter() - started
+
+        problem = _integrity_error(raw_path)
+        if problem:
+            raise sqlite3.DatabaseError(f"Backup copy failed integrity check: {problem}")
+
+        # Compress under a temporary name so a half-written file never looks like a snapshot
+        with open(raw_path, 'rb') as src, gzip.open(snapshot_path + ".partial", 'wb', compresslevel=gzip_level) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(snapshot_path + ".partial", snapshot_path)
+        checksum = _sha256(snapshot_path)
+        with open(snapshot_path + ".sha256", 'w') as f:
+            f.write(f"{checksum}  {os.path.basename(snapshot_path)}\n") # sha256sum -c format
+        raw_size = os.path.getsize(raw_path)
+    finally:
+        for leftover in (raw_path, snapshot_path + ".partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    _rotate(backup_dir, keep)
+    summary = {
+        'path': snapshot_path,
+        'sha256': checksum,
+        'database_bytes': raw_size,
+        'snapshot_bytes': os.path.getsize(snapshot_path),
+        'copy_seconds': copy_seconds,
+        'seconds': time.perf_counter() - started,
+    }
+    logger.info(f"Backed up {source_path} to {snapshot_path} ({raw_size} -> {summary['snapshot_bytes']} bytes) "
+                f"in {summary['seconds']:.2f}s")
+    return summary
+
+def _unpack_verified(snapshot_path, dest_path):
+    """Check the snapshot's checksum, decompress it to `dest_path` and run an integrity check.
+    Raises ValueError / sqlite3.DatabaseError (and removes `dest_path`) on any problem.
+    """
+    checksum_path = snapshot_path + ".sha256"
+    if not os.path.exists(checksum_path):
+        raise ValueError(f"No checksum file next to {snapshot_path}")
+    with open(checksum_path) as f:
+        expected = f.read().split()[0]
+    actual = _sha256(snapshot_path)
+    if actual != expected:
+        raise ValueError(f"Checksum mismatch for {snapshot_path}: expected {expected}, got {actual}")
+
+    try:
+        with gzip.open(snapshot_path, 'rb') as src, open(dest_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        problem = _integrity_error(dest_path)
+        if problem:
+            raise sqlite3.DatabaseError(f"{snapshot_path} failed integrity check: {problem}")
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+
+def verify_snapshot(snapshot_path):
+    """Return (ok, message) for a snapshot without touching the live database."""
+    scratch = snapshot_path + ".verify"
+    try:
+        _unpack_verified(snapshot_path, scratch)
+        return True, f"{snapshot_path} is intact"
+    except (ValueError, OSError, sqlite3.DatabaseError) as e:
+        return False, str(e)
+    finally:
+        if os.path.exists(scratch):
+            os.remove(scratch)
+
+def restore_backup(snapshot_path, db_path=DATABASE_PATH):
+    """Replace the database with a verified snapshot. Returns the path the old database was moved to.
+
+    Nothing is swapped unless the snapshot passes its checksum and integrity check.
+    The bot must not be running: the restore closes this process's connections,
+    but can't stop another process from writing to the old file.
+    """
+    staged = db_path + ".restore"
+    _unpack_verified(snapshot_path, staged)
+
+    close_connections()
+    previous = None
+    if os.path.exists(db_path):
+        # Keep the old database (and its WAL) in case the wrong snapshot was picked
+        previous = f"{db_path}.pre-restore-{datetime.datetime.now(pytz.utc).strftime('%Y%m%d-%H%M%S')}"
+        os.replace(db_path, previous)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.replace(db_path + suffix, previous + suffix)
+    os.replace(staged, db_path)
+    logger.info(f"Restored {db_path} from {snapshot_path} (previous database kept at {previous})")
+    return previous
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back up, verify or restore stats.db.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--verify", metavar="FILE", help="Check a snapshot's checksum and integrity")
+    group.add_argument("--restore", metavar="FILE", help="Verify a snapshot and swap it in (stop the bot first)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.verify:
+        ok, message = verify_snapshot(args.verify)
+        print(message)
+        raise SystemExit(0 if ok else 1)
+    elif args.restore:
+        print(f"Restored. Previous database kept at {restore_backup(args.restore)}")
+    else:
+        print(backup_database())
@@ -0,0 +1,169 @@
+import threading
+import logging
+from contextlib import contextmanager
+from const import STATS_MAX_BUFFERED_EVENTS, DEFAULT_SERVER_ID
+
+logger = logging.getLogger('nameless_bot')
+
+# Index of each counter inside a delta list
+DEATHS, ADVANCEMENTS, PLAYTIME = 0, 1, 2
+
+
+class StatsBatcher:
+    """In-memory accumulator for stat increments, merged per (player, date, server).
+
+    record_death/record_advancement/record_logout add deltas here instead of
+    writing straight away; database.queries.flush_pending_stats() drains them
+    into one transaction. Deltas stay visible to readers (see pending_totals /
+    pending_for_range) until the transaction that writes them has committed.
+    A reader that adds them onto table rows must hold stats_view.shared() for
+    the whole read: the flush commits and calls commit() under
+    stats_view.exclusive(), so the reader sees each delta exactly once.
+    """
+
+    def __init__(self, max_buffered_events=STATS_MAX_BUFFERED_EVENTS):
+        self.max_buffered_events = max_buffered_events
+        self._lock = threading.Lock()
+        self._pending = {}   # (minecraft_username, date, server_id) -> [deaths, advancements, playtime]
+        self._in_flight = {} # Drained but not yet committed
+        self._event_count = 0    # Increments in _pending (not keys: one key merges many)
+        self._in_flight_count = 0 # Increments in _in_flight
+
+    def add(self, minecraft_username, date, deaths=0, advancements=0, playtime=0, server_id=DEFAULT_SERVER_ID):
+        """Buffer an increment. Returns True once the buffer should be flushed."""
+        with self._lock:
+            delta = self._pending.setdefault((minecraft_username, date, server_id), [0, 0, 0])
+            delta[DEATHS] += deaths
+            delta[ADVANCEMENTS] += advancements
+            delta[PLAYTIME] += playtime
+            self._event_count += 1
+            return self._event_count >= self.max_buffered_events
+
+    def drain(self):
+        """Move all pending deltas to in-flight and return them as {(player, date, server): [d, a, p]}."""
+        with self._lock:
+            if self._in_flight:
+                # A previous flush never finished; fold it back in so nothing is lost
+                self._merge(self._pending, self._in_flight)
+                self._event_count += self._in_flight_count
+            self._in_flight = self._pending
+            self._in_flight_count = self._event_count
+            self._pending = {}
+            self._event_count = 0
+            return dict(self._in_flight)
+
+    def commit(self):
+        """Forget the in-flight deltas once they are safely in the database."""
+        with self._lock:
+            self._in_flight = {}
+            self._in_flight_count = 0
+
+    def restore(self):
+        """Put in-flight deltas back into the buffer after a failed flush."""
+        with self._lock:
+            self._merge(self._pending, self._in_flight)
+            self._event_count += self._in_flight_count
+            self._in_flight = {}
+            self._in_flight_count = 0
+
+    def discard_player(self, minecraft_username):
+        """Drop every buffered delta for a player (used when the player is deleted)."""
+        with self._lock:
+            for buffer in (self._pending, self._in_flight):
+                for key in [k for k in buffer if k[0] == minecraft_username]:
+                    del buffer[key]
+
+    def pending_count(self):
+        with self._lock:
+            return self._event_count
+
+    def pending_totals(self, server_id=None):
+        """Unwritten deltas summed per player: {player: [d, a, p]} (one server's, or all of them)."""
+        return self.pending_for_range(None, None, server_id)
+
+    def pending_for_range(self, start_date, end_date, server_id=None):
+        """Unwritten deltas summed per player for an inclusive date range (None = unbounded)
+        on one server, or summed over every server if server_id is None.
+        """
+        totals = {}
+        with self._lock:
+            for buffer in (self._in_flight, self._pending):
+                for (player, date, server), delta in buffer.items():
+                    if server_id is not None and server != server_id:
+                        continue
+                    if start_date is not None and date < start_date:
+                        continue
+                    if end_date is not None and date > end_date:
+                        continue
+                    total = totals.setdefault(player, [0, 0, 0])
+                    total[DEATHS] += delta[DEATHS]
+                    total[ADVANCEMENTS] += delta[ADVANCEMENTS]
+                    total[PLAYTIME] += delta[PLAYTIME]
+        return totals
+
+    def pending_by_date(self):
+        """Unwritten deltas per (player, date), summed over servers: {(player, date): [d, a, p]}."""
+        merged = {}
+        with self._lock:
+            for buffer in (self._in_flight, self._pending):
+                for (player, date, _), delta in buffer.items():
+                    current = merged.setdefault((player, date), [0, 0, 0])
+                    for i in range(3):
+                        current[i] += delta[i]
+        return merged
+
+    @staticmethod
+    def _merge(target, source):
+        for key, delta in source.items():
+            current = target.setdefault(key, [0, 0, 0])
+            for i in range(3):
+                current[i] += delta[i]
+
+
+class SharedLock:
+    """A lock held by any number of threads in shared mode, or by one in exclusive mode.
+    A thread waiting for exclusive mode goes before new shared holders, so a steady
+    stream of readers can't hold off a flush. Not re-entrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._shared = 0
+        self._exclusive = False
+        self._exclusive_waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._exclusive or self._exclusive_waiting:
+                self._cond.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                if not self._shared:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._exclusive_waiting += 1
+            while self._exclusive or self._shared:
+                self._cond.wait()
+            self._exclusive_waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+
+# Process-wide batcher used by database.queries
+stats_batcher = StatsBatcher()
+# Held shared by readers that combine table rows with buffered deltas, exclusive
+# by the flush while it commits and drops its in-flight deltas
+stats_view = SharedLock()
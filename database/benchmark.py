@@ -0,0 +1,443 @@
+"""Run the same event workload through database.db against each storage backend.
+
+    python -m database.benchmark                          # both backends, default sizes
+    python -m database.benchmark --backend memory --events 200000
+    python -m database.benchmark retention --years 3      # history size and reads, before and after retention
+    python -m database.benchmark rank --players 100000    # !rank lookups: rank index vs sorting get_all_*
+    python -m database.benchmark replay --events 3000000  # rebuild every aggregate from the events log
+    python -m database.benchmark bulk --players 10000     # server stop / daily save / bulk update with everyone online
+    python -m database.benchmark backup --events 3000000  # online backup while the bot writes
+
+The SQLite run uses a fresh stats.db in a temporary directory, never the bot's.
+Every call goes through the async facade (writer thread, reader pool), so this
+measures the whole pipeline the bot uses, not just the storage code. After both
+runs the final stats are compared, so a backend that drifts from the other fails.
+
+The other workloads time one part of database.queries on a synthetic stats.db,
+also in a temporary directory, and check that the faster path returns the same
+results as the one it replaces:
+
+- retention: several years of daily history, measured before and after
+  database.retention compacts everything past HISTORY_HOT_DAYS (rows, bytes
+  in use, and the time for range and timeline reads across both tiers).
+- rank: get_rank (the rank index) against sorting a whole get_all_* board
+  and scanning it, on 100k players by default.
+- replay: database.replay on a synthetic events log of a few million events;
+  the rebuilt totals must match the ones the log was generated with.
+- bulk: the set-based maintenance writes (save_daily_stats,
+  clear_online_players, bulk_update_history) with 10k players online.
+- backup: database.backup on a large stats.db (a synthetic events log
+  replayed into every table) while a writer keeps recording deaths; reports
+  the wall time and the writer's worst stall, idle and during the backup.
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import pytz
+from const import DATABASE_PATH, BACKUP_GZIP_LEVEL
+from database import db, queries, retention, rollups
+from database.backup import backup_database, verify_snapshot
+from database.connection import close_connections, read_connection, write_connection
+from database.events import EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT
+from database.rank_index import METRICS
+from database.replay import replay_events
+
+logger = logging.getLogger('nameless_bot')
+
+
+async def _run_workload(players, event_count, seed):
+    """Returns ({phase: seconds}, final state used for the cross-backend comparison)."""
+    rng = random.Random(seed)
+    names = [f"bench_player_{i}" for i in range(players)]
+    timings = {}
+
+    started = time.perf_counter()
+    await db.initialize_database()
+    for name in names:
+        await db.add_player(name, f"{name}#0")
+    timings['setup'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await asyncio.gather(*(db.record_login(name) for name in names))
+    for batch_start in range(0, event_count, 1000):
+        batch = []
+        for _ in range(min(1000, event_count - batch_start)):
+            record = db.record_death if rng.random() < 0.7 else db.record_advancement
+            batch.append(record(rng.choice(names)))
+        await asyncio.gather(*batch) # A burst of webhook messages
+    await asyncio.gather(*(db.record_logout(name) for name in names))
+    await db.flush_pending_stats()
+    timings['events'] = time.perf_counter() - started
+
+    today = datetime.datetime.now(pytz.utc).date()
+    started = time.perf_counter()
+    for _ in range(100):
+        await db.record_death(rng.choice(names)) # Invalidate the cached snapshot each time
+        await db.get_leaderboard_snapshot()
+        await db.get_all_deaths()
+        await db.get_stats_for_period(7)
+        await db.get_player_stats(rng.choice(names))
+        await db.get_player_timeline(rng.choice(names), (today - datetime.timedelta(days=29)).isoformat(), today.isoformat())
+    timings['reads'] = time.perf_counter() - started
+
+    # Playtime depends on how long each backend took, so only counters are compared
+    final = (sorted(row[:4] for row in await db.get_all_players()),
+             sorted(row[:3] for row in await db.get_stats_for_period(1)))
+    return timings, final
+
+async def _run_backends(backends, players, event_count, seed):
+    results, finals = {}, {}
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as scratch:
+            previous_dir = os.getcwd()
+            os.chdir(scratch) # DATABASE_PATH is relative, so SQLite writes here
+            storage = db.use_storage(backend)
+            try:
+                timings, finals[backend] = await _run_workload(players, event_count, seed)
+            finally:
+                storage.close()
+                os.chdir(previous_dir)
+        timings['events_per_second'] = event_count / timings['events']
+        results[backend] = timings
+    return results, finals
+
+def run_benchmark(backends=('sqlite', 'memory'), players=200, event_count=20000, seed=1):
+    """Run the workload on each backend in turn. Returns {backend: {phase: seconds}}."""
+    previous_storage = db.current_storage()
+    try:
+        # One event loop for every run: the facade's write queue belongs to the loop that first used it
+        results, finals = asyncio.run(_run_backends(backends, players, event_count, seed))
+    finally:
+        db.use_storage(previous_storage)
+
+    reference = finals[backends[0]]
+    for backend, final in finals.items():
+        if final != reference:
+            raise AssertionError(f"Backend {backend} ended with different stats than {backends[0]}")
+    return results
+
+@contextmanager
+def _scratch_database():
+    """Point database.queries at a fresh stats.db in a temporary directory for the block."""
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        close_connections()
+        os.chdir(scratch) # DATABASE_PATH is relative
+        try:
+            queries.initialize_database()
+            yield scratch
+        finally:
+            close_connections()
+            os.chdir(previous_dir)
+
+def _timed(func, *args, repeat=1):
+    """(result of the last call, seconds per call)."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return result, (time.perf_counter() - started) / repeat
+
+def _history_size():
+    """Rows in both history tiers and the bytes of every page in use."""
+    with read_connection() as conn:
+        rows = conn.execute("SELECT (SELECT COUNT(*) FROM stats_history) + (SELECT COUNT(*) FROM stats_history_archive)").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return rows, pages * conn.execute("PRAGMA page_size").fetchone()[0]
+
+def _history_reads(names, start, today, repeat):
+    """Time the history reads the bot makes, over ranges reaching back into archived years.
+    Returns ({read: seconds per call}, {read: result}).
+    """
+    first = start.replace(day=1)
+    sunday = datetime.date.fromisoformat(rollups.week_start((today - datetime.timedelta(days=500)).isoformat()))
+    reads = {
+        'range_all': (queries.get_stats_for_range, first.isoformat(), today.isoformat()),
+        'range_from_sunday': (queries.get_stats_for_range, sunday.isoformat(), today.isoformat()),
+        'range_last_week': (queries.get_stats_for_range, (today - datetime.timedelta(days=6)).isoformat(), today.isoformat()),
+        'timeline_month': (queries.get_players_timeline, names[:10], first.isoformat(), today.isoformat(), 'month'),
+        'timeline_week': (queries.get_players_timeline, names[:10], sunday.isoformat(), today.isoformat(), 'week'),
+        'timeline_day': (queries.get_players_timeline, names[:10], (today - datetime.timedelta(days=29)).isoformat(), today.isoformat(), 'day'),
+    }
+    timings, results = {}, {}
+    for read, (func, *args) in reads.items():
+        results[read], timings[read] = _timed(func, *args, repeat=repeat)
+    return timings, results
+
+def run_retention_benchmark(players=50, years=3, servers=2, repeat=20, seed=1):
+    """Fill a scratch stats.db with `years` of daily history, then measure size and reads
+    before and after retention. Returns {'hot': {...}, 'tiered': {...}, 'retention': seconds}.
+    """
+    rng = random.Random(seed)
+    names = [f"bench_player_{i}" for i in range(players)]
+    server_ids = ['main'] + [f"server_{i}" for i in range(1, servers)]
+    today = datetime.datetime.now(pytz.utc).date()
+    start = today - datetime.timedelta(days=365 * years)
+    results = {}
+    with _scratch_database():
+        day = start
+        while day <= today:
+            rows = []
+            month = day.month
+            while day <= today and day.month == month: # One transaction per month
+                rows.extend(
+                    (name, day.isoformat(), rng.randint(0, 3), int(rng.random() < 0.2), rng.randint(60, 7200), server_id)
+                    for name in names for server_id in server_ids if rng.random() < 0.6
+                )
+                day += datetime.timedelta(days=1)
+            with write_connection() as conn:
+                rollups.upsert_history_rows(conn, rows)
+
+        for phase in ('hot', 'tiered'):
+            if phase == 'tiered':
+                _, results['retention'] = _timed(retention.run_retention)
+            rows, size = _history_size()
+            timings, answers = _history_reads(names, start, today, repeat)
+            results[phase] = {'rows': rows, 'bytes': size, 'reads': timings, 'answers': answers}
+
+    # Reads that reach archived days return None by design; everything else must not change
+    hot, tiered = results['hot']['answers'], results['tiered']['answers']
+    for read in hot:
+        if read != 'timeline_day' and hot[read] != tiered[read]:
+            raise AssertionError(f"{read} changed after retention")
+    return results
+
+def _rank_by_sorting(minecraft_username, metric, neighbors=0):
+    """get_rank the way it was done before the rank index: the whole sorted board, scanned in Python."""
+    rows = {'deaths': queries.get_all_deaths, 'advancements': queries.get_all_advancements,
+            'playtime': queries.get_all_playtimes}[metric]()
+    position = next(i for i, row in enumerate(rows) if row[0] == minecraft_username)
+    value = rows[position][2]
+    rank = next(i for i, row in enumerate(rows) if row[2] == value) + 1 # Ties share the first one's rank
+    first = max(0, position - neighbors)
+    nearby = [(i, row[0], row[2]) for i, row in enumerate(rows[first:position + neighbors + 1], first + 1)]
+    return rank, len(rows), value, nearby
+
+def run_rank_benchmark(players=100000, lookups=1000, sort_lookups=10, neighbors=2, seed=1):
+    """Time !rank's lookups (rank plus neighbours on all three boards) through the rank index
+    and by sorting, on `players` random players. Returns {phase: seconds}; lookups are per player.
+    """
+    rng = random.Random(seed)
+    names = [f"bench_player_{i}" for i in range(players)]
+    timings, answers = {}, {}
+    with _scratch_database():
+        with write_connection() as conn:
+            conn.executemany(
+                "INSERT INTO player_stats (minecraft_username, discord_username, deaths, advancements, playtime_seconds) VALUES (?, ?, ?, ?, ?)",
+                [(name, f"{name}#0", rng.randint(0, 500), rng.randint(0, 120), rng.randint(0, 10 ** 6)) for name in names]
+            )
+        _, timings['startup'] = _timed(queries.initialize_database) # Seeds the registry and the rank index
+
+        sample = rng.sample(names, lookups)
+        for approach, get_rank, count in (('index', queries.get_rank, lookups), ('sort', _rank_by_sorting, sort_lookups)):
+            started = time.perf_counter()
+            answers[approach] = [[get_rank(name, metric, neighbors) for metric in METRICS] for name in sample[:count]]
+            timings[approach] = (time.perf_counter() - started) / count
+
+        _, timings['record_death'] = _timed(lambda: queries.record_death(rng.choice(names)), repeat=1000)
+        queries.flush_pending_stats()
+
+    # Tied players may be listed in another order (and so have other neighbours): compare the standings only
+    def comparable(standings):
+        return [[standing[:3] for standing in player] for player in standings]
+    if comparable(answers['index'][:sort_lookups]) != comparable(answers['sort']):
+        raise AssertionError("The rank index disagrees with the sorted boards")
+    return timings
+
+def _fill_events_log(players, event_count, days, seed, chunk_size=100000):
+    """Write a synthetic events log (deaths, advancements and sessions of `players` players spread
+    over the last `days` days) straight into the tables, with player_stats set to the totals it
+    adds up to. Call inside _scratch_database().
+    """
+    rng = random.Random(seed)
+    names = [f"bench_player_{i}" for i in range(players)]
+    totals = {name: [0, 0, 0] for name in names}
+    now = int(datetime.datetime.now(pytz.utc).timestamp())
+    with write_connection() as conn:
+        conn.executemany("INSERT INTO players (minecraft_username) VALUES (?)", [(name,) for name in names])
+        ids = dict(conn.execute("SELECT minecraft_username, id FROM players"))
+    for chunk_start in range(0, event_count, chunk_size):
+        rows = []
+        for message_id in range(chunk_start, min(chunk_start + chunk_size, event_count)):
+            name = rng.choice(names)
+            roll = rng.random()
+            event_type, value = (EVENT_DEATH, 0) if roll < 0.7 else (EVENT_ADVANCEMENT, 0) if roll < 0.8 \
+                else (EVENT_JOIN, 0) if roll < 0.9 else (EVENT_LEAVE, rng.randint(60, 7200))
+            if event_type == EVENT_DEATH:
+                totals[name][0] += 1
+            elif event_type == EVENT_ADVANCEMENT:
+                totals[name][1] += 1
+            totals[name][2] += value
+            rows.append((event_type, ids[name], now - rng.randrange(days * 86400), message_id, value))
+        with write_connection() as conn:
+            conn.executemany("INSERT INTO events (event_type, player_id, ts, message_id, value) VALUES (?, ?, ?, ?, ?)", rows)
+    with write_connection() as conn:
+        conn.executemany(
+            "INSERT INTO player_stats (minecraft_username, discord_username, deaths, advancements, playtime_seconds) VALUES (?, ?, ?, ?, ?)",
+            [(name, f"{name}#0", d, a, p) for name, (d, a, p) in totals.items()]
+        )
+        conn.executemany(
+            "INSERT INTO server_stats (server_id, minecraft_username, deaths, advancements, playtime_seconds) VALUES ('main', ?, ?, ?, ?)",
+            [(name, d, a, p) for name, (d, a, p) in totals.items()]
+        )
+    queries.initialize_database() # Seeds the registry and the rank index with the new players
+
+def run_replay_benchmark(players=500, event_count=3000000, days=365, seed=1):
+    """Replay a synthetic log of `event_count` events. Returns the replay summary, plus 'fill'
+    (seconds to write the log) and 'events_per_second'.
+    """
+    with _scratch_database():
+        _, fill = _timed(_fill_events_log, players, event_count, days, seed)
+        summary = replay_events()
+    if summary['changes']:
+        raise AssertionError(f"Replay changed {len(summary['changes'])} players' totals")
+    summary['fill'] = fill
+    summary['events_per_second'] = summary['events'] / summary['seconds']
+    return summary
+
+def run_bulk_benchmark(players=10000, rounds=3, seed=1):
+    """Time the set-based writes with `players` players: save_daily_stats flushing one death
+    each, clear_online_players with all of them online for an hour, and bulk_update_history
+    setting everyone's totals. Returns {call: seconds per call}, averaged over `rounds`.
+    """
+    rng = random.Random(seed)
+    names = [f"bench_player_{i}" for i in range(players)]
+    timings = {'save_daily_stats': 0, 'clear_online_players': 0, 'bulk_update_history': 0}
+    with _scratch_database():
+        with write_connection() as conn:
+            conn.executemany(
+                "INSERT INTO player_stats (minecraft_username, discord_username, deaths, advancements, playtime_seconds) VALUES (?, ?, 0, 0, 0)",
+                [(name, f"{name}#0") for name in names]
+            )
+        queries.initialize_database() # Registers the new players
+
+        for _ in range(rounds):
+            for name in names:
+                queries.record_death(name)
+            timings['save_daily_stats'] += _timed(queries.save_daily_stats)[1]
+
+            with read_connection() as conn:
+                playtime_before = conn.execute("SELECT SUM(playtime_seconds) FROM player_stats").fetchone()[0]
+            login_time = int(datetime.datetime.now(pytz.utc).timestamp()) - 3600
+            with write_connection() as conn:
+                conn.executemany("INSERT INTO online_players (server_id, minecraft_username, login_time) VALUES ('main', ?, ?)",
+                                 [(name, login_time) for name in names])
+            timings['clear_online_players'] += _timed(queries.clear_online_players)[1]
+            with read_connection() as conn:
+                credited = conn.execute("SELECT SUM(playtime_seconds) FROM player_stats").fetchone()[0] - playtime_before
+            if not players * 3600 <= credited <= players * 3602: # A second may tick over during the call
+                raise AssertionError(f"clear_online_players credited {credited}s for {players} one-hour sessions")
+
+            updates = {name: {'deaths': rng.randint(0, 500), 'advancements': rng.randint(0, 120)} for name in names}
+            timings['bulk_update_history'] += _timed(queries.bulk_update_history, updates)[1]
+            with read_connection() as conn:
+                totals = {name: (d, a) for name, d, a in conn.execute("SELECT minecraft_username, deaths, advancements FROM player_stats")}
+            if any(totals[name] != (stats['deaths'], stats['advancements']) for name, stats in updates.items()):
+                raise AssertionError("bulk_update_history didn't set every player's totals")
+    return {call: seconds / rounds for call, seconds in timings.items()}
+
+def _write_stalls(name, stop, interval=0.005):
+    """record_death + flush every `interval` seconds until `stop` is set, like a busy bot.
+    Returns each write's duration.
+    """
+    durations = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        queries.record_death(name)
+        queries.flush_pending_stats()
+        durations.append(time.perf_counter() - started)
+        stop.wait(interval)
+    return durations
+
+def _with_writer(func, *args, **kwargs):
+    """Run func(*args, **kwargs) while _write_stalls runs on another thread. Returns (result, worst write seconds)."""
+    stop, durations = threading.Event(), []
+    writer = threading.Thread(target=lambda: durations.extend(_write_stalls("bench_player_0", stop)))
+    writer.start()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        stop.set()
+        writer.join()
+    return result, max(durations)
+
+def run_backup_benchmark(players=500, event_count=3000000, idle_seconds=2, gzip_levels=(BACKUP_GZIP_LEVEL, 6), seed=1):
+    """Back up a large scratch stats.db (a replayed synthetic log) while a writer keeps going,
+    once per gzip level. Returns {'database_bytes', 'idle_stall', level: {summary..., 'stall'}}.
+    """
+    results = {}
+    with _scratch_database() as scratch:
+        _fill_events_log(players, event_count, 365, seed)
+        replay_events() # Fills stats_history and the rollups, so every table has its real size
+        _, results['idle_stall'] = _with_writer(time.sleep, idle_seconds)
+        for level in gzip_levels:
+            summary, stall = _with_writer(backup_database, DATABASE_PATH, os.path.join(scratch, "backups"),
+                                          len(gzip_levels), gzip_level=level)
+            ok, message = verify_snapshot(summary['path'])
+            if not ok:
+                raise AssertionError(message)
+            results['database_bytes'] = summary['database_bytes']
+            results[level] = dict(summary, stall=stall)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare storage backends on the same event workload.")
+    parser.add_argument("--backend", nargs="+", default=['sqlite', 'memory'], choices=['sqlite', 'memory'])
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--events", type=int, default=20000)
+    workloads = parser.add_subparsers(dest="workload")
+    retention_args = workloads.add_parser("retention", help="History size and read times before and after retention")
+    retention_args.add_argument("--players", type=int, default=50)
+    retention_args.add_argument("--years", type=int, default=3)
+    retention_args.add_argument("--servers", type=int, default=2)
+    rank_args = workloads.add_parser("rank", help="!rank lookups through the rank index and by sorting get_all_*")
+    rank_args.add_argument("--players", type=int, default=100000)
+    replay_args = workloads.add_parser("replay", help="Rebuild every aggregate from a synthetic events log")
+    replay_args.add_argument("--players", type=int, default=500)
+    replay_args.add_argument("--events", type=int, default=3000000)
+    bulk_args = workloads.add_parser("bulk", help="Set-based maintenance writes with every player online")
+    bulk_args.add_argument("--players", type=int, default=10000)
+    backup_args = workloads.add_parser("backup", help="Online backup of a large stats.db while a writer keeps going")
+    backup_args.add_argument("--events", type=int, default=3000000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.workload == "retention":
+        results = run_retention_benchmark(args.players, args.years, args.servers)
+        print(f"{args.years} years, {args.players} players, {args.servers} servers; retention took {results['retention']:.2f}s")
+        for phase in ('hot', 'tiered'):
+            result = results[phase]
+            reads = ", ".join(f"{read} {seconds * 1000:.2f}ms" for read, seconds in result['reads'].items())
+            print(f"{phase:>6}: {result['rows']:,} history rows, {result['bytes'] / 1024 / 1024:.1f} MiB; {reads}")
+    elif args.workload == "rank":
+        timings = run_rank_benchmark(args.players)
+        print(f"{args.players:,} players: startup {timings['startup']:.2f}s; rank + neighbours on 3 boards: "
+              f"sorting get_all_* {timings['sort'] * 1000:.1f}ms, rank index {timings['index'] * 1e6:.0f}us; "
+              f"record_death {timings['record_death'] * 1e6:.0f}us")
+    elif args.workload == "replay":
+        summary = run_replay_benchmark(args.players, args.events)
+        print(f"{args.events:,} events, {args.players} players (log written in {summary['fill']:.1f}s): "
+              f"replay of {summary['events']:,} stat events {summary['seconds']:.1f}s ({summary['events_per_second']:,.0f}/s) "
+              f"-> {summary['history_rows']:,} history rows, totals unchanged")
+    elif args.workload == "bulk":
+        timings = run_bulk_benchmark(args.players)
+        print(f"{args.players:,} players: " + ", ".join(f"{call} {seconds * 1000:.0f}ms" for call, seconds in timings.items()))
+    elif args.workload == "backup":
+        results = run_backup_benchmark(event_count=args.events)
+        print(f"{results['database_bytes'] / 1024 / 1024:.0f} MiB database; writer's worst stall idle "
+              f"{results['idle_stall'] * 1000:.1f}ms")
+        for level, result in results.items():
+            if isinstance(level, int):
+                print(f"gzip level {level}: wall {result['seconds']:.1f}s (page copy {result['copy_seconds']:.1f}s), "
+                      f"snapshot {result['snapshot_bytes'] / 1024 / 1024:.0f} MiB, writer's worst stall {result['stall'] * 1000:.1f}ms")
+    else:
+        for backend, timings in run_benchmark(args.backend, args.players, args.events).items():
+            print(f"{backend:>6}: setup {timings['setup']:.2f}s, {args.events} events {timings['events']:.2f}s "
+                  f"({timings['events_per_second']:,.0f}/s), 100 read rounds {timings['reads']:.2f}s")
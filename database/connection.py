@@ -1,8 +1,137 @@
 import sqlite3
-import os
-from const import DATABASE_PATH
+import threading
+import queue
+import logging
+from contextlib import contextmanager
+from const import (
+    DATABASE_PATH, DB_READER_POOL_SIZE, DB_MMAP_SIZE, DB_CACHED_STATEMENTS,
+    DB_BUSY_TIMEOUT_SECONDS
+)
 
-def get_connection():
-    """Create and return a database connection."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    return conn
\ No newline at end of file
+logger = logging.getLogger('nameless_bot')
+
+
+class ConnectionManager:
+    """Owns one long-lived writer connection and a small pool of reader connections.
+
+    SQLite allows a single writer at a time, so every write goes through the same
+    connection guarded by a re-entrant lock. Nested `write()` blocks join the outer
+    transaction as a SAVEPOINT: an error inside one undoes just its writes (even if
+    the caller catches it), and only the outermost block commits. Readers are handed
+    out from a pool; with WAL journaling they never block (or get blocked by) the writer.
+    """
+
+    def __init__(self, path, reader_pool_size=DB_READER_POOL_SIZE):
+        self.path = path
+        self.reader_pool_size = max(1, reader_pool_size)
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+
+    def _connect(self):
+        """Open a connection with the pragmas every connection should share."""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False, # Connections are handed between threads, access is serialized by us
+            cached_statements=DB_CACHED_STATEMENTS
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # Safe with WAL, skips the fsync on every commit
+        conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def write(self):
+        """Yield the writer connection inside a transaction (commit on success, rollback on error)."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+                logger.debug(f"Opened writer connection to {self.path}")
+            self._write_depth += 1
+            savepoint = None
+            if self._write_depth > 1:
+                if not self._writer.in_transaction:
+                    self._writer.execute("BEGIN") # Or RELEASE would commit the outer block's transaction
+                savepoint = f"nested_write_{self._write_depth}"
+                self._writer.execute(f"SAVEPOINT {savepoint}")
+            try:
+                yield self._writer
+            except BaseException:
+                self._write_depth -= 1
+                if savepoint:
+                    self._writer.execute(f"ROLLBACK TO {savepoint}")
+                    self._writer.execute(f"RELEASE {savepoint}")
+                elif self._write_depth == 0:
+                    self._writer.rollback()
+                raise
+            else:
+                self._write_depth -= 1
+                if savepoint:
+                    self._writer.execute(f"RELEASE {savepoint}")
+                elif self._write_depth == 0:
+                    self._writer.commit()
+
+    @contextmanager
+    def read(self):
+        """Yield a pooled reader connection, returning it to the pool afterwards."""
+        conn = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                if self._reader_count < self.reader_pool_size:
+                    self._reader_count += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._reader_lock:
+                        self._reader_count -= 1
+                    raise
+            else:
+                conn = self._readers.get() # Pool exhausted, wait for a reader to come back
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def close(self):
+        """Close every open connection (used on shutdown)."""
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._reader_lock:
+            while True:
+                try:
+                    self._readers.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._reader_count = 0
+        logger.debug(f"Closed all connections to {self.path}")
+
+
+# Process-wide manager used by database.queries and the helpers
+manager = ConnectionManager(DATABASE_PATH)
+
+def write_connection():
+    """Context manager yielding the shared writer connection inside a transaction."""
+    return manager.write()
+
+def read_connection():
+    """Context manager yielding a pooled reader connection."""
+    return manager.read()
+
+def close_connections():
+    """Close the shared connections."""
+    manager.close()
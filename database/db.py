@@ -0,0 +1,130 @@
+"""Async facade over the storage backend (database.queries unless configured otherwise).
+
+Usage: `from database import db` then `await db.record_death(name)`.
+
+Every call is dispatched to the current Storage (see database/storage.py) at call
+time, so use_storage() can swap the backend for tests and benchmarks.
+
+Writes run one at a time on a dedicated writer thread; at most DB_WRITE_QUEUE_SIZE
+writes can be pending, further callers wait (without blocking the event loop)
+until a slot frees up. Reads run on a small thread pool so a slow write or fsync
+never holds up a leaderboard query, and neither ever stalls the Discord loop.
+Long maintenance jobs (backups) get a thread of their own.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from const import DB_WRITE_QUEUE_SIZE, DB_READER_THREADS
+from database.storage import Storage, get_storage
+
+logger = logging.getLogger('nameless_bot')
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_readers = ThreadPoolExecutor(max_workers=DB_READER_THREADS, thread_name_prefix="db-reader")
+_maintenance = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-maintenance")
+_write_slots = asyncio.Semaphore(DB_WRITE_QUEUE_SIZE) # Bounds the writer queue
+_storage = get_storage()
+
+
+def use_storage(storage):
+    """Route every facade call to `storage` from now on (a backend name or a Storage). Returns it."""
+    global _storage
+    _storage = get_storage(storage) if isinstance(storage, str) else storage
+    return _storage
+
+def current_storage():
+    """The Storage calls are currently routed to."""
+    return _storage
+
+
+async def run_write(func, *args, **kwargs):
+    """Run a blocking write function on the writer thread and await its result."""
+    async with _write_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_writer, functools.partial(func, *args, **kwargs))
+
+async def run_read(func, *args, **kwargs):
+    """Run a blocking read function on the reader pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, functools.partial(func, *args, **kwargs))
+
+async def run_maintenance(func, *args, **kwargs):
+    """Run a long job that only reads the live database on the maintenance thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_maintenance, functools.partial(func, *args, **kwargs))
+
+def _write(name):
+    @functools.wraps(getattr(Storage, name))
+    async def wrapper(*args, **kwargs):
+        return await run_write(getattr(_storage, name), *args, **kwargs)
+    return wrapper
+
+def _read(name):
+    @functools.wraps(getattr(Storage, name))
+    async def wrapper(*args, **kwargs):
+        return await run_read(getattr(_storage, name), *args, **kwargs)
+    return wrapper
+
+
+# --- Writes ---
+initialize_database = _write('initialize_database')
+record_death = _write('record_death')
+record_advancement = _write('record_advancement')
+record_login = _write('record_login')
+record_logout = _write('record_logout')
+clear_online_players = _write('clear_online_players')
+bulk_update_history = _write('bulk_update_history')
+delete_player = _write('delete_player')
+add_player = _write('add_player')
+save_daily_stats = _write('save_daily_stats')
+flush_pending_stats = _write('flush_pending_stats')
+rebuild_rollups = _write('rebuild_rollups')
+replay_events = _write('replay_events')
+record_server_event = _write('record_server_event')
+retention_step = _write('retention_step')
+record_ingest_offset = _write('record_ingest_offset')
+claim_message = _write('claim_message') # On the writer, in order with the events it guards
+save_quip_rotation = _write('save_quip_rotation')
+backfill_webhook_events = _write('backfill_webhook_events') # On the writer, so live events can't interleave
+
+# --- Reads ---
+get_player_stats = _read('get_player_stats')
+get_all_players = _read('get_all_players')
+get_all_deaths = _read('get_all_deaths')
+get_all_advancements = _read('get_all_advancements')
+get_all_playtimes = _read('get_all_playtimes')
+get_leaderboard_snapshot = _read('get_leaderboard_snapshot')
+get_rank = _read('get_rank')
+get_online_players_db = _read('get_online_players_db')
+get_stats_for_period = _read('get_stats_for_period')
+get_stats_for_range = _read('get_stats_for_range')
+get_stats_for_date = _read('get_stats_for_date')
+get_player_timeline = _read('get_player_timeline')
+get_players_timeline = _read('get_players_timeline')
+get_ingest_offset = _read('get_ingest_offset')
+get_quip_rotations = _read('get_quip_rotations')
+canonical_minecraft = _read('canonical_minecraft')
+minecraft_from_discord = _read('minecraft_from_discord')
+discord_from_minecraft = _read('discord_from_minecraft')
+
+# --- Maintenance ---
+async def backup_database(*args, **kwargs):
+    """Flush buffered stats, then snapshot the database (see database.backup). None if the backend can't."""
+    await flush_pending_stats()
+    return await run_maintenance(_storage.backup_database, *args, **kwargs)
+
+async def export_stats(*args, **kwargs):
+    """Flush buffered stats, then stream a table to a gzipped file (see database.export)."""
+    await flush_pending_stats()
+    return await run_maintenance(_storage.export_stats, *args, **kwargs)
+
+
+def shutdown():
+    """Wait for queued writes to finish, flush buffered stats, then close the shared connections."""
+    _writer.shutdown(wait=True)
+    _readers.shutdown(wait=True)
+    _maintenance.shutdown(wait=True)
+    _storage.flush_pending_stats()
+    _storage.close()
+    logger.info("Database facade shut down.")
@@ -0,0 +1,120 @@
+import datetime
+import threading
+import logging
+import pytz
+from const import STATS_MAX_BUFFERED_EVENTS, DEFAULT_SERVER_ID
+
+logger = logging.getLogger('nameless_bot')
+
+# Event types stored in events.event_type. Never renumber these, the log is permanent.
+EVENT_JOIN = 1
+EVENT_LEAVE = 2        # value = playtime seconds credited for the session
+EVENT_DEATH = 3
+EVENT_ADVANCEMENT = 4
+EVENT_SERVER_START = 5
+EVENT_SERVER_STOP = 6
+# Adjustments: value = signed change to one counter that no webhook event explains
+# (counters from before the log, imports, totals set by hand)
+EVENT_ADJUST_DEATHS = 7
+EVENT_ADJUST_ADVANCEMENTS = 8
+EVENT_ADJUST_PLAYTIME = 9
+
+EVENT_NAMES = {
+    EVENT_JOIN: "join", EVENT_LEAVE: "leave", EVENT_DEATH: "death",
+    EVENT_ADVANCEMENT: "advancement", EVENT_SERVER_START: "start", EVENT_SERVER_STOP: "stop",
+    EVENT_ADJUST_DEATHS: "adjust deaths", EVENT_ADJUST_ADVANCEMENTS: "adjust advancements",
+    EVENT_ADJUST_PLAYTIME: "adjust playtime",
+}
+# Adjustment event type for each counter, in (deaths, advancements, playtime) order
+ADJUSTMENT_EVENTS = (EVENT_ADJUST_DEATHS, EVENT_ADJUST_ADVANCEMENTS, EVENT_ADJUST_PLAYTIME)
+# Adjustments logged at this ts change the totals only, not the history of any day
+UNDATED_TS = 0
+
+
+class EventLog:
+    """Buffers parsed webhook events until database.queries.flush_pending_stats()
+    writes them, in the same transaction as the counters they produced.
+    """
+
+    def __init__(self, max_buffered_events=STATS_MAX_BUFFERED_EVENTS):
+        self.max_buffered_events = max_buffered_events
+        self._lock = threading.Lock()
+        self._pending = []   # (event_type, minecraft_username or None, ts, message_id, value, server_id)
+        self._in_flight = []
+
+    def append(self, event_type, minecraft_username=None, message_id=None, value=0, ts=None, server_id=DEFAULT_SERVER_ID):
+        """Buffer an event. Returns True once the buffer should be flushed."""
+        if ts is None:
+            ts = int(datetime.datetime.now(pytz.utc).timestamp())
+        with self._lock:
+            self._pending.append((event_type, minecraft_username, ts, message_id, value, server_id))
+            return len(self._pending) >= self.max_buffered_events
+
+    def drain(self):
+        with self._lock:
+            self._in_flight = self._in_flight + self._pending
+            self._pending = []
+            return list(self._in_flight)
+
+    def commit(self):
+        with self._lock:
+            self._in_flight = []
+
+    def restore(self):
+        with self._lock:
+            self._pending = self._in_flight + self._pending
+            self._in_flight = []
+
+    def discard_player(self, minecraft_username):
+        with self._lock:
+            self._pending = [e for e in self._pending if e[1] != minecraft_username]
+            self._in_flight = [e for e in self._in_flight if e[1] != minecraft_username]
+
+
+# Process-wide event buffer used by database.queries
+event_log = EventLog()
+
+# minecraft_username -> players.id, filled lazily
+_player_ids = {}
+_player_ids_lock = threading.Lock()
+
+def player_ids(conn, names):
+    """Resolve (creating if needed) the compact integer id for each Minecraft username."""
+    with _player_ids_lock:
+        missing = [name for name in set(names) if name is not None and name not in _player_ids]
+        if missing:
+            conn.executemany("INSERT OR IGNORE INTO players (minecraft_username) VALUES (?)", [(n,) for n in missing])
+            # Read the ids back in chunks rather than one SELECT per new name
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                _player_ids.update((name, player_id) for player_id, name in conn.execute(
+                    f"SELECT id, minecraft_username FROM players WHERE minecraft_username IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ))
+        return dict(_player_ids)
+
+def reset_player_ids():
+    """Forget every cached id (after a rolled back transaction may have created some)."""
+    with _player_ids_lock:
+        _player_ids.clear()
+
+def forget_player(minecraft_username):
+    """Drop a cached id (the players row is removed by delete_player)."""
+    with _player_ids_lock:
+        _player_ids.pop(minecraft_username, None)
+
+def adjustment_events(minecraft_username, delta, server_id=DEFAULT_SERVER_ID, ts=UNDATED_TS):
+    """Event tuples, as insert_events takes them, logging a [deaths, advancements, playtime] change."""
+    return [(event_type, minecraft_username, ts, None, value, server_id)
+            for event_type, value in zip(ADJUSTMENT_EVENTS, delta) if value]
+
+def insert_events(conn, events):
+    """Write buffered (event_type, name, ts, message_id, value, server_id) tuples to the events table."""
+    if not events:
+        return
+    ids = player_ids(conn, [e[1] for e in events])
+    conn.executemany(
+        "INSERT INTO events (event_type, player_id, ts, message_id, value, server_id) VALUES (?, ?, ?, ?, ?, ?)",
+        [(event_type, ids.get(name), ts, message_id, value, None if server_id == DEFAULT_SERVER_ID else server_id)
+         for event_type, name, ts, message_id, value, server_id in events]
+    )
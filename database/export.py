@@ -0,0 +1,122 @@
+"""Export player_stats or stats_history to a gzipped CSV or JSONL file.
+
+Rows are streamed from the cursor EXPORT_CHUNK_ROWS at a time and written
+straight into the compressor, so memory stays flat however much history there is.
+
+    python -m database.export                                   # all history as CSV
+    python -m database.export --table players --format jsonl
+    python -m database.export --start 2025-01-01 --end 2025-01-31 --player LuigiTime34 -o jan.csv.gz
+"""
+import argparse
+import csv
+import datetime
+import gzip
+import json
+import logging
+import os
+import time
+import pytz
+from const import EXPORT_CHUNK_ROWS
+from database.connection import read_connection
+
+logger = logging.getLogger('nameless_bot')
+
+# Exportable tables: name -> (SQL table, columns, date column or None)
+EXPORT_TABLES = {
+    'players': ("player_stats", ("minecraft_username", "discord_username", "deaths", "advancements", "playtime_seconds"), None),
+    'history': ("stats_history", ("date", "server_id", "minecraft_username", "deaths", "advancements", "playtime_seconds"), "date"),
+}
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def check_export_args(table, fmt, start_date=None, end_date=None):
+    """Raise ValueError for an unknown table/format or a date filter on a table without dates."""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table {table!r} (expected one of: {', '.join(EXPORT_TABLES)})")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r} (expected one of: {', '.join(EXPORT_FORMATS)})")
+    if (start_date or end_date) and EXPORT_TABLES[table][2] is None:
+        raise ValueError(f"The {table} table has no dates to filter on")
+    for date in (start_date, end_date):
+        if date:
+            datetime.date.fromisoformat(date) # ValueError if malformed
+
+def default_export_path(table, fmt, directory="."):
+    stamp = datetime.datetime.now(pytz.utc).strftime("%Y%m%d-%H%M%S")
+    return os.path.join(directory, f"{table}-{stamp}.{fmt}.gz")
+
+def write_export(chunks, columns, path, fmt):
+    """Write an iterable of row lists to `path` as gzipped CSV (with a header) or JSONL.
+    Returns the number of rows written. The file only appears once it is complete.
+    """
+    rows = 0
+    partial = path + ".partial"
+    try:
+        with gzip.open(partial, 'wt', encoding='utf-8', newline='', compresslevel=6) as f:
+            if fmt == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for chunk in chunks:
+                    writer.writerows(chunk)
+                    rows += len(chunk)
+            else:
+                for chunk in chunks:
+                    f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in chunk)
+                    rows += len(chunk)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return rows
+
+def export_summary(path, table, rows, started):
+    summary = {'path': path, 'table': table, 'rows': rows, 'bytes': os.path.getsize(path),
+               'seconds': time.perf_counter() - started}
+    logger.info(f"Exported {rows} {table} rows to {path} ({summary['bytes']} bytes) in {summary['seconds']:.2f}s")
+    return summary
+
+def export_stats(table='history', fmt='csv', path=None, start_date=None, end_date=None, player=None,
+                 chunk_size=EXPORT_CHUNK_ROWS):
+    """Stream a table (optionally filtered by inclusive YYYY-MM-DD dates and/or player)
+    from stats.db to a gzipped file. Returns a summary dict with the path and row count.
+    """
+    check_export_args(table, fmt, start_date, end_date)
+    started = time.perf_counter()
+    sql_table, columns, date_column = EXPORT_TABLES[table]
+    path = path or default_export_path(table, fmt)
+
+    conditions, params = [], []
+    if start_date:
+        conditions.append(f"{date_column} >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append(f"{date_column} <= ?")
+        params.append(end_date)
+    if player:
+        conditions.append("minecraft_username = ?")
+        params.append(player)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # History comes out in date order straight off idx_stats_history_date_player
+    order = f"ORDER BY {date_column}, minecraft_username, server_id" if date_column else "ORDER BY minecraft_username"
+
+    with read_connection() as conn:
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {sql_table} {where} {order}", params)
+        rows = write_export(iter(lambda: cursor.fetchmany(chunk_size), []), columns, path, fmt)
+    return export_summary(path, table, rows, started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export stats to a gzipped CSV or JSONL file.")
+    parser.add_argument("--table", choices=list(EXPORT_TABLES), default='history')
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument("--start", metavar="YYYY-MM-DD", help="First history date to include")
+    parser.add_argument("--end", metavar="YYYY-MM-DD", help="Last history date to include")
+    parser.add_argument("--player", help="Only this Minecraft username")
+    parser.add_argument("-o", "--output", help="Output file (default: <table>-<timestamp>.<format>.gz)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_ROWS, help="Rows fetched per chunk")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        print(export_stats(args.table, args.format, args.output, args.start, args.end, args.player, args.chunk_size))
+    except ValueError as e:
+        parser.error(str(e))
@@ -0,0 +1,491 @@
+"""In-memory Storage backend (see database/storage.py).
+
+Holds the same data as stats.db in dicts keyed the way the SQLite tables are, so
+every read returns exactly what the SQLite backend would, but nothing is ever
+written to disk and writes need no buffering. Meant for load tests and
+benchmarks; everything is lost when the process exits.
+"""
+import datetime
+import threading
+import time
+import logging
+import pytz
+from const import MINECRAFT_TO_DISCORD, LEDGER_TTL_DAYS, DEFAULT_SERVER_ID
+from database import rollups
+from database.export import EXPORT_TABLES, check_export_args, default_export_path, write_export, export_summary
+from database.backfill import fold_events, new_events, new_summary
+from database.events import (
+    EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT, ADJUSTMENT_EVENTS, UNDATED_TS, adjustment_events
+)
+from database.replay import diff_totals
+from database.player_registry import registry
+from database.rank_index import rank_index
+from database.snapshot import build_snapshot
+
+logger = logging.getLogger('nameless_bot')
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def _now():
+    return int(datetime.datetime.now(pytz.utc).timestamp())
+
+def _date_of(ts):
+    """History date of a unix timestamp; None (today) if ts is None."""
+    return None if ts is None else datetime.datetime.fromtimestamp(ts, pytz.utc).strftime("%Y-%m-%d")
+
+
+class MemoryStorage:
+    """Storage backed by dicts, guarded by one lock (reads and writes arrive from
+    the facade's executor threads).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._players = {}  # minecraft_username -> [discord_username, deaths, advancements, playtime], insertion ordered like player_stats
+        self._online = {}   # server_id -> {minecraft_username: login_time}
+        self._history = {}  # date -> {(minecraft_username, server_id): [deaths, advancements, playtime]}
+        self._weekly = {}   # week_start -> {minecraft_username: [...]}, summed over servers
+        self._monthly = {}  # month -> {...}
+        self._server_stats = {} # server_id -> {minecraft_username: [deaths, advancements, playtime]}
+        self._events = []   # (event_type, minecraft_username, ts, message_id, value, server_id)
+        self._offsets = {}  # ingestion source -> (offset, fingerprint)
+        self._processed = {} # message_id -> processed_at, like processed_messages
+        self._quip_rotation = {} # minecraft_username -> (catalog, seed, position)
+        self._version = 0
+        self._snapshots = {} # server_id (None for all servers) -> LeaderboardSnapshot
+
+    # --- Helpers ---
+    def _rows(self):
+        return [(name, p[0], p[1], p[2], p[3]) for name, p in self._players.items()]
+
+    def _changed(self):
+        self._version += 1
+
+    def _log_event(self, event_type, minecraft_username=None, message_id=None, value=0, ts=None, server_id=DEFAULT_SERVER_ID):
+        if ts is None:
+            ts = int(datetime.datetime.now(pytz.utc).timestamp())
+        self._events.append((event_type, minecraft_username, ts, message_id, value, server_id))
+
+    def _add_history(self, minecraft_username, date, deaths, advancements, playtime, server_id=DEFAULT_SERVER_ID):
+        for table, key, row in ((self._history, date, (minecraft_username, server_id)),
+                                (self._weekly, rollups.week_start(date), minecraft_username),
+                                (self._monthly, rollups.month_of(date), minecraft_username)):
+            total = table.setdefault(key, {}).setdefault(row, [0, 0, 0])
+            total[0] += deaths
+            total[1] += advancements
+            total[2] += playtime
+
+    def _record_position(self, position):
+        """Save a log event's (source, offset, fingerprint), like record_ingest_offset."""
+        if position:
+            source, offset, fingerprint = position
+            self._offsets[source] = (offset, fingerprint)
+
+    def _day_totals(self, date):
+        """One day's history summed over servers: {minecraft_username: [d, a, p]}."""
+        totals = {}
+        for (minecraft_username, _), (d, a, p) in self._history.get(date, {}).items():
+            total = totals.setdefault(minecraft_username, [0, 0, 0])
+            total[0] += d
+            total[1] += a
+            total[2] += p
+        return totals
+
+    def _add_stat(self, minecraft_username, deaths=0, advancements=0, playtime=0, server_id=DEFAULT_SERVER_ID, date=None,
+                  history=True):
+        """Credit a history row (today's unless `date` is given; any name, like stats_history; none
+        if `history` is False), the server's totals and a known player's totals.
+        """
+        if history:
+            self._add_history(minecraft_username, date or datetime.datetime.now(pytz.utc).strftime("%Y-%m-%d"),
+                              deaths, advancements, playtime, server_id)
+        total = self._server_stats.setdefault(server_id, {}).setdefault(minecraft_username, [0, 0, 0])
+        total[0] += deaths
+        total[1] += advancements
+        total[2] += playtime
+        player = self._players.get(minecraft_username)
+        if player is not None:
+            player[1] += deaths
+            player[2] += advancements
+            player[3] += playtime
+        rank_index.add(minecraft_username, deaths, advancements, playtime)
+        self._changed()
+
+    # --- Setup ---
+    def initialize_database(self):
+        with self._lock:
+            for minecraft_username, discord_username in MINECRAFT_TO_DISCORD.items():
+                self._players.setdefault(minecraft_username, [discord_username, 0, 0, 0])
+            registry.load((name, p[0]) for name, p in self._players.items())
+            rank_index.load((name, p[1], p[2], p[3]) for name, p in self._players.items())
+            self._changed()
+        logger.info("In-memory storage initialized (nothing is saved to disk)")
+
+    def close(self):
+        pass
+
+    # --- Writes ---
+    def record_death(self, minecraft_username, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+        with self._lock:
+            self._log_event(EVENT_DEATH, minecraft_username, message_id, ts=ts, server_id=server_id)
+            self._add_stat(minecraft_username, deaths=1, server_id=server_id, date=_date_of(ts))
+            self._record_position(position)
+        logger.info(f"Recorded death for {minecraft_username}")
+
+    def record_advancement(self, minecraft_username, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+        with self._lock:
+            self._log_event(EVENT_ADVANCEMENT, minecraft_username, message_id, ts=ts, server_id=server_id)
+            self._add_stat(minecraft_username, advancements=1, server_id=server_id, date=_date_of(ts))
+            self._record_position(position)
+        logger.info(f"Recorded advancement for {minecraft_username}")
+
+    def record_login(self, minecraft_username, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+        with self._lock:
+            login_time = _now() if ts is None else int(ts)
+            self._log_event(EVENT_JOIN, minecraft_username, message_id, ts=login_time, server_id=server_id)
+            self._online.setdefault(server_id, {})[minecraft_username] = login_time
+            self._record_position(position)
+        logger.info(f"Recorded login for {minecraft_username} on {server_id}")
+
+    def record_logout(self, minecraft_username, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+        with self._lock:
+            self._record_position(position)
+            login_time = self._online.get(server_id, {}).pop(minecraft_username, None)
+            if login_time is None:
+                logger.warning(f"No login record found for {minecraft_username} on {server_id} upon logout.")
+                return 0
+            current_time = _now() if ts is None else int(ts)
+            playtime = max(0, current_time - login_time)
+            self._log_event(EVENT_LEAVE, minecraft_username, message_id, playtime, current_time, server_id)
+            self._add_stat(minecraft_username, playtime=playtime, server_id=server_id, date=_date_of(current_time))
+        logger.info(f"Recorded logout for {minecraft_username}, added {playtime} seconds")
+        return playtime
+
+    def record_server_event(self, event_type, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+        with self._lock:
+            self._log_event(event_type, message_id=message_id, ts=ts, server_id=server_id)
+            self._record_position(position)
+
+    def clear_online_players(self, server_id=None, ts=None):
+        with self._lock:
+            servers = list(self._online) if server_id is None else [server_id]
+            count = sum(len(self._online.get(server, {})) for server in servers)
+            if not count:
+                logger.info("No online players to clear.")
+                return
+            current_time = _now() if ts is None else int(ts)
+            for server in servers:
+                for minecraft_username, login_time in self._online.pop(server, {}).items():
+                    self._log_event(EVENT_LEAVE, minecraft_username, None, max(0, current_time - login_time), current_time, server)
+                    if current_time > login_time:
+                        self._add_stat(minecraft_username, playtime=current_time - login_time, server_id=server,
+                                       date=_date_of(current_time))
+            self._changed()
+        logger.info(f"Cleared {count} online players and updated their playtime.")
+
+    def bulk_update_history(self, updates, server_id=None):
+        """Same rules as database.queries.bulk_update_history: differences logged as adjustments."""
+        target = DEFAULT_SERVER_ID if server_id is None else server_id
+        changed = 0
+        with self._lock:
+            for minecraft_username, stats in updates.items():
+                values = tuple(
+                    stats[key] if key in stats and isinstance(stats[key], int) else None
+                    for key in ('deaths', 'advancements', 'playtime')
+                )
+                if values == (None, None, None):
+                    logger.warning(f"No valid updates provided for {minecraft_username} in bulk update: {stats}")
+                    continue
+                player = self._players.get(minecraft_username)
+                if player is None:
+                    continue
+                if server_id is None:
+                    old = player[1:]
+                else:
+                    old = self._server_stats.get(server_id, {}).get(minecraft_username, (0, 0, 0))
+                delta = [0 if new is None else new - old[i] for i, new in enumerate(values)]
+                if any(delta):
+                    changed += 1
+                    for event_type, _, ts, _, value, _ in adjustment_events(minecraft_username, delta, target):
+                        self._log_event(event_type, minecraft_username, value=value, ts=ts, server_id=target)
+                    self._add_stat(minecraft_username, *delta, server_id=target, history=False)
+        logger.info(f"Bulk updated history for {len(updates)} players ({changed} changed){f' on {server_id}' if server_id else ''}")
+        return True
+
+    def delete_player(self, minecraft_username):
+        with self._lock:
+            self._players.pop(minecraft_username, None)
+            for rows in (*self._online.values(), *self._server_stats.values(), *self._weekly.values(), *self._monthly.values()):
+                rows.pop(minecraft_username, None)
+            for rows in self._history.values():
+                for key in [key for key in rows if key[0] == minecraft_username]:
+                    del rows[key]
+            self._events = [event for event in self._events if event[1] != minecraft_username]
+            self._quip_rotation.pop(minecraft_username, None)
+            registry.remove(minecraft_username)
+            rank_index.remove(minecraft_username)
+            self._changed()
+        logger.info(f"Deleted player {minecraft_username} from database")
+        return True
+
+    def add_player(self, minecraft_username, discord_username):
+        with self._lock:
+            if minecraft_username in self._players:
+                logger.info(f"Player {minecraft_username} (Discord: {discord_username}) already exists or insert was ignored.")
+                return None
+            self._players[minecraft_username] = [discord_username, 0, 0, 0]
+            registry.add(minecraft_username, discord_username)
+            rank_index.set(minecraft_username)
+            self._changed()
+        logger.info(f"NEWLY ADDED player {minecraft_username} (Discord: {discord_username}) to database")
+        return True
+
+    def save_daily_stats(self):
+        return True # Nothing is buffered
+
+    def flush_pending_stats(self):
+        return 0
+
+    def rebuild_rollups(self):
+        with self._lock:
+            self._weekly, self._monthly = {}, {}
+            history, self._history = self._history, {}
+            for date, rows in history.items():
+                for (minecraft_username, server_id), (d, a, p) in rows.items():
+                    self._add_history(minecraft_username, date, d, a, p, server_id)
+            weeks = sum(len(rows) for rows in self._weekly.values())
+            months = sum(len(rows) for rows in self._monthly.values())
+        logger.info(f"Rebuilt rollups: {weeks} weekly rows, {months} monthly rows")
+        return weeks, months
+
+    def replay_events(self, chunk_size=None, dry_run=False):
+        """Rebuild totals, history and rollups from the events list (chunk_size is ignored)."""
+        started = time.perf_counter()
+        with self._lock:
+            days = {}  # (minecraft_username, UTC date or None if undated, server_id) -> [deaths, advancements, playtime]
+            event_count = 0
+            for event_type, minecraft_username, ts, _, value, server_id in self._events:
+                if event_type in (EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_LEAVE):
+                    delta = (event_type == EVENT_DEATH, event_type == EVENT_ADVANCEMENT, value if event_type == EVENT_LEAVE else 0)
+                elif event_type in ADJUSTMENT_EVENTS:
+                    delta = tuple(value if event_type == adjust else 0 for adjust in ADJUSTMENT_EVENTS)
+                else:
+                    continue
+                event_count += 1 # Deleted players' events are already gone (see delete_player)
+                date = None if ts == UNDATED_TS else (_EPOCH + datetime.timedelta(days=ts // 86400)).isoformat()
+                total = days.setdefault((minecraft_username, date, server_id), [0, 0, 0])
+                for i in range(3):
+                    total[i] += delta[i]
+            days = {key: total for key, total in days.items() if any(total)}
+            players = {name for name, _, _ in days}
+            replayed = {}
+            for (minecraft_username, _, _), delta in days.items():
+                total = replayed.setdefault(minecraft_username, [0, 0, 0])
+                for i in range(3):
+                    total[i] += delta[i]
+            changes = diff_totals(
+                {name: tuple(p[1:]) for name, p in self._players.items()},
+                {name: tuple(total) for name, total in replayed.items() if name in self._players}
+            )
+
+            if not dry_run:
+                for player in self._players.values():
+                    player[1:] = [0, 0, 0]
+                self._history, self._weekly, self._monthly, self._server_stats = {}, {}, {}, {}
+                for (minecraft_username, date, server_id), (d, a, p) in days.items():
+                    self._add_stat(minecraft_username, d, a, p, server_id, date, history=date is not None)
+                rank_index.load((name, p[1], p[2], p[3]) for name, p in self._players.items())
+                self._changed()
+
+        summary = {
+            'events': event_count,
+            'players': len(players),
+            'history_rows': sum(date is not None for _, date, _ in days),
+            'changes': changes,
+            'seconds': time.perf_counter() - started,
+        }
+        logger.info(f"Replayed {event_count} events into {len(players)} players / {summary['history_rows']} history rows "
+                    f"in {summary['seconds']:.2f}s, {len(changes)} players' totals {'would change' if dry_run else 'changed'}")
+        return summary
+
+    def retention_step(self, batch_size=None, hot_days=None, today=None):
+        """Prunes expired processed message ids; history stays in daily rows (no archive tier in memory)."""
+        expired = int(time.time()) - LEDGER_TTL_DAYS * 86400
+        with self._lock:
+            removed = [message_id for message_id, processed_at in self._processed.items() if processed_at < expired]
+            for message_id in removed:
+                del self._processed[message_id]
+        return len(removed)
+
+    def claim_message(self, message_id):
+        with self._lock:
+            if message_id in self._processed:
+                logger.info(f"Message {message_id} was already processed, skipping it")
+                return False
+            self._processed[message_id] = int(time.time())
+            return True
+
+    def save_quip_rotation(self, minecraft_username, catalog, seed, position):
+        with self._lock:
+            self._quip_rotation[minecraft_username] = (catalog, seed, position)
+
+    def record_ingest_offset(self, source, offset, fingerprint=None):
+        with self._lock:
+            self._offsets[source] = (offset, fingerprint)
+
+    def backfill_webhook_events(self, events, batch_size=None, server_id=DEFAULT_SERVER_ID):
+        """Same rules as database.backfill.backfill_webhook_events (batch_size is ignored)."""
+        started = time.perf_counter()
+        events = sorted(events, key=lambda e: (e[2], e[3] or 0))
+        summary = new_summary(events)
+        with self._lock:
+            seen = set(self._processed) | {event[3] for event in self._events if event[3] is not None}
+            fresh = new_events(events, seen, summary)
+            self._processed.update((e[3], int(time.time())) for e in fresh if e[3] is not None)
+            rows, deltas = fold_events(fresh, self._online.setdefault(server_id, {}), server_id)
+            self._events.extend(rows)
+            for (minecraft_username, date, _), (d, a, p) in deltas.items():
+                self._add_stat(minecraft_username, d, a, p, server_id, date)
+                summary['playtime'] += p
+            self._changed()
+        summary['seconds'] = time.perf_counter() - started
+        return summary
+
+    # --- Reads ---
+    def canonical_minecraft(self, name):
+        return registry.canonical_minecraft(name)
+
+    def minecraft_from_discord(self, discord_name):
+        return registry.minecraft_from_discord(discord_name)
+
+    def discord_from_minecraft(self, minecraft_username):
+        return registry.discord_from_minecraft(minecraft_username)
+
+    def get_player_stats(self, minecraft_username=None, discord_username=None):
+        if not minecraft_username:
+            minecraft_username = registry.minecraft_from_discord(discord_username)
+        with self._lock:
+            player = self._players.get(minecraft_username) if minecraft_username else None
+            return (minecraft_username, *player) if player else None
+
+    def get_all_players(self):
+        with self._lock:
+            return self._rows()
+
+    def _ranked(self, index, reverse):
+        with self._lock:
+            rows = [(name, p[0], p[index]) for name, p in self._players.items()]
+        rows.sort(key=lambda r: r[2], reverse=reverse)
+        return rows
+
+    def get_all_deaths(self):
+        return self._ranked(1, reverse=False)
+
+    def get_all_advancements(self):
+        return self._ranked(2, reverse=True)
+
+    def get_all_playtimes(self):
+        return self._ranked(3, reverse=True)
+
+    def get_leaderboard_snapshot(self, server_id=None):
+        with self._lock:
+            snapshot = self._snapshots.get(server_id)
+            if snapshot is None or snapshot.version != self._version:
+                if server_id is None:
+                    rows = self._rows()
+                else:
+                    totals = self._server_stats.get(server_id, {})
+                    rows = [(name, self._players[name][0], *totals[name]) for name in sorted(totals) if name in self._players]
+                snapshot = self._snapshots[server_id] = build_snapshot(
+                    self._version, int(datetime.datetime.now(pytz.utc).timestamp()), rows
+                )
+            return snapshot
+
+    def get_quip_rotations(self):
+        with self._lock:
+            return [(name,) + rotation for name, rotation in self._quip_rotation.items()]
+
+    def get_ingest_offset(self, source):
+        with self._lock:
+            return self._offsets.get(source)
+
+    def get_rank(self, minecraft_username, metric, neighbors=0):
+        standing = rank_index.rank(minecraft_username, metric) # Kept current by _add_stat and friends
+        if standing is None:
+            return None
+        return standing + (rank_index.around(minecraft_username, metric, neighbors),)
+
+    def get_online_players_db(self, server_id=None):
+        with self._lock:
+            if server_id is not None:
+                return list(self._online.get(server_id, {}))
+            return list(dict.fromkeys(name for online in self._online.values() for name in online))
+
+    def get_stats_for_range(self, start_date, end_date):
+        totals = {}
+        with self._lock:
+            for date in rollups.bucket_keys(start_date, end_date, 'day'):
+                for minecraft_username, (d, a, p) in self._day_totals(date).items():
+                    total = totals.setdefault(minecraft_username, [0, 0, 0])
+                    total[0] += d
+                    total[1] += a
+                    total[2] += p
+        return [(name, d, a, p) for name, (d, a, p) in sorted(totals.items())] # GROUP BY order
+
+    def get_stats_for_date(self, date):
+        with self._lock:
+            rows = self._day_totals(date)
+            return [(name, *rows[name]) for name in sorted(rows)]
+
+    def get_stats_for_period(self, period_days):
+        end_date_dt = datetime.datetime.now(pytz.utc)
+        start_date_dt = end_date_dt - datetime.timedelta(days=max(0, period_days - 1))
+        return self.get_stats_for_range(start_date_dt.strftime("%Y-%m-%d"), end_date_dt.strftime("%Y-%m-%d"))
+
+    def get_players_timeline(self, minecraft_usernames, start_date, end_date, bucket='day'):
+        keys = rollups.bucket_keys(start_date, end_date, bucket)
+        series = {}
+        with self._lock:
+            table = {
+                'day': lambda: {key: self._day_totals(key) for key in keys},
+                'week': lambda: self._weekly,
+                'month': lambda: self._monthly,
+            }[bucket]()
+            for name in dict.fromkeys(minecraft_usernames):
+                rows = [table.get(key, {}).get(name, (0, 0, 0)) for key in keys]
+                series[name] = {
+                    'deaths': [row[0] for row in rows],
+                    'advancements': [row[1] for row in rows],
+                    'playtime': [row[2] for row in rows],
+                }
+        return keys, series
+
+    def get_player_timeline(self, minecraft_username, start_date, end_date, bucket='day'):
+        keys, series = self.get_players_timeline([minecraft_username], start_date, end_date, bucket)
+        return keys, series[minecraft_username]
+
+    # --- Maintenance ---
+    def backup_database(self, *args, **kwargs):
+        logger.warning("In-memory storage has no database file to back up")
+        return None
+
+    def export_stats(self, table='history', fmt='csv', path=None, start_date=None, end_date=None, player=None,
+                     chunk_size=None):
+        """Same files as database.export.export_stats; rows are copied out under the lock first."""
+        check_export_args(table, fmt, start_date, end_date)
+        started = time.perf_counter()
+        path = path or default_export_path(table, fmt)
+        with self._lock:
+            if table == 'players':
+                rows = [row for row in sorted(self._rows()) if not player or row[0] == player]
+            else:
+                rows = [
+                    (date, server_id, name, *self._history[date][(name, server_id)])
+                    for date in sorted(self._history)
+                    if (not start_date or date >= start_date) and (not end_date or date <= end_date)
+                    for name, server_id in sorted(self._history[date])
+                    if not player or name == player
+                ]
+        rows = write_export([rows], EXPORT_TABLES[table][1], path, fmt)
+        return export_summary(path, table, rows, started)
@@ -0,0 +1,98 @@
+"""Which Discord messages have already been counted.
+
+A gateway resume can deliver a webhook message twice, and an admin can replay
+channel history; neither may count a death or advancement again. The ledger
+answers "was this message id processed?" without touching the database for
+the messages that matter most, the live ones:
+
+- message ids are snowflakes, increasing with time, so any id above the highest
+  one ever processed is new (the usual case: one comparison);
+- the last LEDGER_CACHE_SIZE ids are kept in an LRU, which catches a
+  redelivery of anything recent;
+- anything older falls through to the processed_messages table (one primary
+  key lookup, see database.queries.claim_message).
+
+New ids are buffered like EventLog's events and written by
+flush_pending_stats(), in the same transaction as the stats they produced, so
+a crash loses both or neither. Rows older than LEDGER_TTL_DAYS are pruned by the
+retention task; past that, backfills still recognise counted messages through
+the events log.
+"""
+import threading
+from collections import OrderedDict
+from const import LEDGER_CACHE_SIZE
+
+_UNKNOWN = 0 # High-water mark before anything was processed (snowflakes are positive)
+
+
+class MessageLedger:
+    """In-memory half of the ledger: high-water mark, LRU and the unwritten ids."""
+
+    def __init__(self, cache_size=LEDGER_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._recent = OrderedDict() # message_id -> None, most recently processed last
+        self._high_water = _UNKNOWN
+        self._pending = {}           # message_id -> processed_at, not yet written
+        self._in_flight = {}
+        self.hits = 0                # Duplicates caught, for the log
+
+    def load(self, high_water):
+        """Start from the highest id in processed_messages (None for an empty table)."""
+        with self._lock:
+            self._high_water = max(self._high_water, high_water or _UNKNOWN)
+
+    def check(self, message_id):
+        """True: already processed. False: definitely new. None: ask the table."""
+        with self._lock:
+            if message_id in self._recent:
+                self._recent.move_to_end(message_id)
+                return True
+            if message_id in self._pending or message_id in self._in_flight:
+                return True
+            if message_id > self._high_water:
+                return False
+            return None
+
+    def add(self, message_id, processed_at):
+        """Mark a message processed (written with the next flush)."""
+        with self._lock:
+            self._pending[message_id] = processed_at
+            self._remember(message_id)
+
+    def remember(self, message_id):
+        """Cache an id the table already has."""
+        with self._lock:
+            self._remember(message_id)
+
+    def note_written(self, message_ids):
+        """Ids written to the table directly (backfill): raise the high-water mark past them."""
+        with self._lock:
+            self._high_water = max(self._high_water, max(message_ids, default=_UNKNOWN))
+
+    def _remember(self, message_id):
+        self._recent[message_id] = None
+        self._recent.move_to_end(message_id)
+        if len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+        if message_id > self._high_water:
+            self._high_water = message_id
+
+    def drain(self):
+        with self._lock:
+            self._in_flight = {**self._in_flight, **self._pending}
+            self._pending = {}
+            return list(self._in_flight.items())
+
+    def commit(self):
+        with self._lock:
+            self._in_flight = {}
+
+    def restore(self):
+        with self._lock:
+            self._pending = {**self._in_flight, **self._pending}
+            self._in_flight = {}
+
+
+# Process-wide ledger used by database.queries and database.backfill
+message_ledger = MessageLedger()
@@ -0,0 +1,394 @@
+import datetime
+import logging
+import pytz
+
+logger = logging.getLogger('nameless_bot')
+
+# Each migration is (version, description, statements). Versions only ever go up;
+# never edit a migration that has shipped, add a new one instead. Statements are
+# plain SQL, frozen as they shipped: never call live code that later changes could alter.
+MIGRATIONS = [
+    (1, "Base tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS player_stats (
+            minecraft_username TEXT PRIMARY KEY,
+            discord_username TEXT,
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0
+        )
+        ''',
+        # Tracking table for online players
+        '''
+        CREATE TABLE IF NOT EXISTS online_players (
+            minecraft_username TEXT PRIMARY KEY,
+            login_time INTEGER
+        )
+        ''',
+        # Daily stats history table
+        '''
+        CREATE TABLE IF NOT EXISTS stats_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            minecraft_username TEXT NOT NULL,
+            date TEXT NOT NULL, -- Store date as YYYY-MM-DD (est)
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0,
+            UNIQUE(minecraft_username, date)
+        )
+        ''',
+    ]),
+    (2, "Indexes for history date ranges and Discord name lookups", [
+        # Covers every date-range aggregate without touching the table rows
+        '''
+        CREATE INDEX IF NOT EXISTS idx_stats_history_date_player
+        ON stats_history(date, minecraft_username, deaths, advancements, playtime_seconds)
+        ''',
+        # Case-insensitive Discord name lookups (`discord_username = ? COLLATE NOCASE`)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_player_stats_discord_nocase
+        ON player_stats(discord_username COLLATE NOCASE)
+        ''',
+    ]),
+    (3, "Weekly and monthly rollups of stats_history", [
+        '''
+        CREATE TABLE IF NOT EXISTS stats_weekly (
+            week_start TEXT NOT NULL, -- Sunday starting the week, YYYY-MM-DD
+            minecraft_username TEXT NOT NULL,
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0,
+            PRIMARY KEY (week_start, minecraft_username)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_monthly (
+            month TEXT NOT NULL, -- YYYY-MM
+            minecraft_username TEXT NOT NULL,
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0,
+            PRIMARY KEY (month, minecraft_username)
+        )
+        ''',
+        # Backfill from existing history. strftime('%w') is 0 for Sunday, so this walks back to the week's Sunday
+        '''
+        INSERT INTO stats_weekly (week_start, minecraft_username, deaths, advancements, playtime_seconds)
+        SELECT date(date, '-' || strftime('%w', date) || ' days'), minecraft_username,
+               SUM(deaths), SUM(advancements), SUM(playtime_seconds)
+        FROM stats_history
+        GROUP BY 1, 2
+        ''',
+        '''
+        INSERT INTO stats_monthly (month, minecraft_username, deaths, advancements, playtime_seconds)
+        SELECT substr(date, 1, 7), minecraft_username,
+               SUM(deaths), SUM(advancements), SUM(playtime_seconds)
+        FROM stats_history
+        GROUP BY 1, 2
+        ''',
+    ]),
+    (4, "Append-only events log", [
+        # Compact integer ids so each event row stays small
+        '''
+        CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY,
+            minecraft_username TEXT NOT NULL UNIQUE
+        )
+        ''',
+        "INSERT OR IGNORE INTO players (minecraft_username) SELECT minecraft_username FROM player_stats",
+        '''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            event_type INTEGER NOT NULL, -- See database/events.py
+            player_id INTEGER,           -- NULL for server start/stop
+            ts INTEGER NOT NULL,         -- Unix seconds (UTC)
+            message_id INTEGER,          -- Source Discord message, if any
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+    ]),
+    (5, "Monthly archive tier for compacted stats_history rows", [
+        '''
+        CREATE TABLE IF NOT EXISTS stats_history_archive (
+            month TEXT NOT NULL, -- YYYY-MM
+            minecraft_username TEXT NOT NULL,
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0,
+            PRIMARY KEY (month, minecraft_username)
+        )
+        ''',
+    ]),
+    (6, "Read positions of ingestion sources (server log tailer)", [
+        '''
+        CREATE TABLE IF NOT EXISTS ingest_offsets (
+            source TEXT PRIMARY KEY,
+            offset INTEGER NOT NULL, -- Bytes consumed
+            fingerprint TEXT,        -- Identifies the file the offset belongs to
+            updated_at INTEGER NOT NULL
+        )
+        ''',
+    ]),
+    (7, "Look up events by source message (webhook backfill skips messages already counted)", [
+        "CREATE INDEX IF NOT EXISTS idx_events_message_id ON events (message_id) WHERE message_id IS NOT NULL",
+    ]),
+    (8, "Ledger of processed webhook messages (redelivered or replayed messages are counted once)", [
+        '''
+        CREATE TABLE IF NOT EXISTS processed_messages (
+            message_id INTEGER PRIMARY KEY, -- Discord snowflake
+            processed_at INTEGER NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_processed_messages_at ON processed_messages (processed_at)",
+        # Messages already in the events log; ones older than LEDGER_TTL_DAYS go with the next retention run
+        '''
+        INSERT OR IGNORE INTO processed_messages (message_id, processed_at)
+        SELECT message_id, MAX(ts) FROM events WHERE message_id IS NOT NULL GROUP BY message_id
+        ''',
+    ]),
+    (9, "Each player's place in the death quip rotation (see tasks/death_quips.py)", [
+        '''
+        CREATE TABLE IF NOT EXISTS quip_rotation (
+            minecraft_username TEXT PRIMARY KEY,
+            catalog TEXT NOT NULL,    -- Version of the quip file the bag was dealt from
+            seed INTEGER NOT NULL,    -- Rebuilds the bag's order
+            position INTEGER NOT NULL -- Quips already told from it
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (10, "Per-server stats: server_id in online_players, stats_history and events, plus server_stats totals", [
+        # Existing rows belong to the one server there was, 'main' (DEFAULT_SERVER_ID in const.py)
+        '''
+        CREATE TABLE online_players_new (
+            server_id TEXT NOT NULL DEFAULT 'main',
+            minecraft_username TEXT NOT NULL,
+            login_time INTEGER,
+            PRIMARY KEY (server_id, minecraft_username)
+        )
+        ''',
+        "INSERT INTO online_players_new (minecraft_username, login_time) SELECT minecraft_username, login_time FROM online_players",
+        "DROP TABLE online_players",
+        "ALTER TABLE online_players_new RENAME TO online_players",
+        '''
+        CREATE TABLE stats_history_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            server_id TEXT NOT NULL DEFAULT 'main',
+            minecraft_username TEXT NOT NULL,
+            date TEXT NOT NULL, -- Store date as YYYY-MM-DD (est)
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0,
+            UNIQUE(server_id, minecraft_username, date)
+        )
+        ''',
+        '''
+        INSERT INTO stats_history_new (id, minecraft_username, date, deaths, advancements, playtime_seconds)
+        SELECT id, minecraft_username, date, deaths, advancements, playtime_seconds FROM stats_history
+        ''',
+        "DROP TABLE stats_history", # Takes idx_stats_history_date_player with it
+        "ALTER TABLE stats_history_new RENAME TO stats_history",
+        # Global date ranges (all servers summed) stay covered by the date-first index...
+        '''
+        CREATE INDEX IF NOT EXISTS idx_stats_history_date_player
+        ON stats_history(date, minecraft_username, deaths, advancements, playtime_seconds)
+        ''',
+        # ...and one server's date ranges get their own
+        '''
+        CREATE INDEX IF NOT EXISTS idx_stats_history_server_date
+        ON stats_history(server_id, date, minecraft_username, deaths, advancements, playtime_seconds)
+        ''',
+        "ALTER TABLE events ADD COLUMN server_id TEXT", # NULL for the default server, keeps the log's rows small
+        # All-time totals per server; player_stats keeps the totals over every server
+        '''
+        CREATE TABLE IF NOT EXISTS server_stats (
+            server_id TEXT NOT NULL,
+            minecraft_username TEXT NOT NULL,
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0,
+            PRIMARY KEY (server_id, minecraft_username)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        INSERT INTO server_stats (server_id, minecraft_username, deaths, advancements, playtime_seconds)
+        SELECT 'main', minecraft_username, deaths, advancements, playtime_seconds FROM player_stats
+        WHERE deaths > 0 OR advancements > 0 OR playtime_seconds > 0
+        ''',
+    ]),
+    (11, "Baseline adjustment events, so replaying the log reproduces the counters it started after", [
+        # Event types as in database/events.py: 2 leave, 3 death, 4 advancement,
+        # 7/8/9 adjust deaths/advancements/playtime. What the log alone replays to, per player, UTC day and server:
+        '''
+        CREATE TEMP TABLE baseline_logged AS
+        SELECT p.minecraft_username AS name, date(e.ts / 86400 * 86400, 'unixepoch') AS date,
+               COALESCE(e.server_id, 'main') AS server_id,
+               SUM(e.event_type = 3) AS deaths, SUM(e.event_type = 4) AS advancements,
+               SUM(CASE WHEN e.event_type = 2 THEN e.value ELSE 0 END) AS playtime
+        FROM events e JOIN players p ON p.id = e.player_id
+        WHERE e.event_type IN (2, 3, 4)
+        GROUP BY 1, 2, 3
+        ''',
+        # Differences to write as adjustments; date NULL changes the totals only
+        '''
+        CREATE TEMP TABLE baseline (
+            name TEXT NOT NULL, date TEXT, server_id TEXT NOT NULL,
+            deaths INTEGER NOT NULL, advancements INTEGER NOT NULL, playtime INTEGER NOT NULL
+        )
+        ''',
+        # Days in stats_history: whatever the log doesn't account for
+        '''
+        INSERT INTO baseline
+        SELECT h.minecraft_username, h.date, h.server_id, h.deaths - COALESCE(l.deaths, 0),
+               h.advancements - COALESCE(l.advancements, 0), h.playtime_seconds - COALESCE(l.playtime, 0)
+        FROM stats_history h LEFT JOIN baseline_logged l
+        ON l.name = h.minecraft_username AND l.date = h.date AND l.server_id = h.server_id
+        ''',
+        # Logged days without a stats_history row: compacted into the archive (or dropped)
+        '''
+        CREATE TEMP TABLE baseline_unlisted AS
+        SELECT * FROM baseline_logged l
+        WHERE NOT EXISTS (
+            SELECT 1 FROM stats_history h
+            WHERE h.minecraft_username = l.name AND h.date = l.date AND h.server_id = l.server_id
+        )
+        ''',
+        # Archived months, dated on the 1st (retention compacts them again)
+        '''
+        INSERT INTO baseline
+        SELECT a.minecraft_username, a.month || '-01', 'main', a.deaths - COALESCE(SUM(u.deaths), 0),
+               a.advancements - COALESCE(SUM(u.advancements), 0), a.playtime_seconds - COALESCE(SUM(u.playtime), 0)
+        FROM stats_history_archive a LEFT JOIN baseline_unlisted u
+        ON u.name = a.minecraft_username AND substr(u.date, 1, 7) = a.month
+        GROUP BY a.month, a.minecraft_username
+        ''',
+        '''
+        INSERT INTO baseline
+        SELECT name, date, server_id, -deaths, -advancements, -playtime FROM baseline_unlisted u
+        WHERE NOT EXISTS (
+            SELECT 1 FROM stats_history_archive a WHERE a.minecraft_username = u.name AND a.month = substr(u.date, 1, 7)
+        )
+        ''',
+        # player_stats must be the sum of server_stats: totals only ever set in player_stats go to 'main'
+        '''
+        INSERT INTO server_stats (server_id, minecraft_username, deaths, advancements, playtime_seconds)
+        SELECT 'main', p.minecraft_username, p.deaths - COALESCE(SUM(s.deaths), 0),
+               p.advancements - COALESCE(SUM(s.advancements), 0), p.playtime_seconds - COALESCE(SUM(s.playtime_seconds), 0)
+        FROM player_stats p LEFT JOIN server_stats s ON s.minecraft_username = p.minecraft_username
+        GROUP BY p.minecraft_username
+        HAVING p.deaths != COALESCE(SUM(s.deaths), 0) OR p.advancements != COALESCE(SUM(s.advancements), 0)
+            OR p.playtime_seconds != COALESCE(SUM(s.playtime_seconds), 0)
+        ON CONFLICT(server_id, minecraft_username) DO UPDATE SET
+        deaths = deaths + excluded.deaths,
+        advancements = advancements + excluded.advancements,
+        playtime_seconds = playtime_seconds + excluded.playtime_seconds
+        ''',
+        # Undated: each server's totals minus everything dated above
+        '''
+        INSERT INTO baseline
+        SELECT name, NULL, server_id, SUM(deaths), SUM(advancements), SUM(playtime) FROM (
+            SELECT minecraft_username AS name, server_id, deaths, advancements, playtime_seconds AS playtime FROM server_stats
+            UNION ALL
+            SELECT name, server_id, -deaths, -advancements, -playtime FROM baseline_logged
+            UNION ALL
+            SELECT name, server_id, -deaths, -advancements, -playtime FROM baseline
+        )
+        GROUP BY name, server_id
+        ''',
+        "INSERT OR IGNORE INTO players (minecraft_username) SELECT DISTINCT name FROM baseline",
+        # One adjustment event per non-zero counter; undated ones at ts 0
+        '''
+        INSERT INTO events (event_type, player_id, ts, message_id, value, server_id)
+        SELECT event_type, player_id, ts, NULL, value, server_id FROM (
+            SELECT t.event_type, p.id AS player_id, COALESCE(CAST(strftime('%s', b.date) AS INTEGER), 0) AS ts,
+                   CASE t.event_type WHEN 7 THEN b.deaths WHEN 8 THEN b.advancements ELSE b.playtime END AS value,
+                   NULLIF(b.server_id, 'main') AS server_id
+            FROM baseline b JOIN players p ON p.minecraft_username = b.name
+            CROSS JOIN (SELECT 7 AS event_type UNION ALL SELECT 8 UNION ALL SELECT 9) t
+        )
+        WHERE value != 0
+        ORDER BY ts, player_id, event_type
+        ''',
+        "DROP TABLE temp.baseline_logged",
+        "DROP TABLE temp.baseline_unlisted",
+        "DROP TABLE temp.baseline",
+    ]),
+    (12, "Per-server history archive: server_id in the stats_history_archive key", [
+        # Months compacted before this were summed over every server; they stay with 'main'
+        '''
+        CREATE TABLE stats_history_archive_new (
+            month TEXT NOT NULL, -- YYYY-MM
+            server_id TEXT NOT NULL DEFAULT 'main',
+            minecraft_username TEXT NOT NULL,
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0,
+            PRIMARY KEY (month, server_id, minecraft_username)
+        )
+        ''',
+        '''
+        INSERT INTO stats_history_archive_new (month, minecraft_username, deaths, advancements, playtime_seconds)
+        SELECT month, minecraft_username, deaths, advancements, playtime_seconds FROM stats_history_archive
+        ''',
+        "DROP TABLE stats_history_archive",
+        "ALTER TABLE stats_history_archive_new RENAME TO stats_history_archive",
+    ]),
+    (13, "Weekly history archive: split each archived month into the weeks inside it", [
+        # Months archived before this have no week breakdown (week_start NULL): rebuild_rollups
+        # keeps the stats_weekly rows of the weeks touching them, range reads can't split them
+        '''
+        CREATE TABLE stats_history_archive_new (
+            month TEXT NOT NULL,  -- YYYY-MM
+            week_start TEXT,      -- Sunday of the week; a week across two months has a row in each
+            server_id TEXT NOT NULL DEFAULT 'main',
+            minecraft_username TEXT NOT NULL,
+            deaths INTEGER DEFAULT 0,
+            advancements INTEGER DEFAULT 0,
+            playtime_seconds INTEGER DEFAULT 0,
+            PRIMARY KEY (month, week_start, server_id, minecraft_username)
+        )
+        ''',
+        '''
+        INSERT INTO stats_history_archive_new (month, server_id, minecraft_username, deaths, advancements, playtime_seconds)
+        SELECT month, server_id, minecraft_username, deaths, advancements, playtime_seconds FROM stats_history_archive
+        ''',
+        "DROP TABLE stats_history_archive",
+        "ALTER TABLE stats_history_archive_new RENAME TO stats_history_archive",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at INTEGER NOT NULL
+    )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def migrate(conn):
+    """Apply every pending migration in order. Returns the resulting schema version.
+
+    Must be called inside a write transaction; an existing stats.db is upgraded in
+    place (the base tables use IF NOT EXISTS so pre-migration databases start at 1).
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN") # Keep DDL inside the transaction so a failed migration rolls back
+    current = get_schema_version(conn)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"Applying database migration {version}: {description}")
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(
+            "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+            (version, description, int(datetime.datetime.now(pytz.utc).timestamp()))
+        )
+        current = version
+    return current
@@ -0,0 +1,76 @@
+import threading
+import logging
+
+logger = logging.getLogger('nameless_bot')
+
+
+class PlayerRegistry:
+    """In-memory Minecraft <-> Discord identity map with O(1) case-insensitive lookups.
+
+    Loaded once from player_stats by initialize_database() and kept current by the
+    write paths in database.queries (add_player / delete_player), so command and
+    webhook handlers never need a query just to resolve who someone is.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._discord_by_mc = {}    # exact Minecraft name -> Discord name (may be None)
+        self._mc_by_lower = {}      # lowercased Minecraft name -> exact Minecraft name
+        self._mc_by_discord = {}    # lowercased Discord name -> exact Minecraft name
+        self.loaded = False
+
+    def load(self, rows):
+        """Replace the registry contents with (minecraft_username, discord_username) rows."""
+        with self._lock:
+            self._discord_by_mc = {}
+            self._mc_by_lower = {}
+            self._mc_by_discord = {}
+            for minecraft_username, discord_username in rows:
+                self._add(minecraft_username, discord_username)
+            self.loaded = True
+        logger.info(f"Player registry loaded with {len(self._discord_by_mc)} players")
+
+    def add(self, minecraft_username, discord_username):
+        with self._lock:
+            self._add(minecraft_username, discord_username)
+
+    def remove(self, minecraft_username):
+        with self._lock:
+            discord_username = self._discord_by_mc.pop(minecraft_username, None)
+            self._mc_by_lower.pop(minecraft_username.lower(), None)
+            if discord_username and self._mc_by_discord.get(discord_username.lower()) == minecraft_username:
+                del self._mc_by_discord[discord_username.lower()]
+                # Another account may share this Discord user
+                for mc_name, disc_name in self._discord_by_mc.items():
+                    if disc_name and disc_name.lower() == discord_username.lower():
+                        self._mc_by_discord[disc_name.lower()] = mc_name
+                        break
+
+    def _add(self, minecraft_username, discord_username):
+        self._discord_by_mc[minecraft_username] = discord_username
+        self._mc_by_lower[minecraft_username.lower()] = minecraft_username
+        if discord_username:
+            # First account linked to a Discord user wins (the old fetchone() lookup did the same)
+            self._mc_by_discord.setdefault(discord_username.lower(), minecraft_username)
+
+    def canonical_minecraft(self, name):
+        """Return the stored spelling of a Minecraft name (any case), or None if unknown."""
+        return self._mc_by_lower.get(name.lower()) if name else None
+
+    def minecraft_from_discord(self, discord_name):
+        """Return the Minecraft name linked to a Discord name (any case), or None."""
+        return self._mc_by_discord.get(discord_name.lower()) if discord_name else None
+
+    def discord_from_minecraft(self, minecraft_username):
+        """Return the Discord name linked to a Minecraft name (any case), or None."""
+        canonical = self.canonical_minecraft(minecraft_username)
+        return self._discord_by_mc.get(canonical) if canonical else None
+
+    def mapping(self):
+        """Copy of the Minecraft -> Discord mapping."""
+        with self._lock:
+            return dict(self._discord_by_mc)
+
+
+# Process-wide registry
+registry = PlayerRegistry()
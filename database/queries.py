@@ -1,7 +1,18 @@
 import sqlite3
 import datetime
-from const import DATABASE_PATH, MINECRAFT_TO_DISCORD
-from database.connection import get_connection # Ensure this import is present
+import threading
+from contextlib import contextmanager
+from const import DATABASE_PATH, MINECRAFT_TO_DISCORD, DEFAULT_SERVER_ID
+from database.connection import write_connection, read_connection
+from database.batcher import stats_batcher, stats_view, DEATHS, ADVANCEMENTS, PLAYTIME
+from database.migrations import migrate
+from database import rollups
+from database import events
+from database.events import event_log
+from database.message_ledger import message_ledger
+from database.player_registry import registry
+from database.snapshot import build_snapshot
+from database.rank_index import rank_index
 from utils.logging import setup_logging
 import logging
 import pytz # Import pytz for timezone handling
@@ -9,170 +20,355 @@ import pytz # Import pytz for timezone handling
 # Setup logger
 logger = logging.getLogger('nameless_bot')
 
+# Bumped by every write that changes player_stats totals (see get_leaderboard_snapshot)
+_stats_version = 0
+_snapshots = {} # server_id (None for all servers) -> LeaderboardSnapshot
+_snapshot_lock = threading.Lock()
+
+# Ingestion offsets waiting for the next flush: source -> (offset, fingerprint)
+_pending_offsets = {}
+_offsets_lock = threading.Lock()
+
 def initialize_database():
-    """Create database tables if they don't exist."""
+    """Bring the database schema up to date and seed the known players."""
     logger.info(f"Initializing database at {DATABASE_PATH}")
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Main stats table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS player_stats (
-        minecraft_username TEXT PRIMARY KEY,
-        discord_username TEXT,
-        deaths INTEGER DEFAULT 0,
-        advancements INTEGER DEFAULT 0,
-        playtime_seconds INTEGER DEFAULT 0
-    )
-    ''')
+    with write_connection() as conn:
+        version = migrate(conn)
 
-    # Tracking table for online players
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS online_players (
-        minecraft_username TEXT PRIMARY KEY,
-        login_time INTEGER
-    )
-    ''')
-
-    # Daily stats history table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS stats_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        minecraft_username TEXT NOT NULL,
-        date TEXT NOT NULL, -- Store date as YYYY-MM-DD (est)
-        deaths INTEGER DEFAULT 0,
-        advancements INTEGER DEFAULT 0,
-        playtime_seconds INTEGER DEFAULT 0,
-        UNIQUE(minecraft_username, date)
-    )
-    ''')
-
-    # Initialize all players from the mapping with default values
-    for mc_username, disc_username in MINECRAFT_TO_DISCORD.items():
-        cursor.execute('''
+        # Initialize all players from the mapping with default values
+        conn.executemany('''
         INSERT OR IGNORE INTO player_stats
         (minecraft_username, discord_username, deaths, advancements, playtime_seconds)
         VALUES (?, ?, 0, 0, 0)
-        ''', (mc_username, disc_username))
+        ''', MINECRAFT_TO_DISCORD.items())
+
+        registry.load(conn.execute("SELECT minecraft_username, discord_username FROM player_stats"))
+        rank_index.load(conn.execute("SELECT minecraft_username, deaths, advancements, playtime_seconds FROM player_stats"))
+        message_ledger.load(conn.execute("SELECT MAX(message_id) FROM processed_messages").fetchone()[0])
+
+    logger.info(f"Database initialized! (schema version {version})")
+
+def flush_pending_stats():
+    """Write every buffered stat increment and event to the database in a single transaction.
+    Returns the number of (player, date, server) rows written.
 
-    conn.commit()
-    conn.close()
-    logger.info("Database initialized!")
+    The commit, dropping the in-flight deltas and invalidating the leaderboard snapshot
+    happen together under stats_view.exclusive(), so a reader holding it shared (see
+    _stats_reader) sees the deltas either in the buffer or in the tables, never both
+    or neither. Must not be called inside another write_connection() block.
+    """
+    deltas = stats_batcher.drain()
+    pending_events = event_log.drain()
+    processed = message_ledger.drain()
+    with _offsets_lock:
+        offsets = dict(_pending_offsets)
+        _pending_offsets.clear()
+    if not deltas and not pending_events and not offsets and not processed:
+        return 0
+    try:
+        with write_connection() as conn:
+            events.insert_events(conn, pending_events)
+            _apply_stat_deltas(conn, deltas)
+            _save_ingest_offsets(conn, offsets)
+            conn.executemany("INSERT OR IGNORE INTO processed_messages (message_id, processed_at) VALUES (?, ?)", processed)
+            with stats_view.exclusive():
+                conn.commit()
+                stats_batcher.commit()
+                event_log.commit()
+                message_ledger.commit()
+                mark_stats_changed()
+        logger.debug(f"Flushed {len(deltas)} buffered stat rows and {len(pending_events)} events")
+        return len(deltas)
+    except Exception as e:
+        # Keep everything for the next attempt
+        stats_batcher.restore()
+        event_log.restore()
+        message_ledger.restore()
+        events.reset_player_ids()
+        with _offsets_lock:
+            for source, offset in offsets.items():
+                _pending_offsets.setdefault(source, offset) # Unless a newer one arrived meanwhile
+        logger.error(f"Error flushing buffered stats: {e}")
+        return 0
+
+def _save_ingest_offsets(conn, offsets):
+    now = int(datetime.datetime.now(pytz.utc).timestamp())
+    conn.executemany(
+        "INSERT OR REPLACE INTO ingest_offsets (source, offset, fingerprint, updated_at) VALUES (?, ?, ?, ?)",
+        [(source, offset, fingerprint, now) for source, (offset, fingerprint) in offsets.items()]
+    )
 
-def record_death(minecraft_username):
-    """Increment death count for a player."""
+def record_ingest_offset(source, offset, fingerprint=None):
+    """Remember how far an ingestion source has read. It is saved by the next flush, in the
+    same transaction as the stats recorded before it, so a restart neither re-reads nor skips lines.
+    """
+    with _offsets_lock:
+        _pending_offsets[source] = (offset, fingerprint)
+
+def _record_position(position):
+    """record_ingest_offset() for an event's (source, offset, fingerprint), if it came from a log."""
+    if position:
+        record_ingest_offset(*position)
+
+def save_quip_rotation(minecraft_username, catalog, seed, position):
+    """Remember where a player is in their death quip bag."""
+    try:
+        with write_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO quip_rotation (minecraft_username, catalog, seed, position) VALUES (?, ?, ?, ?)",
+                (minecraft_username, catalog, seed, position)
+            )
+    except Exception as e:
+        logger.error(f"Error saving quip rotation for {minecraft_username}: {e}")
+
+def get_quip_rotations():
+    """Every saved (minecraft_username, catalog, seed, position)."""
+    try:
+        with read_connection() as conn:
+            return conn.execute("SELECT minecraft_username, catalog, seed, position FROM quip_rotation").fetchall()
+    except Exception as e:
+        logger.error(f"Error getting quip rotations: {e}")
+        return []
+
+def get_ingest_offset(source):
+    """Return the last (offset, fingerprint) recorded for a source, or None if it never read anything."""
+    try:
+        with _offsets_lock:
+            if source in _pending_offsets:
+                return _pending_offsets[source]
+        with read_connection() as conn:
+            return conn.execute("SELECT offset, fingerprint FROM ingest_offsets WHERE source = ?", (source,)).fetchone()
+    except Exception as e:
+        logger.error(f"Error getting ingest offset for {source}: {e}")
+        return None
+
+def claim_message(message_id):
+    """Mark a webhook message processed. Returns False if it already was (a redelivery or
+    replay: the caller must not count it again), True the first time.
+    """
+    try:
+        seen = message_ledger.check(message_id)
+        if seen is None: # Older than the cache, not necessarily counted
+            with read_connection() as conn:
+                seen = conn.execute("SELECT 1 FROM processed_messages WHERE message_id = ?", (message_id,)).fetchone() is not None
+            if seen:
+                message_ledger.remember(message_id)
+        if seen:
+            message_ledger.hits += 1
+            logger.info(f"Message {message_id} was already processed, skipping it")
+            return False
+        message_ledger.add(message_id, int(datetime.datetime.now(pytz.utc).timestamp()))
+        return True
+    except Exception as e:
+        logger.error(f"Error checking processed message {message_id}: {e}")
+        return True # Better a rare double count than a lost event
+
+def _apply_stat_deltas(conn, deltas):
+    """Add {(player, date, server_id): [deaths, advancements, playtime]} to player_stats,
+    server_stats and stats_history.
+    """
+    server_totals = {}
+    for (minecraft_username, _, server_id), delta in deltas.items():
+        total = server_totals.setdefault((server_id, minecraft_username), [0, 0, 0])
+        for i in range(3):
+            total[i] += delta[i]
+    _add_to_totals(conn, server_totals)
+
+    # Daily history plus the weekly/monthly rollups, all in this transaction
+    rollups.upsert_history_rows(conn, [
+        (name, date, d, a, p, server_id) for (name, date, server_id), (d, a, p) in deltas.items()
+    ])
+
+def _add_to_totals(conn, server_totals):
+    """Add {(server_id, player): [deaths, advancements, playtime]} to server_stats and player_stats."""
+    totals = {}
+    for (_, minecraft_username), delta in server_totals.items():
+        total = totals.setdefault(minecraft_username, [0, 0, 0])
+        for i in range(3):
+            total[i] += delta[i]
+
+    conn.executemany('''
+    UPDATE player_stats SET
+        deaths = deaths + ?,
+        advancements = advancements + ?,
+        playtime_seconds = playtime_seconds + ?
+    WHERE minecraft_username = ?
+    ''', [(d, a, p, name) for name, (d, a, p) in totals.items()])
+
+    conn.executemany('''
+    INSERT INTO server_stats (server_id, minecraft_username, deaths, advancements, playtime_seconds)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(server_id, minecraft_username) DO UPDATE SET
+    deaths = deaths + excluded.deaths,
+    advancements = advancements + excluded.advancements,
+    playtime_seconds = playtime_seconds + excluded.playtime_seconds
+    ''', [(server_id, name, d, a, p) for (server_id, name), (d, a, p) in server_totals.items()])
+
+def _event_time(ts=None):
+    """An event's unix timestamp: `ts`, or now if it isn't known."""
+    return int(datetime.datetime.now(pytz.utc).timestamp()) if ts is None else int(ts)
+
+def _event_date(ts):
+    """The history date (est date) of a unix timestamp."""
+    return datetime.datetime.fromtimestamp(ts, pytz.utc).strftime("%Y-%m-%d")
+
+def _buffer_stat(minecraft_username, deaths=0, advancements=0, playtime=0, server_id=DEFAULT_SERVER_ID, ts=None):
+    """Queue an increment for the day of `ts` (today if None). Returns True once the buffer should be flushed."""
+    should_flush = stats_batcher.add(minecraft_username, _event_date(_event_time(ts)), deaths, advancements, playtime, server_id)
+    rank_index.add(minecraft_username, deaths, advancements, playtime)
+    mark_stats_changed() # Readers already see buffered deltas
+    return should_flush
+
+@contextmanager
+def _stats_reader():
+    """A reader connection for queries that add buffered deltas onto table rows. Read
+    the rows and the deltas inside the block: a flush can't publish while it is open.
+    """
+    with stats_view.shared(), read_connection() as conn:
+        yield conn
+
+def mark_stats_changed():
+    """Invalidate the cached leaderboard snapshot after player_stats totals change."""
+    global _stats_version
+    with _snapshot_lock:
+        _stats_version += 1
+
+def _log_event(event_type, minecraft_username=None, message_id=None, value=0, server_id=DEFAULT_SERVER_ID, ts=None):
+    """Queue an event for the events log. Returns True once the buffer should be flushed."""
+    return event_log.append(event_type, minecraft_username, message_id, value, ts, server_id=server_id)
+
+# The record_* functions take the event's time as `ts` (now if None) and, for a line read
+# from a log, the (source, offset, fingerprint) it was read up to as `position`: that offset
+# is saved in the same flush as the event, so a restart never reads the line again. A full
+# buffer is only flushed once the whole event is buffered (writes run one at a time on the
+# facade's writer thread, so nothing else can flush in between).
+
+def record_server_event(event_type, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+    """Log a server start/stop event."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE player_stats SET deaths = deaths + 1 WHERE minecraft_username = ?",
-            (minecraft_username,)
-        )
-
-        # Also update today's stats directly (use est date)
-        today_est = datetime.datetime.now(pytz.utc).strftime("%Y-%m-%d")
-        cursor.execute('''
-        INSERT INTO stats_history (minecraft_username, date, deaths, advancements, playtime_seconds)
-        VALUES (?, ?, 1, 0, 0)
-        ON CONFLICT(minecraft_username, date) DO UPDATE SET
-        deaths = deaths + 1
-        ''', (minecraft_username, today_est))
-
-        conn.commit()
-        conn.close()
+        full = _log_event(event_type, message_id=message_id, server_id=server_id, ts=ts)
+        _record_position(position)
+        if full:
+            flush_pending_stats()
+    except Exception as e:
+        logger.error(f"Error recording server event {event_type} on {server_id}: {e}")
+
+def _with_pending(rows, stat_index=None, reverse=False, server_id=None):
+    """Add buffered deltas onto player_stats-shaped rows (name first, discord second).
+    With stat_index set, rows are (name, discord, value) and are re-sorted by value.
+    With server_id set, only that server's deltas are added (for server_stats rows).
+    """
+    pending = stats_batcher.pending_totals(server_id)
+    if not pending:
+        return rows
+    merged = []
+    for row in rows:
+        delta = pending.get(row[0])
+        if delta:
+            if stat_index is None:
+                row = row[:2] + (row[2] + delta[DEATHS], row[3] + delta[ADVANCEMENTS], row[4] + delta[PLAYTIME])
+            else:
+                row = row[:2] + (row[2] + delta[stat_index],)
+        merged.append(row)
+    if stat_index is not None:
+        merged.sort(key=lambda r: r[2], reverse=reverse)
+    return merged
+
+def _with_pending_history(rows, start_date, end_date):
+    """Add buffered deltas in [start_date, end_date] onto (name, deaths, advancements, playtime) rows."""
+    pending = stats_batcher.pending_for_range(start_date, end_date)
+    if not pending:
+        return rows
+    merged = []
+    for row in rows:
+        delta = pending.pop(row[0], None)
+        if delta:
+            row = (row[0], row[1] + delta[DEATHS], row[2] + delta[ADVANCEMENTS], row[3] + delta[PLAYTIME])
+        merged.append(row)
+    # Players with no row yet in the range
+    merged.extend((name, d, a, p) for name, (d, a, p) in pending.items())
+    return merged
+
+def record_death(minecraft_username, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+    """Increment death count for a player (buffered, see flush_pending_stats)."""
+    try:
+        full = _log_event(events.EVENT_DEATH, minecraft_username, message_id, server_id=server_id, ts=ts)
+        full = _buffer_stat(minecraft_username, deaths=1, server_id=server_id, ts=ts) or full
+        _record_position(position)
+        if full:
+            flush_pending_stats()
         logger.info(f"Recorded death for {minecraft_username}")
     except Exception as e:
         logger.error(f"Error recording death: {e}")
 
-def record_advancement(minecraft_username):
-    """Increment advancement count for a player."""
+def record_advancement(minecraft_username, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+    """Increment advancement count for a player (buffered, see flush_pending_stats)."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE player_stats SET advancements = advancements + 1 WHERE minecraft_username = ?",
-            (minecraft_username,)
-        )
-
-        # Also update today's stats directly (use est date)
-        today_est = datetime.datetime.now(pytz.utc).strftime("%Y-%m-%d")
-        cursor.execute('''
-        INSERT INTO stats_history (minecraft_username, date, deaths, advancements, playtime_seconds)
-        VALUES (?, ?, 0, 1, 0)
-        ON CONFLICT(minecraft_username, date) DO UPDATE SET
-        advancements = advancements + 1
-        ''', (minecraft_username, today_est))
-
-        conn.commit()
-        conn.close()
+        full = _log_event(events.EVENT_ADVANCEMENT, minecraft_username, message_id, server_id=server_id, ts=ts)
+        full = _buffer_stat(minecraft_username, advancements=1, server_id=server_id, ts=ts) or full
+        _record_position(position)
+        if full:
+            flush_pending_stats()
         logger.info(f"Recorded advancement for {minecraft_username}")
     except Exception as e:
         logger.error(f"Error recording advancement: {e}")
 
-def record_login(minecraft_username):
-    """Record when a player logs in."""
+def record_login(minecraft_username, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+    """Record when a player logs in to a server."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        current_time = int(datetime.datetime.now(pytz.utc).timestamp()) # Use est timestamp
-        cursor.execute(
-            "INSERT OR REPLACE INTO online_players (minecraft_username, login_time) VALUES (?, ?)",
-            (minecraft_username, current_time)
-        )
-        conn.commit()
-        conn.close()
-        logger.info(f"Recorded login for {minecraft_username} at {current_time}")
+        current_time = _event_time(ts)
+        full = _log_event(events.EVENT_JOIN, minecraft_username, message_id, server_id=server_id, ts=current_time)
+        with write_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO online_players (server_id, minecraft_username, login_time) VALUES (?, ?, ?)",
+                (server_id, minecraft_username, current_time)
+            )
+        _record_position(position)
+        if full:
+            flush_pending_stats()
+        logger.info(f"Recorded login for {minecraft_username} on {server_id} at {current_time}")
     except Exception as e:
         logger.error(f"Error recording login: {e}")
 
-def record_logout(minecraft_username):
-    """Record when a player logs out and update playtime. Returns playtime added."""
+def record_logout(minecraft_username, message_id=None, server_id=DEFAULT_SERVER_ID, ts=None, position=None):
+    """Record when a player logs out of a server and update playtime. Returns playtime added."""
     playtime = 0 # Default return value
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Get login time
-        cursor.execute(
-            "SELECT login_time FROM online_players WHERE minecraft_username = ?",
-            (minecraft_username,)
-        )
-        result = cursor.fetchone()
-
-        if result:
-            login_time = result[0]
-            current_time = int(datetime.datetime.now(pytz.utc).timestamp()) # Use est timestamp
-            # Ensure playtime is not negative if clock adjustments happened
-            playtime = max(0, current_time - login_time)
+        with write_connection() as conn:
+            cursor = conn.cursor()
 
-            # Update total playtime
+            # Get login time
             cursor.execute(
-                "UPDATE player_stats SET playtime_seconds = playtime_seconds + ? WHERE minecraft_username = ?",
-                (playtime, minecraft_username)
+                "SELECT login_time FROM online_players WHERE server_id = ? AND minecraft_username = ?",
+                (server_id, minecraft_username)
             )
+            result = cursor.fetchone()
 
-            # Also update today's stats (use est date)
-            today_est = datetime.datetime.now(pytz.utc).strftime("%Y-%m-%d")
-            cursor.execute('''
-            INSERT INTO stats_history (minecraft_username, date, deaths, advancements, playtime_seconds)
-            VALUES (?, ?, 0, 0, ?)
-            ON CONFLICT(minecraft_username, date) DO UPDATE SET
-            playtime_seconds = playtime_seconds + ?
-            ''', (minecraft_username, today_est, playtime, playtime))
+            if result:
+                login_time = result[0]
+                current_time = _event_time(ts)
+                # Ensure playtime is not negative if clock adjustments happened
+                playtime = max(0, current_time - login_time)
 
-            # Remove from online players
-            cursor.execute(
-                "DELETE FROM online_players WHERE minecraft_username = ?",
-                (minecraft_username,)
-            )
+                # Remove from online players
+                cursor.execute(
+                    "DELETE FROM online_players WHERE server_id = ? AND minecraft_username = ?",
+                    (server_id, minecraft_username)
+                )
+            else:
+                # Log this case - might happen on bot restart if player was online
+                logger.warning(f"No login record found for {minecraft_username} on {server_id} upon logout.")
 
-            conn.commit()
+        full = False
+        if result:
+            # Total and the day's playtime are buffered like deaths/advancements
+            full = _log_event(events.EVENT_LEAVE, minecraft_username, message_id, playtime, server_id=server_id, ts=current_time)
+            full = _buffer_stat(minecraft_username, playtime=playtime, server_id=server_id, ts=current_time) or full
             logger.info(f"Recorded logout for {minecraft_username}, added {playtime} seconds")
-        else:
-            # Log this case - might happen on bot restart if player was online
-            logger.warning(f"No login record found for {minecraft_username} upon logout.")
+        _record_position(position)
+        if full:
+            flush_pending_stats()
 
-        conn.close()
         return playtime # Return the calculated playtime
     except Exception as e:
         logger.error(f"Error recording logout for {minecraft_username}: {e}")
@@ -181,239 +377,325 @@ def record_logout(minecraft_username):
 def get_player_stats(minecraft_username=None, discord_username=None):
     """Get stats for a player by minecraft or discord username."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        if minecraft_username:
-            cursor.execute(
-                "SELECT * FROM player_stats WHERE minecraft_username = ?",
-                (minecraft_username,)
-            )
-        elif discord_username:
-            cursor.execute(
-                "SELECT * FROM player_stats WHERE discord_username = ?",
-                (discord_username,)
-            )
-        else:
-            conn.close() # Close connection before returning
-            return None
-
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        if not minecraft_username:
+            # The registry resolves the Discord name (any case), then it's a primary key lookup
+            minecraft_username = registry.minecraft_from_discord(discord_username)
+            if not minecraft_username:
+                return None
+
+        with _stats_reader() as conn:
+            result = conn.execute("SELECT * FROM player_stats WHERE minecraft_username = ?", (minecraft_username,)).fetchone()
+            return _with_pending([result])[0] if result else None
     except Exception as e:
         logger.error(f"Error getting player stats for {minecraft_username or discord_username}: {e}")
-        # Ensure connection is closed in case of error during fetch/execute
-        try: conn.close()
-        except: pass
         return None
 
 def get_all_players():
     """Get stats for all players."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM player_stats")
-        result = cursor.fetchall()
-        conn.close()
-        return result
+        with _stats_reader() as conn:
+            result = conn.execute("SELECT * FROM player_stats").fetchall()
+            return _with_pending(result)
     except Exception as e:
         logger.error(f"Error getting all players: {e}")
-        try: conn.close()
-        except: pass
         return []
 
 def get_all_deaths():
     """Get all player death counts sorted from lowest to highest."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT minecraft_username, discord_username, deaths FROM player_stats ORDER BY deaths ASC"
-        )
-        result = cursor.fetchall()
-        conn.close()
-        return result
+        with _stats_reader() as conn:
+            result = conn.execute(
+                "SELECT minecraft_username, discord_username, deaths FROM player_stats ORDER BY deaths ASC"
+            ).fetchall()
+            return _with_pending(result, DEATHS)
     except Exception as e:
         logger.error(f"Error getting death counts: {e}")
-        try: conn.close()
-        except: pass
         return []
 
 def get_all_advancements():
     """Get all player advancement counts sorted from highest to lowest."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT minecraft_username, discord_username, advancements FROM player_stats ORDER BY advancements DESC"
-        )
-        result = cursor.fetchall()
-        conn.close()
-        return result
+        with _stats_reader() as conn:
+            result = conn.execute(
+                "SELECT minecraft_username, discord_username, advancements FROM player_stats ORDER BY advancements DESC"
+            ).fetchall()
+            return _with_pending(result, ADVANCEMENTS, reverse=True)
     except Exception as e:
         logger.error(f"Error getting advancement counts: {e}")
-        try: conn.close()
-        except: pass
         return []
 
 def get_all_playtimes():
     """Get all player playtimes sorted from highest to lowest."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT minecraft_username, discord_username, playtime_seconds FROM player_stats ORDER BY playtime_seconds DESC"
-        )
-        result = cursor.fetchall()
-        conn.close()
-        return result
+        with _stats_reader() as conn:
+            result = conn.execute(
+                "SELECT minecraft_username, discord_username, playtime_seconds FROM player_stats ORDER BY playtime_seconds DESC"
+            ).fetchall()
+            return _with_pending(result, PLAYTIME, reverse=True)
     except Exception as e:
         logger.error(f"Error getting playtimes: {e}")
-        try: conn.close()
-        except: pass
         return []
 
-def get_online_players_db():
-    """Get list of currently online players from the database."""
+def get_leaderboard_snapshot(server_id=None):
+    """Return a LeaderboardSnapshot of every player's totals (buffered deltas included),
+    summed over all servers, or with server_id set, of the players who played on that server.
+
+    The global totals are player_stats itself (every write keeps it summed over the
+    servers), a server's come from server_stats through its primary key. Rows are
+    scanned once and sorted per metric in memory. Each snapshot is cached and handed
+    out again until the next write changes the totals, so the leaderboard and role
+    updates of one cycle share a single scan.
+    """
+    try:
+        with _snapshot_lock:
+            cached = _snapshots.get(server_id)
+            if cached is not None and cached.version == _stats_version:
+                return cached
+
+        with _stats_reader() as conn:
+            with _snapshot_lock:
+                version = _stats_version # Can't move until the rows and deltas below are read
+            if server_id is None:
+                rows = conn.execute("SELECT * FROM player_stats").fetchall()
+            else:
+                rows = conn.execute('''
+                SELECT s.minecraft_username, p.discord_username, s.deaths, s.advancements, s.playtime_seconds
+                FROM server_stats s JOIN player_stats p ON p.minecraft_username = s.minecraft_username
+                WHERE s.server_id = ?
+                ''', (server_id,)).fetchall()
+                # Known players whose first stats on this server are still buffered
+                listed = {row[0] for row in rows}
+                rows.extend(
+                    (name, registry.discord_from_minecraft(name), 0, 0, 0)
+                    for name in stats_batcher.pending_totals(server_id)
+                    if name not in listed and registry.canonical_minecraft(name) == name
+                )
+                rows.sort(key=lambda row: row[0]) # server_stats key order, wherever the rows came from
+            rows = _with_pending(rows, server_id=server_id)
+        snapshot = build_snapshot(version, int(datetime.datetime.now(pytz.utc).timestamp()), rows)
+
+        with _snapshot_lock:
+            current = _snapshots.get(server_id)
+            if current is None or current.version <= version:
+                _snapshots[server_id] = snapshot
+        return snapshot
+    except Exception as e:
+        logger.error(f"Error building leaderboard snapshot{f' for {server_id}' if server_id else ''}: {e}")
+        return None
+
+def get_rank(minecraft_username, metric, neighbors=0):
+    """A player's standing on one leaderboard ('deaths', 'advancements' or 'playtime'):
+    (rank, total_players, value, nearby), where nearby is [(position, minecraft_username, value)]
+    for up to `neighbors` players either side of them. None for an unknown player.
+    Answered by the rank index (buffered increments included), without a table scan.
+    """
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT minecraft_username FROM online_players")
-        result = cursor.fetchall()
-        conn.close()
+        standing = rank_index.rank(minecraft_username, metric)
+        if standing is None:
+            return None
+        return standing + (rank_index.around(minecraft_username, metric, neighbors),)
+    except Exception as e:
+        logger.error(f"Error getting {metric} rank for {minecraft_username}: {e}")
+        return None
+
+def get_online_players_db(server_id=None):
+    """Get list of players currently online on a server (or on any server) from the database."""
+    try:
+        with read_connection() as conn:
+            if server_id is None:
+                result = conn.execute("SELECT DISTINCT minecraft_username FROM online_players").fetchall()
+            else:
+                result = conn.execute("SELECT minecraft_username FROM online_players WHERE server_id = ?", (server_id,)).fetchall()
         return [player[0] for player in result]
     except Exception as e:
         logger.error(f"Error getting online players: {e}")
-        try: conn.close()
-        except: pass
         return []
 
-def clear_online_players():
-    """Clear all online players and update playtimes (e.g., on server stop/bot shutdown)."""
+def clear_online_players(server_id=None, ts=None):
+    """Clear the online players of a server (all servers if None) and update playtimes
+    up to `ts` (now if None), e.g. on server stop/bot shutdown.
+    """
+    # Limits every statement below to the server being cleared
+    scope, scope_params = ("", ()) if server_id is None else (" AND server_id = ?", (server_id,))
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Get all online players
-        cursor.execute("SELECT minecraft_username, login_time FROM online_players")
-        players = cursor.fetchall()
-
-        if not players:
-            conn.close()
-            logger.info("No online players to clear.")
-            return # Nothing to do
-
-        current_time = int(datetime.datetime.now(pytz.utc).timestamp()) # Use est timestamp
-        today_est = datetime.datetime.now(pytz.utc).strftime("%Y-%m-%d") # Use est date
-
-        # Update playtime for each player
-        for player in players:
-            minecraft_username, login_time = player
-            playtime = max(0, current_time - login_time)
-
-            if playtime > 0: # Only update if there's playtime to add
-                cursor.execute(
-                    "UPDATE player_stats SET playtime_seconds = playtime_seconds + ? WHERE minecraft_username = ?",
-                    (playtime, minecraft_username)
+        flush_pending_stats() # Keep the events log in order (buffered joins before these leaves)
+        with write_connection() as conn:
+            cursor = conn.cursor()
+
+            # Get all online players
+            cursor.execute(f"SELECT server_id, minecraft_username, login_time FROM online_players WHERE true{scope}", scope_params)
+            players = cursor.fetchall()
+
+            if not players:
+                logger.info(f"No online players to clear{f' on {server_id}' if server_id else ''}.")
+                return # Nothing to do
+
+            current_time = _event_time(ts)
+            today_est = _event_date(current_time) # Use est date
+
+            # Credit every open session in one pass, straight from online_players
+            # (SUM: with every server cleared, a player may have been on several)
+            # (online_players is keyed by server first, so summing per player in a correlated
+            # subquery would scan it once per player)
+            cursor.execute(f'''
+            UPDATE player_stats
+            SET playtime_seconds = playtime_seconds + o.credit
+            FROM (
+                SELECT minecraft_username, SUM(? - login_time) AS credit FROM online_players
+                WHERE login_time < ?{scope}
+                GROUP BY minecraft_username
+            ) o
+            WHERE o.minecraft_username = player_stats.minecraft_username
+            ''', (current_time, current_time, *scope_params))
+
+            cursor.execute(f'''
+            INSERT INTO server_stats (server_id, minecraft_username, deaths, advancements, playtime_seconds)
+            SELECT server_id, minecraft_username, 0, 0, ? - login_time FROM online_players
+            WHERE login_time < ?{scope}
+            ON CONFLICT(server_id, minecraft_username) DO UPDATE SET
+            playtime_seconds = playtime_seconds + excluded.playtime_seconds
+            ''', (current_time, current_time, *scope_params))
+
+            # Also update today's stats (and the weekly/monthly rollups), one pass per server
+            for cleared_server in sorted({row[0] for row in players}):
+                rollups.upsert_history_select(
+                    conn, today_est,
+                    "SELECT minecraft_username, 0, 0, ? - login_time FROM online_players WHERE server_id = ? AND login_time < ?",
+                    (current_time, cleared_server, current_time), server_id=cleared_server
                 )
 
-                # Also update today's stats
-                cursor.execute('''
-                INSERT INTO stats_history (minecraft_username, date, deaths, advancements, playtime_seconds)
-                VALUES (?, ?, 0, 0, ?)
-                ON CONFLICT(minecraft_username, date) DO UPDATE SET
-                playtime_seconds = playtime_seconds + ?
-                ''', (minecraft_username, today_est, playtime, playtime))
+            for cleared_server, minecraft_username, login_time in players:
+                if current_time > login_time: # Only sessions with playtime were credited
+                    logger.info(f"Added {current_time - login_time} seconds to {minecraft_username} on {cleared_server} during clear")
+
+            # Log the forced leaves in the same transaction so a replay sees the same playtime
+            events.insert_events(conn, [
+                (events.EVENT_LEAVE, minecraft_username, current_time, None, max(0, current_time - login_time), cleared_server)
+                for cleared_server, minecraft_username, login_time in players
+            ])
 
-                logger.info(f"Added {playtime} seconds to {minecraft_username} during clear")
+            # Clear the online players table
+            cursor.execute(f"DELETE FROM online_players WHERE true{scope}", scope_params)
 
-        # Clear the online players table
-        cursor.execute("DELETE FROM online_players")
+        rank_index.add_many([
+            (minecraft_username, 0, 0, max(0, current_time - login_time)) for _, minecraft_username, login_time in players
+        ])
+        mark_stats_changed()
 
-        conn.commit()
-        conn.close()
         logger.info(f"Cleared {len(players)} online players and updated their playtime.")
     except Exception as e:
         logger.error(f"Error clearing online players: {e}")
-        try: conn.close()
-        except: pass
 
 
-def bulk_update_history(updates):
-    """Update player stats in bulk from provided dictionary."""
+def bulk_update_history(updates, server_id=None):
+    """Set player totals from {player: {'deaths': n, 'advancements': n, 'playtime': n}}
+    (missing keys keep their value). With server_id None these are the totals over every
+    server and the difference is credited to the default server; otherwise they are that
+    server's totals (e.g. from its world stats files). The differences are logged as undated
+    adjustment events in the same transaction, so a replay reproduces them.
+    """
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        for minecraft_username, stats in updates.items():
-            # Validate keys to prevent injection or errors
-            valid_keys = {'deaths', 'advancements', 'playtime'}
-            update_clauses = []
-            update_values = []
-
-            if 'deaths' in stats and isinstance(stats['deaths'], int):
-                update_clauses.append("deaths = ?")
-                update_values.append(stats['deaths'])
-            if 'advancements' in stats and isinstance(stats['advancements'], int):
-                 update_clauses.append("advancements = ?")
-                 update_values.append(stats['advancements'])
-            # Map 'playtime' key from input to 'playtime_seconds' column
-            if 'playtime' in stats and isinstance(stats['playtime'], int):
-                 update_clauses.append("playtime_seconds = ?")
-                 update_values.append(stats['playtime'])
-
-            if update_clauses:
-                 sql = f"UPDATE player_stats SET {', '.join(update_clauses)} WHERE minecraft_username = ?"
-                 update_values.append(minecraft_username)
-                 cursor.execute(sql, tuple(update_values))
-                 logger.debug(f"Bulk updated {minecraft_username} with {stats}")
-            else:
-                 logger.warning(f"No valid updates provided for {minecraft_username} in bulk update: {stats}")
-
-
-        conn.commit()
-        conn.close()
-        logger.info(f"Bulk updated history for {len(updates)} players")
+        # Write buffered increments first so the absolute values below aren't offset by them
+        flush_pending_stats()
+        target = DEFAULT_SERVER_ID if server_id is None else server_id
+        with write_connection() as conn:
+            # Validate keys to prevent injection or errors; 'playtime' maps to playtime_seconds
+            requested = {}
+            for minecraft_username, stats in updates.items():
+                values = tuple(
+                    stats[key] if key in stats and isinstance(stats[key], int) else None
+                    for key in ('deaths', 'advancements', 'playtime')
+                )
+                if values == (None, None, None):
+                    logger.warning(f"No valid updates provided for {minecraft_username} in bulk update: {stats}")
+                elif registry.canonical_minecraft(minecraft_username) != minecraft_username:
+                    logger.warning(f"Unknown player {minecraft_username} in bulk update, skipped")
+                else:
+                    requested[minecraft_username] = values
+                    logger.debug(f"Bulk updated {minecraft_username} with {stats}")
+
+            # Current totals, in the same transaction the differences are written in
+            current = {}
+            names = list(requested)
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                if server_id is None:
+                    rows = conn.execute(f'''
+                    SELECT minecraft_username, deaths, advancements, playtime_seconds FROM player_stats
+                    WHERE minecraft_username IN ({placeholders})
+                    ''', chunk)
+                else:
+                    rows = conn.execute(f'''
+                    SELECT minecraft_username, deaths, advancements, playtime_seconds FROM server_stats
+                    WHERE server_id = ? AND minecraft_username IN ({placeholders})
+                    ''', (server_id, *chunk))
+                current.update((row[0], row[1:]) for row in rows)
+
+            deltas = {}
+            for minecraft_username, values in requested.items():
+                old = current.get(minecraft_username, (0, 0, 0)) # No server_stats row yet: nothing there
+                delta = [0 if new is None else new - old[i] for i, new in enumerate(values)]
+                if any(delta):
+                    deltas[(target, minecraft_username)] = delta
+            _add_to_totals(conn, deltas)
+            events.insert_events(conn, [
+                row for (_, name), delta in deltas.items() for row in events.adjustment_events(name, delta, target)
+            ])
+
+        rank_index.add_many([(minecraft_username, d, a, p) for (_, minecraft_username), (d, a, p) in deltas.items()])
+        mark_stats_changed()
+        logger.info(f"Bulk updated history for {len(updates)} players ({len(deltas)} changed)"
+                    f"{f' on {server_id}' if server_id else ''}")
         return True
     except Exception as e:
+        events.reset_player_ids() # The rolled back transaction may have created some
         logger.error(f"Error updating history: {e}")
-        try: conn.close()
-        except: pass
         return False
 
 def delete_player(minecraft_username):
     """Delete a player from the database."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Delete from player_stats
-        cursor.execute(
-            "DELETE FROM player_stats WHERE minecraft_username = ?",
-            (minecraft_username,)
-        )
-
-        # Also delete from online_players if they're there
-        cursor.execute(
-            "DELETE FROM online_players WHERE minecraft_username = ?",
-            (minecraft_username,)
-        )
-
-        # Also delete from stats_history
-        cursor.execute(
-            "DELETE FROM stats_history WHERE minecraft_username = ?",
-            (minecraft_username,)
-        )
-
-        conn.commit()
-        conn.close()
+        stats_batcher.discard_player(minecraft_username)
+        event_log.discard_player(minecraft_username)
+        with write_connection() as conn:
+            cursor = conn.cursor()
+
+            # Delete from player_stats
+            cursor.execute(
+                "DELETE FROM player_stats WHERE minecraft_username = ?",
+                (minecraft_username,)
+            )
+
+            # Also delete from online_players if they're there
+            cursor.execute(
+                "DELETE FROM online_players WHERE minecraft_username = ?",
+                (minecraft_username,)
+            )
+
+            # Also delete from stats_history and its rollups
+            for table in ("stats_history", "stats_history_archive", "stats_weekly", "stats_monthly", "server_stats"):
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE minecraft_username = ?",
+                    (minecraft_username,)
+                )
+
+            # And their events, so a replay doesn't bring them back
+            cursor.execute(
+                "DELETE FROM events WHERE player_id IN (SELECT id FROM players WHERE minecraft_username = ?)",
+                (minecraft_username,)
+            )
+            cursor.execute("DELETE FROM players WHERE minecraft_username = ?", (minecraft_username,))
+            cursor.execute("DELETE FROM quip_rotation WHERE minecraft_username = ?", (minecraft_username,))
+            events.forget_player(minecraft_username)
+
+        registry.remove(minecraft_username)
+        rank_index.remove(minecraft_username)
+        mark_stats_changed()
         logger.info(f"Deleted player {minecraft_username} from database")
         return True
     except Exception as e:
         logger.error(f"Error deleting player {minecraft_username}: {e}")
-        try: conn.close()
-        except: pass
         return False
 
 def add_player(minecraft_username, discord_username): # discord_username is likely "User#Tag" or ID string
@@ -424,115 +706,165 @@ def add_player(minecraft_username, discord_username): # discord_username is like
         None: If player already existed (or insert was ignored).
         False: On database error.
     """
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Assuming minecraft_username is the PRIMARY KEY or has a UNIQUE constraint
-        cursor.execute(
-            "INSERT OR IGNORE INTO player_stats (minecraft_username, discord_username, deaths, advancements, playtime_seconds) VALUES (?, ?, 0, 0, 0)",
-            (minecraft_username, discord_username) # Use discord_username directly
-        )
+        # The write context rolls back automatically if anything below raises
+        with write_connection() as conn:
+            # Assuming minecraft_username is the PRIMARY KEY or has a UNIQUE constraint
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO player_stats (minecraft_username, discord_username, deaths, advancements, playtime_seconds) VALUES (?, ?, 0, 0, 0)",
+                (minecraft_username, discord_username) # Use discord_username directly
+            )
+            inserted = cursor.rowcount > 0 # A row was actually inserted
 
-        if cursor.rowcount > 0: # A row was actually inserted
-            conn.commit()
+        if inserted:
+            registry.add(minecraft_username, discord_username)
+            rank_index.set(minecraft_username)
+            mark_stats_changed()
             logger.info(f"NEWLY ADDED player {minecraft_username} (Discord: {discord_username}) to database")
             return True
         else:
             # No rows affected, means player likely already existed due to OR IGNORE
-            conn.commit() # Commit in case other (unrelated) operations happened
             logger.info(f"Player {minecraft_username} (Discord: {discord_username}) already exists or insert was ignored.")
             return None
     except Exception as e:
         logger.error(f"Error in add_player for MC: {minecraft_username}, Discord: {discord_username}: {e}", exc_info=True)
-        if conn: # Attempt to rollback if there was an error mid-transaction
-            try:
-                conn.rollback()
-            except Exception as rb_err:
-                logger.error(f"Error during rollback for {minecraft_username}: {rb_err}")
         return False
-    finally:
-        if conn:
-            conn.close()
-            
+
 def save_daily_stats():
-    """Ensure an entry exists for today in stats_history for all known players.
+    """Make sure everything recorded so far is in stats_history before a summary reads it.
        Called by the daily summary task before processing yesterday.
+       Inactive players no longer get a zero row every day: a history row is created by
+       the first increment of the day, and readers already treat a missing row as zeros.
     """
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Get current date in YYYY-MM-DD format (est)
-        today_est = datetime.datetime.now(pytz.utc).strftime("%Y-%m-%d")
-
-        # Get all known players from the main stats table
-        cursor.execute("SELECT minecraft_username FROM player_stats")
-        all_mc_users = [row[0] for row in cursor.fetchall()]
-
-        # For each player, ensure they have an entry for today (don't overwrite incremental values)
-        inserted_count = 0
-        for mc_username in all_mc_users:
-            # Use INSERT OR IGNORE to safely create the row if it doesn't exist
-            # Initialize with 0s; actual increments happen in record_death/advancement/logout
-            cursor.execute('''
-            INSERT OR IGNORE INTO stats_history
-            (minecraft_username, date, deaths, advancements, playtime_seconds)
-            VALUES (?, ?, 0, 0, 0)
-            ''', (mc_username, today_est))
-            if cursor.rowcount > 0:
-                inserted_count += 1
-
-        conn.commit()
-        conn.close()
-        if inserted_count > 0:
-            logger.info(f"Ensured/Created daily stats entries for {inserted_count} players for date {today_est}")
-        # else: # Optional: reduce log spam
-        #     logger.debug(f"All players already had stats entries for {today_est}")
+        written = flush_pending_stats()
+        if written:
+            logger.info(f"Saved {written} pending daily stats rows")
         return True
     except Exception as e:
         logger.error(f"Error saving/ensuring daily stats entries: {e}")
-        try: conn.close()
-        except: pass
         return False
 
+def get_stats_for_range(start_date, end_date):
+    """Get aggregated stats per player for an inclusive YYYY-MM-DD date range.
+       Whole months and weeks come from the rollup tables, only the edges from daily rows
+       (or, for archived history, from the archive's weeks). Returns None if an edge would
+       split an archived week, which can't be answered (see rollups.split_range).
+    """
+    try:
+        with _stats_reader() as conn:
+            sql, params = rollups.range_query(conn, start_date, end_date)
+            result = conn.execute(sql, params).fetchall() if sql else []
+            return _with_pending_history(result, start_date, end_date)
+    except ValueError as e:
+        logger.warning(f"Can't get stats for range {start_date} to {end_date}: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error getting stats for range {start_date} to {end_date}: {e}")
+        return []
+
+def rebuild_rollups():
+    """Regenerate the weekly and monthly rollups from stats_history. Returns (weeks, months)."""
+    try:
+        flush_pending_stats()
+        with write_connection() as conn:
+            return rollups.rebuild_rollups(conn)
+    except Exception as e:
+        logger.error(f"Error rebuilding rollups: {e}")
+        return None
+
+def get_players_timeline(minecraft_usernames, start_date, end_date, bucket='day'):
+    """Stats series for several players over an inclusive YYYY-MM-DD range, in one query.
+
+    `bucket` is 'day', 'week' (Sunday start) or 'month'. Returns (bucket_keys, series)
+    where series is {player: {'deaths': [...], 'advancements': [...], 'playtime': [...]}}
+    with one value per bucket key, zero where nothing happened. Week and month buckets
+    are read from the rollups, so they always hold the whole week/month (and still work
+    for archived history). Day buckets of archived days are None: those were compacted
+    into weeks (see database/retention.py). Returns None on error.
+    """
+    try:
+        table, column = rollups.BUCKET_TABLES[bucket]
+        keys = rollups.bucket_keys(start_date, end_date, bucket)
+        index = {key: i for i, key in enumerate(keys)}
+        names = list(dict.fromkeys(minecraft_usernames))
+        series = {
+            name: {'deaths': [0] * len(keys), 'advancements': [0] * len(keys), 'playtime': [0] * len(keys)}
+            for name in names
+        }
+        if not keys or not names:
+            return keys, series
+
+        with _stats_reader() as conn:
+            rows = conn.execute(f'''
+            SELECT minecraft_username, {column}, deaths, advancements, playtime_seconds
+            FROM {table}
+            WHERE {column} BETWEEN ? AND ? AND minecraft_username IN ({', '.join('?' * len(names))})
+            ''', (keys[0], keys[-1], *names)).fetchall()
+
+            # Buffered increments that haven't been flushed yet
+            rows.extend(
+                (name, rollups.bucket_key(date, bucket), d, a, p)
+                for (name, date), (d, a, p) in stats_batcher.pending_by_date().items()
+                if name in series
+            )
+            archived = rollups.archived_before(conn) if bucket == 'day' else None
+        for name, key, deaths, advancements, playtime in rows:
+            i = index.get(key)
+            if i is not None:
+                player = series[name]
+                player['deaths'][i] += deaths
+                player['advancements'][i] += advancements
+                player['playtime'][i] += playtime
+        if archived:
+            archived_days = sum(1 for key in keys if key < archived)
+            for player in series.values():
+                for values in player.values():
+                    values[:archived_days] = [None] * archived_days
+        return keys, series
+    except Exception as e:
+        logger.error(f"Error getting timeline for {minecraft_usernames} ({start_date} to {end_date} by {bucket}): {e}")
+        return None
+
+def get_player_timeline(minecraft_username, start_date, end_date, bucket='day'):
+    """Single-player get_players_timeline: (bucket_keys, {'deaths': [...], ...}) or None on error."""
+    result = get_players_timeline([minecraft_username], start_date, end_date, bucket)
+    if result is None:
+        return None
+    keys, series = result
+    return keys, series[minecraft_username]
+
+def get_stats_for_date(date):
+    """Get each player's stats_history totals (summed over servers) for a single YYYY-MM-DD date."""
+    try:
+        with _stats_reader() as conn:
+            # Covered by idx_stats_history_date_player, already in player order
+            result = conn.execute('''
+            SELECT minecraft_username, SUM(deaths), SUM(advancements), SUM(playtime_seconds)
+            FROM stats_history
+            WHERE date = ?
+            GROUP BY minecraft_username
+            ''', (date,)).fetchall()
+            return _with_pending_history(result, date, date)
+    except Exception as e:
+        logger.error(f"Error getting stats for date {date}: {e}")
+        return []
+
 def get_stats_for_period(period_days):
     """Get aggregated stats for the specified period ending today (est).
        period_days=1 means today only.
        period_days=7 means today + previous 6 days.
     """
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Calculate date range using est dates
-        end_date_dt = datetime.datetime.now(pytz.utc)
-        # For a 1-day period, start_date is also today
-        # For a 7-day period, start_date is 6 days ago (today inclusive)
-        start_date_dt = end_date_dt - datetime.timedelta(days=max(0, period_days - 1))
-
-        end_date = end_date_dt.strftime("%Y-%m-%d")
-        start_date = start_date_dt.strftime("%Y-%m-%d")
-
-        logger.debug(f"Getting stats for period: {start_date} to {end_date}")
-
-        # Get aggregated stats for period
-        cursor.execute('''
-        SELECT minecraft_username,
-               SUM(deaths) as total_deaths,
-               SUM(advancements) as total_advancements,
-               SUM(playtime_seconds) as total_playtime
-        FROM stats_history
-        WHERE date BETWEEN ? AND ?
-        GROUP BY minecraft_username
-        ''', (start_date, end_date))
-
-        results = cursor.fetchall()
-        conn.close()
-        return results
-    except Exception as e:
-        logger.error(f"Error getting stats for period {period_days} days ({start_date} to {end_date}): {e}")
-        try: conn.close()
-        except: pass
-        return []
\ No newline at end of file
+    # Calculate date range using est dates
+    end_date_dt = datetime.datetime.now(pytz.utc)
+    # For a 1-day period, start_date is also today
+    # For a 7-day period, start_date is 6 days ago (today inclusive)
+    start_date_dt = end_date_dt - datetime.timedelta(days=max(0, period_days - 1))
+
+    end_date = end_date_dt.strftime("%Y-%m-%d")
+    start_date = start_date_dt.strftime("%Y-%m-%d")
+
+    logger.debug(f"Getting stats for period: {start_date} to {end_date}")
+
+    # Get aggregated stats for period
+    return get_stats_for_range(start_date, end_date)
@@ -0,0 +1,264 @@
+import random
+import threading
+import logging
+
+logger = logging.getLogger('nameless_bot')
+
+# Metric names and their index in a (deaths, advancements, playtime) totals tuple
+METRICS = ('deaths', 'advancements', 'playtime')
+REBUILD_SHARE = 8 # RankIndex.add_many rebuilds the trees for batches of at least 1/8 of the players
+
+
+class _Node:
+    __slots__ = ('key', 'priority', 'left', 'right', 'size')
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.size = 1
+
+
+def _size(node):
+    return node.size if node else 0
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+def _split(node, key):
+    """Split into (keys < key, keys >= key)."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    _update(node)
+    return left, node
+
+def _merge(left, right):
+    """Join two treaps where every key in `left` is below every key in `right`."""
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class OrderStatisticTree:
+    """Randomized treap whose nodes know their subtree size.
+
+    Keys are kept in ascending order; insert, remove, count_below (rank) and
+    select (k-th key) are all O(log n) expected.
+    """
+
+    def __init__(self, keys=()):
+        # Build in O(n) from sorted keys: a Cartesian tree on the random priorities
+        spine = [] # Right spine of the tree built so far
+        for key in sorted(keys):
+            node, last = _Node(key), None
+            while spine and spine[-1].priority < node.priority:
+                last = spine.pop()
+            node.left = last
+            if spine:
+                spine[-1].right = node
+            spine.append(node)
+        self._root = spine[0] if spine else None
+        # Fill in subtree sizes bottom-up
+        order, stack = [], [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(child for child in (node.left, node.right) if child)
+        for node in reversed(order):
+            _update(node)
+
+    def __len__(self):
+        return _size(self._root)
+
+    def insert(self, key):
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        """Remove one occurrence of `key` (which must be present)."""
+        path, node = [], self._root
+        while node is not None and node.key != key:
+            path.append(node)
+            node = node.left if key < node.key else node.right
+        if node is None:
+            return
+        replacement = _merge(node.left, node.right)
+        if not path:
+            self._root = replacement
+        elif path[-1].left is node:
+            path[-1].left = replacement
+        else:
+            path[-1].right = replacement
+        for ancestor in path:
+            ancestor.size -= 1
+
+    def count_below(self, key):
+        """Number of keys strictly less than `key`."""
+        count, node = 0, self._root
+        while node is not None:
+            if node.key < key:
+                count += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def select(self, index):
+        """The key at 0-based position `index` in ascending order."""
+        node = self._root
+        while node is not None:
+            left_size = _size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node.key
+            else:
+                index -= left_size + 1
+                node = node.right
+        raise IndexError(index)
+
+    def slice(self, start, stop):
+        """Keys at positions [start, stop) in ascending order."""
+        return [self.select(i) for i in range(max(0, start), min(stop, len(self)))]
+
+
+class RankIndex:
+    """Live per-metric standings for every player.
+
+    Deaths rank lowest first and advancements/playtime highest first, the same
+    orders as the leaderboards. Seeded from player_stats by initialize_database()
+    and kept current by the database.queries write paths (buffered increments
+    included), so !rank never has to sort the whole table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}   # minecraft_username -> [deaths, advancements, playtime]
+        self._trees = {metric: OrderStatisticTree() for metric in METRICS}
+
+    @staticmethod
+    def _key(metric, value, minecraft_username):
+        # Ascending keys; negate the "higher is better" metrics. Ties break by name.
+        return (value if metric == 'deaths' else -value, minecraft_username)
+
+    def _rebuild(self):
+        self._trees = {
+            metric: OrderStatisticTree(
+                self._key(metric, totals[i], name) for name, totals in self._totals.items()
+            )
+            for i, metric in enumerate(METRICS)
+        }
+
+    def load(self, rows):
+        """Replace the contents with (minecraft_username, deaths, advancements, playtime) rows."""
+        with self._lock:
+            self._totals = {name: [d, a, p] for name, d, a, p in rows}
+            self._rebuild()
+        logger.info(f"Rank index loaded with {len(self._totals)} players")
+
+    def _set(self, minecraft_username, new_totals):
+        old_totals = self._totals.get(minecraft_username)
+        for i, metric in enumerate(METRICS):
+            if old_totals is not None:
+                if old_totals[i] == new_totals[i]:
+                    continue
+                self._trees[metric].remove(self._key(metric, old_totals[i], minecraft_username))
+            self._trees[metric].insert(self._key(metric, new_totals[i], minecraft_username))
+        self._totals[minecraft_username] = list(new_totals)
+
+    def add(self, minecraft_username, deaths=0, advancements=0, playtime=0):
+        """Apply increments for a known player (unknown names are ignored)."""
+        with self._lock:
+            totals = self._totals.get(minecraft_username)
+            if totals is not None:
+                self._set(minecraft_username, (totals[0] + deaths, totals[1] + advancements, totals[2] + playtime))
+
+    def add_many(self, increments):
+        """add() for a batch of (minecraft_username, deaths, advancements, playtime) increments.
+        A batch touching at least 1/REBUILD_SHARE of the players (e.g. a server stop with
+        everyone online) rebuilds the trees in one sort instead of moving each player.
+        """
+        with self._lock:
+            if len(increments) * REBUILD_SHARE < len(self._totals):
+                for minecraft_username, deaths, advancements, playtime in increments:
+                    totals = self._totals.get(minecraft_username)
+                    if totals is not None:
+                        self._set(minecraft_username, (totals[0] + deaths, totals[1] + advancements, totals[2] + playtime))
+                return
+            for minecraft_username, *deltas in increments:
+                totals = self._totals.get(minecraft_username)
+                if totals is not None:
+                    for i, delta in enumerate(deltas):
+                        totals[i] += delta
+            self._rebuild()
+
+    def set(self, minecraft_username, deaths=None, advancements=None, playtime=None):
+        """Overwrite totals; None keeps the current value (0 for a new player)."""
+        with self._lock:
+            current = self._totals.get(minecraft_username, [0, 0, 0])
+            self._set(minecraft_username, tuple(
+                current[i] if value is None else value
+                for i, value in enumerate((deaths, advancements, playtime))
+            ))
+
+    def remove(self, minecraft_username):
+        with self._lock:
+            totals = self._totals.pop(minecraft_username, None)
+            if totals is not None:
+                for i, metric in enumerate(METRICS):
+                    self._trees[metric].remove(self._key(metric, totals[i], minecraft_username))
+
+    def rank(self, minecraft_username, metric):
+        """Return (rank, total_players, value) or None for an unknown player.
+        Tied players share a rank (1, 2, 2, 4...).
+        """
+        with self._lock:
+            totals = self._totals.get(minecraft_username)
+            if totals is None:
+                return None
+            value = totals[METRICS.index(metric)]
+            # Everyone strictly ahead: keys below the smallest possible key for this value
+            ahead = self._trees[metric].count_below(self._key(metric, value, ''))
+            return ahead + 1, len(self._totals), value
+
+    def top(self, metric, k):
+        """The first k (minecraft_username, value) entries of a metric's standings."""
+        with self._lock:
+            return [self._entry(metric, key) for key in self._trees[metric].slice(0, k)]
+
+    def around(self, minecraft_username, metric, k):
+        """Up to k entries either side of a player, with their 1-based positions:
+        [(position, minecraft_username, value)]. Empty for an unknown player.
+        """
+        with self._lock:
+            totals = self._totals.get(minecraft_username)
+            if totals is None:
+                return []
+            tree = self._trees[metric]
+            position = tree.count_below(self._key(metric, totals[METRICS.index(metric)], minecraft_username))
+            keys = tree.slice(position - k, position + k + 1)
+            first = max(0, position - k)
+            return [(first + i + 1,) + self._entry(metric, key) for i, key in enumerate(keys)]
+
+    @staticmethod
+    def _entry(metric, key):
+        value, minecraft_username = key
+        return minecraft_username, (value if metric == 'deaths' else -value)
+
+
+# Process-wide index used by database.queries and !rank
+rank_index = RankIndex()
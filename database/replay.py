@@ -0,0 +1,169 @@
+"""Rebuild every aggregate from the append-only events table.
+
+player_stats counters, server_stats, stats_history and its rollups are all
+derived from the events log, so if any of them get corrupted they can be recomputed:
+
+    python -m database.replay            # rebuild stats.db in place
+    python -m database.replay --dry-run  # only report what would change, per player
+
+Counters the webhook events don't explain are logged as adjustment events
+(database/events.py): migration 11 wrote one per player, day and counter for
+everything recorded before the log existed. Undated adjustments (ts 0) change
+the totals but not the history of any day.
+"""
+import argparse
+import datetime
+import logging
+import time
+from const import REPLAY_CHUNK_SIZE, DEFAULT_SERVER_ID
+from database.connection import write_connection
+from database.events import (
+    EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_ADJUST_DEATHS, EVENT_ADJUST_ADVANCEMENTS,
+    EVENT_ADJUST_PLAYTIME, UNDATED_TS
+)
+from database import rollups
+from database.rank_index import rank_index
+from database.queries import flush_pending_stats, mark_stats_changed
+
+logger = logging.getLogger('nameless_bot')
+
+_EPOCH = datetime.date(1970, 1, 1)
+STATS = ('deaths', 'advancements', 'playtime')
+
+
+def diff_totals(current, replayed):
+    """{player: {stat: (current, replayed)}} for every stat a replay would change.
+    Both arguments map player -> (deaths, advancements, playtime); missing players count as zeros.
+    """
+    changes = {}
+    for name in sorted(current.keys() | replayed.keys()):
+        before, after = current.get(name, (0, 0, 0)), replayed.get(name, (0, 0, 0))
+        changed = {stat: (b, a) for stat, b, a in zip(STATS, before, after) if b != a}
+        if changed:
+            changes[name] = changed
+    return changes
+
+def format_changes(changes):
+    """One line per player and changed stat, for the CLI."""
+    if not changes:
+        return "Every player's totals match the events log."
+    return "\n".join(
+        f"{name}: {stat} {before} -> {after} ({after - before:+})"
+        for name, stats in changes.items() for stat, (before, after) in stats.items()
+    )
+
+
+def replay_events(chunk_size=REPLAY_CHUNK_SIZE, dry_run=False):
+    """Rebuild player_stats and server_stats counters, stats_history and the rollups from the events log.
+
+    SQLite folds the events into one row per (player, UTC day, server) and those rows are
+    streamed back in chunks, so memory stays flat however long the log gets. The
+    whole rebuild is one transaction. Returns a summary dict; its 'changes' are the
+    per-player totals that differ from the current ones (see diff_totals).
+    """
+    flush_pending_stats() # Buffered events must be in the table before we read it
+
+    started = time.perf_counter()
+    totals = {}  # player_id -> [deaths, advancements, playtime]
+    server_totals = {} # (server_id, player_id) -> [deaths, advancements, playtime]
+    day_names = {}
+    history_count = 0
+
+    with write_connection() as conn:
+        names = dict(conn.execute("SELECT id, minecraft_username FROM players"))
+        current = {row[0]: row[1:] for row in conn.execute(
+            "SELECT minecraft_username, deaths, advancements, playtime_seconds FROM player_stats"
+        )}
+        event_count = 0
+
+        if not dry_run:
+            # Swap the aggregates; the surrounding transaction makes this all-or-nothing
+            conn.execute("UPDATE player_stats SET deaths = 0, advancements = 0, playtime_seconds = 0")
+            conn.execute("DELETE FROM stats_history")
+            conn.execute("DELETE FROM server_stats")
+            conn.execute("DELETE FROM stats_history_archive") # The log covers archived days too
+
+        # Dates are UTC days (ts / 86400), the same bucketing record_* uses; NULL for undated adjustments
+        cursor = conn.execute('''
+        SELECT player_id, CASE WHEN ts = ? THEN NULL ELSE ts / 86400 END, COALESCE(server_id, ?), COUNT(*),
+               SUM(CASE event_type WHEN ? THEN 1 WHEN ? THEN value ELSE 0 END),
+               SUM(CASE event_type WHEN ? THEN 1 WHEN ? THEN value ELSE 0 END),
+               SUM(CASE WHEN event_type IN (?, ?) THEN value ELSE 0 END)
+        FROM events
+        WHERE event_type IN (?, ?, ?, ?, ?, ?)
+        GROUP BY 2, 1, 3 -- Day first: rows come out in date order, which suits the history indexes
+        ''', (UNDATED_TS, DEFAULT_SERVER_ID, EVENT_DEATH, EVENT_ADJUST_DEATHS, EVENT_ADVANCEMENT, EVENT_ADJUST_ADVANCEMENTS,
+              EVENT_LEAVE, EVENT_ADJUST_PLAYTIME, EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_LEAVE,
+              EVENT_ADJUST_DEATHS, EVENT_ADJUST_ADVANCEMENTS, EVENT_ADJUST_PLAYTIME))
+
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            history_rows = []
+            for player_id, day_number, server_id, count, d, a, p in chunk:
+                event_count += count
+                name = names.get(player_id)
+                if name is None or not (d or a or p):
+                    continue # Deleted player, or e.g. a zero-length session
+                total = totals.get(player_id)
+                if total is None:
+                    total = totals[player_id] = [0, 0, 0]
+                server_total = server_totals.get((server_id, player_id))
+                if server_total is None:
+                    server_total = server_totals[(server_id, player_id)] = [0, 0, 0]
+                for t in (total, server_total):
+                    t[0] += d
+                    t[1] += a
+                    t[2] += p
+                if day_number is None:
+                    continue # Undated adjustment: totals only
+                date = day_names.get(day_number)
+                if date is None:
+                    date = day_names[day_number] = (_EPOCH + datetime.timedelta(days=day_number)).isoformat()
+                history_rows.append((server_id, name, date, d, a, p))
+            history_count += len(history_rows)
+            if not dry_run:
+                conn.executemany('''
+                INSERT INTO stats_history (server_id, minecraft_username, date, deaths, advancements, playtime_seconds)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', history_rows)
+
+        if not dry_run:
+            conn.executemany(
+                "UPDATE player_stats SET deaths = ?, advancements = ?, playtime_seconds = ? WHERE minecraft_username = ?",
+                [(d, a, p, names[player_id]) for player_id, (d, a, p) in totals.items()]
+            )
+            conn.executemany(
+                "INSERT INTO server_stats (server_id, minecraft_username, deaths, advancements, playtime_seconds) VALUES (?, ?, ?, ?, ?)",
+                [(server_id, names[player_id], d, a, p) for (server_id, player_id), (d, a, p) in server_totals.items()]
+            )
+            rollups.rebuild_rollups(conn)
+            rank_index.load(conn.execute("SELECT minecraft_username, deaths, advancements, playtime_seconds FROM player_stats"))
+
+    if not dry_run:
+        mark_stats_changed()
+
+    summary = {
+        'events': event_count,
+        'players': len(totals),
+        'history_rows': history_count,
+        'changes': diff_totals(current, {names[player_id]: tuple(total) for player_id, total in totals.items()
+                                         if names[player_id] in current}),
+        'seconds': time.perf_counter() - started,
+    }
+    logger.info(f"Replayed {event_count} events into {len(totals)} players / {history_count} history rows "
+                f"in {summary['seconds']:.2f}s, {len(summary['changes'])} players' totals "
+                f"{'would change' if dry_run else 'changed'}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild stats aggregates from the events log.")
+    parser.add_argument("--dry-run", action="store_true", help="Read the log and report, but don't write anything")
+    parser.add_argument("--chunk-size", type=int, default=REPLAY_CHUNK_SIZE, help="Rows streamed per chunk")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    summary = replay_events(chunk_size=args.chunk_size, dry_run=args.dry_run)
+    print(format_changes(summary.pop('changes')))
+    print(summary)
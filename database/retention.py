@@ -0,0 +1,105 @@
+"""Keep stats_history small: drop empty rows and compact old days into months.
+
+Daily rows older than HISTORY_HOT_DAYS (rounded down to whole months) are
+folded into stats_history_archive, one row per server, player and week of a
+month (a week across two months has a row in each). stats_monthly and
+stats_weekly are untouched, and rebuild_rollups can regenerate both from the
+archive. Archived days can't be split any more: range reads still work as long
+as each edge falls on a week or month boundary (see rollups.split_range), and
+day timelines show those days as None. Each call does one short transaction, so a backlog is worked off a
+batch at a time between the bot's normal writes. Entries of the processed
+message ledger older than LEDGER_TTL_DAYS are pruned the same way:
+
+    python -m database.retention              # catch up in one go (e.g. after an import)
+    python -m database.benchmark retention    # size and read times before and after, on synthetic history
+"""
+import datetime
+import logging
+import time
+import pytz
+from const import HISTORY_HOT_DAYS, RETENTION_BATCH_ROWS, LEDGER_TTL_DAYS
+from database.connection import write_connection
+
+logger = logging.getLogger('nameless_bot')
+
+
+def archive_cutoff(today=None, hot_days=HISTORY_HOT_DAYS):
+    """First day (YYYY-MM-DD) of the oldest month that stays in daily rows."""
+    today = today or datetime.datetime.now(pytz.utc).date()
+    return (today - datetime.timedelta(days=hot_days)).replace(day=1).isoformat()
+
+def retention_step(batch_size=RETENTION_BATCH_ROWS, hot_days=HISTORY_HOT_DAYS, today=None):
+    """Run one retention transaction. Returns the number of stats_history and
+    processed_messages rows removed, 0 once there is nothing left to do.
+    """
+    with write_connection() as conn:
+        # Ledger entries past their TTL (see database/message_ledger.py)
+        expired = int(time.time()) - LEDGER_TTL_DAYS * 86400
+        removed = conn.execute('''
+        DELETE FROM processed_messages WHERE message_id IN (
+            SELECT message_id FROM processed_messages WHERE processed_at < ? LIMIT ?
+        )
+        ''', (expired, batch_size)).rowcount
+        if removed:
+            logger.debug(f"Retention: pruned {removed} processed message ids")
+            return removed
+
+        # Rows with nothing in them (e.g. zero-length sessions, or the old per-player daily rows)
+        removed = conn.execute('''
+        DELETE FROM stats_history WHERE id IN (
+            SELECT id FROM stats_history
+            WHERE deaths = 0 AND advancements = 0 AND playtime_seconds = 0
+            LIMIT ?
+        )
+        ''', (batch_size,)).rowcount
+        if removed:
+            logger.debug(f"Retention: deleted {removed} empty history rows")
+            return removed
+
+        cutoff = archive_cutoff(today, hot_days)
+        oldest = conn.execute("SELECT MIN(date) FROM stats_history WHERE date < ?", (cutoff,)).fetchone()[0]
+        if oldest is None:
+            return 0
+
+        # Take about batch_size rows, but always whole days so no day ends up half in each tier
+        row = conn.execute(
+            "SELECT date FROM stats_history WHERE date < ? ORDER BY date LIMIT 1 OFFSET ?",
+            (cutoff, batch_size)
+        ).fetchone()
+        upper = row[0] if row else cutoff
+        if upper == oldest:
+            upper = (datetime.date.fromisoformat(oldest) + datetime.timedelta(days=1)).isoformat()
+
+        conn.execute('''
+        INSERT INTO stats_history_archive (month, week_start, server_id, minecraft_username, deaths, advancements, playtime_seconds)
+        SELECT substr(date, 1, 7), date(date, '-' || strftime('%w', date) || ' days'), server_id, minecraft_username,
+               SUM(deaths), SUM(advancements), SUM(playtime_seconds)
+        FROM stats_history
+        WHERE date < ?
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT(month, week_start, server_id, minecraft_username) DO UPDATE SET
+        deaths = deaths + excluded.deaths,
+        advancements = advancements + excluded.advancements,
+        playtime_seconds = playtime_seconds + excluded.playtime_seconds
+        ''', (upper,))
+        removed = conn.execute("DELETE FROM stats_history WHERE date < ?", (upper,)).rowcount
+        logger.debug(f"Retention: archived {removed} history rows before {upper}")
+        return removed
+
+def run_retention(batch_size=RETENTION_BATCH_ROWS, hot_days=HISTORY_HOT_DAYS):
+    """Call retention_step until it is caught up. Returns the total rows removed."""
+    started = time.perf_counter()
+    total = 0
+    while True:
+        removed = retention_step(batch_size, hot_days)
+        if not removed:
+            break
+        total += removed
+    if total:
+        logger.info(f"Retention removed {total} rows in {time.perf_counter() - started:.2f}s")
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print(run_retention())
@@ -0,0 +1,236 @@
+import datetime
+import logging
+from const import DEFAULT_SERVER_ID
+
+logger = logging.getLogger('nameless_bot')
+
+# Weeks start on Sunday, matching the weekly summary and !currentstats
+
+
+def week_start(date_str):
+    """Return the Sunday (YYYY-MM-DD) starting the week that contains `date_str`."""
+    day = datetime.date.fromisoformat(date_str)
+    return (day - datetime.timedelta(days=(day.weekday() + 1) % 7)).isoformat()
+
+def month_of(date_str):
+    """Return the YYYY-MM month key for a YYYY-MM-DD date."""
+    return date_str[:7]
+
+def upsert_history_rows(conn, rows):
+    """Add [(player, date, deaths, advancements, playtime, server_id)] to stats_history and both
+    rollups. The rollups are global: rows for the same player from different servers add up there.
+    Callers run this inside their write transaction so the three tables never disagree.
+    """
+    if not rows:
+        return
+    conn.executemany('''
+    INSERT INTO stats_history (minecraft_username, date, deaths, advancements, playtime_seconds, server_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(server_id, minecraft_username, date) DO UPDATE SET
+    deaths = deaths + excluded.deaths,
+    advancements = advancements + excluded.advancements,
+    playtime_seconds = playtime_seconds + excluded.playtime_seconds
+    ''', rows)
+
+    weekly, monthly = {}, {}
+    for name, date, deaths, advancements, playtime, _ in rows:
+        for bucket, key in ((weekly, (week_start(date), name)), (monthly, (month_of(date), name))):
+            total = bucket.setdefault(key, [0, 0, 0])
+            total[0] += deaths
+            total[1] += advancements
+            total[2] += playtime
+
+    conn.executemany('''
+    INSERT INTO stats_weekly (week_start, minecraft_username, deaths, advancements, playtime_seconds)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(week_start, minecraft_username) DO UPDATE SET
+    deaths = deaths + excluded.deaths,
+    advancements = advancements + excluded.advancements,
+    playtime_seconds = playtime_seconds + excluded.playtime_seconds
+    ''', [(week, name, d, a, p) for (week, name), (d, a, p) in weekly.items()])
+
+    conn.executemany('''
+    INSERT INTO stats_monthly (month, minecraft_username, deaths, advancements, playtime_seconds)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(month, minecraft_username) DO UPDATE SET
+    deaths = deaths + excluded.deaths,
+    advancements = advancements + excluded.advancements,
+    playtime_seconds = playtime_seconds + excluded.playtime_seconds
+    ''', [(month, name, d, a, p) for (month, name), (d, a, p) in monthly.items()])
+
+def upsert_history_select(conn, date, select_sql, params=(), server_id=DEFAULT_SERVER_ID):
+    """Set-based upsert_history_rows for a single date and server: `select_sql` yields
+    (player, deaths, advancements, playtime) rows and each of the three tables
+    gets one INSERT ... SELECT.
+    """
+    for table, key_columns, keys in (("stats_history", "server_id, date", (server_id, date)),
+                                     ("stats_weekly", "week_start", (week_start(date),)),
+                                     ("stats_monthly", "month", (month_of(date),))):
+        # The WHERE true keeps SQLite from parsing ON CONFLICT as part of the SELECT's join
+        conn.execute(f'''
+        INSERT INTO {table} ({key_columns}, minecraft_username, deaths, advancements, playtime_seconds)
+        SELECT {', '.join('?' * len(keys))}, * FROM ({select_sql}) WHERE true
+        ON CONFLICT({key_columns}, minecraft_username) DO UPDATE SET
+        deaths = deaths + excluded.deaths,
+        advancements = advancements + excluded.advancements,
+        playtime_seconds = playtime_seconds + excluded.playtime_seconds
+        ''', (*keys, *params))
+
+# True for a week (SQL expression `week`) touching a month archived before migration 13, which has no week rows
+_UNSPLIT_WEEK = '''EXISTS (
+    SELECT 1 FROM stats_history_archive a
+    WHERE a.month IN (substr({week}, 1, 7), substr(date({week}, '+6 days'), 1, 7)) AND a.week_start IS NULL
+)'''
+
+def rebuild_rollups(conn):
+    """Regenerate stats_weekly and stats_monthly from stats_history and its archive."""
+    conn.execute("DELETE FROM stats_monthly")
+    # Weeks touching a month archived without its weeks (before migration 13) can't be rebuilt: keep them
+    conn.execute(f"DELETE FROM stats_weekly WHERE NOT {_UNSPLIT_WEEK.format(week='stats_weekly.week_start')}")
+    # strftime('%w') is 0 for Sunday, so this walks back to the week's Sunday
+    conn.execute(f'''
+    INSERT INTO stats_weekly (week_start, minecraft_username, deaths, advancements, playtime_seconds)
+    SELECT week_start, minecraft_username, SUM(deaths), SUM(advancements), SUM(playtime_seconds)
+    FROM (
+        SELECT date(date, '-' || strftime('%w', date) || ' days') AS week_start, minecraft_username,
+               deaths, advancements, playtime_seconds
+        FROM stats_history
+        UNION ALL
+        SELECT week_start, minecraft_username, deaths, advancements, playtime_seconds
+        FROM stats_history_archive WHERE week_start IS NOT NULL
+    ) h
+    WHERE NOT {_UNSPLIT_WEEK.format(week='h.week_start')}
+    GROUP BY 1, 2
+    ''')
+    conn.execute('''
+    INSERT INTO stats_monthly (month, minecraft_username, deaths, advancements, playtime_seconds)
+    SELECT month, minecraft_username, SUM(deaths), SUM(advancements), SUM(playtime_seconds)
+    FROM (
+        SELECT substr(date, 1, 7) AS month, minecraft_username, deaths, advancements, playtime_seconds
+        FROM stats_history
+        UNION ALL
+        SELECT month, minecraft_username, deaths, advancements, playtime_seconds
+        FROM stats_history_archive
+    )
+    GROUP BY 1, 2
+    ''')
+    weeks = conn.execute("SELECT COUNT(*) FROM stats_weekly").fetchone()[0]
+    months = conn.execute("SELECT COUNT(*) FROM stats_monthly").fetchone()[0]
+    logger.info(f"Rebuilt rollups: {weeks} weekly rows, {months} monthly rows")
+    return weeks, months
+
+def archived_before(conn):
+    """First day (YYYY-MM-DD) still kept in daily rows, or None if nothing was archived.
+    Earlier days only survive as weeks of a month (see database/retention.py).
+    """
+    month = conn.execute("SELECT MAX(month) FROM stats_history_archive").fetchone()[0]
+    if month is None:
+        return None
+    first = datetime.date.fromisoformat(month + "-01")
+    return (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1).isoformat() # First of next month
+
+# Timeline buckets: (table, key column) holding one row per player per bucket
+BUCKET_TABLES = {
+    'day': ("stats_history", "date"),
+    'week': ("stats_weekly", "week_start"),
+    'month': ("stats_monthly", "month"),
+}
+
+def bucket_key(date_str, bucket):
+    """The bucket key (YYYY-MM-DD day, Sunday week start or YYYY-MM month) a date falls in."""
+    if bucket == 'week':
+        return week_start(date_str)
+    if bucket == 'month':
+        return month_of(date_str)
+    return date_str
+
+def bucket_keys(start_date, end_date, bucket):
+    """Every bucket key touching an inclusive date range, oldest first."""
+    step = {'day': 1, 'week': 7}.get(bucket)
+    day = datetime.date.fromisoformat(bucket_key(start_date, bucket) + ("-01" if bucket == 'month' else ""))
+    end = datetime.date.fromisoformat(end_date)
+    keys = []
+    while day <= end:
+        keys.append(bucket_key(day.isoformat(), bucket))
+        if step:
+            day += datetime.timedelta(days=step)
+        else:
+            day = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) # First of next month
+    return keys
+
+def split_range(start_date, end_date, archived_before=None):
+    """Cover an inclusive YYYY-MM-DD range with as few rollup rows as possible.
+    Returns (months, weeks, archived, days): whole months, whole Sunday-start weeks,
+    (month, week_start) archive rows and the leftover single days at the edges.
+    Nothing is covered twice. Days before `archived_before` only come as the part
+    of a week inside one month, so a range that would need single archived days
+    raises ValueError.
+    """
+    months, weeks, archived, days = [], [], [], []
+    day = datetime.date.fromisoformat(start_date)
+    end = datetime.date.fromisoformat(end_date)
+    while day <= end:
+        next_month = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        if day.day == 1 and next_month - datetime.timedelta(days=1) <= end:
+            months.append(day.strftime("%Y-%m"))
+            day = next_month
+            continue
+        if day.weekday() == 6 and day + datetime.timedelta(days=6) <= end:
+            weeks.append(day.isoformat())
+            day += datetime.timedelta(days=7)
+            continue
+        if archived_before and day.isoformat() < archived_before:
+            # Saturday ending the week, or the month's last day if that comes first
+            last = min(day + datetime.timedelta(days=(5 - day.weekday()) % 7), next_month - datetime.timedelta(days=1))
+            if not (day.weekday() == 6 or day.day == 1) or last > end:
+                raise ValueError(
+                    f"{start_date} to {end_date} splits a week of archived history (before {archived_before}): "
+                    f"ranges there must start on a Sunday or the 1st and end on a Saturday or a month's last day"
+                )
+            archived.append((day.strftime("%Y-%m"), week_start(day.isoformat())))
+            day = last + datetime.timedelta(days=1)
+            continue
+        days.append(day.isoformat())
+        day += datetime.timedelta(days=1)
+    return months, weeks, archived, days
+
+def range_query(conn, start_date, end_date):
+    """Build the SQL (and params) summing stats per player over a date range from the
+    rollups and, for archived weeks, the archive. Raises ValueError if the range can't be
+    answered exactly (see split_range).
+    """
+    months, weeks, archived, days = split_range(start_date, end_date, archived_before(conn))
+    parts, params = [], []
+    for table, column, keys in (("stats_monthly", "month", months),
+                                ("stats_weekly", "week_start", weeks),
+                                ("stats_history", "date", days)):
+        if keys:
+            parts.append(
+                f"SELECT minecraft_username, deaths, advancements, playtime_seconds FROM {table} "
+                f"WHERE {column} IN ({', '.join('?' * len(keys))})"
+            )
+            params.extend(keys)
+    if archived:
+        archived_months = sorted({month for month, _ in archived})
+        unsplit = conn.execute(
+            f"SELECT month FROM stats_history_archive WHERE month IN ({', '.join('?' * len(archived_months))}) AND week_start IS NULL LIMIT 1",
+            archived_months
+        ).fetchone()
+        if unsplit:
+            raise ValueError(f"{start_date} to {end_date} splits {unsplit[0]}, archived before weeks were kept: only the whole month can be read")
+        parts.append(
+            "SELECT minecraft_username, deaths, advancements, playtime_seconds FROM stats_history_archive "
+            f"WHERE {' OR '.join(['(month = ? AND week_start = ?)'] * len(archived))}"
+        )
+        params.extend(key for pair in archived for key in pair)
+    if not parts:
+        return None, []
+    sql = f'''
+    SELECT minecraft_username,
+           SUM(deaths) as total_deaths,
+           SUM(advancements) as total_advancements,
+           SUM(playtime_seconds) as total_playtime
+    FROM ({" UNION ALL ".join(parts)})
+    GROUP BY minecraft_username
+    '''
+    return sql, params
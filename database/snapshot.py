@@ -0,0 +1,41 @@
+import types
+import logging
+from typing import NamedTuple, Mapping
+
+logger = logging.getLogger('nameless_bot')
+
+
+class LeaderboardSnapshot(NamedTuple):
+    """Read-only view of every player's totals, taken in one scan of player_stats.
+
+    The sorted views use the same row shapes and orders as get_all_deaths /
+    get_all_advancements / get_all_playtimes, so code written against those
+    lists works unchanged. `version` goes up whenever the totals change, which
+    lets callers (and get_leaderboard_snapshot itself) reuse a snapshot safely.
+    """
+    version: int
+    timestamp: int          # Unix seconds (UTC) when the snapshot was taken
+    players: tuple          # (minecraft, discord, deaths, advancements, playtime) rows
+    by_player: Mapping      # minecraft_username -> players row
+    deaths: tuple           # (minecraft, discord, deaths), lowest first
+    advancements: tuple     # (minecraft, discord, advancements), highest first
+    playtimes: tuple        # (minecraft, discord, playtime_seconds), highest first
+
+    def stats_for(self, minecraft_username):
+        """The full players row for a Minecraft name, or None."""
+        return self.by_player.get(minecraft_username)
+
+
+def build_snapshot(version, timestamp, rows):
+    """Build a LeaderboardSnapshot from player_stats-shaped rows."""
+    players = tuple(tuple(row) for row in rows)
+    # sorted() is stable, so ties keep player_stats order like the old ORDER BY queries
+    return LeaderboardSnapshot(
+        version=version,
+        timestamp=timestamp,
+        players=players,
+        by_player=types.MappingProxyType({row[0]: row for row in players}),
+        deaths=tuple(row[:2] + (row[2],) for row in sorted(players, key=lambda r: r[2])),
+        advancements=tuple(row[:2] + (row[3],) for row in sorted(players, key=lambda r: r[3], reverse=True)),
+        playtimes=tuple(row[:2] + (row[4],) for row in sorted(players, key=lambda r: r[4], reverse=True)),
+    )
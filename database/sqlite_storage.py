@@ -0,0 +1,21 @@
+"""The default Storage backend: stats.db through database.queries (see database/storage.py)."""
+from database.queries import (
+    initialize_database, record_death, record_advancement, record_login, record_logout,
+    record_server_event, clear_online_players, bulk_update_history, delete_player, add_player,
+    save_daily_stats, flush_pending_stats, rebuild_rollups,
+    get_player_stats, get_all_players, get_all_deaths, get_all_advancements, get_all_playtimes,
+    get_leaderboard_snapshot, get_rank, get_online_players_db, get_stats_for_range, get_stats_for_date,
+    get_stats_for_period, get_players_timeline, get_player_timeline,
+    record_ingest_offset, get_ingest_offset, claim_message, save_quip_rotation, get_quip_rotations
+)
+from database.replay import replay_events
+from database.retention import retention_step
+from database.backup import backup_database
+from database.export import export_stats
+from database.backfill import backfill_webhook_events
+from database.connection import close_connections as close
+from database.player_registry import registry
+
+canonical_minecraft = registry.canonical_minecraft
+minecraft_from_discord = registry.minecraft_from_discord
+discord_from_minecraft = registry.discord_from_minecraft
@@ -0,0 +1,108 @@
+"""Storage backends behind the database.db facade.
+
+Every stats query the bot makes goes through the Storage protocol below. Two
+backends implement it:
+
+- 'sqlite' (default): stats.db via database.queries and its maintenance jobs
+  (replay, retention, backups). See database/sqlite_storage.py.
+- 'memory': plain dicts in this process, nothing touches disk. For load tests
+  and benchmarks. See database/memory_storage.py.
+
+The backend is picked by STORAGE_BACKEND in const.py; database.db.use_storage()
+swaps it at runtime (e.g. to run one benchmark against both).
+"""
+from typing import Protocol
+from const import STORAGE_BACKEND
+
+
+class Storage(Protocol):
+    """Everything database.db can ask of a backend. Return values match the SQLite
+    backend: rows are tuples in player_stats/stats_history column order.
+    """
+
+    # --- Setup ---
+    def initialize_database(self) -> None:
+        """Create/upgrade the schema, seed MINECRAFT_TO_DISCORD and load the registry and rank index."""
+    def close(self) -> None:
+        """Release connections (called on shutdown)."""
+
+    # --- Writes ---
+    # server_id defaults to DEFAULT_SERVER_ID; stats are kept per server and summed in player_stats.
+    # ts is when the event happened (now if None); position is the (source, offset, fingerprint)
+    # a log line was read up to, saved atomically with the event (see ingest/log_tailer.py)
+    def record_death(self, minecraft_username, message_id=None, server_id=..., ts=None, position=None) -> None: ...
+    def record_advancement(self, minecraft_username, message_id=None, server_id=..., ts=None, position=None) -> None: ...
+    def record_login(self, minecraft_username, message_id=None, server_id=..., ts=None, position=None) -> None: ...
+    def record_logout(self, minecraft_username, message_id=None, server_id=..., ts=None, position=None) -> int:
+        """Returns the playtime credited (0 if the player wasn't online on that server)."""
+    def record_server_event(self, event_type, message_id=None, server_id=..., ts=None, position=None) -> None: ...
+    def clear_online_players(self, server_id=None, ts=None) -> None:
+        """Credit and close the open sessions of one server, or of every server if None, up to ts."""
+    def bulk_update_history(self, updates, server_id=None) -> bool:
+        """Set totals over every server (None) or one server's; the differences are logged as adjustment events."""
+    def delete_player(self, minecraft_username) -> bool: ...
+    def add_player(self, minecraft_username, discord_username):
+        """True if added, None if the player already existed, False on error."""
+    def save_daily_stats(self) -> bool: ...
+    def flush_pending_stats(self) -> int: ...
+    def rebuild_rollups(self):
+        """Returns (weekly rows, monthly rows), or None on error."""
+    def replay_events(self, chunk_size=..., dry_run=False) -> dict:
+        """Rebuild the aggregates from the events log; the summary's 'changes' are the per-player
+        {stat: (current, replayed)} totals that differ (see database/replay.py)."""
+    def retention_step(self, batch_size=..., hot_days=..., today=None) -> int: ...
+    def record_ingest_offset(self, source, offset, fingerprint=None) -> None:
+        """Persist an ingestion source's read position together with the stats recorded before it."""
+    def claim_message(self, message_id) -> bool:
+        """Mark a webhook message processed; False if it already was (see database/message_ledger.py)."""
+    def save_quip_rotation(self, minecraft_username, catalog, seed, position) -> None:
+        """Remember a player's place in the death quip rotation (see tasks/death_quips.py)."""
+    def backfill_webhook_events(self, events, batch_size=..., server_id=...):
+        """Record one server's missed (event_type, name, ts, message_id) webhook events at their original times,
+        skipping message ids already counted (see database/backfill.py). Summary dict, or None on error."""
+
+    # --- Reads ---
+    def get_player_stats(self, minecraft_username=None, discord_username=None): ...
+    def get_all_players(self) -> list: ...
+    def get_all_deaths(self) -> list: ...
+    def get_all_advancements(self) -> list: ...
+    def get_all_playtimes(self) -> list: ...
+    def get_leaderboard_snapshot(self, server_id=None):
+        """Totals over every server, or one server's (only players who have stats there)."""
+    def get_rank(self, minecraft_username, metric, neighbors=0):
+        """(rank, total_players, value, [(position, name, value)] around the player) on one leaderboard, or None."""
+    def get_online_players_db(self, server_id=None) -> list: ...
+    def get_stats_for_range(self, start_date, end_date) -> list: ...
+    def get_stats_for_date(self, date) -> list: ...
+    def get_stats_for_period(self, period_days) -> list: ...
+    def get_players_timeline(self, minecraft_usernames, start_date, end_date, bucket='day'): ...
+    def get_player_timeline(self, minecraft_username, start_date, end_date, bucket='day'): ...
+    def get_ingest_offset(self, source):
+        """(offset, fingerprint) last recorded for an ingestion source, or None."""
+    def get_quip_rotations(self) -> list:
+        """Every saved (minecraft_username, catalog, seed, position)."""
+    # Who someone is, case-insensitive and without a query (see database/player_registry.py)
+    def canonical_minecraft(self, name):
+        """The stored spelling of a Minecraft name, or None if the player is unknown."""
+    def minecraft_from_discord(self, discord_name):
+        """The Minecraft name linked to a Discord name, or None."""
+    def discord_from_minecraft(self, minecraft_username):
+        """The Discord name linked to a Minecraft name, or None."""
+
+    # --- Maintenance ---
+    def backup_database(self, *args, **kwargs):
+        """Snapshot the store; returns a summary dict, or None if the backend has nothing to back up."""
+    def export_stats(self, table='history', fmt='csv', path=None, start_date=None, end_date=None, player=None,
+                     chunk_size=...) -> dict:
+        """Stream a table to a gzipped CSV/JSONL file (see database/export.py); returns a summary dict."""
+
+
+def get_storage(name=STORAGE_BACKEND) -> Storage:
+    """Return a backend by name ('sqlite' or 'memory')."""
+    if name == 'sqlite':
+        from database import sqlite_storage
+        return sqlite_storage
+    if name == 'memory':
+        from database.memory_storage import MemoryStorage
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend {name!r} (expected 'sqlite' or 'memory')")
@@ -0,0 +1,84 @@
+"""Time classify_message against the substring-and-re.search chain on_message
+used before it (tests/test_webhook_parser.py checks that both agree).
+
+    python -m ingest.benchmark
+    python -m ingest.benchmark --messages 500000
+"""
+import argparse
+import random
+import re
+import time
+from const import DEATH_MARKER, ADVANCEMENT_MARKER
+from database.events import (
+    EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_SERVER_START, EVENT_SERVER_STOP, EVENT_NAMES
+)
+from ingest.webhook_parser import classify_message
+
+
+def legacy_parse(content):
+    """The classification on_message did before ingest/webhook_parser.py, for comparison."""
+    if ":white_check_mark: **Server has started**" in content:
+        return EVENT_SERVER_START, None
+    elif ":octagonal_sign: **Server has stopped**" in content:
+        return EVENT_SERVER_STOP, None
+    elif " joined the server" in content:
+        match = re.search(r"\*\*(.*?)\*\* joined the server", content)
+        if not match:
+            match = re.search(r"(.*?) joined the server", content)
+        if match:
+            return EVENT_JOIN, re.sub(r"\\(.)", r"\1", match.group(1))
+    elif " left the server" in content:
+        match = re.search(r"\*\*(.*?)\*\* left the server", content)
+        if not match:
+            match = re.search(r"(.*?) left the server", content)
+        if match:
+            return EVENT_LEAVE, match.group(1).replace("\\", "")
+    elif content.startswith(DEATH_MARKER):
+        match = re.search(f"^{re.escape(DEATH_MARKER)}\\s+(\\S+)", content)
+        if match:
+            return EVENT_DEATH, re.sub(r"\\(.)", r"\1", match.group(1))
+    elif content.startswith(ADVANCEMENT_MARKER) or ADVANCEMENT_MARKER in content:
+        match = re.search(f"{ADVANCEMENT_MARKER} (.*?) has made the advancement", content)
+        if match:
+            return EVENT_ADVANCEMENT, re.sub(r"\\(.)", r"\1", match.group(1))
+    return None
+
+def benchmark_messages(count, seed=1):
+    """A webhook channel's mix: mostly joins/leaves, then deaths and advancements, some chatter."""
+    rng = random.Random(seed)
+    names = [f"Player\\_{i}" if i % 5 == 0 else f"Player{i}" for i in range(50)]
+    templates = (
+        ["**{}** joined the server"] * 30 + ["**{}** left the server"] * 30 +
+        [DEATH_MARKER + " {} was slain by Zombie"] * 20 +
+        [ADVANCEMENT_MARKER + " {} has made the advancement [Stone Age]"] * 15 +
+        ["who is on the server? {}"] * 4 + [":white_check_mark: **Server has started**"]
+    )
+    return [rng.choice(templates).format(rng.choice(names)) for _ in range(count)]
+
+def time_parser(parse, messages, repeat=3):
+    """Best messages/second over `repeat` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            parse(message)
+        best = min(best, time.perf_counter() - started)
+    return len(messages) / best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the webhook message classifier.")
+    parser.add_argument("--messages", type=int, default=200000, help="Messages per timed run")
+    args = parser.parse_args()
+
+    messages = benchmark_messages(args.messages)
+    old_rate = time_parser(legacy_parse, messages)
+    new_rate = time_parser(classify_message, messages)
+    print(f"old chain:        {old_rate:>12,.0f} messages/s")
+    print(f"classify_message: {new_rate:>12,.0f} messages/s ({new_rate / old_rate:.1f}x)")
+    by_kind = {}
+    for message in messages[:20000]:
+        event = classify_message(message)
+        key = EVENT_NAMES[event.kind] if event else "not an event"
+        by_kind[key] = by_kind.get(key, 0) + 1
+    print(f"Mix (first 20,000): {by_kind}")
@@ -0,0 +1,270 @@
+"""Read join/leave/death/advancement/start/stop events straight from the server's logs/latest.log.
+
+An alternative to the webhook channel (enabled by SERVER_LOG_PATH in const.py):
+no Discord latency or rate limits, and nothing is lost while the bot is offline,
+because reading resumes from the last saved byte offset.
+
+Each event carries the position just after its line, which the record_* call
+saves in the same flush as the stats the line produced, so a restart never
+counts a line twice. Events are stamped with the line's [HH:MM:SS], not with
+the time they were read, so lines read after downtime keep their real playtime
+and date. The log has no dates: LogTailer._date_lines works them out from when
+the file was last written and the times going backwards at each midnight.
+When the server rotates latest.log into logs/<date>-<n>.log.gz, the rest of the
+old file is read from the archive before starting on the new one.
+"""
+import datetime
+import glob
+import gzip
+import hashlib
+import logging
+import os
+import re
+from typing import NamedTuple, Optional
+from database.events import (
+    EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_SERVER_START, EVENT_SERVER_STOP
+)
+
+logger = logging.getLogger('nameless_bot')
+
+# "[12:34:56] [Server thread/INFO]: text" (vanilla) or "[12:34:56 INFO]: text" (Paper/Spigot)
+_LINE = re.compile(r"^\[(?P<time>\d{2}:\d{2}:\d{2})(?: INFO)?\](?: \[[^\]]+/INFO\])?: (?P<text>.*?)\s*$")
+_STAMP = re.compile(rb"^\[(\d{2}):(\d{2}):(\d{2})[\] ]") # Any line's time, event or not (warnings, chat, ...)
+_PLAYER = r"(?P<name>[A-Za-z0-9_]{1,16})" # Chat ("<name> ...") and "[Server] ..." never match this at the start
+_JOIN = re.compile(rf"^{_PLAYER} joined the game$")
+_LEAVE = re.compile(rf"^{_PLAYER} left the game$")
+_ADVANCEMENT = re.compile(rf"^{_PLAYER} has (?:made the advancement|completed the challenge|reached the goal) \[")
+# Beginnings of the vanilla death messages (death.* in the language file)
+_DEATH = re.compile(
+    rf"^{_PLAYER} (?:"
+    r"was (?:slain|shot|fireballed|pummeled|killed|blown up|struck by lightning|squashed|squished|pricked|"
+    r"impaled|burnt|poked|stung|skewered|obliterated|roasted|frozen|doomed|knocked|speared|stabbed|"
+    r"blasted|smashed|too soft)|"
+    r"blew up|walked into|drowned|died|experienced kinetic energy|removed an elytra|hit the ground too hard|"
+    r"fell|went up in flames|went off with a bang|burned to death|tried to swim in lava|"
+    r"discovered the floor was lava|suffocated|starved to death|withered away|froze to death|"
+    r"left the confines of this world|didn't want to live)"
+)
+_START = re.compile(r"^Done \([\d.,]+s\)! For help, type")
+_STOP = re.compile(r"^Stopping (?:the )?server$")
+
+# Checked in order; a player event is (event_type, name), start/stop are (event_type, None)
+_PLAYER_PATTERNS = ((EVENT_JOIN, _JOIN), (EVENT_LEAVE, _LEAVE), (EVENT_ADVANCEMENT, _ADVANCEMENT), (EVENT_DEATH, _DEATH))
+
+SERVER_LOG_SOURCE = 'server_log' # ingest_offsets key
+
+FINGERPRINT_BYTES = 512 # The first line (capped) identifies a log file across renames
+ARCHIVES_CHECKED = 5    # Newest rotated logs searched for the one we were reading
+_ARCHIVE_DATE = re.compile(r"(\d{4}-\d{2}-\d{2})-\d+\.log\.gz$") # logs/2024-03-10-1.log.gz
+
+
+class LogLine(NamedTuple):
+    """One complete line and where it ends."""
+    text: str
+    offset: int                 # Byte offset just after the line
+    fingerprint: Optional[str]  # Of the file it was read from
+    time: Optional[datetime.datetime] = None # When it was logged (local time); None if it has no [HH:MM:SS]
+
+
+class LogEvent(NamedTuple):
+    """One game event read from the server log."""
+    kind: int                   # EVENT_* from database.events
+    username: Optional[str]     # Minecraft name; None for server start/stop
+    ts: int                     # Unix time of the line
+    position: tuple             # (SERVER_LOG_SOURCE, offset, fingerprint) to save with the event
+
+
+def parse_log_line(line):
+    """Return (event_type, minecraft_username or None, datetime.time) for an event line, else None."""
+    match = _LINE.match(line)
+    if not match:
+        return None
+    text = match.group('text')
+    for event_type, pattern in _PLAYER_PATTERNS:
+        player = pattern.match(text)
+        if player:
+            return _with_time(event_type, player.group('name'), match.group('time'))
+    if _START.match(text):
+        return _with_time(EVENT_SERVER_START, None, match.group('time'))
+    if _STOP.match(text):
+        return _with_time(EVENT_SERVER_STOP, None, match.group('time'))
+    return None
+
+def _with_time(event_type, minecraft_username, stamp):
+    try:
+        return event_type, minecraft_username, datetime.time(int(stamp[:2]), int(stamp[3:5]), int(stamp[6:]))
+    except ValueError: # Not a time after all, e.g. [99:00:00]
+        return None
+
+def _stamp(raw):
+    """The datetime.time a raw log line starts with, or None."""
+    match = _STAMP.match(raw)
+    if not match:
+        return None
+    try:
+        return datetime.time(*map(int, match.groups()))
+    except ValueError:
+        return None
+
+def _rollovers(times, previous=None):
+    """How many midnights a run of line times passes: how often a time is earlier than the one before."""
+    count = 0
+    for line_time in times:
+        if previous is not None and line_time < previous:
+            count += 1
+        previous = line_time
+    return count
+
+def _archive_written(path):
+    """When a rotated log's lines were written: the end of the day in its name, else its mtime."""
+    named = _ARCHIVE_DATE.search(os.path.basename(path))
+    if named:
+        try:
+            return datetime.datetime.combine(datetime.date.fromisoformat(named.group(1)), datetime.time.max)
+        except ValueError:
+            pass
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path))
+
+def _fingerprint(f):
+    """Hash of the file's first line, or None until that line is complete."""
+    f.seek(0)
+    head = f.read(FINGERPRINT_BYTES)
+    newline = head.find(b"\n")
+    if newline < 0 and len(head) < FINGERPRINT_BYTES:
+        return None
+    return hashlib.sha1(head[:newline + 1] if newline >= 0 else head).hexdigest()
+
+def _complete_lines(data, start, fingerprint):
+    """Split bytes read at offset `start` into LogLines (not dated yet) and their times.
+    Returns (lines, times, bytes consumed).
+    """
+    lines, times = [], []
+    end = 0
+    while True:
+        newline = data.find(b"\n", end)
+        if newline < 0:
+            break
+        raw = data[end:newline]
+        lines.append(LogLine(raw.decode('utf-8', errors='replace').rstrip("\r"), start + newline + 1, fingerprint))
+        times.append(_stamp(raw))
+        end = newline + 1
+    return lines, times, end
+
+
+class LogTailer:
+    """Incremental reader for one log file. read() returns the new complete LogLines
+    plus the (offset, fingerprint) to save once they have been handled.
+    """
+
+    def __init__(self, path, offset=None, fingerprint=None):
+        self.path = path
+        self.offset = offset       # None: start at the end of whatever is there now
+        self.fingerprint = fingerprint
+        self._last_dated = None    # (fingerprint, datetime) of the last line dated, to carry on from
+
+    def _date_lines(self, lines, times, fingerprint, written, later_times=()):
+        """Give each line of one file that has a [HH:MM:SS] its local datetime.
+
+        The log has times but no dates; a time earlier than the line before's means
+        midnight passed. Lines carry on from the last line dated in the same file.
+        Otherwise (the first read, or a new file) they are dated back from `written`,
+        when the file was last written: its last line is on that day, or the day before
+        if its time is later. `later_times` are the times of the file's lines after these,
+        not read yet, whose midnights count too. A whole day without a single line can't
+        be seen and shifts everything before it by a day.
+        """
+        stamped = [(i, line_time) for i, line_time in enumerate(times) if line_time is not None]
+        if not stamped:
+            return lines
+        one_day = datetime.timedelta(days=1)
+        dated = list(lines)
+        if self._last_dated and self._last_dated[0] == fingerprint:
+            day, previous = self._last_dated[1].date(), self._last_dated[1].time()
+            for i, line_time in stamped:
+                if line_time < previous:
+                    day += one_day
+                dated[i] = lines[i]._replace(time=datetime.datetime.combine(day, line_time))
+                previous = line_time
+        else:
+            day = written.date()
+            if datetime.datetime.combine(day, later_times[-1] if later_times else stamped[-1][1]) > written:
+                day -= one_day # The file's last line was logged before midnight
+            day -= one_day * _rollovers(later_times, stamped[-1][1])
+            following = None
+            for i, line_time in reversed(stamped):
+                if following is not None and line_time > following:
+                    day -= one_day
+                dated[i] = lines[i]._replace(time=datetime.datetime.combine(day, line_time))
+                following = line_time
+        self._last_dated = (fingerprint, dated[stamped[-1][0]].time)
+        return dated
+
+    def _read_archived_rest(self):
+        """Lines after self.offset in the rotated copy of the file we were reading, if it can be found."""
+        pattern = os.path.join(os.path.dirname(self.path), "*.log.gz")
+        for archive in sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)[:ARCHIVES_CHECKED]:
+            try:
+                with gzip.open(archive, 'rb') as f:
+                    if _fingerprint(f) != self.fingerprint:
+                        continue
+                    f.seek(self.offset)
+                    lines, times, _ = _complete_lines(f.read(), self.offset, self.fingerprint)
+                    lines = self._date_lines(lines, times, self.fingerprint, _archive_written(archive))
+                    logger.info(f"Read {len(lines)} lines left in rotated log {archive}")
+                    return lines
+            except (OSError, EOFError) as e:
+                logger.warning(f"Could not read rotated log {archive}: {e}")
+        logger.warning(f"{self.path} was rotated and its old copy wasn't found; lines after byte {self.offset} are lost")
+        return []
+
+    def read(self, max_bytes=None):
+        """Return (lines, (offset, fingerprint)). Follows rotation and truncation."""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return [], (self.offset, self.fingerprint) # Between rotation and the new file appearing
+        with f:
+            fingerprint = _fingerprint(f)
+            stat = os.fstat(f.fileno())
+            size, written = stat.st_size, datetime.datetime.fromtimestamp(stat.st_mtime)
+            lines = []
+            if self.offset is None:
+                # First run: don't replay history the webhook may already have counted
+                self.offset = size if fingerprint else 0
+                self.fingerprint = fingerprint
+                logger.info(f"Tailing {self.path} from byte {self.offset}")
+            elif fingerprint is None or fingerprint != self.fingerprint or size < self.offset:
+                # A different file than last time (or it was truncated): finish the old one first
+                if self.fingerprint is not None:
+                    lines = self._read_archived_rest()
+                logger.info(f"{self.path} was rotated, reading the new file from the start")
+                self.offset, self.fingerprint = 0, fingerprint
+                self._last_dated = None # A truncated file keeps its fingerprint but starts over
+            if fingerprint is not None:
+                f.seek(self.offset)
+                data = f.read(max_bytes) if max_bytes else f.read()
+                if max_bytes and len(data) == max_bytes and b"\n" not in data:
+                    data += f.readline() # A line longer than max_bytes: read all of it, or we'd never get past it
+                new_lines, times, consumed = _complete_lines(data, self.offset, fingerprint)
+                self.offset += consumed
+                later_times = []
+                if self.offset < size and new_lines and not (self._last_dated and self._last_dated[0] == fingerprint):
+                    # Stopped short of the end with nothing to carry on from: count the midnights still to come
+                    f.seek(self.offset)
+                    later_times = [line_time for line_time in map(_stamp, f) if line_time is not None]
+                lines.extend(self._date_lines(new_lines, times, fingerprint, written, later_times))
+        return lines, (self.offset, self.fingerprint)
+
+    def read_events(self, max_bytes=None):
+        """Like read(), but returns the LogEvents of the lines instead of the lines."""
+        lines, position = self.read(max_bytes)
+        events = []
+        for line in lines:
+            event = parse_log_line(line.text)
+            if event:
+                event_type, minecraft_username, _ = event
+                events.append(LogEvent(
+                    event_type, minecraft_username, int(line.time.timestamp()),
+                    (SERVER_LOG_SOURCE, line.offset, line.fingerprint)
+                ))
+        return events, position
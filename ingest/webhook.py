@@ -0,0 +1,97 @@
+"""Replay webhook channel messages the bot missed while it was offline.
+
+Messages are classified like on_message does (ingest/webhook_parser.py) and
+recorded at their original times (see database/backfill.py); !backfill does the
+same from the channel history.
+
+    python -m ingest.webhook export.json                      # DiscordChatExporter JSON, or a list of API message objects
+    python -m ingest.webhook export.json --after 2026-10-01 --ignore-author <bot user id>
+"""
+import argparse
+import datetime
+import json
+import logging
+from const import DEFAULT_SERVER_ID
+from database.events import EVENT_NAMES
+from ingest.webhook_parser import classify_message
+
+logger = logging.getLogger('nameless_bot')
+
+DISCORD_EPOCH_MS = 1420070400000 # Message ids (snowflakes) count milliseconds from here
+
+
+def snowflake_time(message_id):
+    """Unix seconds a Discord message was sent, from its id."""
+    return ((int(message_id) >> 22) + DISCORD_EPOCH_MS) // 1000
+
+def message_event(message_id, ts, content):
+    """(event_type, minecraft_username, ts, message_id) for database.backfill, or None."""
+    event = classify_message(content)
+    if event is None:
+        return None
+    return event.kind, event.username, int(ts), int(message_id)
+
+def message_time(timestamp):
+    """Unix seconds from an export's ISO 8601 timestamp; one without an offset is UTC,
+    like Discord's own, not the local time fromisoformat() would assume."""
+    sent = datetime.datetime.fromisoformat(timestamp)
+    if sent.tzinfo is None:
+        sent = sent.replace(tzinfo=datetime.timezone.utc)
+    return sent.timestamp()
+
+def load_message_export(path, after=None, ignore_author=None):
+    """Events from a JSON message export: DiscordChatExporter's {"messages": [...]} or a
+    plain list of Discord API message objects (any order). `after` is a Unix time;
+    messages by `ignore_author` (the bot's own replies) are skipped.
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    messages = data["messages"] if isinstance(data, dict) else data
+    events = []
+    for message in messages:
+        if ignore_author is not None and str(message.get("author", {}).get("id")) == str(ignore_author):
+            continue
+        timestamp = message.get("timestamp")
+        ts = message_time(timestamp) if timestamp else snowflake_time(message["id"])
+        if after is not None and ts <= after:
+            continue
+        event = message_event(message["id"], ts, message.get("content") or "")
+        if event:
+            events.append(event)
+    logger.info(f"Read {len(messages)} messages from {path}: {len(events)} events")
+    return events
+
+def format_backfill_summary(summary):
+    return (f"{summary['recorded']} of {summary['messages']} events recorded in {summary['seconds']:.1f}s "
+            f"({summary['duplicates']} already counted, {summary['unknown']} for unknown players, "
+            f"{summary['playtime'] // 60} minutes of playtime)")
+
+
+if __name__ == "__main__":
+    from database.storage import get_storage
+
+    parser = argparse.ArgumentParser(description="Count webhook messages the bot missed, from a JSON export.")
+    parser.add_argument("export", help="JSON export of the webhook channel")
+    parser.add_argument("--after", type=datetime.date.fromisoformat, help="Only messages after this date (UTC)")
+    parser.add_argument("--ignore-author", help="Skip messages by this user id (the bot itself)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the events found in the export")
+    parser.add_argument("--server", default=DEFAULT_SERVER_ID, help="Server id the channel belongs to (see SERVERS in const.py)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    after = None
+    if args.after:
+        after = datetime.datetime.combine(args.after, datetime.time(), datetime.timezone.utc).timestamp()
+    events = load_message_export(args.export, after, args.ignore_author)
+    if args.dry_run:
+        counts = {}
+        for event in events:
+            counts[EVENT_NAMES[event[0]]] = counts.get(EVENT_NAMES[event[0]], 0) + 1
+        print(f"Dry run: {len(events)} events found {counts}")
+    else:
+        storage = get_storage()
+        storage.initialize_database() # Loads the registry used to match names
+        summary = storage.backfill_webhook_events(events, server_id=args.server)
+        if summary is None:
+            raise SystemExit("Backfill failed (see the log); batches written so far are kept and re-running is safe.")
+        print(format_backfill_summary(summary))
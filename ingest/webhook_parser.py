@@ -0,0 +1,117 @@
+"""Classify messages posted to the webhook channel.
+
+classify_message() replaces the chain of substring checks and per-message
+re.search calls on_message used to run. Everything is compiled once at import:
+
+- _SHAPES matches the layouts the webhook actually posts, anchored at the start
+  of the message, so a message that isn't one of them fails on its first
+  character. Which group matched gives the event type; no other pattern runs.
+- Anything else (a plain "Steve joined the server", a prefixed emoji) falls
+  back to one search for the markers on_message looked for anywhere in the
+  text. That pattern has no capturing groups on purpose: it stays a literal
+  alternation, which the re module scans for with a fast first-character
+  check. Groups make the same search several times slower.
+
+tests/test_webhook_parser.py checks it against a message corpus, and
+python -m ingest.benchmark times it against the old chain.
+"""
+import logging
+import re
+from typing import NamedTuple, Optional
+from const import DEATH_MARKER, ADVANCEMENT_MARKER
+from database.events import (
+    EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_SERVER_START, EVENT_SERVER_STOP
+)
+
+logger = logging.getLogger('nameless_bot')
+
+
+class WebhookEvent(NamedTuple):
+    """One game event parsed from a webhook message."""
+    kind: int                   # EVENT_* from database.events
+    username: Optional[str]     # Minecraft name as posted (escapes removed); None for server start/stop
+    text: str                   # The whole message
+    advancement: Optional[str]  # Advancement title, if an advancement message names one
+
+_SERVER_STARTED = ":white_check_mark: **Server has started**"
+_SERVER_STOPPED = ":octagonal_sign: **Server has stopped**"
+
+# Group numbers below are what _SHAPES.match(...).lastindex reports
+_SHAPES = re.compile(
+    r"\*\*(.*?)\*\* (joined|left) the server"                                 # 1 name, 2 verb
+    rf"|{re.escape(DEATH_MARKER)}\s+(\S+)"                                    # 3 name
+    rf"|{re.escape(ADVANCEMENT_MARKER)} (.*?) has made the advancement"       # 4 name
+    r"(?: \[([^\]\n]*)\])?"                                                   # 5 title
+    rf"|({re.escape(_SERVER_STARTED)})"                                       # 6
+    rf"|({re.escape(_SERVER_STOPPED)})"                                       # 7
+)
+
+# Fallback: matched marker -> event type
+_MARKER_KINDS = {
+    _SERVER_STARTED: EVENT_SERVER_START,
+    _SERVER_STOPPED: EVENT_SERVER_STOP,
+    " joined the server": EVENT_JOIN,
+    " left the server": EVENT_LEAVE,
+    f"{ADVANCEMENT_MARKER} ": EVENT_ADVANCEMENT,
+}
+_MARKERS = re.compile("|".join(map(re.escape, _MARKER_KINDS))) # No groups, see the module docstring
+_DEATH = re.compile(rf"{re.escape(DEATH_MARKER)}\s+(\S+)")
+_ADVANCEMENT = re.compile(r"(.*?) has made the advancement(?: \[([^\]\n]*)\])?")
+
+
+def unescape_name(name):
+    """Undo Discord markdown escapes in a posted name (Steve\\_ -> Steve_, \\\\ -> \\).
+    Plain str.replace calls; re.sub with a template costs about 4x as much per name.
+    """
+    if "\\" not in name:
+        return name
+    return name.replace("\\\\", "\0").replace("\\", "").replace("\0", "\\")
+
+def classify_message(text):
+    """Return the WebhookEvent a webhook message reports, or None."""
+    shape = _SHAPES.match(text)
+    if shape is None:
+        return _classify_other(text)
+    group = shape.lastindex
+    if group == 2:
+        kind = EVENT_JOIN if shape.group(2) == "joined" else EVENT_LEAVE
+        return WebhookEvent(kind, unescape_name(shape.group(1)), text, None)
+    if group == 3:
+        return WebhookEvent(EVENT_DEATH, unescape_name(shape.group(3)), text, None)
+    if group in (4, 5):
+        return WebhookEvent(EVENT_ADVANCEMENT, unescape_name(shape.group(4)), text, shape.group(5))
+    return WebhookEvent(EVENT_SERVER_START if group == 6 else EVENT_SERVER_STOP, None, text, None)
+
+def _session_name(text, marker_start):
+    """The name before " joined/left the server": inside **bold** if the line ends in it, else the whole line."""
+    line = text[text.rfind("\n", 0, marker_start) + 1:marker_start]
+    if line.endswith("**"):
+        bold = line.find("**")
+        if bold + 2 <= len(line) - 2:
+            return line[bold + 2:-2]
+    return line
+
+def _classify_other(text):
+    """Messages in any other layout, with on_message's old precedence:
+    start/stop, join/leave, death, then advancement.
+    """
+    marker = _MARKERS.search(text)
+    kind = _MARKER_KINDS[marker.group()] if marker else None
+
+    if kind in (EVENT_SERVER_START, EVENT_SERVER_STOP):
+        return WebhookEvent(kind, None, text, None)
+    if kind in (EVENT_JOIN, EVENT_LEAVE):
+        return WebhookEvent(kind, unescape_name(_session_name(text, marker.start())), text, None)
+
+    if text.startswith(DEATH_MARKER):
+        death = _DEATH.match(text)
+        if death:
+            return WebhookEvent(EVENT_DEATH, unescape_name(death.group(1)), text, None)
+        logger.warning(f"Message started with DEATH_MARKER but couldn't extract username: {text}")
+        return None
+
+    if kind == EVENT_ADVANCEMENT:
+        advancement = _ADVANCEMENT.match(text, marker.end())
+        if advancement:
+            return WebhookEvent(EVENT_ADVANCEMENT, unescape_name(advancement.group(1)), text, advancement.group(2))
+    return None
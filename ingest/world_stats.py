@@ -0,0 +1,140 @@
+"""Import deaths and playtime from the Minecraft server's own stats files.
+
+The server keeps authoritative per-player counters in <world>/stats/<uuid>.json,
+including everything from before the bot was listening. The files are parsed in
+worker processes, matched to player_stats through the server's usercache.json
+(uuid -> name) and compared with that server's totals (server_stats). The
+differing counters are written in one transaction, together with the adjustment
+events that let a replay of the events log reproduce them.
+
+    python -m ingest.world_stats --dry-run            # show what would change
+    python -m ingest.world_stats /srv/mc/world        # apply (stop the bot first, or use !importstats)
+    python -m ingest.world_stats --server creative /srv/creative/world
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from const import WORLD_DIR, WORLD_STATS_WORKERS, WORLD_STATS_MIN_PARALLEL_FILES, DEFAULT_SERVER_ID
+from database.player_registry import registry
+from utils.formatters import format_playtime
+
+logger = logging.getLogger('nameless_bot')
+
+TICKS_PER_SECOND = 20
+
+
+def read_stats_file(path):
+    """Return (uuid, deaths, playtime_seconds) for one stats file, or (uuid, None, error) if unreadable."""
+    uuid = os.path.basename(path)[:-len(".json")].lower()
+    try:
+        with open(path, 'rb') as f:
+            data = json.load(f)
+        custom = data.get("stats", {}).get("minecraft:custom")
+        if custom is not None:
+            deaths = custom.get("minecraft:deaths", 0)
+            # Renamed in 1.17; play_one_minute was counted in ticks despite its name
+            ticks = custom.get("minecraft:play_time", custom.get("minecraft:play_one_minute", 0))
+        else: # Pre-1.13 flat format
+            deaths = data.get("stat.deaths", 0)
+            ticks = data.get("stat.playOneMinute", 0)
+        return uuid, int(deaths), int(ticks) // TICKS_PER_SECOND
+    except (OSError, ValueError, AttributeError, TypeError) as e:
+        return uuid, None, str(e)
+
+def read_usercache(path):
+    """Map lowercase uuid -> last known name from the server's usercache.json."""
+    with open(path, encoding='utf-8') as f:
+        return {entry["uuid"].lower(): entry["name"] for entry in json.load(f)}
+
+def scan_world_stats(world_dir=WORLD_DIR, usercache_path=None, workers=WORLD_STATS_WORKERS):
+    """Read every <world_dir>/stats/*.json. Returns a summary dict:
+    'stats' {player_stats name: (deaths, playtime_seconds)}, 'unknown' [names/uuids
+    not in player_stats], 'errors' [(uuid, message)], 'files' and 'seconds'.
+    """
+    started = time.perf_counter()
+    stats_dir = os.path.join(world_dir, "stats")
+    usercache_path = usercache_path or os.path.join(os.path.dirname(os.path.abspath(world_dir)), "usercache.json")
+    names = read_usercache(usercache_path)
+    paths = [entry.path for entry in os.scandir(stats_dir) if entry.name.endswith(".json")]
+
+    # Small servers finish before a process pool would have started
+    workers = workers or os.cpu_count() or 1
+    if len(paths) < WORLD_STATS_MIN_PARALLEL_FILES or workers == 1:
+        results = list(map(read_stats_file, paths))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(read_stats_file, paths, chunksize=max(1, len(paths) // (workers * 4))))
+
+    summary = {'stats': {}, 'unknown': [], 'errors': [], 'files': len(paths)}
+    for uuid, deaths, playtime in results:
+        if deaths is None:
+            summary['errors'].append((uuid, playtime))
+            continue
+        name = names.get(uuid)
+        minecraft_username = registry.canonical_minecraft(name) if name else None
+        if minecraft_username:
+            summary['stats'][minecraft_username] = (deaths, playtime)
+        else:
+            summary['unknown'].append(name or uuid)
+    summary['seconds'] = time.perf_counter() - started
+    logger.info(f"Read {len(paths)} world stats files in {summary['seconds']:.2f}s: {len(summary['stats'])} known players, "
+                f"{len(summary['unknown'])} unknown, {len(summary['errors'])} unreadable")
+    return summary
+
+def diff_world_stats(world_stats, players):
+    """Compare scanned stats with the world's server's totals: the `players` rows of
+    get_leaderboard_snapshot(server_id), where a player without a row has none yet.
+    Returns [(name, old_deaths, new_deaths, old_playtime, new_playtime)] for players whose counters differ.
+    """
+    current = {name: (deaths, playtime) for name, _, deaths, _, playtime in players}
+    changes = []
+    for name, new in world_stats.items():
+        deaths, playtime = current.get(name, (0, 0))
+        if (deaths, playtime) != new:
+            changes.append((name, deaths, new[0], playtime, new[1]))
+    return sorted(changes)
+
+def format_change(change):
+    name, old_deaths, new_deaths, old_playtime, new_playtime = change
+    return (f"{name}: deaths {old_deaths} -> {new_deaths}, "
+            f"playtime {format_playtime(old_playtime)} -> {format_playtime(new_playtime)}")
+
+def change_updates(changes):
+    """bulk_update_history(updates, server_id) input for a list of changes."""
+    return {name: {'deaths': new_deaths, 'playtime': new_playtime}
+            for name, _, new_deaths, _, new_playtime in changes}
+
+
+if __name__ == "__main__":
+    from database.storage import get_storage
+
+    parser = argparse.ArgumentParser(description="Import deaths and playtime from world/stats/*.json.")
+    parser.add_argument("world", nargs="?", default=WORLD_DIR, help="World directory (containing stats/)")
+    parser.add_argument("--usercache", help="usercache.json (default: next to the world directory)")
+    parser.add_argument("--workers", type=int, default=WORLD_STATS_WORKERS, help="Parser processes (default: CPU count)")
+    parser.add_argument("--server", default=DEFAULT_SERVER_ID, help="Server id the world belongs to (see SERVERS in const.py)")
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would change")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    storage = get_storage()
+    storage.initialize_database() # Loads the registry used to match names
+    scan = scan_world_stats(args.world, args.usercache, args.workers)
+    changes = diff_world_stats(scan['stats'], storage.get_leaderboard_snapshot(args.server).players)
+    for change in changes:
+        print(format_change(change))
+    for uuid, error in scan['errors']:
+        print(f"Could not read {uuid}: {error}")
+    if scan['unknown']:
+        print(f"Not in player_stats (skipped): {', '.join(sorted(scan['unknown']))}")
+    if args.dry_run:
+        print(f"Dry run: {len(changes)} players would change.")
+    elif changes:
+        if not storage.bulk_update_history(change_updates(changes), args.server):
+            raise SystemExit("Update failed, nothing was changed (see the log).")
+        print(f"Updated {len(changes)} players.")
+    else:
+        print("Everything already matches.")
@@ -1,8 +1,6 @@
 import discord
 from discord.ext import commands, tasks
-import re
 import subprocess
-import random
 import asyncio
 import datetime
 import logging
@@ -14,15 +12,18 @@ load_dotenv()
 
 # Import from our modules
 from const import (
-    DATABASE_PATH, ROLES, ONLINE_ROLE_NAME, WEBHOOK_CHANNEL_ID, MOD_ROLE_ID,
+    DATABASE_PATH, ROLES, ONLINE_ROLE_NAME, MOD_ROLE_ID,
     SCOREBOARD_CHANNEL_ID, DEATH_MARKER, ADVANCEMENT_MARKER, LOG_CHANNEL_ID,
-    WHITELIST_ROLE_ID, WEEKLY_RANKINGS_CHANNEL_ID
+    WHITELIST_ROLE_ID, WEEKLY_RANKINGS_CHANNEL_ID, STATS_FLUSH_INTERVAL_SECONDS,
+    RETENTION_INTERVAL_MINUTES, BACKUP_INTERVAL_HOURS, SERVER_LOG_PATH, SERVER_LOG_POLL_SECONDS,
+    SERVER_LOG_MAX_READ_BYTES
 )
-from database.queries import (
-    initialize_database, record_death, record_advancement, record_login,
-    record_logout, get_player_stats, clear_online_players, save_daily_stats,
-    get_stats_for_period, get_all_deaths, get_all_advancements, get_all_playtimes, get_connection
+from database import db
+from database.events import (
+    EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_SERVER_START, EVENT_SERVER_STOP, EVENT_NAMES
 )
+from ingest.log_tailer import LogTailer, SERVER_LOG_SOURCE
+from ingest.webhook_parser import classify_message
 from utils.discord_helpers import (
     get_discord_user, get_player_display_names, get_minecraft_from_discord,
     get_discord_from_minecraft
@@ -31,10 +32,20 @@ from utils.formatters import format_playtime
 from commands.player_stats import (
     deaths_command, advancements_command, playtime_command,
     deathlist_command, advancementlist_command, playtimelist_command,
-    currentstats_command # <--- ADDED IMPORT
+    currentstats_command, # <--- ADDED IMPORT
+    rank_command, history_command
+)
+from commands.admin import (
+    updateroles_command, addhistory_command, whitelist_command, rebuildrollups_command,
+    backup_command, export_command, importstats_command, backfill_command, pipeline_command,
+    reloadquips_command
 )
-from commands.admin import updateroles_command, addhistory_command, whitelist_command
 from tasks.leaderboard import update_leaderboards
+from tasks.event_pipeline import EventPipeline
+from tasks.refresh_scheduler import RefreshScheduler
+from tasks.presence import PresenceManager
+from tasks.death_quips import death_quips
+from tasks.servers import servers_by_channel, default_server
 from tasks.roles import (
     add_online_role, remove_online_role, clear_all_online_roles,
     update_achievement_roles # <--- CHANGED IMPORT
@@ -48,11 +59,11 @@ intents.message_content = True  # For reading message content
 intents.members = True  # For accessing member info
 bot = commands.Bot(command_prefix='!', intents=intents)
 
-# Global variables
-server_online = False
-online_players = []
+# Global variables (each server's online state lives in its ServerState, see tasks/servers.py)
 logger = None
 discord_handler = None
+log_tailer = None        # LogTailer when SERVER_LOG_PATH is set
+saved_log_offset = None  # Last offset handed to db.record_ingest_offset
 
 # Helper function to trigger updates
 async def trigger_stat_updates(bot, guild, scoreboard_channel):
@@ -66,6 +77,21 @@ async def trigger_stat_updates(bot, guild, scoreboard_channel):
     else:
         logger.warning("Scoreboard channel not found for triggered update.")
 
+# Stat changes only mark the leaderboards dirty; one refresh per burst (tasks/refresh_scheduler.py)
+leaderboard_refresh = RefreshScheduler(lambda: trigger_stat_updates(bot, None, bot.get_channel(SCOREBOARD_CHANNEL_ID)))
+
+async def trigger_server_leaderboards(server):
+    """Update the leaderboards of one server in its own scoreboard channel."""
+    channel = bot.get_channel(server.scoreboard_channel_id)
+    if channel:
+        await update_leaderboards(bot, channel, server=server)
+    else:
+        logger.warning(f"Scoreboard channel {server.scoreboard_channel_id} of {server.name} not found.")
+
+# Servers with a scoreboard channel of their own get their own boards, debounced the same way
+for _server in servers_by_channel.values():
+    if _server.scoreboard_channel_id:
+        _server.leaderboard_refresh = RefreshScheduler(lambda server=_server: trigger_server_leaderboards(server))
 
 # Daily stats summary task - Run at 00:05 est daily
 @tasks.loop(time=datetime.time(hour=3, minute=55, tzinfo=pytz.utc))
@@ -77,7 +103,7 @@ async def daily_stats_summary():
 
     try:
         # Save today's stats snapshot (ensures the day has an entry, important if bot restarts)
-        save_daily_stats()
+        await db.save_daily_stats()
 
         stats_channel_id = WEEKLY_RANKINGS_CHANNEL_ID
         channel = bot.get_channel(stats_channel_id)
@@ -88,19 +114,8 @@ async def daily_stats_summary():
         # Get yesterday's date (since the task runs just after midnight est)
         yesterday = (datetime.datetime.now(pytz.utc) - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
 
-        # Connect to DB
-        conn = get_connection()
-        cursor = conn.cursor()
-
         # Get stats specifically for yesterday
-        cursor.execute('''
-        SELECT minecraft_username, deaths, advancements, playtime_seconds
-        FROM stats_history
-        WHERE date = ?
-        ''', (yesterday,))
-
-        daily_stats = cursor.fetchall()
-        conn.close()
+        daily_stats = await db.get_stats_for_date(yesterday)
 
         if not daily_stats or len(daily_stats) == 0:
             logger.info(f"No daily stats to report for {yesterday}")
@@ -159,6 +174,35 @@ async def daily_stats_summary():
     except Exception as e:
         logger.error(f"Error in daily stats summary: {e}")
 
+@tasks.loop(seconds=STATS_FLUSH_INTERVAL_SECONDS)
+async def flush_stats_buffer():
+    """Write buffered death/advancement/playtime increments to the database."""
+    await db.flush_pending_stats()
+
+@tasks.loop(minutes=RETENTION_INTERVAL_MINUTES)
+async def history_retention():
+    """Drop empty stats_history rows and compact old ones into the archive."""
+    total = 0
+    try:
+        # One short transaction per step; other writes queue up in between
+        while True:
+            removed = await db.retention_step()
+            if not removed:
+                break
+            total += removed
+    except Exception as e:
+        logger.error(f"Error during history retention: {e}")
+    if total:
+        logger.info(f"History retention removed {total} rows")
+
+@tasks.loop(hours=BACKUP_INTERVAL_HOURS)
+async def scheduled_backup():
+    """Snapshot stats.db into the rotating backups directory."""
+    try:
+        await db.backup_database()
+    except Exception as e:
+        logger.error(f"Error during scheduled backup: {e}", exc_info=True)
+
 @tasks.loop(hours=1) # Update roles every hour (adjust as needed)
 async def periodic_role_update():
     """Periodically updates achievement roles."""
@@ -206,23 +250,8 @@ async def weekly_stats_summary():
         end_date = end_date_dt.strftime("%Y-%m-%d")
         start_date = start_date_dt.strftime("%Y-%m-%d")
 
-        # Connect to DB
-        conn = get_connection()
-        cursor = conn.cursor()
-
         # Aggregate stats for the past week
-        cursor.execute('''
-        SELECT minecraft_username,
-               SUM(deaths) as total_deaths,
-               SUM(advancements) as total_advancements,
-               SUM(playtime_seconds) as total_playtime
-        FROM stats_history
-        WHERE date BETWEEN ? AND ?
-        GROUP BY minecraft_username
-        ''', (start_date, end_date))
-
-        weekly_stats = cursor.fetchall()
-        conn.close()
+        weekly_stats = await db.get_stats_for_range(start_date, end_date)
 
         if not weekly_stats or len(weekly_stats) == 0:
             logger.info(f"No weekly stats to report for {start_date} to {end_date}")
@@ -293,7 +322,7 @@ async def weekly_stats_summary():
 @bot.event
 async def on_ready():
     """When bot is ready, initialize everything."""
-    global logger, discord_handler
+    global logger, discord_handler, log_tailer, saved_log_offset
 
     # Set up logging
     logger, discord_handler = setup_logging(bot, LOG_CHANNEL_ID)
@@ -302,340 +331,246 @@ async def on_ready():
     logger.info(f'Bot is ready! Logged in as {bot.user}')
 
     # Initialize database
-    initialize_database()
+    await db.initialize_database()
+
+    # Death quips and where each player is in their rotation
+    try:
+        death_quips.load()
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load death quips, using the built-in one: {e}")
+    death_quips.restore(await db.get_quip_rotations())
 
-    # Set initial status
-    await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="Server is currently offline."))
+    # Set initial status (after a reconnect too, so forget what was shown before)
+    presence.invalidate()
+    presence.set(status_text(bot.guilds[0] if bot.guilds else None), urgent=True)
 
     # Start background tasks for summaries
     logger.info("Starting tasks...")
+    event_pipeline.start()
     daily_stats_summary.start()
     weekly_stats_summary.start()
     periodic_role_update.start()
+    if not flush_stats_buffer.is_running():
+        flush_stats_buffer.start()
+    if not history_retention.is_running():
+        history_retention.start()
+    if not scheduled_backup.is_running():
+        scheduled_backup.start()
+    if SERVER_LOG_PATH and not tail_server_log.is_running():
+        # Resume where the last run stopped (nothing saved yet: start at the end of the log)
+        saved_offset, fingerprint = await db.get_ingest_offset(SERVER_LOG_SOURCE) or (None, None)
+        log_tailer = LogTailer(SERVER_LOG_PATH, saved_offset, fingerprint)
+        saved_log_offset = saved_offset
+        tail_server_log.start()
 
     logger.info("Performing initial leaderboard and role update...")
     scoreboard_channel = bot.get_channel(SCOREBOARD_CHANNEL_ID)
     guild = bot.guilds[0] if bot.guilds else None # Get guild here once
 
+    snapshot = await db.get_leaderboard_snapshot() # Shared by both updates below
     if scoreboard_channel:
-        await update_leaderboards(bot, scoreboard_channel)
+        await update_leaderboards(bot, scoreboard_channel, snapshot)
     else:
         logger.error(f"Could not find scoreboard channel {SCOREBOARD_CHANNEL_ID} for initial update.")
 
     if guild:
-        await update_achievement_roles(bot, guild) # Keep initial update
+        await update_achievement_roles(bot, guild, snapshot) # Keep initial update
     else:
         logger.warning("No guilds found for initial role update.")
 
+    for server in servers_by_channel.values():
+        if server.leaderboard_refresh:
+            await trigger_server_leaderboards(server)
+
     logger.info("Bot initialization complete!")
 
+# --- Game events, shared by the webhook channel and the server log tailer ---
+# Both only classify and submit; event_pipeline (tasks/event_pipeline.py) runs the three stages below.
+
+# Reaction added to a webhook message for each player event
+EVENT_REACTIONS = {EVENT_JOIN: '✅', EVENT_LEAVE: '👋', EVENT_DEATH: '🇱', EVENT_ADVANCEMENT: ADVANCEMENT_MARKER}
+
+def status_text(guild):
+    """What the bot's presence should say: offline, or who is online (on any server)."""
+    running = [server for server in servers_by_channel.values() if server.online]
+    if not running:
+        return "Server is currently offline." if len(servers_by_channel) <= 1 else "All servers are currently offline."
+    online_players = list(dict.fromkeys(name for server in running for name in server.online_players))
+    discord_display_names = get_player_display_names(online_players, guild) if guild else list(online_players)
+    if discord_display_names:
+        status_text = f" {len(discord_display_names)} player(s) online: {', '.join(discord_display_names)}"
+        if len(status_text) > 100:  # If too long, simplify
+            status_text = f"Online: {len(discord_display_names)} players"
+    else:
+        status_text = "Server is online. Join now!"
+    return status_text
+
+# Sends the status only when it changes, within the gateway's presence budget (tasks/presence.py)
+presence = PresenceManager(
+    lambda text: bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name=text))
+)
+
+def is_online_anywhere(minecraft_username):
+    return any(minecraft_username in server.online_players for server in servers_by_channel.values())
+
+def stats_changed(server):
+    """A server's stats changed: the global leaderboards and the server's own need a refresh."""
+    event_pipeline.request_refresh(stats_changed=True)
+    if server.leaderboard_refresh:
+        server.leaderboard_refresh.mark_dirty()
+
+async def persist_event(kind, minecraft_username, message, server=None, log_event=None):
+    """Database half of an event on `server` (a ServerState, default_server if None), run in arrival order.
+    Returns the stored spelling of the player's name (None if unknown or a server start),
+    the players no longer online anywhere for a server stop, or False if the message
+    was already processed (a redelivery or replay; nothing is done).
+    """
+    message_id = message.id if message else None # Server log lines have no id; their offset keeps them from repeating
+    if message_id is not None and not await db.claim_message(message_id):
+        return False
+    server = server or default_server
+    server_id = server.server_id
+    # A log line's time and read position, recorded with it (webhook events happen now)
+    ts, position = (log_event.ts, log_event.position) if log_event else (None, None)
+
+    if kind == EVENT_SERVER_START:
+        server.online = True
+        await db.record_server_event(EVENT_SERVER_START, message_id=message_id, server_id=server_id, ts=ts, position=position)
+        logger.info(f"{server.name} has started!")
+        presence.set(status_text(bot.guilds[0] if bot.guilds else None), urgent=True)
+        return None
+    if kind == EVENT_SERVER_STOP:
+        server.online = False
+        await db.record_server_event(EVENT_SERVER_STOP, message_id=message_id, server_id=server_id, ts=ts, position=position)
+        # Update playtime for everyone who was online on this server
+        await db.clear_online_players(server_id, ts) # This function updates playtime in DB
+        left, server.online_players = server.online_players, []
+        logger.info(f"{server.name} has stopped!")
+        # Same guild as every other status, so the refresh this stop requests doesn't send a second one
+        presence.set(status_text(bot.guilds[0] if bot.guilds else None), urgent=True)
+        stats_changed(server)
+        return [name for name in left if not is_online_anywhere(name)]
+
+    # Check if player exists (the storage's player registry mirrors player_stats)
+    known_username = await db.canonical_minecraft(minecraft_username)
+    if not known_username:
+        logger.warning(f"Unknown player in {EVENT_NAMES[kind]} event: {minecraft_username}")
+        return None
+
+    if kind == EVENT_JOIN:
+        await db.record_login(known_username, message_id=message_id, server_id=server_id, ts=ts, position=position)
+        if known_username not in server.online_players:
+            server.online_players.append(known_username)
+        logger.info(f"{known_username} joined {server.name}")
+        event_pipeline.request_refresh()
+    elif kind == EVENT_LEAVE:
+        playtime_added = await db.record_logout(
+            known_username, message_id=message_id, server_id=server_id, ts=ts, position=position
+        ) # Updates DB
+        if known_username in server.online_players:
+            server.online_players.remove(known_username)
+        logger.info(f"{known_username} left {server.name}")
+        if playtime_added > 0:
+            stats_changed(server)
+        else:
+            event_pipeline.request_refresh()
+    elif kind == EVENT_DEATH:
+        await db.record_death(known_username, message_id=message_id, server_id=server_id, ts=ts, position=position) # Updates DB
+        logger.info(f"{known_username} died on {server.name}")
+        stats_changed(server)
+    elif kind == EVENT_ADVANCEMENT:
+        await db.record_advancement(known_username, message_id=message_id, server_id=server_id, ts=ts, position=position) # Updates DB
+        logger.info(f"{known_username} got an advancement on {server.name}")
+        stats_changed(server)
+    return known_username
+
+async def event_side_effects(kind, minecraft_username, message, known_username, server=None):
+    """Discord half of an event: reactions, online roles and the death quip."""
+    if known_username is False:
+        return # Already handled when the message first arrived
+    server = server or default_server
+    guild = message.guild if message else (bot.guilds[0] if bot.guilds else None) # Assumes the main guild
+    if kind == EVENT_SERVER_STOP:
+        if guild and not any(s.online for s in servers_by_channel.values()):
+            await clear_all_online_roles(guild)
+        elif guild:
+            # Other servers are still up: only players who aren't on one of them lose the role
+            for name in known_username or []:
+                member = get_discord_user(bot, await db.discord_from_minecraft(name), guild)
+                if member and not is_online_anywhere(name):
+                    await remove_online_role(member)
+        return
+    if kind == EVENT_SERVER_START:
+        return
+
+    if message:
+        await message.add_reaction(EVENT_REACTIONS[kind])
+        if not known_username:
+            await message.add_reaction('❓')
+
+    if known_username and kind in (EVENT_JOIN, EVENT_LEAVE) and guild:
+        member = get_discord_user(bot, await db.discord_from_minecraft(known_username), guild)
+        if member and kind == EVENT_JOIN:
+            await add_online_role(member)
+        elif member and not is_online_anywhere(known_username): # Still playing on another server
+            await remove_online_role(member)
+
+    if kind == EVENT_DEATH:
+        channel = message.channel if message else bot.get_channel(server.webhook_channel_id)
+        if channel:
+            quip, rotation = death_quips.pick(known_username or minecraft_username)
+            await channel.send(quip)
+            if known_username:
+                await db.save_quip_rotation(known_username, *rotation)
+
+async def refresh_after_events(stats_changed):
+    """Derived updates, once per burst of events: presence and leaderboards, both debounced."""
+    presence.set(status_text(bot.guilds[0] if bot.guilds else None))
+    if stats_changed:
+        leaderboard_refresh.mark_dirty()
+
+event_pipeline = EventPipeline(persist_event, event_side_effects, refresh_after_events)
+
+@tasks.loop(seconds=SERVER_LOG_POLL_SECONDS)
+async def tail_server_log():
+    """Feed new server log lines into the event pipeline, like webhook messages."""
+    global saved_log_offset
+    try:
+        events, (offset, fingerprint) = await asyncio.to_thread(log_tailer.read_events, SERVER_LOG_MAX_READ_BYTES)
+    except Exception as e:
+        logger.error(f"Error reading server log {SERVER_LOG_PATH}: {e}")
+        return
+    for event in events:
+        # Each event saves the offset just after its line together with its stats
+        await event_pipeline.submit(event.kind, event.username, server=default_server, log_event=event)
+    if offset != saved_log_offset:
+        await event_pipeline.persisted() # The lines after the last event must not get ahead of it
+        await db.record_ingest_offset(SERVER_LOG_SOURCE, offset, fingerprint)
+        saved_log_offset = offset
+
 @bot.event
 async def on_message(message):
     """Handle incoming messages."""
-    global server_online, online_players, logger
-
     # Ignore own messages
     if message.author == bot.user:
         return
 
+    # Which server's webhook channel this is, if any: one dict lookup however many servers there are
+    server = servers_by_channel.get(message.channel.id)
+
     # Debug logging for webhook messages
-    if message.channel.id == WEBHOOK_CHANNEL_ID:
-        logger.debug(f"Webhook message received: {message.content}")
-
-    # Check if it's in the webhook channel
-    if message.channel.id == WEBHOOK_CHANNEL_ID:
-        # Get necessary objects for update triggers
-        scoreboard_channel = bot.get_channel(SCOREBOARD_CHANNEL_ID)
-        guild = message.guild # Assumes webhook is in the main guild
-
-        # Server status messages
-        if ":white_check_mark: **Server has started**" in message.content:
-            server_online = True
-            # await message.add_reaction('✅')
-            await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="Server is online! (0 players)"))
-            logger.info("Server has started!")
-
-        elif ":octagonal_sign: **Server has stopped**" in message.content:
-            server_online = False
-            # await message.add_reaction('🛑')
-
-            # Update playtime for all online players
-            clear_online_players() # This function updates playtime in DB
-            online_players = []
-
-            # Clear online roles
-            if guild:
-                await clear_all_online_roles(guild)
-
-            await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="Server is currently offline."))
-            logger.info("Server has stopped!")
-            # Trigger updates after potential playtime changes
-            await trigger_stat_updates(bot, guild, scoreboard_channel) # <--- ADDED
-
-        # Player join - check for both bold and plain text formats
-        elif " joined the server" in message.content:
-            logger.debug(f"Join message detected: {message.content}")
-
-            match = re.search(r"\*\*(.*?)\*\* joined the server", message.content)
-            if not match:
-                match = re.search(r"(.*?) joined the server", message.content)
-
-            if match:
-                # Properly clean the extracted username
-                minecraft_username = re.sub(r"\\(.)", r"\1", match.group(1))
-                await message.add_reaction('✅')
-
-                logger.debug(f"Extracted username: {minecraft_username}")
-
-                # Check if player exists in database instead of MINECRAFT_TO_DISCORD
-                player_stats = get_player_stats(minecraft_username=minecraft_username)
-                if player_stats:
-                    discord_username = player_stats[1]  # discord_username is second column
-
-                    # Record login
-                    record_login(minecraft_username)
-                    if minecraft_username not in online_players:
-                         online_players.append(minecraft_username)
-
-                    # Add online role
-                    if guild:
-                        member = get_discord_user(bot, discord_username)
-                        if member:
-                            await add_online_role(member)
-
-                    # Update bot status
-                    discord_display_names = get_player_display_names(online_players, guild)
-                    status_text = f" {len(discord_display_names)} player(s) online: {', '.join(discord_display_names)}"
-                    if len(status_text) > 100:  # If too long, simplify
-                        status_text = f"Online: {len(discord_display_names)} players"
-
-                    await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name=status_text))
-                    logger.info(f"{minecraft_username} joined the server")
-                else:
-                    await message.add_reaction('❓')
-                    logger.warning(f"Unknown player joined: {minecraft_username}")
-            else:
-                logger.error("Could not extract username from join message")
-
-        # Player leave - check for both bold and plain text formats
-        elif " left the server" in message.content:
-            logger.debug(f"Leave message detected: {message.content}")
-
-            # Try bold format first (from markdown)
-            match = re.search(r"\*\*(.*?)\*\* left the server", message.content)
-            if not match:
-                # Try plain text format
-                match = re.search(r"(.*?) left the server", message.content)
-
-            if match:
-                minecraft_username = match.group(1).replace("\\", "")  # Remove escape chars
-                await message.add_reaction('👋')
-
-                logger.debug(f"Extracted username: {minecraft_username}")
-
-                # Check if player exists in database
-                player_stats = get_player_stats(minecraft_username=minecraft_username)
-                if player_stats:
-                    discord_username = player_stats[1]  # discord_username is second column
-
-                    # Record logout - returns playtime added
-                    playtime_added = record_logout(minecraft_username) # Updates DB
-                    if minecraft_username in online_players:
-                        online_players.remove(minecraft_username)
-
-                    # Remove online role
-                    if guild:
-                        member = get_discord_user(bot, discord_username)
-                        if member:
-                            await remove_online_role(member)
-
-                    # Update bot status
-                    discord_display_names = get_player_display_names(online_players, guild)
-                    if discord_display_names:
-                        status_text = f" {len(discord_display_names)} player(s) online: {', '.join(discord_display_names)}"
-                        if len(status_text) > 100:
-                            status_text = f"Online: {len(discord_display_names)} players"
-                        await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name=status_text))
-                    else:
-                        await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="Server is online. Join now!"))
-
-                    logger.info(f"{minecraft_username} left the server")
-                    # Trigger updates if playtime was added
-                    if playtime_added > 0:
-                         await trigger_stat_updates(bot, guild, scoreboard_channel) # <--- ADDED
-                else:
-                    await message.add_reaction('❓')
-                    logger.warning(f"Unknown player left: {minecraft_username}")
-            else:
-                logger.error("Could not extract username from leave message")
-
-        # Death messages - also check for both formats
-                # Death messages - ONLY check if starts with marker
-        elif message.content.startswith(DEATH_MARKER):
-            match = re.search(f"^{re.escape(DEATH_MARKER)}\\s+(\\S+)", message.content)
-
-            if match:
-                # Extract and clean the username (remove potential webhook escapes like \_ )
-                minecraft_username = re.sub(r"\\(.)", r"\1", match.group(1))
-                await message.add_reaction('🇱')  # Your death reaction
-
-                # Debug output to see what username we're actually extracting
-                logger.debug(f"Death detected for username (startswith): '{minecraft_username}'")
-
-                # Check if player exists in database
-                player_stats = get_player_stats(minecraft_username=minecraft_username)
-                if player_stats:
-                    record_death(minecraft_username) # Updates DB
-                    logger.info(f"{minecraft_username} died")
-                    # Trigger updates after death record (ensure guild and scoreboard_channel are defined)
-                    if guild and scoreboard_channel: # Make sure these variables are available here
-                        await trigger_stat_updates(bot, guild, scoreboard_channel)
-                    elif not guild:
-                        logger.warning("Guild object not available for trigger_stat_updates on death.")
-                    elif not scoreboard_channel:
-                         logger.warning("Scoreboard channel object not available for trigger_stat_updates on death.")
-
-                else:
-                    await message.add_reaction('❓')
-                    logger.warning(f"Unknown player died (startswith check): {minecraft_username} from message: {message.content}")
-
-                # Send a random death message
-                death_messages = [
-                        f"And the award for 'Most Creative Way to Lose All Your Items' goes to **{minecraft_username}**...",
-                        f"Your gravestone should just read 'Oops' at this point, **{minecraft_username}**.",
-                        f"I'm sure your items are happier wherever they are now.",
-                        f"Maybe try surviving next time, **{minecraft_username}**?",
-                        f"Another beautiful contribution to the respawn button usage statistics.",
-                        f"That was definitely the game's fault. Definitely.",
-                        f"I guess those diamonds really wanted their freedom, huh **{minecraft_username}**?",
-                        f"Taking the express route back to spawn, I see.",
-                        f"Your death was... inspirational. For the mobs, anyway.",
-                        f"How thoughtful of you to donate all your items to the void.",
-                        f"The respawn screen missed you. Glad you two could reunite.",
-                        f"Your coordinates have been noted as 'places not to go'.",
-                        f"That was certainly... a choice.",
-                        f"Amazing how quickly you turn experience points into disappointment.",
-                        f"Your items are throwing a farewell party without you, **{minecraft_username}**.",
-                        f"I see you've chosen the dramatic exit. Again.",
-                        f"**{minecraft_username}** thought they could fly. They were wrong.",
-                        f"Just made a generous donation to the item despawn fund.",
-                        f"Decided their inventory was too cluttered anyway.",
-                        f"Testing the respawn mechanics. For science, of course.",
-                        f"Found an exciting new way to return to spawn.",
-                        f"Has completed their speedrun to the death screen.",
-                        f"Taking an unscheduled break from existing.",
-                        f"Thought their armor was just for decoration.",
-                        f"Discovered that actions have consequences.",
-                        f"Conducting gravity research. Results inconclusive.",
-                        f"Just demonstrated what not to do.",
-                        f"Perfected the art of item scattering.",
-                        f"Made their items available for public collection.",
-                        f"Should consider a career that doesn't involve survival.",
-                        f"Contributing to the mob kill count statistics. Again.",
-                        f"Just rage-quit life.",
-                        f"Found out the hard way.",
-                        f"Has chosen death as today's activity.",
-                        f"Taking the scenic route back to spawn.",
-                        f"Apparently thought that was a good idea.",
-                        f"Successfully failed. An impressive feat, really.",
-                        f"Experiencing technical difficulties. Please stand by.",
-                        f"Went to extraordinary lengths to lose all their progress.",
-                        f"Clearly needed more practice.",
-                        f"Was overcome by a sudden case of not being alive anymore.",
-                        f"Demonstrating how not to play Minecraft.",
-                        f"Decided to personally check the respawn system.",
-                        f"Having an unplanned inventory reset.",
-                        f"Should reconsider their life choices. Or death choices.",
-                        f"Just helped the server clear some item lag. How generous.",
-                        f"That was so pathetic, even the dirt you fell on is ashamed to be associated with you.",
-                        f"How does it feel knowing the only thing you’re good at is disappointing everyone?",
-                        f"Every time you die, the concept of intelligence takes permanent damage.",
-                        f"That was so embarrassing, even the respawn screen is tired of seeing you.",
-                        f"Death doesn’t even want you. It just has no choice but to clean up your failures.",
-                        f"If stupidity was a speedrun category, you’d be the world record holder.",
-                        f"Nothing in this world is more consistent than your ability to ruin everything.",
-                        f"Your ability to fail is honestly impressive. Too bad it's the only skill you have.",
-                        f"At this point, even your own shadow would rather disassociate from you.",
-                        f"Congratulations, you’ve turned dying into a full-time job.",
-                        f"Keep this up and the game is going to start preloading the death screen for you.",
-                        f"You don’t even deserve a death message. Just quit. Just leave.",
-                        f"Watching you play is like watching a train derail in slow motion, except somehow worse.",
-                        f"If there was an IQ test for playing this game, you wouldn’t even qualify for the tutorial.",
-                        f"Every time you respawn, the world collectively sighs in disappointment.",
-                        f"Nothing has ever been wasted as much as the oxygen you’re using up right now.",
-                        f"The sheer lack of talent is almost fascinating. Almost.",
-                        f"Somehow, the only thing more fragile than your ego is your ability to stay alive.",
-                        f"One day, failure might stop following you around. But today is not that day.",
-                        f"Your life expectancy in this game is lower than my expectations for you, and those were already rock bottom.",
-                        f"You’ve been here for five minutes and I already regret every moment of it.",
-                        f"It’s almost impressive how you manage to be wrong in every possible way.",
-                        f"The only thing you’ve mastered is finding new ways to embarrass yourself.",
-                        f"The world isn’t against you. It’s just watching you lose a fight against yourself.",
-                        f"If survival was a multiple-choice question, you’d still somehow pick the wrong answer.",
-                        f"The only thing more tragic than your gameplay is the fact that you keep coming back.",
-                        f"You couldn’t make it through this game even if you had creative mode.",
-                        f"That was so bad, the game should uninstall itself out of pure secondhand embarrassment.",
-                        f"Maybe try thinking before acting? Or is that asking too much?",
-                        f"Watching paint dry is more exciting than whatever this mess is.",
-                        f"You are the reason respawn exists, but honestly, it shouldn’t bother anymore.",
-                        f"If failure was an art form, you'd be the Mona Lisa of disappointment.",
-                        f"I would say 'get good,' but honestly, that ship sailed a long time ago.",
-                        f"You don’t even need enemies when your worst opponent is yourself.",
-                        f"Even a random number generator would have better survival instincts than you.",
-                        f"The concept of evolution just reversed itself watching that disaster unfold.",
-                        f"There is literally no excuse for how unbelievably bad that was.",
-                        f"If you were a mob, you'd be the one everyone farms for free loot.",
-                        f"The only thing you’ve built in this game is a solid reputation for being terrible.",
-                        f"Even the game itself is questioning why you’re still here.",
-                        f"Death shouldn’t be this easy, yet here you are proving otherwise.",
-                        f"There’s a difference between having bad luck and being the bad luck.",
-                        f"This game has thousands of mechanics, and yet you haven’t mastered a single one.",
-                        f"If common sense was a stat, yours would be in the negative.",
-                        f"You should probably craft a boat, because you've clearly sunk to a new low.",
-                        f"Every second you exist in this world is an insult to basic survival instincts.",
-                        f"You’ve set a new record for making the worst possible decisions in the shortest amount of time.",
-                        f"Your gameplay is proof that some people just aren’t meant to succeed.",
-                        f"Survival is a simple concept. Somehow, you’ve managed to misunderstand it entirely.",
-                        f"There’s a fine line between being unlucky and being a walking disaster. You obliterated that line.",
-                        f"If failure was a potion, you'd be the splash version—affecting everything around you.",
-                        f"If brains were durability, yours would have broken a long time ago.",
-                        f"The only real danger here is your own inability to function properly.",
-                        f"Every time you die, the void whispers ‘not this idiot again.’",
-                        f"This isn’t a learning curve, it’s a straight drop off a cliff, just like you.",
-                        f"At this point, the respawn button should just be a permanent part of your screen.",
-                        f"Out of all possible outcomes, you still somehow manage to choose the worst one.",
-                        f"The fact that you thought you’d survive that is the funniest joke of all.",
-                        f"You just took 'trial and error' and removed the trial part completely.",
-                        f"The only thing more painful than watching this is the thought of you trying again."
-                    ]
-                await message.channel.send(random.choice(death_messages))
-
-            else:
-                # This means the message started with the marker but didn't match the pattern
-                # (e.g., no space and username after marker)
-                logger.warning(f"Message started with DEATH_MARKER but couldn't extract username: {message.content}")
-
-        elif message.content.startswith(ADVANCEMENT_MARKER) or ADVANCEMENT_MARKER in message.content:
-            match = re.search(f"{ADVANCEMENT_MARKER} (.*?) has made the advancement", message.content)
-
-            if match:
-                minecraft_username = re.sub(r"\\(.)", r"\1", match.group(1))
-
-                await message.add_reaction(ADVANCEMENT_MARKER)
-
-                # Check if player exists in database
-                player_stats = get_player_stats(minecraft_username=minecraft_username)
-                if player_stats:
-                    record_advancement(minecraft_username) # Updates DB
-                    logger.info(f"{minecraft_username} got an advancement")
-                    # Trigger updates after advancement record
-                    await trigger_stat_updates(bot, guild, scoreboard_channel) # <--- ADDED
-                else:
-                    await message.add_reaction('❓')
-                    logger.warning(f"Unknown player got advancement: {minecraft_username}")
+    if server:
+        logger.debug(f"Webhook message received from {server.name}: {message.content}")
+
+    # Check if it's in a webhook channel (the default server's is ignored when its server log is the event source)
+    if server and not (SERVER_LOG_PATH and server is default_server):
+        event = classify_message(message.content)
+        if event:
+            logger.debug(f"Webhook event {EVENT_NAMES[event.kind]} for {event.username} on {server.server_id}")
+            await event_pipeline.submit(event.kind, event.username, message, server) # Waits while the queue is full
 
     # Handle playerlist command when server is offline
-    if not server_online and message.content.strip() == "playerlist":
+    if not (server or default_server).online and message.content.strip() == "playerlist":
         await message.add_reaction('❌')
         await message.channel.send("You can't use this command right now, the server is down.")
 
@@ -697,6 +632,14 @@ async def advancements_cmd(ctx, username=None):
 async def playtime_cmd(ctx, username=None):
     await playtime_command(ctx, bot, username)
 
+@bot.command(name="rank")
+async def rank_cmd(ctx, username=None):
+    await rank_command(ctx, bot, username)
+
+@bot.command(name="history")
+async def history_cmd(ctx, username=None, bucket=None):
+    await history_command(ctx, bot, username, bucket)
+
 @bot.command(name="deathlist")
 async def deathlist_cmd(ctx):
     await deathlist_command(ctx, bot)
@@ -725,6 +668,41 @@ async def whitelist_cmd(ctx, discord_user=None, minecraft_user=None):
 async def currentstats_cmd(ctx):
     await currentstats_command(ctx, bot)
 
+@bot.command(name="rebuildrollups")
+async def rebuildrollups_cmd(ctx):
+    await rebuildrollups_command(ctx, bot)
+
+@bot.command(name="backup")
+async def backup_cmd(ctx):
+    await backup_command(ctx, bot)
+
+@bot.command(name="export")
+async def export_cmd(ctx, *args):
+    await export_command(ctx, bot, *args)
+
+@bot.command(name="importstats")
+async def importstats_cmd(ctx, mode=None):
+    await importstats_command(ctx, bot, mode)
+
+@bot.command(name="pipeline")
+async def pipeline_cmd(ctx):
+    await pipeline_command(ctx, bot, event_pipeline.stats(), leaderboard_refresh.stats(), presence.stats())
+
+@bot.command(name="reloadquips")
+async def reloadquips_cmd(ctx):
+    await reloadquips_command(ctx, bot, death_quips)
+
+@bot.command(name="backfill")
+async def backfill_cmd(ctx, days=None, server_id=None):
+    result = await backfill_command(ctx, bot, days, server_id)
+    if result:
+        server = result[0]
+        # Missed joins/leaves may have changed who is online
+        server.online_players = await db.get_online_players_db(server.server_id)
+        leaderboard_refresh.mark_dirty()
+        if server.leaderboard_refresh:
+            server.leaderboard_refresh.mark_dirty()
+
 # Run the bot
 if __name__ == "__main__":
     # Ensure pytz is installed: pip install pytz
@@ -748,4 +726,6 @@ if __name__ == "__main__":
                 bot.loop.run_until_complete(bot.close())
             except:
                 pass
-        exit(0)
\ No newline at end of file
+        exit(0)
+    finally:
+        db.shutdown() # Flush queued writes and close the database
\ No newline at end of file
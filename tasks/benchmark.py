@@ -0,0 +1,239 @@
+"""Push a burst of synthetic webhook messages through the event pipeline and
+through the old inline handling, with every Discord call simulated by a sleep.
+
+    python -m tasks.benchmark                          # 1,000 messages, 50ms per Discord call
+    python -m tasks.benchmark --messages 5000 --latency-ms 80
+    python -m tasks.benchmark --mode pipeline --window-ms 500
+
+Persistence is real (a fresh SQLite stats.db in a temporary directory per mode),
+messages are classified with ingest.webhook_parser. Three modes:
+
+- inline: one message at a time, everything awaited in on_message (what the
+  request described as the old behaviour);
+- concurrent: the same handler per message, all at once (what discord.py's
+  per-event tasks amount to under a burst; no ordering, no coalescing);
+- pipeline: tasks.event_pipeline.EventPipeline, with leaderboard edits left to
+  tasks.refresh_scheduler.RefreshScheduler (--window-ms/--max-delay-ms, scaled
+  down like the call latency).
+
+Simulated calls on the same route (reactions in the webhook channel, role
+edits, the quip channel, presence, each leaderboard message) run one at a time,
+as Discord's per-route rate limits make them; different routes overlap.
+
+For each: wall time until the last side effect/refresh, Discord calls made,
+and whether every player's events were persisted and acted on in the order
+they were posted.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from database import db
+from database.events import EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT
+from database.player_registry import registry
+from ingest.webhook_parser import classify_message
+from tasks.event_pipeline import EventPipeline
+from tasks.refresh_scheduler import RefreshScheduler
+
+logger = logging.getLogger('nameless_bot')
+
+LEADERBOARD_CALLS = 3 # Leaderboard messages edited by one refresh
+
+
+class FakeDiscord:
+    """Counts simulated API calls; each takes `latency` seconds, one at a time per route."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.by_route = {}
+        self._routes = {}
+
+    async def call(self, route):
+        self.calls += 1
+        self.by_route[route] = self.by_route.get(route, 0) + 1
+        lock = self._routes.setdefault(route, asyncio.Lock())
+        async with lock:
+            await asyncio.sleep(self.latency)
+
+
+class FakeMessage:
+    def __init__(self, message_id, content, discord):
+        self.id = message_id
+        self.content = content
+        self._discord = discord
+
+    async def add_reaction(self, emoji):
+        await self._discord.call('reaction')
+
+
+def burst(count, players, seed=1):
+    """Webhook messages for `players` players, each joining, dying/advancing and leaving in turn."""
+    rng = random.Random(seed)
+    sequences = []
+    for i in range(players):
+        name = f"burst_player_{i}"
+        steps = [f"**{name}** joined the server"]
+        steps += [rng.choice([f"⚰️ {name} fell from a high place", f"⭐ {name} has made the advancement [Stone Age]"])
+                  for _ in range(count // players - 2)]
+        steps.append(f"**{name}** left the server")
+        sequences.append(steps)
+    messages = []
+    while len(messages) < count and any(sequences):
+        steps = rng.choice([s for s in sequences if s])
+        messages.append(steps.pop(0)) # Interleave players, each one's order kept
+    return messages
+
+def make_handlers(discord, persisted, acted, debounce=None):
+    """persist/side_effects/refresh like main.py's, against the real database and a FakeDiscord.
+    `persisted` and `acted` collect message ids per player in the order they were
+    written and in the order their side effects finished. With debounce=(window, max_delay),
+    refresh() only marks a RefreshScheduler dirty, as main.refresh_after_events does.
+    """
+    pipeline = None
+
+    async def persist(kind, minecraft_username, message, server=None, log_event=None):
+        known_username = registry.canonical_minecraft(minecraft_username)
+        if not known_username:
+            return None
+        stats_changed = True
+        if kind == EVENT_JOIN:
+            await db.record_login(known_username, message_id=message.id)
+            stats_changed = False
+        elif kind == EVENT_LEAVE:
+            stats_changed = await db.record_logout(known_username, message_id=message.id) > 0
+        elif kind == EVENT_DEATH:
+            await db.record_death(known_username, message_id=message.id)
+        elif kind == EVENT_ADVANCEMENT:
+            await db.record_advancement(known_username, message_id=message.id)
+        persisted.setdefault(known_username, []).append(message.id)
+        persisted['last_at'] = time.perf_counter()
+        if pipeline:
+            pipeline.request_refresh(stats_changed)
+        return known_username, stats_changed
+
+    async def side_effects(kind, minecraft_username, message, result, server=None):
+        await message.add_reaction('✅')
+        if kind in (EVENT_JOIN, EVENT_LEAVE):
+            await discord.call('role')
+        elif kind == EVENT_DEATH:
+            await discord.call('quip')
+        if result:
+            acted.setdefault(result[0], []).append(message.id)
+
+    async def edit_leaderboards():
+        await asyncio.gather(*(discord.call(f'leaderboard {i}') for i in range(LEADERBOARD_CALLS)))
+
+    scheduler = RefreshScheduler(edit_leaderboards, *debounce) if debounce else None
+
+    async def refresh(stats_changed):
+        await discord.call('presence')
+        if stats_changed and scheduler:
+            scheduler.mark_dirty()
+        elif stats_changed:
+            await edit_leaderboards()
+
+    def attach(p):
+        nonlocal pipeline
+        pipeline = p
+
+    return persist, side_effects, refresh, attach, scheduler
+
+async def _run_mode(mode, contents, players, latency, window, max_delay):
+    discord, persisted, acted = FakeDiscord(latency), {}, {}
+    debounce = (window, max_delay) if mode == 'pipeline' else None
+    persist, side_effects, refresh, attach, scheduler = make_handlers(discord, persisted, acted, debounce)
+    await db.initialize_database()
+    for i in range(players):
+        await db.add_player(f"burst_player_{i}", f"burst_player_{i}#0")
+    messages = [FakeMessage(i, content, discord) for i, content in enumerate(contents)]
+
+    async def handle_inline(message):
+        event = classify_message(message.content)
+        result = await persist(event.kind, event.username, message)
+        await side_effects(event.kind, event.username, message, result)
+        if result:
+            await refresh(result[1])
+
+    started = time.perf_counter()
+    stats = None
+    if mode == 'inline':
+        for message in messages:
+            await handle_inline(message)
+    elif mode == 'concurrent':
+        await asyncio.gather(*(handle_inline(message) for message in messages))
+    else:
+        pipeline = EventPipeline(persist, side_effects, refresh)
+        attach(pipeline)
+        pipeline.start()
+        for message in messages:
+            event = classify_message(message.content)
+            await pipeline.submit(event.kind, event.username, message)
+        await pipeline.stop()
+        await scheduler.flush() # The trailing refresh
+        stats = pipeline.stats()
+        stats['leaderboard'] = scheduler.stats()
+    seconds = time.perf_counter() - started
+    await db.flush_pending_stats()
+    persisted_seconds = persisted.pop('last_at') - started
+    in_order = all(ids == sorted(ids) for ids in list(persisted.values()) + list(acted.values()))
+    leaderboard_edits = sum(count for route, count in discord.by_route.items() if route.startswith('leaderboard'))
+    return {'seconds': seconds, 'persisted_seconds': persisted_seconds, 'calls': discord.calls,
+            'leaderboard_edits': leaderboard_edits, 'in_order': in_order, 'pipeline': stats}
+
+async def _run_modes(modes, contents, players, latency, window, max_delay):
+    results = {}
+    for mode in modes:
+        with tempfile.TemporaryDirectory() as scratch:
+            previous_dir = os.getcwd()
+            os.chdir(scratch) # DATABASE_PATH is relative, so SQLite writes here
+            storage = db.use_storage('sqlite')
+            try:
+                results[mode] = await _run_mode(mode, contents, players, latency, window, max_delay)
+            finally:
+                storage.close()
+                os.chdir(previous_dir)
+    return results
+
+def run_benchmark(modes=('inline', 'concurrent', 'pipeline'), message_count=1000, players=20, latency=0.05,
+                  window=0.5, max_delay=1.5, seed=1):
+    """Returns {mode: {'seconds', 'persisted_seconds', 'calls', 'leaderboard_edits', 'in_order',
+    'pipeline' (pipeline and leaderboard scheduler stats, or None)}}.
+    """
+    previous_storage = db.current_storage()
+    try:
+        # One event loop for every run: the facade's write queue belongs to the loop that first used it
+        return asyncio.run(_run_modes(modes, burst(message_count, players, seed), players, latency, window, max_delay))
+    finally:
+        db.use_storage(previous_storage)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare inline webhook handling with the event pipeline under a burst.")
+    parser.add_argument("--mode", nargs="+", default=['inline', 'concurrent', 'pipeline'],
+                        choices=['inline', 'concurrent', 'pipeline'])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Simulated duration of each Discord call")
+    parser.add_argument("--window-ms", type=float, default=500, help="Leaderboard debounce window (pipeline mode)")
+    parser.add_argument("--max-delay-ms", type=float, default=1500, help="Longest a leaderboard change waits (pipeline mode)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    results = run_benchmark(args.mode, args.messages, args.players, args.latency_ms / 1000,
+                            args.window_ms / 1000, args.max_delay_ms / 1000)
+    for mode, result in results.items():
+        print(f"{mode:>10}: {result['seconds']:.2f}s ({args.messages / result['seconds']:,.0f} messages/s), "
+              f"all stats written after {result['persisted_seconds']:.2f}s, {result['calls']} Discord calls "
+              f"({result['leaderboard_edits']} leaderboard edits), per-player order {'kept' if result['in_order'] else 'BROKEN'}")
+        stats = result['pipeline']
+        if stats:
+            print(f"{'':>12}max queue depth {stats['max_depth']}, submit waited {stats['blocked_submits']} times "
+                  f"({stats['blocked_seconds']:.2f}s), persisted latency avg {stats['persist_latency_avg'] * 1000:.0f}ms, "
+                  f"done latency avg {stats['done_latency_avg'] * 1000:.0f}ms / max {stats['done_latency_max'] * 1000:.0f}ms, "
+                  f"{stats['refreshes']} refreshes for {stats['refresh_requests']} requests")
+            board = stats['leaderboard']
+            print(f"{'':>12}leaderboards refreshed {board['refreshes']} times for {board['triggers']} stat changes "
+                  f"({board['saved']} refreshes saved)")
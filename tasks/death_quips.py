@@ -0,0 +1,110 @@
+"""Death quips: loaded once from DEATH_QUIPS_PATH, dealt from a shuffle bag per player.
+
+The quips used to be a list of f-strings rebuilt on every death, and
+random.choice often picked the same one twice in a row. Now:
+
+- death_quips.txt is read once (and again on !reloadquips). Each line is a
+  template; {player} becomes the player's name. Lines with any other {field}
+  are skipped with a warning.
+- Each player draws from their own shuffled bag: no quip repeats until every
+  one has been used, and a new bag never starts with the quip that ended the
+  last one.
+- A bag is saved as (catalog, seed, position): the order is rebuilt from the
+  seed, so a restart picks up where it left off with three small values per
+  player. A bag dealt from a different catalog (the file was edited) starts over.
+"""
+import hashlib
+import logging
+import random
+import string
+from const import DEATH_QUIPS_PATH
+
+logger = logging.getLogger('nameless_bot')
+
+FALLBACK_QUIPS = ["Your gravestone should just read 'Oops' at this point, **{player}**."] # If the file can't be read
+
+
+def parse_quips(lines):
+    """Return (templates, skipped lines) from the catalog file's lines."""
+    templates, skipped = [], []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            fields = {field for _, field, _, _ in string.Formatter().parse(line) if field is not None}
+        except ValueError: # Unbalanced braces
+            fields = None
+        if fields is None or fields - {"player"}:
+            skipped.append(line)
+            continue
+        templates.append(line)
+    return templates, skipped
+
+def _bag_order(size, seed):
+    order = list(range(size))
+    random.Random(seed).shuffle(order)
+    return order
+
+
+class QuipCatalog:
+    """The loaded quips plus every player's position in their bag."""
+
+    def __init__(self, path=DEATH_QUIPS_PATH):
+        self.path = path
+        self.templates = list(FALLBACK_QUIPS)
+        self.version = self._version(self.templates)
+        self._bags = {}     # minecraft_username -> [catalog version, seed, position]
+        self._orders = {}   # minecraft_username -> (seed, quip order), rebuilt from the seed when needed
+
+    @staticmethod
+    def _version(templates):
+        return hashlib.sha1("\n".join(templates).encode("utf-8")).hexdigest()[:12]
+
+    def load(self):
+        """(Re)read the catalog file. Returns (quips loaded, lines skipped). If the file
+        can't be read (OSError) or has no usable quips (ValueError), the current quips stay.
+        """
+        with open(self.path, encoding="utf-8") as f:
+            templates, skipped = parse_quips(f)
+        for line in skipped:
+            logger.warning(f"Skipping death quip with an unknown {{field}}: {line}")
+        if not templates:
+            raise ValueError(f"{self.path} has no usable quips")
+        self.templates = templates
+        self.version = self._version(templates)
+        self._orders.clear()
+        logger.info(f"Loaded {len(templates)} death quips from {self.path} (catalog {self.version})")
+        return len(templates), len(skipped)
+
+    def restore(self, rotations):
+        """Resume saved bags: (minecraft_username, catalog version, seed, position) rows."""
+        for minecraft_username, version, seed, position in rotations:
+            self._bags[minecraft_username] = [version, seed, position]
+
+    def pick(self, minecraft_username):
+        """Next quip for a player. Returns (text, (catalog version, seed, position)) to save."""
+        size = len(self.templates)
+        bag = self._bags.get(minecraft_username)
+        if bag is None or bag[0] != self.version:
+            bag = self._bags[minecraft_username] = [self.version, random.getrandbits(31), 0]
+        elif bag[2] >= size:
+            # Bag used up: a new order that doesn't start with the quip just told
+            last = self._order(minecraft_username, bag[1])[-1]
+            seed = random.getrandbits(31)
+            while size > 1 and _bag_order(size, seed)[0] == last:
+                seed = random.getrandbits(31)
+            bag[1:] = [seed, 0]
+        index = self._order(minecraft_username, bag[1])[bag[2]]
+        bag[2] += 1
+        return self.templates[index].format(player=minecraft_username), tuple(bag)
+
+    def _order(self, minecraft_username, seed):
+        cached = self._orders.get(minecraft_username)
+        if cached is None or cached[0] != seed or len(cached[1]) != len(self.templates):
+            cached = self._orders[minecraft_username] = (seed, _bag_order(len(self.templates), seed))
+        return cached[1]
+
+
+# Process-wide catalog used by main.py
+death_quips = QuipCatalog()
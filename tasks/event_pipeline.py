@@ -0,0 +1,196 @@
+"""Queue and workers between on_message and everything an event causes.
+
+on_message (and the server log tailer) only classify a message and submit()
+it. The work is split across three kinds of workers:
+
+- persistence: one worker, so database writes and the online/offline state
+  change in exactly the order events arrived;
+- side effects: EVENT_PIPELINE_WORKERS workers for the Discord calls (reactions,
+  online roles, the death quip). Events are sharded by (server, player), so one
+  player's effects stay in order while different players' round-trips overlap. A
+  server start/stop goes into every shard as a barrier (_Barrier): each shard
+  stops there, the last one to arrive runs its effects alone, then all go on.
+  So a stop can't clear roles before an earlier join has added one, and the
+  persistence worker never waits for Discord;
+- refresh: one worker for derived updates (presence, leaderboards, roles).
+  Requests that arrive while a refresh is running are merged into one.
+
+The queue is bounded (EVENT_QUEUE_SIZE): when it is full, submit() waits, which
+holds back on_message instead of letting events pile up in memory. stats()
+reports how much that happened.
+"""
+import asyncio
+import logging
+import time
+from const import EVENT_QUEUE_SIZE, EVENT_PIPELINE_WORKERS
+
+logger = logging.getLogger('nameless_bot')
+
+
+class _Barrier:
+    """A server start/stop queued to every shard; its effects run once all of them reach it."""
+
+    def __init__(self, item, parties):
+        self.item = item
+        self.waiting = parties
+        self.crossed = asyncio.Event()
+
+
+class EventPipeline:
+    """persist(kind, name, message, server, log_event) -> result runs first, then
+    side_effects(kind, name, message, result, server); refresh(stats_changed) runs
+    whenever request_refresh() was called since the last refresh. `server` and
+    `log_event` are whatever submit() was given (main.py passes the ServerState, and
+    the LogEvent of events read from the server log).
+    """
+
+    def __init__(self, persist, side_effects, refresh, workers=EVENT_PIPELINE_WORKERS, maxsize=EVENT_QUEUE_SIZE):
+        self._persist = persist
+        self._side_effects = side_effects
+        self._refresh = refresh
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._shards = [asyncio.Queue(maxsize=maxsize) for _ in range(workers)]
+        self._refresh_wanted = asyncio.Event()
+        self._refresh_stats = False
+        self._refresh_idle = asyncio.Event()
+        self._refresh_idle.set()
+        self._tasks = []
+        self._metrics = {
+            'submitted': 0, 'persisted': 0, 'side_effects': 0, 'errors': 0,
+            'refresh_requests': 0, 'refreshes': 0,
+            'max_depth': 0, 'blocked_submits': 0, 'blocked_seconds': 0.0,
+            'persist_latency_total': 0.0, 'persist_latency_max': 0.0,
+            'done_latency_total': 0.0, 'done_latency_max': 0.0,
+        }
+
+    def start(self):
+        """Start the workers (once, from inside the running event loop)."""
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._persist_worker()))
+        self._tasks.extend(asyncio.create_task(self._side_effect_worker(shard)) for shard in self._shards)
+        self._tasks.append(asyncio.create_task(self._refresh_worker()))
+        logger.info(f"Event pipeline started ({len(self._shards)} side effect workers, queue size {self._queue.maxsize})")
+
+    async def stop(self):
+        """Finish everything queued, then cancel the workers."""
+        await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind, minecraft_username=None, message=None, server=None, log_event=None):
+        """Queue an event; waits while the queue is full."""
+        item = (kind, minecraft_username, message, server, log_event, time.perf_counter())
+        if self._queue.full():
+            self._metrics['blocked_submits'] += 1
+            started = time.perf_counter()
+            await self._queue.put(item)
+            self._metrics['blocked_seconds'] += time.perf_counter() - started
+        else:
+            self._queue.put_nowait(item)
+        self._metrics['submitted'] += 1
+        self._metrics['max_depth'] = max(self._metrics['max_depth'], self._queue.qsize())
+
+    def request_refresh(self, stats_changed=False):
+        """Ask for a derived update; several requests before it runs become one."""
+        self._metrics['refresh_requests'] += 1
+        self._refresh_stats = self._refresh_stats or stats_changed
+        self._refresh_idle.clear()
+        self._refresh_wanted.set()
+
+    async def persisted(self):
+        """Wait until every event submitted so far has been written."""
+        await self._queue.join()
+
+    async def drain(self):
+        """Wait until every submitted event and the refreshes it asked for are done."""
+        await self._queue.join()
+        await self._join_shards()
+        await self._refresh_idle.wait()
+
+    def stats(self):
+        """Counters plus current depths and average latencies (seconds)."""
+        stats = dict(self._metrics)
+        stats['depth'] = self._queue.qsize()
+        stats['shard_depths'] = [shard.qsize() for shard in self._shards]
+        stats['persist_latency_avg'] = stats['persist_latency_total'] / max(1, stats['persisted'])
+        stats['done_latency_avg'] = stats['done_latency_total'] / max(1, stats['side_effects'])
+        return stats
+
+    # --- Workers ---
+    async def _join_shards(self):
+        await asyncio.gather(*(shard.join() for shard in self._shards))
+
+    def _record_latency(self, name, enqueued):
+        latency = time.perf_counter() - enqueued
+        self._metrics[f'{name}_latency_total'] += latency
+        self._metrics[f'{name}_latency_max'] = max(self._metrics[f'{name}_latency_max'], latency)
+
+    async def _persist_worker(self):
+        while True:
+            kind, minecraft_username, message, server, log_event, enqueued = await self._queue.get()
+            try:
+                result = await self._persist(kind, minecraft_username, message, server, log_event)
+                self._metrics['persisted'] += 1
+                self._record_latency('persist', enqueued)
+                item = (kind, minecraft_username, message, server, result, enqueued)
+                if minecraft_username is None:
+                    # Server start/stop: after every earlier effect, before any later one
+                    barrier = _Barrier(item, len(self._shards))
+                    for shard in self._shards:
+                        await shard.put(barrier)
+                else:
+                    await self._shards[hash((server, minecraft_username.lower())) % len(self._shards)].put(item)
+            except Exception as e:
+                self._metrics['errors'] += 1
+                logger.error(f"Error persisting event {kind} for {minecraft_username}: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _side_effect_worker(self, shard):
+        while True:
+            item = await shard.get()
+            try:
+                if isinstance(item, _Barrier):
+                    await self._cross(item)
+                else:
+                    await self._run_side_effects(item)
+            finally:
+                shard.task_done()
+
+    async def _cross(self, barrier):
+        """Wait at a barrier; the last shard to reach it runs its effects and lets the others go."""
+        barrier.waiting -= 1
+        if barrier.waiting:
+            await barrier.crossed.wait()
+            return
+        try:
+            await self._run_side_effects(barrier.item)
+        finally:
+            barrier.crossed.set()
+
+    async def _run_side_effects(self, item):
+        kind, minecraft_username, message, server, result, enqueued = item
+        try:
+            await self._side_effects(kind, minecraft_username, message, result, server)
+        except Exception as e:
+            self._metrics['errors'] += 1
+            logger.error(f"Error in side effects of event {kind} for {minecraft_username}: {e}", exc_info=True)
+        self._metrics['side_effects'] += 1
+        self._record_latency('done', enqueued)
+
+    async def _refresh_worker(self):
+        while True:
+            await self._refresh_wanted.wait()
+            self._refresh_wanted.clear()
+            stats_changed, self._refresh_stats = self._refresh_stats, False
+            try:
+                await self._refresh(stats_changed)
+            except Exception as e:
+                self._metrics['errors'] += 1
+                logger.error(f"Error refreshing after events: {e}", exc_info=True)
+            self._metrics['refreshes'] += 1
+            if not self._refresh_wanted.is_set():
+                self._refresh_idle.set()
@@ -3,7 +3,7 @@ import asyncio
 import datetime
 import pytz # Import pytz
 import logging
-from database.queries import get_all_playtimes, get_all_advancements, get_all_deaths
+from database import db
 from utils.formatters import format_playtime
 from const import SCOREBOARD_CHANNEL_ID
 from utils.logging import setup_logging # Keep if you use setup_logging elsewhere
@@ -13,12 +13,16 @@ logger = logging.getLogger('nameless_bot')
 
 # Global variable to cache message IDs (consider storing in DB or file for persistence)
 # For simplicity, we keep it in memory, but it will reset on bot restart.
-leaderboard_messages = {'deaths': None, 'advancements': None, 'playtime': None}
-leaderboard_message_ids = {'deaths': None, 'advancements': None, 'playtime': None}
+# Keyed by (channel id, 'deaths'/'advancements'/'playtime'): each server's boards live in their own channel
+leaderboard_messages = {}
+leaderboard_message_ids = {}
 
 
-async def update_leaderboards(bot, channel):
-    """Update the leaderboard messages in the designated channel."""
+async def update_leaderboards(bot, channel, snapshot=None, server=None):
+    """Update the leaderboard messages in the designated channel.
+    Pass a LeaderboardSnapshot to reuse one already taken this cycle, and a
+    ServerState (tasks/servers.py) for that server's boards instead of the global ones.
+    """
     global leaderboard_messages, leaderboard_message_ids
     logger.debug(f"Attempting to update leaderboards in channel: {channel.name if channel else 'None'}")
 
@@ -33,18 +37,24 @@ async def update_leaderboards(bot, channel):
               logger.warning("Fetched channel within update_leaderboards - caller should provide it.")
 
 
-    # Fetch latest data
-    playtime_data = get_all_playtimes()
-    adv_data = get_all_advancements()
-    deaths_data = get_all_deaths() # Sorted lowest to highest
+    # Fetch latest data (one scan of player_stats, already sorted per metric)
+    if snapshot is None:
+        snapshot = await db.get_leaderboard_snapshot(server.server_id if server else None)
+    if snapshot is None:
+        logger.error("Could not get a leaderboard snapshot. Leaderboard update skipped.")
+        return
+    playtime_data = snapshot.playtimes
+    adv_data = snapshot.advancements
+    deaths_data = snapshot.deaths # Sorted lowest to highest
 
     # Create embeds
     current_time_est = datetime.datetime.now(pytz.utc)
     current_ts = int(current_time_est.timestamp())
+    suffix = f" — {server.name}" if server else ""
 
     # Playtime leaderboard
     playtime_embed = discord.Embed(
-        title="🕒 Playtime Leaderboard",
+        title=f"🕒 Playtime Leaderboard{suffix}",
         description=f"Who's spending their life on the server?\nUpdated: <t:{current_ts}:R>", # Use relative time
         color=discord.Color.green()
     )
@@ -59,7 +69,7 @@ async def update_leaderboards(bot, channel):
 
     # Advancements leaderboard
     adv_embed = discord.Embed(
-        title="⭐ Advancements Leaderboard",
+        title=f"⭐ Advancements Leaderboard{suffix}",
         description=f"Who's been busy progressing?\nUpdated: <t:{current_ts}:R>",
         color=discord.Color.gold()
     )
@@ -74,7 +84,7 @@ async def update_leaderboards(bot, channel):
 
     # Deaths leaderboard (Least Deaths)
     deaths_embed = discord.Embed(
-        title="💀 Deaths Leaderboard",
+        title=f"💀 Deaths Leaderboard{suffix}",
         description=f"Who's been playing it safe?\nUpdated: <t:{current_ts}:R>",
         color=discord.Color.red()
     )
@@ -93,8 +103,9 @@ async def update_leaderboards(bot, channel):
     # Try to fetch messages using cached IDs first, more reliable than history scan
     async def edit_or_send(key, embed):
         global leaderboard_messages, leaderboard_message_ids
-        message_obj = leaderboard_messages.get(key)
-        message_id = leaderboard_message_ids.get(key)
+        slot = (channel.id, key)
+        message_obj = leaderboard_messages.get(slot)
+        message_id = leaderboard_message_ids.get(slot)
 
         # 1. Try editing using cached message object
         if message_obj:
@@ -104,7 +115,7 @@ async def update_leaderboards(bot, channel):
                 return message_obj # Return updated object
             except (discord.NotFound, discord.HTTPException) as e:
                 logger.warning(f"Failed to edit {key} leaderboard using cached object (ID: {message_obj.id}): {e}. Will try fetching by ID.")
-                leaderboard_messages[key] = None # Invalidate cache
+                leaderboard_messages[slot] = None # Invalidate cache
                 message_obj = None # Clear object
 
         # 2. Try fetching by ID and editing
@@ -112,12 +123,12 @@ async def update_leaderboards(bot, channel):
              try:
                  message_obj = await channel.fetch_message(message_id)
                  await message_obj.edit(embed=embed)
-                 leaderboard_messages[key] = message_obj # Update cache
+                 leaderboard_messages[slot] = message_obj # Update cache
                  logger.info(f"Fetched and edited leaderboard message for {key} (ID: {message_id}).")
                  return message_obj
              except (discord.NotFound, discord.HTTPException) as e:
                  logger.warning(f"Failed to fetch/edit {key} leaderboard using ID {message_id}: {e}. Will send new message.")
-                 leaderboard_message_ids[key] = None # Invalidate ID cache too
+                 leaderboard_message_ids[slot] = None # Invalidate ID cache too
                  message_obj = None
 
         # 3. If editing failed or no ID, send a new message
@@ -125,8 +136,8 @@ async def update_leaderboards(bot, channel):
              try:
                  logger.info(f"Sending new leaderboard message for {key}.")
                  new_msg = await channel.send(embed=embed)
-                 leaderboard_messages[key] = new_msg
-                 leaderboard_message_ids[key] = new_msg.id # Cache new ID
+                 leaderboard_messages[slot] = new_msg
+                 leaderboard_message_ids[slot] = new_msg.id # Cache new ID
                  # Optionally: Delete old messages if found in history? More complex.
                  return new_msg
              except discord.HTTPException as e:
@@ -134,8 +145,8 @@ async def update_leaderboards(bot, channel):
                  return None
 
     # Call the edit_or_send function for each leaderboard type
-    leaderboard_messages['playtime'] = await edit_or_send('playtime', playtime_embed)
-    leaderboard_messages['advancements'] = await edit_or_send('advancements', adv_embed)
-    leaderboard_messages['deaths'] = await edit_or_send('deaths', deaths_embed)
+    leaderboard_messages[(channel.id, 'playtime')] = await edit_or_send('playtime', playtime_embed)
+    leaderboard_messages[(channel.id, 'advancements')] = await edit_or_send('advancements', adv_embed)
+    leaderboard_messages[(channel.id, 'deaths')] = await edit_or_send('deaths', deaths_embed)
 
-    logger.info("Finished leaderboard update cycle.")
\ No newline at end of file
+    logger.info(f"Finished leaderboard update cycle{f' for {server.name}' if server else ''}.")
\ No newline at end of file
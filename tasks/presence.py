@@ -0,0 +1,102 @@
+"""The bot's "Watching ..." status, sent only when it changes.
+
+Every join and leave used to call bot.change_presence. Presence updates share
+the gateway's small rate limit, so a restart storm of thirty joins mostly got
+throttled or dropped. PresenceManager holds the status text the bot should
+show and sends it:
+
+- only when it differs from what was last sent;
+- once per burst: changes within PRESENCE_WINDOW_SECONDS are merged into one
+  update, unless a change is urgent (server start/stop), which goes out at once;
+- at most PRESENCE_BUDGET times per PRESENCE_BUDGET_SECONDS. Past that, the
+  latest text waits for the budget to allow it.
+"""
+import asyncio
+import collections
+import logging
+import time
+from const import PRESENCE_WINDOW_SECONDS, PRESENCE_BUDGET, PRESENCE_BUDGET_SECONDS
+
+logger = logging.getLogger('nameless_bot')
+
+
+class PresenceManager:
+    """send(text) is awaited to actually change the presence."""
+
+    def __init__(self, send, window=PRESENCE_WINDOW_SECONDS, budget=PRESENCE_BUDGET, budget_seconds=PRESENCE_BUDGET_SECONDS):
+        self._send = send
+        self.window = window
+        self.budget = budget
+        self.budget_seconds = budget_seconds
+        self._desired = None
+        self._sent = None
+        self._urgent = False
+        self._wake = asyncio.Event()
+        self._sent_at = collections.deque() # Times of recent sends, for the budget
+        self._task = None
+        self._metrics = {'requests': 0, 'sent': 0, 'unchanged': 0, 'errors': 0, 'throttled_seconds': 0.0}
+
+    def set(self, text, urgent=False):
+        """Ask for `text` to be shown. Never waits; must be called from the event loop."""
+        self._metrics['requests'] += 1
+        self._desired = text
+        if text == self._sent and (self._task is None or self._task.done()):
+            self._metrics['unchanged'] += 1
+            return
+        if urgent:
+            self._urgent = True
+            self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def invalidate(self):
+        """Forget what was sent (after a reconnect Discord no longer shows it)."""
+        self._sent = None
+
+    async def flush(self):
+        """Send a pending change now (budget permitting) and wait for it."""
+        while self._task is not None and not self._task.done():
+            self._urgent = True
+            self._wake.set()
+            await asyncio.shield(self._task)
+
+    def stats(self):
+        """Counters; requests - sent is how many presence updates were avoided."""
+        stats = dict(self._metrics)
+        stats['current'] = self._sent
+        stats['pending'] = self._desired != self._sent
+        return stats
+
+    async def _run(self):
+        while self._desired != self._sent:
+            if not self._urgent:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.window) # Let the burst settle
+                except asyncio.TimeoutError:
+                    pass
+            await self._wait_for_budget()
+            self._urgent = False
+            self._wake.clear()
+            text = self._desired
+            if text == self._sent:
+                break # Changed back meanwhile
+            self._sent_at.append(time.monotonic())
+            try:
+                await self._send(text)
+                self._sent = text
+                self._metrics['sent'] += 1
+            except Exception as e:
+                self._metrics['errors'] += 1
+                logger.error(f"Error changing presence to {text!r}: {e}")
+                return # The next set() tries again
+
+    async def _wait_for_budget(self):
+        while True:
+            now = time.monotonic()
+            while self._sent_at and self._sent_at[0] <= now - self.budget_seconds:
+                self._sent_at.popleft()
+            if len(self._sent_at) < self.budget:
+                return
+            delay = self._sent_at[0] + self.budget_seconds - now
+            self._metrics['throttled_seconds'] += delay
+            await asyncio.sleep(delay)
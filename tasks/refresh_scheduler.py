@@ -0,0 +1,80 @@
+"""Debounced leaderboard refreshes.
+
+Every death, advancement and logout used to re-query the database and edit the
+three leaderboard messages. Now they only call mark_dirty(): the refresh runs
+once the triggers have stopped for `window` seconds (or `max_delay` seconds
+after the first one, so a busy evening still updates the board). A trigger that
+arrives while a refresh is running gets a trailing refresh after it, so the
+last change is always shown. stats() reports how many refreshes that saved.
+"""
+import asyncio
+import logging
+import time
+from const import LEADERBOARD_REFRESH_WINDOW_SECONDS, LEADERBOARD_REFRESH_MAX_DELAY_SECONDS
+
+logger = logging.getLogger('nameless_bot')
+
+
+class RefreshScheduler:
+    """Runs refresh() once per burst of mark_dirty() calls."""
+
+    def __init__(self, refresh, window=LEADERBOARD_REFRESH_WINDOW_SECONDS, max_delay=LEADERBOARD_REFRESH_MAX_DELAY_SECONDS):
+        self._refresh = refresh
+        self.window = window
+        self.max_delay = max_delay
+        self._task = None
+        self._dirty = False
+        self._first_trigger = None # When the oldest change not yet shown was marked
+        self._last_trigger = None
+        self._wake = asyncio.Event() # Set by flush() to skip the rest of the wait
+        self._metrics = {'triggers': 0, 'refreshes': 0, 'errors': 0, 'refresh_seconds': 0.0, 'last_refresh': None}
+
+    def mark_dirty(self):
+        """Note that the leaderboards are out of date. Never waits; must be called from the event loop."""
+        now = time.monotonic()
+        self._metrics['triggers'] += 1
+        self._dirty = True
+        self._last_trigger = now
+        if self._first_trigger is None:
+            self._first_trigger = now
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def flush(self):
+        """Refresh now if anything is pending, and wait until no refresh is running."""
+        while self._task is not None and not self._task.done():
+            self._wake.set()
+            await asyncio.shield(self._task)
+
+    def stats(self):
+        """Counters; 'saved' is how many triggers didn't need a refresh of their own."""
+        stats = dict(self._metrics)
+        stats['pending'] = self._dirty
+        stats['saved'] = max(0, stats['triggers'] - stats['refreshes'] - (1 if self._dirty else 0))
+        return stats
+
+    async def _run(self):
+        while self._dirty:
+            # Wait out the burst: until `window` passes without a trigger, or `max_delay` since the first
+            while True:
+                now = time.monotonic()
+                due = min(self._last_trigger + self.window, self._first_trigger + self.max_delay)
+                if now >= due or self._wake.is_set():
+                    break
+                try:
+                    await asyncio.wait_for(self._wake.wait(), due - now)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+            self._dirty = False
+            self._first_trigger = None
+            started = time.perf_counter()
+            try:
+                await self._refresh()
+            except Exception as e:
+                self._metrics['errors'] += 1
+                logger.error(f"Error during leaderboard refresh: {e}", exc_info=True)
+            self._metrics['refreshes'] += 1
+            self._metrics['refresh_seconds'] += time.perf_counter() - started
+            self._metrics['last_refresh'] = time.time()
+            # Marked dirty during the refresh: loop for the trailing refresh
@@ -7,7 +7,7 @@ from const import (
     MOST_ADVANCEMENTS_ROLE, LEAST_ADVANCEMENTS_ROLE, MOST_PLAYTIME_ROLE,
     LEAST_PLAYTIME_ROLE
 )
-from database.queries import get_all_deaths, get_all_advancements, get_all_playtimes, get_player_stats, get_all_players
+from database import db
 from utils.discord_helpers import get_discord_user
 import logging
 
@@ -65,8 +65,10 @@ async def clear_all_online_roles(guild):
             logger.info(f"Finished clearing {ONLINE_ROLE_NAME} role from {cleared_count} members.")
 
 
-async def update_achievement_roles(bot, guild):
-    """Update all achievement roles based on current stats sequentially."""
+async def update_achievement_roles(bot, guild, snapshot=None):
+    """Update all achievement roles based on current stats sequentially.
+    Pass a LeaderboardSnapshot to reuse one already taken this cycle.
+    """
     if not guild:
         logger.warning("update_achievement_roles called without a valid guild.")
         return
@@ -75,9 +77,11 @@ async def update_achievement_roles(bot, guild):
 
     # --- Get Data ---
     try:
-        deaths_data = get_all_deaths() # sorted low -> high
-        advancements_data = get_all_advancements() # sorted high -> low
-        playtimes_data = get_all_playtimes() # sorted high -> low
+        if snapshot is None:
+            snapshot = await db.get_leaderboard_snapshot()
+        deaths_data = snapshot.deaths # sorted low -> high
+        advancements_data = snapshot.advancements # sorted high -> low
+        playtimes_data = snapshot.playtimes # sorted high -> low
     except Exception as e:
         logger.error(f"Failed to fetch data for role update: {e}")
         return
@@ -135,7 +139,7 @@ async def update_achievement_roles(bot, guild):
         for player in deaths_data:
             mc_name, disc_id, deaths = player
             if deaths > 0: # Must have died at least once
-                 stats = get_player_stats(minecraft_username=mc_name)
+                 stats = snapshot.stats_for(mc_name)
                  if stats and stats[4] >= 18000: # 5 hours playtime
                      if deaths < min_eligible_deaths:
                           min_eligible_deaths = deaths
@@ -158,7 +162,7 @@ async def update_achievement_roles(bot, guild):
     if advancements_data and 'least_adv' in roles:
         min_eligible_adv = float('inf')
         eligible_players_least_adv = []
-        all_players_stats = get_all_players()
+        all_players_stats = snapshot.players
         for mc_name, disc_id, _, advancements, playtime in all_players_stats:
             if playtime >= 300: # 5 mins playtime
                 if advancements < min_eligible_adv:
@@ -0,0 +1,58 @@
+"""The Minecraft servers the bot follows: one ServerState per webhook channel.
+
+Each server posts its joins, leaves, deaths and advancements to its own webhook
+channel (SERVERS in const.py). on_message finds the server a message belongs to
+with one dict lookup on the channel id, however many servers are configured,
+and everything the event records is kept under that server's id:
+
+- online/offline and the online players are per server (ServerState);
+- stats go to server_stats and stats_history under the server's id, and are
+  summed into player_stats, which the global leaderboards and roles read;
+- a server with a scoreboard_channel_id gets its own leaderboards there,
+  refreshed by its own RefreshScheduler.
+"""
+import logging
+from const import SERVERS, DEFAULT_SERVER_ID
+
+logger = logging.getLogger('nameless_bot')
+
+
+class ServerState:
+    """Live state of one Minecraft server."""
+
+    def __init__(self, server_id, name, webhook_channel_id=None, scoreboard_channel_id=None):
+        self.server_id = server_id
+        self.name = name
+        self.webhook_channel_id = webhook_channel_id
+        self.scoreboard_channel_id = scoreboard_channel_id
+        self.online = False
+        self.online_players = []
+        self.leaderboard_refresh = None # RefreshScheduler for this server's own boards (main.py), if it has any
+
+    def __repr__(self):
+        return f"<ServerState {self.server_id} ({'online' if self.online else 'offline'}, {len(self.online_players)} players)>"
+
+
+def load_servers(config=SERVERS):
+    """ServerStates keyed by webhook channel id, from a {channel id: settings} mapping like SERVERS.
+    Raises ValueError if two channels claim the same server id.
+    """
+    servers = {}
+    ids = set()
+    for channel_id, settings in config.items():
+        server_id = settings['id']
+        if server_id in ids:
+            raise ValueError(f"Server id {server_id!r} is configured for more than one webhook channel")
+        ids.add(server_id)
+        servers[channel_id] = ServerState(
+            server_id, settings.get('name', server_id), channel_id, settings.get('scoreboard_channel_id')
+        )
+    return servers
+
+
+# Process-wide servers used by main.py
+servers_by_channel = load_servers()
+servers_by_id = {server.server_id: server for server in servers_by_channel.values()}
+# Where events without a channel go (the server log tailer)
+default_server = (servers_by_id.get(DEFAULT_SERVER_ID) or next(iter(servers_by_channel.values()), None)
+                  or ServerState(DEFAULT_SERVER_ID, DEFAULT_SERVER_ID))
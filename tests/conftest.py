@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from database import queries
+from database import events
+from database import migrations
+from database.batcher import stats_batcher
+from database.connection import manager
+from database.message_ledger import message_ledger
+
+
+def reset_buffers():
+    """Drop whatever the process-wide buffers and caches still hold from an earlier test."""
+    for buffer in (stats_batcher, events.event_log, message_ledger):
+        buffer.drain()
+        buffer.commit()
+    message_ledger.__init__(message_ledger.cache_size) # Its LRU and high-water mark belong to the old stats.db
+    events.reset_player_ids()
+    queries._pending_offsets.clear()
+    queries._snapshots.clear()
+
+
+@pytest.fixture
+def db_dir(tmp_path, monkeypatch):
+    """A temporary directory to hold stats.db, with the shared connections and buffers reset around the test."""
+    manager.close()
+    monkeypatch.chdir(tmp_path) # DATABASE_PATH is relative
+    reset_buffers()
+    yield tmp_path
+    reset_buffers()
+    manager.close()
+
+
+@pytest.fixture
+def fresh_db(db_dir):
+    """database.queries on an empty, fully migrated stats.db."""
+    queries.initialize_database()
+    return queries
+
+
+@pytest.fixture
+def migrate_to(monkeypatch):
+    """migrate_to(conn, version): apply the migrations up to and including `version` only."""
+    def migrate(conn, version):
+        with monkeypatch.context() as patch:
+            patch.setattr(migrations, 'MIGRATIONS', [m for m in migrations.MIGRATIONS if m[0] <= version])
+            return migrations.migrate(conn)
+    return migrate
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """An event loop whose clock jumps to the next timer instead of waiting for it:
+    asyncio.sleep(60) returns at once, with loop.time() 60 seconds later."""
+
+    def __init__(self):
+        super().__init__()
+        self.now = 0.0
+        select = self._selector.select
+
+        def advance(timeout=None):
+            if timeout: # None: nothing scheduled; 0: callbacks already due
+                self.now += timeout
+            return select(0 if timeout is not None else None)
+        self._selector.select = advance
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def virtual_clock():
+    """A VirtualClockLoop; run coroutines with virtual_clock.run_until_complete()."""
+    loop = VirtualClockLoop()
+    yield loop
+    loop.close()
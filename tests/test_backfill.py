@@ -0,0 +1,92 @@
+"""Backfilling missed webhook messages (database/backfill.py, ingest/webhook.py) on both storage backends."""
+import datetime
+import json
+import time
+import pytest
+from database import sqlite_storage
+from database.events import EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT
+from database.memory_storage import MemoryStorage
+from ingest.webhook import load_message_export
+
+PLAYERS = ("Steve", "Alex")
+
+
+def utc_ts(day, hour, minute=0):
+    return int(datetime.datetime(2024, 3, day, hour, minute, tzinfo=datetime.timezone.utc).timestamp())
+
+
+# Steve plays over midnight UTC; the day a stat lands on comes from the message, not from when it's backfilled
+EVENTS = [
+    (EVENT_JOIN, "Steve", utc_ts(10, 23, 0), 101),
+    (EVENT_DEATH, "Steve", utc_ts(10, 23, 30), 102),
+    (EVENT_ADVANCEMENT, "Alex", utc_ts(11, 0, 15), 103),
+    (EVENT_LEAVE, "Steve", utc_ts(11, 1, 0), 104),
+    (EVENT_DEATH, "Nobody", utc_ts(11, 2, 0), 105),
+]
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request):
+    if request.param == 'sqlite':
+        request.getfixturevalue('fresh_db')
+        storage = sqlite_storage
+    else:
+        storage = MemoryStorage()
+        storage.initialize_database()
+    for name in PLAYERS:
+        storage.add_player(name, f"{name}#0001")
+    return storage
+
+
+def test_events_are_dated_by_their_messages(storage):
+    summary = storage.backfill_webhook_events(EVENTS, batch_size=2)
+    assert (summary['recorded'], summary['duplicates'], summary['unknown']) == (4, 0, 1)
+    assert summary['playtime'] == 7200
+    assert storage.get_player_stats("Steve")[2:] == (1, 0, 7200)
+    assert storage.get_stats_for_date("2024-03-10") == [("Steve", 1, 0, 0)]
+    assert storage.get_stats_for_date("2024-03-11") == [("Alex", 0, 1, 0), ("Steve", 0, 0, 7200)]
+    assert storage.get_online_players_db() == []
+
+
+def test_running_twice_changes_nothing(storage):
+    storage.backfill_webhook_events(EVENTS, batch_size=2)
+    before = storage.get_all_players()
+    summary = storage.backfill_webhook_events(EVENTS, batch_size=2)
+    assert (summary['recorded'], summary['duplicates'], summary['playtime']) == (0, 4, 0)
+    assert storage.get_all_players() == before
+
+
+def test_messages_counted_live_are_skipped(storage):
+    # The bot saw the join and the death before going offline (the death is still buffered)
+    for kind, name, ts, message_id in EVENTS[:2]:
+        assert storage.claim_message(message_id)
+        record = storage.record_login if kind == EVENT_JOIN else storage.record_death
+        record(name, message_id=message_id, ts=ts)
+
+    summary = storage.backfill_webhook_events(EVENTS)
+    assert (summary['recorded'], summary['duplicates']) == (2, 2)
+    # The live session is closed by the backfilled leave, and the death is counted once
+    assert storage.get_player_stats("Steve")[2:] == (1, 0, 7200)
+    assert not storage.claim_message(104) # Backfilled ids are claimed too
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    """Local time away from UTC, so reading a naive timestamp as local time would show."""
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_export_timestamps_are_utc(tmp_path, new_york):
+    export = tmp_path / "export.json"
+    export.write_text(json.dumps({"messages": [
+        {"id": "101", "timestamp": "2024-03-10T23:00:00", "author": {"id": "1"}, "content": "**Steve** joined the server"},
+        {"id": "102", "timestamp": "2024-03-11T01:00:00+02:00", "author": {"id": "1"}, "content": "**Steve** left the server"},
+        {"id": "103", "timestamp": "2024-03-11T00:00:00", "author": {"id": "2"}, "content": "**Alex** joined the server"},
+    ]}))
+    assert load_message_export(str(export), ignore_author="2") == [
+        (EVENT_JOIN, "Steve", utc_ts(10, 23, 0), 101), (EVENT_LEAVE, "Steve", utc_ts(10, 23, 0), 102),
+    ]
@@ -0,0 +1,85 @@
+"""Online backups of stats.db (database/backup.py): consistent under writes, verified before a restore."""
+import threading
+import pytest
+from const import DATABASE_PATH
+from database import queries
+from database.backup import backup_database, list_snapshots, restore_backup, verify_snapshot
+from database.connection import read_connection
+from database.events import EVENT_DEATH
+
+PLAYER = "LuigiTime34"
+
+
+def deaths_and_logged_deaths():
+    with read_connection() as conn:
+        return conn.execute('''
+            SELECT (SELECT deaths FROM player_stats WHERE minecraft_username = ?),
+                   (SELECT COUNT(*) FROM events WHERE event_type = ?)
+        ''', (PLAYER, EVENT_DEATH)).fetchone()
+
+
+def test_backup_while_writing(fresh_db, tmp_path):
+    q = fresh_db
+    writing, stop = threading.Event(), threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            q.record_death(PLAYER)
+            q.flush_pending_stats()
+            writing.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    writing.wait()
+    try:
+        # One page per step: the bot's commits land between the steps
+        summary = backup_database(DATABASE_PATH, str(tmp_path / "backups"), pages_per_step=1, step_sleep=0.001)
+    finally:
+        stop.set()
+        thread.join()
+    assert verify_snapshot(summary['path'])[0]
+    live_deaths = deaths_and_logged_deaths()[0]
+
+    # The snapshot is one consistent moment: each death is in both the counter and the log
+    restore_backup(summary['path'], DATABASE_PATH)
+    q.initialize_database()
+    deaths, logged = deaths_and_logged_deaths()
+    assert deaths == logged
+    assert 0 < deaths < live_deaths
+
+
+def test_restore_round_trip(fresh_db, tmp_path):
+    q = fresh_db
+    q.record_death(PLAYER)
+    q.record_advancement(PLAYER)
+    q.flush_pending_stats()
+    before = q.get_player_stats(PLAYER)
+    snapshot = backup_database(DATABASE_PATH, str(tmp_path / "backups"))['path']
+
+    q.delete_player(PLAYER)
+    assert q.get_player_stats(PLAYER) is None
+    previous = restore_backup(snapshot, DATABASE_PATH)
+    q.initialize_database()
+    assert q.get_player_stats(PLAYER) == before
+    assert (tmp_path / previous).exists() # The replaced database is kept
+
+
+def test_restore_rejects_a_checksum_mismatch(fresh_db, tmp_path):
+    q = fresh_db
+    q.record_death(PLAYER)
+    q.flush_pending_stats()
+    snapshot = backup_database(DATABASE_PATH, str(tmp_path / "backups"))['path']
+    assert list_snapshots(str(tmp_path / "backups")) == [snapshot]
+
+    with open(snapshot, 'r+b') as f:
+        f.seek(100)
+        byte = f.read(1)
+        f.seek(100)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    assert not verify_snapshot(snapshot)[0]
+    q.record_death(PLAYER) # Made after the snapshot: must survive the refused restore
+    q.flush_pending_stats()
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        restore_backup(snapshot, DATABASE_PATH)
+    assert q.get_player_stats(PLAYER)[2] == 2
+    assert not (tmp_path / (DATABASE_PATH + ".restore")).exists()
@@ -0,0 +1,33 @@
+"""StatsBatcher (database/batcher.py) bookkeeping across drain/commit/restore."""
+from database.batcher import StatsBatcher
+
+DAY = "2024-03-10"
+
+
+def test_restore_puts_back_the_event_count():
+    batcher = StatsBatcher(max_buffered_events=10)
+    for _ in range(6):
+        batcher.add("Steve", DAY, deaths=1) # One key, six increments
+    batcher.add("Alex", DAY, advancements=1)
+    assert batcher.drain() == {("Steve", DAY, "main"): [6, 0, 0], ("Alex", DAY, "main"): [0, 1, 0]}
+    assert batcher.pending_count() == 0
+
+    batcher.add("Steve", DAY, deaths=1)
+    batcher.restore() # The flush failed
+    assert batcher.pending_count() == 8
+    assert not batcher.add("Alex", DAY, deaths=1) # 9 of 10
+    assert batcher.add("Alex", DAY, deaths=1)
+
+
+def test_unfinished_flush_is_counted_again():
+    batcher = StatsBatcher(max_buffered_events=10)
+    for _ in range(4):
+        batcher.add("Steve", DAY, deaths=1)
+    batcher.drain() # Neither committed nor restored
+    batcher.add("Steve", DAY, deaths=1)
+    assert batcher.drain() == {("Steve", DAY, "main"): [5, 0, 0]}
+    batcher.restore()
+    assert batcher.pending_count() == 5
+    batcher.drain()
+    batcher.commit()
+    assert batcher.pending_count() == 0 and batcher.pending_totals() == {}
@@ -0,0 +1,25 @@
+"""The database/benchmark.py workloads, at sizes small enough to run with the tests.
+Each one raises AssertionError if its fast path disagrees with what it replaces."""
+from database import benchmark
+
+
+def test_rank_workload(db_dir):
+    timings = benchmark.run_rank_benchmark(players=500, lookups=50, sort_lookups=5)
+    assert set(timings) == {'startup', 'index', 'sort', 'record_death'}
+
+
+def test_replay_workload(db_dir):
+    summary = benchmark.run_replay_benchmark(players=20, event_count=5000, days=30)
+    assert 0 < summary['events'] < 5000 # Joins don't change any aggregate, so replay skips them
+    assert summary['history_rows'] > 0
+
+
+def test_bulk_workload(db_dir):
+    timings = benchmark.run_bulk_benchmark(players=200, rounds=2)
+    assert set(timings) == {'save_daily_stats', 'clear_online_players', 'bulk_update_history'}
+
+
+def test_backup_workload(db_dir):
+    results = benchmark.run_backup_benchmark(players=20, event_count=5000, idle_seconds=0.05, gzip_levels=(1,))
+    assert results[1]['snapshot_bytes'] > 0
+    assert results[1]['stall'] > 0
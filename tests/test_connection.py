@@ -0,0 +1,53 @@
+"""Nested write() blocks (database/connection.py)."""
+import pytest
+from database.connection import ConnectionManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+    with manager.write() as conn:
+        conn.execute("CREATE TABLE t (value INTEGER)")
+    yield manager
+    manager.close()
+
+
+def values(manager):
+    with manager.read() as conn:
+        return [row[0] for row in conn.execute("SELECT value FROM t ORDER BY value")]
+
+
+def test_caught_inner_failure_is_undone(manager):
+    with manager.write() as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+        try:
+            with manager.write() as inner:
+                inner.execute("INSERT INTO t VALUES (2)")
+                raise ValueError("inner block fails")
+        except ValueError:
+            pass
+        with manager.write() as inner:
+            inner.execute("INSERT INTO t VALUES (3)")
+    assert values(manager) == [1, 3]
+
+
+def test_inner_failure_before_any_outer_write(manager):
+    with manager.write() as conn:
+        try:
+            with manager.write() as inner:
+                inner.execute("INSERT INTO t VALUES (2)")
+                raise ValueError("inner block fails")
+        except ValueError:
+            pass
+        conn.execute("INSERT INTO t VALUES (1)")
+    assert values(manager) == [1]
+
+
+def test_inner_block_commits_with_the_outer_one(manager):
+    with pytest.raises(ValueError):
+        with manager.write() as conn:
+            with manager.write() as inner:
+                inner.execute("INSERT INTO t VALUES (2)") # Opens the transaction itself
+            assert values(manager) == [] # Not committed by the inner block
+            raise ValueError("outer block fails")
+    assert values(manager) == []
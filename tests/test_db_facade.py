@@ -0,0 +1,122 @@
+"""The async facade (database/db.py) must keep the event loop responsive while a query runs."""
+import asyncio
+import time
+from database import db
+from database.memory_storage import MemoryStorage
+
+SLOW_QUERY_SECONDS = 0.5
+PROBE_INTERVAL = 0.01
+
+
+class SlowStorage(MemoryStorage):
+    """In-memory storage whose reads and writes take SLOW_QUERY_SECONDS."""
+
+    def get_all_players(self):
+        time.sleep(SLOW_QUERY_SECONDS)
+        return super().get_all_players()
+
+    def record_death(self, *args, **kwargs):
+        time.sleep(SLOW_QUERY_SECONDS)
+        return super().record_death(*args, **kwargs)
+
+
+async def probe_loop(coro):
+    """Await `coro` while a probe coroutine wakes every PROBE_INTERVAL.
+    Returns (result, how late each probe wakeup was in seconds).
+    """
+    delays = []
+
+    async def probe():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            delays.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+    task = asyncio.create_task(probe())
+    await asyncio.sleep(0) # Let the probe start before the query does
+    try:
+        result = await coro
+        await asyncio.sleep(PROBE_INTERVAL * 2) # Record the wakeup that was due while it ran
+        return result, delays
+    finally:
+        task.cancel()
+
+
+def run_with_slow_storage(make_coro):
+    previous = db.current_storage()
+    storage = db.use_storage(SlowStorage())
+    try:
+        storage.initialize_database()
+        return asyncio.run(probe_loop(make_coro()))
+    finally:
+        db.use_storage(previous)
+
+
+def test_probe_detects_a_blocked_loop():
+    async def blocking():
+        time.sleep(SLOW_QUERY_SECONDS) # What a direct query call on the loop would do
+
+    _, delays = asyncio.run(probe_loop(blocking()))
+    assert max(delays) > SLOW_QUERY_SECONDS / 2
+
+
+def test_slow_read_does_not_block_the_loop():
+    started = time.perf_counter()
+    players, delays = run_with_slow_storage(db.get_all_players)
+    assert time.perf_counter() - started >= SLOW_QUERY_SECONDS
+    assert players # The seeded players came back
+    assert len(delays) >= SLOW_QUERY_SECONDS / PROBE_INTERVAL / 2
+    assert max(delays) < 0.1
+
+
+def test_slow_write_does_not_block_the_loop():
+    _, delays = run_with_slow_storage(lambda: db.record_death("Steve"))
+    assert len(delays) >= SLOW_QUERY_SECONDS / PROBE_INTERVAL / 2
+    assert max(delays) < 0.1
+
+
+class FakeAuthor(str):
+    """A Discord member: str() is the user name."""
+
+    @property
+    def mention(self):
+        return f"@{self}"
+
+
+class FakeContext:
+    """Just enough of a discord.py Context for the stats commands."""
+
+    def __init__(self, author):
+        self.author = FakeAuthor(author)
+        self.sent = []
+        self.message = self
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def send(self, content=None, embed=None):
+        self.sent.append(embed.description if embed else content)
+
+
+def test_commands_run_on_memory_storage():
+    from commands.player_stats import deaths_command, resolve_player
+
+    async def main():
+        await db.add_player("Steve", "steve_d")
+        await db.record_death("Steve")
+        assert await db.canonical_minecraft("STEVE") == "Steve"
+        assert await db.discord_from_minecraft("steve") == "steve_d"
+        ctx = FakeContext("Steve_D") # Discord names match in any case
+        assert await resolve_player(ctx) == ("Steve", "@Steve_D")
+        await deaths_command(ctx, None)
+        await deaths_command(ctx, None, "nobody")
+        return ctx.sent
+
+    previous = db.current_storage()
+    try:
+        db.use_storage(MemoryStorage()).initialize_database()
+        sent = asyncio.run(main())
+    finally:
+        db.use_storage(previous)
+    assert "**Steve** has died **1** times" in sent[0]
+    assert sent[1].startswith("Could not find a matching player for 'nobody'")
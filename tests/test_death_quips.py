@@ -0,0 +1,70 @@
+"""Per-player shuffle bags in tasks/death_quips.py, with a seeded RNG."""
+import random
+import pytest
+from tasks.death_quips import QuipCatalog, parse_quips
+
+QUIPS = [f"Quip {i} for {{player}}" for i in range(5)]
+
+
+@pytest.fixture
+def seeded():
+    """The global RNG (used for new bag seeds) seeded, and put back afterwards."""
+    state = random.getstate()
+    random.seed(34)
+    yield
+    random.setstate(state)
+
+
+@pytest.fixture
+def catalog(tmp_path, seeded):
+    path = tmp_path / "death_quips.txt"
+    path.write_text("# Death quips\n\n" + "\n".join(QUIPS) + "\n", encoding="utf-8")
+    catalog = QuipCatalog(str(path))
+    assert catalog.load() == (len(QUIPS), 0)
+    return catalog
+
+
+def picks(catalog, minecraft_username, count):
+    return [catalog.pick(minecraft_username)[0] for _ in range(count)]
+
+
+def test_parse_quips():
+    lines = ["{player} fell", "# comment", "", "{player} met {killer}", "unbalanced {player", "no name at all"]
+    assert parse_quips(lines) == (["{player} fell", "no name at all"], ["{player} met {killer}", "unbalanced {player"])
+
+
+def test_no_repeat_until_the_bag_is_used_up(catalog):
+    dealt = picks(catalog, "Steve", len(QUIPS) * 20)
+    for start in range(0, len(dealt), len(QUIPS)):
+        assert sorted(dealt[start:start + len(QUIPS)]) == sorted(q.format(player="Steve") for q in QUIPS)
+    # Not even across the end of a bag
+    assert all(a != b for a, b in zip(dealt, dealt[1:]))
+
+
+def test_players_have_their_own_bags(catalog):
+    steve = picks(catalog, "Steve", 3)
+    alex = picks(catalog, "Alex", len(QUIPS))
+    assert len(set(alex)) == len(QUIPS) # Alex's deaths don't use up Steve's bag
+    steve += picks(catalog, "Steve", len(QUIPS) - 3)
+    assert len(set(steve)) == len(QUIPS)
+
+
+def test_a_restored_bag_continues_where_it_left_off(catalog):
+    for _ in range(3):
+        _, saved = catalog.pick("Steve")
+    expected = picks(catalog, "Steve", 2)
+
+    restarted = QuipCatalog(catalog.path)
+    restarted.load()
+    restarted.restore([("Steve", *saved)])
+    assert picks(restarted, "Steve", 2) == expected
+
+
+def test_a_bag_from_another_catalog_starts_over(catalog):
+    _, saved = catalog.pick("Steve")
+    with open(catalog.path, 'a', encoding="utf-8") as f:
+        f.write("One more for {player}\n")
+    catalog.load()
+    dealt = picks(catalog, "Steve", len(QUIPS) + 1)
+    assert len(set(dealt)) == len(QUIPS) + 1
+    assert catalog.pick("Steve")[1][0] != saved[0]
@@ -0,0 +1,55 @@
+"""Ordering and isolation of the stages in tasks/event_pipeline.py."""
+import asyncio
+from database.events import EVENT_JOIN, EVENT_SERVER_STOP
+from tasks.event_pipeline import EventPipeline
+
+SLOW_EFFECT_SECONDS = 0.3
+
+
+def run_pipeline(events, slow_kind=None):
+    """Push (kind, name) events through a pipeline whose `slow_kind` effects take
+    SLOW_EFFECT_SECONDS. Returns the order effects ran in and how long it took until
+    every event was persisted.
+    """
+    effects = []
+
+    async def persist(kind, minecraft_username, message, server=None, log_event=None):
+        return minecraft_username
+
+    async def side_effects(kind, minecraft_username, message, result, server=None):
+        if kind == slow_kind:
+            await asyncio.sleep(SLOW_EFFECT_SECONDS)
+        effects.append((kind, minecraft_username))
+
+    async def refresh(stats_changed):
+        pass
+
+    async def main():
+        pipeline = EventPipeline(persist, side_effects, refresh, workers=4)
+        pipeline.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for kind, minecraft_username in events:
+            await pipeline.submit(kind, minecraft_username)
+        await pipeline.persisted()
+        persisted_after = loop.time() - started
+        await pipeline.stop()
+        return effects, persisted_after
+
+    return asyncio.run(main())
+
+
+def test_server_stop_effects_run_between_the_player_effects():
+    before = [(EVENT_JOIN, f"Player{i}") for i in range(8)]
+    after = [(EVENT_JOIN, f"Late{i}") for i in range(8)]
+    effects, _ = run_pipeline(before + [(EVENT_SERVER_STOP, None)] + after)
+    stop = effects.index((EVENT_SERVER_STOP, None))
+    assert sorted(effects[:stop]) == sorted(before)
+    assert sorted(effects[stop + 1:]) == sorted(after)
+
+
+def test_slow_server_effects_do_not_hold_up_persistence():
+    events = [(EVENT_SERVER_STOP, None), (EVENT_JOIN, "Steve"), (EVENT_SERVER_STOP, None), (EVENT_JOIN, "Alex")]
+    effects, persisted_after = run_pipeline(events, slow_kind=EVENT_SERVER_STOP)
+    assert persisted_after < SLOW_EFFECT_SECONDS
+    assert effects == events
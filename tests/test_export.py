@@ -0,0 +1,93 @@
+"""Exports (database/export.py) read back to the rows they were written from, on both storage backends."""
+import asyncio
+import csv
+import datetime
+import gzip
+import json
+import pytest
+from database import db, sqlite_storage
+from database.export import EXPORT_TABLES
+from database.memory_storage import MemoryStorage
+
+PLAYERS = {"Steve": "Steve, Jr.#0001", "Émilie": "émilie#0002"} # A comma for CSV quoting, non-ASCII for the encoding
+
+
+def utc_ts(day, hour=12):
+    return int(datetime.datetime(2024, 3, day, hour, tzinfo=datetime.timezone.utc).timestamp())
+
+
+# (date, server_id, minecraft_username, deaths, advancements, playtime_seconds), in export order
+HISTORY = [
+    ("2024-03-01", "creative", "Steve", 0, 1, 0),
+    ("2024-03-01", "main", "Steve", 2, 0, 0),
+    ("2024-03-02", "main", "Émilie", 1, 0, 0),
+    ("2024-03-03", "main", "Steve", 0, 0, 600),
+]
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request):
+    previous = db.current_storage()
+    if request.param == 'sqlite':
+        request.getfixturevalue('fresh_db')
+        storage = db.use_storage(sqlite_storage)
+    else:
+        storage = db.use_storage(MemoryStorage())
+        storage.initialize_database()
+    for name, discord_username in PLAYERS.items():
+        storage.add_player(name, discord_username)
+    for date, server_id, name, deaths, advancements, playtime in HISTORY:
+        day = int(date[-2:])
+        for _ in range(deaths):
+            storage.record_death(name, server_id=server_id, ts=utc_ts(day))
+        for _ in range(advancements):
+            storage.record_advancement(name, server_id=server_id, ts=utc_ts(day))
+        if playtime:
+            storage.record_login(name, server_id=server_id, ts=utc_ts(day))
+            storage.record_logout(name, server_id=server_id, ts=utc_ts(day) + playtime)
+    yield storage # Still buffered: db.export_stats flushes first
+    db.use_storage(previous)
+
+
+def read_export(path, fmt, table):
+    """Rows of an export as tuples in EXPORT_TABLES column order, with numbers as ints."""
+    columns = EXPORT_TABLES[table][1]
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        if fmt == 'jsonl':
+            records = [json.loads(line) for line in f]
+        else:
+            reader = csv.reader(f)
+            assert tuple(next(reader)) == columns
+            records = [dict(zip(columns, row)) for row in reader]
+    return [tuple(int(r[c]) if c.endswith(("deaths", "advancements", "seconds")) else r[c] for c in columns)
+            for r in records]
+
+
+def export(tmp_path, table, fmt, **filters):
+    path = str(tmp_path / f"{table}.{fmt}.gz")
+    summary = asyncio.run(db.export_stats(table, fmt, path, chunk_size=3, **filters))
+    rows = read_export(path, fmt, table)
+    assert summary['rows'] == len(rows)
+    return rows
+
+
+@pytest.mark.parametrize("fmt", ['csv', 'jsonl'])
+def test_history_round_trip(storage, tmp_path, fmt):
+    assert export(tmp_path, 'history', fmt) == HISTORY
+    assert export(tmp_path, 'history', fmt, start_date="2024-03-02", end_date="2024-03-03") == HISTORY[2:]
+    assert export(tmp_path, 'history', fmt, player="Steve") == [row for row in HISTORY if row[2] == "Steve"]
+
+
+@pytest.mark.parametrize("fmt", ['csv', 'jsonl'])
+def test_players_round_trip(storage, tmp_path, fmt):
+    rows = export(tmp_path, 'players', fmt)
+    assert rows == sorted(tuple(row[:5]) for row in storage.get_all_players())
+    assert ("Steve", "Steve, Jr.#0001", 2, 1, 600) in rows
+    assert ("Émilie", "émilie#0002", 1, 0, 0) in rows
+    assert export(tmp_path, 'players', fmt, player="Émilie") == [("Émilie", "émilie#0002", 1, 0, 0)]
+
+
+def test_bad_arguments_leave_no_file(storage, tmp_path):
+    with pytest.raises(ValueError):
+        asyncio.run(db.export_stats('players', 'csv', str(tmp_path / "players.csv.gz"), start_date="2024-03-01"))
+    assert list(tmp_path.glob("players*")) == []
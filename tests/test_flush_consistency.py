@@ -0,0 +1,75 @@
+"""Reads that run while flush_pending_stats commits must count every buffered increment once."""
+import threading
+from database.batcher import stats_batcher
+
+PLAYER = "LuigiTime34"
+DEATHS = 2 # Column of player_stats rows
+
+
+def test_read_during_flush_commit(fresh_db, monkeypatch):
+    q = fresh_db
+    for _ in range(3):
+        q.record_death(PLAYER)
+    assert q.get_leaderboard_snapshot().stats_for(PLAYER)[DEATHS] == 3 # Cached before the flush
+
+    seen = {}
+    def read():
+        seen['stats'] = q.get_player_stats(PLAYER)
+        seen['snapshot'] = q.get_leaderboard_snapshot()
+        seen['range'] = q.get_stats_for_period(1)
+
+    # Start a read right after the SQL commit, before the in-flight deltas are dropped
+    commit = stats_batcher.commit
+    readers = []
+    def commit_with_reader():
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(0.2) # Long enough to finish, unless the flush holds it off
+        readers.append(reader.is_alive())
+        commit()
+        readers.append(reader)
+    monkeypatch.setattr(stats_batcher, 'commit', commit_with_reader)
+
+    assert q.flush_pending_stats() == 1
+    blocked, reader = readers
+    reader.join()
+    assert blocked # Waited for the flush to publish
+    assert seen['stats'][DEATHS] == 3
+    assert seen['snapshot'].stats_for(PLAYER)[DEATHS] == 3
+    assert dict((row[0], row[1]) for row in seen['range'])[PLAYER] == 3
+    assert q.get_leaderboard_snapshot().stats_for(PLAYER)[DEATHS] == 3
+
+
+def test_concurrent_reads_never_miss_or_double_count(fresh_db):
+    q = fresh_db
+    total = 600
+    done = threading.Event()
+    errors = []
+
+    def write():
+        try:
+            for i in range(total):
+                q.record_death(PLAYER) # Flushes itself every STATS_MAX_BUFFERED_EVENTS
+                if i % 37 == 0:
+                    q.flush_pending_stats()
+            q.flush_pending_stats()
+        finally:
+            done.set()
+
+    def read():
+        last = 0
+        while not done.is_set():
+            for deaths in (q.get_player_stats(PLAYER)[DEATHS], q.get_leaderboard_snapshot().stats_for(PLAYER)[DEATHS]):
+                # A double count overshoots the writer, a missed delta goes backwards
+                if not last <= deaths <= total:
+                    errors.append((last, deaths))
+                last = max(last, deaths)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    write()
+    for reader in readers:
+        reader.join()
+    assert not errors
+    assert q.get_player_stats(PLAYER)[DEATHS] == total
@@ -0,0 +1,183 @@
+"""Reading events from the server log (ingest/log_tailer.py) and saving where it got to."""
+import datetime
+import gzip
+import os
+import pytest
+from database.batcher import stats_batcher
+from database.connection import read_connection
+from database.events import event_log, EVENT_JOIN, EVENT_LEAVE, EVENT_DEATH, EVENT_ADVANCEMENT, EVENT_SERVER_START, EVENT_SERVER_STOP
+from database.memory_storage import MemoryStorage
+from ingest.log_tailer import LogTailer, parse_log_line, SERVER_LOG_SOURCE
+
+PLAYER = "LuigiTime34"
+FIRST_LINE = "[09:00:00] [Server thread/INFO]: Starting minecraft server version 1.21.4\n"
+
+
+def local_ts(day, hour, minute, second=0):
+    return int(datetime.datetime(2024, 3, day, hour, minute, second).timestamp())
+
+
+def write_log(path, lines, written, mode='w'):
+    """Write lines to a log file and set its mtime to `written` (a local datetime)."""
+    with open(path, mode) as f:
+        f.writelines(lines)
+    os.utime(path, (written.timestamp(), written.timestamp()))
+
+
+def test_parse_log_line():
+    assert parse_log_line(f"[12:34:56] [Server thread/INFO]: {PLAYER} joined the game") == (EVENT_JOIN, PLAYER, datetime.time(12, 34, 56))
+    assert parse_log_line(f"[12:34:56 INFO]: {PLAYER} left the game") == (EVENT_LEAVE, PLAYER, datetime.time(12, 34, 56))
+    assert parse_log_line(f"[01:02:03] [Server thread/INFO]: {PLAYER} was shot by Skeleton")[:2] == (EVENT_DEATH, PLAYER)
+    assert parse_log_line(f"[01:02:03] [Server thread/INFO]: {PLAYER} has made the advancement [Stone Age]")[:2] == (EVENT_ADVANCEMENT, PLAYER)
+    assert parse_log_line('[01:02:03] [Server thread/INFO]: Done (3.2s)! For help, type "help"')[:2] == (EVENT_SERVER_START, None)
+    assert parse_log_line("[01:02:03] [Server thread/INFO]: Stopping the server")[:2] == (EVENT_SERVER_STOP, None)
+    assert parse_log_line(f"[01:02:03] [Server thread/INFO]: <{PLAYER}> {PLAYER} joined the game") is None # Chat
+    assert parse_log_line(f"[99:00:00] [Server thread/INFO]: {PLAYER} joined the game") is None
+
+
+def test_events_carry_line_time_and_position(tmp_path):
+    log = tmp_path / "latest.log"
+    join = f"[23:50:00] [Server thread/INFO]: {PLAYER} joined the game\n"
+    leave = f"[00:10:00] [Server thread/INFO]: {PLAYER} left the game\n" # After midnight
+    write_log(log, [FIRST_LINE, join, leave], datetime.datetime(2024, 3, 11, 0, 15))
+    tailer = LogTailer(str(log), 0, None)
+
+    events, (offset, fingerprint) = tailer.read_events()
+    assert [(e.kind, e.username, e.ts) for e in events] == [
+        (EVENT_JOIN, PLAYER, local_ts(10, 23, 50)), (EVENT_LEAVE, PLAYER, local_ts(11, 0, 10)),
+    ]
+    assert events[0].position == (SERVER_LOG_SOURCE, len(FIRST_LINE) + len(join), fingerprint)
+    assert events[1].position == (SERVER_LOG_SOURCE, offset, fingerprint) == (SERVER_LOG_SOURCE, os.path.getsize(log), fingerprint)
+
+
+# Three days in one file: the times go backwards at each midnight, on any line
+SEVERAL_DAYS = [
+    FIRST_LINE,
+    f"[22:00:00] [Server thread/INFO]: {PLAYER} joined the game\n",
+    "[06:00:00] [Server thread/INFO]: Saving the game (this may take a moment!)\n",
+    f"[23:00:00] [Server thread/INFO]: {PLAYER} was slain by Zombie\n",
+    "[00:30:00] [Server thread/WARN]: Can't keep up! Is the server overloaded?\n",
+    f"[01:00:00] [Server thread/INFO]: {PLAYER} left the game\n",
+]
+SEVERAL_DAYS_EVENTS = [(EVENT_JOIN, local_ts(8, 22, 0)), (EVENT_DEATH, local_ts(9, 23, 0)), (EVENT_LEAVE, local_ts(10, 1, 0))]
+
+
+def test_a_log_spanning_several_days(tmp_path):
+    log = tmp_path / "latest.log"
+    write_log(log, SEVERAL_DAYS, datetime.datetime(2024, 3, 10, 1, 5))
+    events, _ = LogTailer(str(log), 0, None).read_events()
+    assert [(e.kind, e.ts) for e in events] == SEVERAL_DAYS_EVENTS
+
+
+@pytest.mark.parametrize("max_bytes", [40, 100])
+def test_reading_in_chunks_dates_lines_the_same(tmp_path, max_bytes):
+    log = tmp_path / "latest.log"
+    write_log(log, SEVERAL_DAYS, datetime.datetime(2024, 3, 10, 1, 5))
+    tailer = LogTailer(str(log), 0, None)
+    events = []
+    while tailer.offset < os.path.getsize(log):
+        read, _ = tailer.read_events(max_bytes)
+        events.extend(read)
+    assert [(e.kind, e.ts) for e in events] == SEVERAL_DAYS_EVENTS
+
+
+def test_a_line_longer_than_max_bytes_is_read_whole(tmp_path):
+    log = tmp_path / "latest.log"
+    long_line = f"[10:00:00] [Server thread/INFO]: {PLAYER} has made the advancement [{'x' * 200}]\n"
+    write_log(log, [FIRST_LINE, long_line], datetime.datetime(2024, 3, 10, 12, 0))
+    tailer = LogTailer(str(log), 0, None)
+    assert tailer.read(max_bytes=64)[0][0].text == FIRST_LINE.rstrip("\n") # Longer than 64 bytes too
+    events, (offset, _) = tailer.read_events(max_bytes=64)
+    assert [(e.kind, e.ts) for e in events] == [(EVENT_ADVANCEMENT, local_ts(10, 10, 0))]
+    assert offset == os.path.getsize(log)
+
+    # Still being written: nothing to read yet, and nothing skipped
+    write_log(log, [f"[11:00:00] [Server thread/INFO]: {'y' * 200}"], datetime.datetime(2024, 3, 10, 12, 0), mode='a')
+    assert tailer.read(max_bytes=64) == ([], (offset, tailer.fingerprint))
+
+
+def test_resume_from_saved_offset(tmp_path):
+    log = tmp_path / "latest.log"
+    written = datetime.datetime(2024, 3, 10, 12, 0)
+    write_log(log, [FIRST_LINE, f"[10:00:00] [Server thread/INFO]: {PLAYER} joined the game\n"], written)
+    events, (offset, fingerprint) = LogTailer(str(log), 0, None).read_events()
+    assert len(events) == 1
+
+    # Restarted with the saved position: only the lines written since, plus a half-written one kept for later
+    write_log(log, [f"[11:00:00] [Server thread/INFO]: {PLAYER} left the game\n", "[11:00:01] [Server"], written, mode='a')
+    events, (resumed, _) = LogTailer(str(log), offset, fingerprint).read_events()
+    assert [(e.kind, e.ts) for e in events] == [(EVENT_LEAVE, local_ts(10, 11, 0))]
+    assert resumed == os.path.getsize(log) - len("[11:00:01] [Server")
+
+
+def test_rotation_reads_the_rest_of_the_archive(tmp_path):
+    log = tmp_path / "latest.log"
+    old_lines = [FIRST_LINE, f"[10:00:00] [Server thread/INFO]: {PLAYER} joined the game\n"]
+    write_log(log, old_lines, datetime.datetime(2024, 3, 10, 10, 0))
+    tailer = LogTailer(str(log), 0, None)
+    tailer.read_events()
+    old_fingerprint = tailer.fingerprint
+
+    # More lines, then the server rotates the log before we read them (bot offline over midnight)
+    rest = f"[23:59:00] [Server thread/INFO]: {PLAYER} left the game\n"
+    with gzip.open(tmp_path / "2024-03-10-1.log.gz", 'wt') as f:
+        f.writelines(old_lines + [rest])
+    new_first = "[00:00:01] [Server thread/INFO]: Starting minecraft server version 1.21.4\n"
+    write_log(log, [new_first, f"[00:05:00] [Server thread/INFO]: {PLAYER} joined the game\n"], datetime.datetime(2024, 3, 11, 0, 5))
+
+    events, (offset, fingerprint) = tailer.read_events()
+    assert [(e.kind, e.ts) for e in events] == [(EVENT_LEAVE, local_ts(10, 23, 59)), (EVENT_JOIN, local_ts(11, 0, 5))]
+    # The archived line's position is in the old file: resuming from it reads the archive again
+    assert events[0].position == (SERVER_LOG_SOURCE, len("".join(old_lines + [rest])), old_fingerprint)
+    assert (offset, fingerprint) == (os.path.getsize(log), events[1].position[2])
+    assert fingerprint != old_fingerprint
+
+
+def test_truncation_starts_over(tmp_path):
+    log = tmp_path / "latest.log"
+    written = datetime.datetime(2024, 3, 10, 12, 0)
+    write_log(log, [FIRST_LINE, f"[10:00:00] [Server thread/INFO]: {PLAYER} joined the game\n"], written)
+    tailer = LogTailer(str(log), 0, None)
+    tailer.read_events()
+
+    write_log(log, [FIRST_LINE], written) # Same first line, but shorter than what was read: truncated
+    write_log(log, [f"[11:00:00] [Server thread/INFO]: {PLAYER} left the game\n"], written, mode='a')
+    events, (offset, _) = tailer.read_events()
+    assert [e.kind for e in events] == [EVENT_LEAVE]
+    assert offset == os.path.getsize(log)
+
+
+def test_playtime_uses_line_times(fresh_db):
+    q = fresh_db
+    q.record_login(PLAYER, ts=local_ts(10, 10, 0), position=(SERVER_LOG_SOURCE, 100, "abc"))
+    assert q.record_logout(PLAYER, ts=local_ts(10, 11, 30), position=(SERVER_LOG_SOURCE, 200, "abc")) == 5400
+    q.flush_pending_stats()
+    assert q.get_player_stats(PLAYER)[4] == 5400
+    assert q.get_ingest_offset(SERVER_LOG_SOURCE) == (200, "abc")
+    day = datetime.datetime.fromtimestamp(local_ts(10, 11, 30), datetime.timezone.utc).strftime("%Y-%m-%d")
+    with read_connection() as conn:
+        assert conn.execute("SELECT date, playtime_seconds FROM stats_history").fetchall() == [(day, 5400)]
+
+
+def test_offset_is_saved_with_the_event_that_fills_the_buffer(fresh_db, monkeypatch):
+    """An event that fills a buffer is flushed whole, together with its offset: a flush
+    in between would save it without the offset, and a restart would read it again."""
+    q = fresh_db
+    monkeypatch.setattr(stats_batcher, 'max_buffered_events', 1)
+    monkeypatch.setattr(event_log, 'max_buffered_events', 1)
+    for line in range(1, 4):
+        q.record_death(PLAYER, position=(SERVER_LOG_SOURCE, line, "abc"))
+        with read_connection() as conn:
+            assert conn.execute('''
+                SELECT (SELECT offset FROM ingest_offsets),
+                       (SELECT COUNT(*) FROM events WHERE event_type = ?),
+                       (SELECT deaths FROM player_stats WHERE minecraft_username = ?)
+            ''', (EVENT_DEATH, PLAYER)).fetchone() == (line, line, line)
+
+
+def test_memory_storage_saves_positions():
+    storage = MemoryStorage()
+    storage.initialize_database()
+    storage.record_login(PLAYER, ts=local_ts(10, 10, 0), position=(SERVER_LOG_SOURCE, 100, "abc"))
+    assert storage.record_logout(PLAYER, ts=local_ts(10, 10, 30), position=(SERVER_LOG_SOURCE, 200, "abc")) == 1800
+    assert storage.get_ingest_offset(SERVER_LOG_SOURCE) == (200, "abc")
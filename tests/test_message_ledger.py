@@ -0,0 +1,91 @@
+"""A redelivered webhook message is counted once, whichever layer of the ledger (database/message_ledger.py) catches it."""
+import pytest
+from database import backfill, queries
+from database.events import EVENT_DEATH
+from database.message_ledger import MessageLedger
+
+PLAYER = "LuigiTime34"
+CACHE_SIZE = 2
+
+
+@pytest.fixture
+def ledger(fresh_db, monkeypatch):
+    """A small ledger in place of the process-wide one, so ids fall out of the LRU quickly."""
+    ledger = MessageLedger(cache_size=CACHE_SIZE)
+    monkeypatch.setattr(queries, 'message_ledger', ledger)
+    monkeypatch.setattr(backfill, 'message_ledger', ledger)
+    return ledger
+
+
+def restart(monkeypatch):
+    """Forget everything in memory, like a new process, and load the ledger from the table."""
+    queries.flush_pending_stats()
+    ledger = MessageLedger(cache_size=CACHE_SIZE)
+    monkeypatch.setattr(queries, 'message_ledger', ledger)
+    monkeypatch.setattr(backfill, 'message_ledger', ledger)
+    queries.initialize_database()
+    return ledger
+
+
+def deliver(message_id):
+    """What on_message does with a death message."""
+    if queries.claim_message(message_id):
+        queries.record_death(PLAYER, message_id=message_id)
+
+
+def deaths():
+    queries.flush_pending_stats()
+    return queries.get_player_stats(PLAYER)[2]
+
+
+def test_layers():
+    ledger = MessageLedger(cache_size=CACHE_SIZE)
+    ledger.load(100)
+    assert ledger.check(101) is False # Above the high-water mark
+    assert ledger.check(100) is None  # At or below it: only the table knows
+    for message_id in (101, 102, 103):
+        ledger.add(message_id, 0)
+    ledger.drain()
+    ledger.commit()
+    assert ledger.check(103) is True and ledger.check(102) is True # In the LRU
+    assert ledger.check(101) is None # Evicted, written
+    assert ledger.check(104) is False
+
+
+def test_redelivery_is_counted_once(ledger):
+    for message_id in range(1001, 1006):
+        deliver(message_id)
+    deliver(1005) # Recent: the LRU
+    deliver(1001) # Evicted but not yet flushed: the pending ids
+    assert ledger.check(1001) is True
+    assert deaths() == 5
+
+    deliver(1005) # Still in the LRU
+    deliver(1001) # Evicted and written: the table
+    assert ledger.check(1001) is True # Remembered again after the lookup
+    assert deaths() == 5
+    assert ledger.hits == 4
+
+
+def test_redelivery_after_restart(ledger, monkeypatch):
+    for message_id in range(1001, 1004):
+        deliver(message_id)
+    ledger = restart(monkeypatch)
+    assert ledger.check(1004) is False # The high-water mark came from the table
+    assert ledger.check(1003) is None
+    deliver(1003)
+    deliver(1001)
+    deliver(1004)
+    assert deaths() == 4
+
+
+def test_backfilled_ids_are_claimed(ledger, monkeypatch):
+    deliver(1001)
+    summary = backfill.backfill_webhook_events([(EVENT_DEATH, PLAYER, 1700000000, 1002)])
+    assert summary['recorded'] == 1
+    assert ledger.check(1002) is None # Raised the high-water mark; the table has it
+    deliver(1002)
+    restart(monkeypatch)
+    deliver(1001)
+    deliver(1002)
+    assert deaths() == 2
@@ -0,0 +1,48 @@
+"""Schema migrations (database/migrations.py) applied to databases from older versions."""
+import sqlite3
+from database import migrations
+
+
+def test_rollups_backfilled_from_existing_history(migrate_to):
+    conn = sqlite3.connect(":memory:")
+    assert migrate_to(conn, 2) == 2
+    conn.executemany(
+        "INSERT INTO stats_history (minecraft_username, date, deaths, advancements, playtime_seconds) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("Steve", "2025-03-01", 1, 2, 30),   # Saturday: week of Sunday 2025-02-23
+            ("Steve", "2025-03-02", 4, 0, 60),   # Sunday: starts its own week
+            ("Steve", "2025-03-08", 1, 1, 10),
+            ("Alex", "2025-02-28", 0, 5, 100),
+        ]
+    )
+
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    assert sorted(conn.execute("SELECT * FROM stats_weekly").fetchall()) == [
+        ("2025-02-23", "Alex", 0, 5, 100),
+        ("2025-02-23", "Steve", 1, 2, 30),
+        ("2025-03-02", "Steve", 5, 1, 70),
+    ]
+    assert sorted(conn.execute("SELECT * FROM stats_monthly").fetchall()) == [
+        ("2025-02", "Alex", 0, 5, 100),
+        ("2025-03", "Steve", 6, 3, 100),
+    ]
+
+
+def test_migrate_is_idempotent():
+    conn = sqlite3.connect(":memory:")
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    conn.commit()
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [m[0] for m in migrations.MIGRATIONS]
+
+
+def test_archive_rows_from_before_servers_belong_to_main(migrate_to):
+    conn = sqlite3.connect(":memory:")
+    migrate_to(conn, 11)
+    conn.execute("INSERT INTO stats_history_archive VALUES ('2023-11', 'Steve', 5, 2, 1000)")
+
+    migrations.migrate(conn)
+    assert conn.execute(
+        "SELECT month, server_id, minecraft_username, deaths, advancements, playtime_seconds FROM stats_history_archive"
+    ).fetchall() == [("2023-11", "main", "Steve", 5, 2, 1000)]
@@ -0,0 +1,53 @@
+"""Identity lookups through the player registry (database/player_registry.py), alone and behind both backends."""
+import pytest
+from database.memory_storage import MemoryStorage
+from database.player_registry import PlayerRegistry, registry
+
+
+def test_lookups_ignore_case():
+    players = PlayerRegistry()
+    players.load([("LuigiTime34", "luigi_is_better"), ("Block_Builder", "Kazzpyr"), ("AltAccount", "kazzpyr")])
+    assert players.canonical_minecraft("luigitime34") == "LuigiTime34"
+    assert players.minecraft_from_discord("LUIGI_IS_BETTER") == "LuigiTime34"
+    assert players.discord_from_minecraft("BLOCK_BUILDER") == "Kazzpyr"
+    assert players.minecraft_from_discord("kazzpyr") == "Block_Builder" # First linked account wins
+    assert players.canonical_minecraft("Nobody") is None
+    assert players.minecraft_from_discord(None) is None
+
+
+def test_add_and_remove_update_every_lookup():
+    players = PlayerRegistry()
+    players.load([("Block_Builder", "kazzpyr"), ("AltAccount", "Kazzpyr")])
+    players.add("NewPlayer", "newbie")
+    assert players.canonical_minecraft("newplayer") == "NewPlayer"
+    assert players.minecraft_from_discord("NEWBIE") == "NewPlayer"
+
+    players.remove("Block_Builder")
+    assert players.canonical_minecraft("block_builder") is None
+    assert players.minecraft_from_discord("kazzpyr") == "AltAccount" # The other account takes over
+    players.remove("AltAccount")
+    assert players.minecraft_from_discord("kazzpyr") is None
+    assert "AltAccount" not in players.mapping()
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request):
+    if request.param == 'sqlite':
+        return request.getfixturevalue('fresh_db')
+    storage = MemoryStorage()
+    storage.initialize_database()
+    return storage
+
+
+def test_player_stats_by_discord_name(storage):
+    storage.record_death("LuigiTime34")
+    assert storage.get_player_stats(discord_username="Luigi_Is_Better")[:3] == ("LuigiTime34", "luigi_is_better", 1)
+    assert storage.get_player_stats(discord_username="nobody") is None
+
+    assert storage.add_player("NewPlayer", "Newbie") is True
+    assert registry.canonical_minecraft("newplayer") == "NewPlayer"
+    assert storage.get_player_stats(discord_username="NEWBIE")[0] == "NewPlayer"
+
+    storage.delete_player("NewPlayer")
+    assert registry.canonical_minecraft("newplayer") is None
+    assert storage.get_player_stats(discord_username="newbie") is None
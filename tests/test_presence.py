@@ -0,0 +1,74 @@
+"""Diff suppression, merging and the rate budget in tasks/presence.py, on a virtual clock."""
+import asyncio
+import types
+import pytest
+from tasks import presence
+from tasks.presence import PresenceManager
+
+WINDOW = 5
+BUDGET = 2
+BUDGET_SECONDS = 60
+
+
+@pytest.fixture
+def loop(virtual_clock, monkeypatch):
+    """The virtual clock, also behind the manager's time.monotonic()."""
+    monkeypatch.setattr(presence, 'time', types.SimpleNamespace(monotonic=virtual_clock.time))
+    return virtual_clock
+
+
+def run(loop, requests, invalidate_at=None):
+    """set(text, urgent) at each (time, text, urgent) request and let everything settle.
+    Returns the (time, text) updates sent and the manager's stats."""
+    sent = []
+
+    async def send(text):
+        sent.append((loop.time(), text))
+
+    async def main():
+        manager = PresenceManager(send, window=WINDOW, budget=BUDGET, budget_seconds=BUDGET_SECONDS)
+        for at, text, urgent in requests:
+            await asyncio.sleep(at - loop.time())
+            if at == invalidate_at:
+                manager.invalidate()
+            manager.set(text, urgent)
+        await asyncio.sleep(BUDGET_SECONDS * 10)
+        return manager.stats()
+
+    stats = loop.run_until_complete(main())
+    return sent, stats
+
+
+def test_unchanged_text_is_not_sent(loop):
+    sent, stats = run(loop, [(0, "3 players", False), (10, "3 players", False), (20, "3 players", True)])
+    assert sent == [(WINDOW, "3 players")]
+    assert (stats['requests'], stats['sent'], stats['unchanged'], stats['pending']) == (3, 1, 2, False)
+
+
+def test_a_burst_sends_the_last_text(loop):
+    sent, _ = run(loop, [(0, "1 player", False), (1, "2 players", False), (2, "3 players", False)])
+    assert sent == [(WINDOW, "3 players")] # The window runs from the first change
+
+
+def test_a_change_undone_within_the_window_is_not_sent(loop):
+    sent, stats = run(loop, [(0, "1 player", False), (10, "2 players", False), (11, "1 player", False)])
+    assert sent == [(WINDOW, "1 player")]
+    assert stats['sent'] == 1
+
+
+def test_urgent_changes_skip_the_window(loop):
+    sent, _ = run(loop, [(0, "1 player", False), (1, "Server offline", True)])
+    assert sent == [(1, "Server offline")]
+
+
+def test_the_budget_delays_the_latest_text(loop):
+    requests = [(0, "A", True), (1, "B", True), (2, "C", True), (3, "D", True)]
+    sent, stats = run(loop, requests)
+    # Two sends per BUDGET_SECONDS: C is never shown, D waits for the first slot to free up
+    assert sent == [(0, "A"), (1, "B"), (BUDGET_SECONDS, "D")]
+    assert stats['throttled_seconds'] == BUDGET_SECONDS - 2
+
+
+def test_invalidate_sends_the_same_text_again(loop):
+    sent, _ = run(loop, [(0, "3 players", True), (10, "3 players", True)], invalidate_at=10)
+    assert sent == [(0, "3 players"), (10, "3 players")]
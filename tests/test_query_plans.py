@@ -0,0 +1,93 @@
+"""EXPLAIN QUERY PLAN checks: history ranges, leaderboards and Discord lookups must use their indexes."""
+import datetime
+import pytest
+from database import retention, rollups
+from database.connection import read_connection, write_connection
+
+PLAYERS = ("LuigiTime34", "Block_Builder")
+
+
+@pytest.fixture
+def history_db(fresh_db):
+    """fresh_db with five months of daily history on two servers."""
+    with write_connection() as conn:
+        rollups.upsert_history_rows(conn, [
+            (name, f"2025-{month:02d}-{day:02d}", 1, 1, 60, server)
+            for name in PLAYERS for month in range(1, 6) for day in range(1, 29) for server in ("main", "creative")
+        ])
+    fresh_db.record_death(PLAYERS[0], server_id="creative")
+    fresh_db.flush_pending_stats()
+    return fresh_db
+
+
+def query_plans(func, *args):
+    """Call a database.queries reader and return {sql: [plan detail lines]} for every statement it ran."""
+    statements = []
+    # The pool hands out the most recently returned reader first, so `func` gets this one
+    with read_connection() as conn:
+        conn.set_trace_callback(statements.append)
+    try:
+        func(*args)
+    finally:
+        with read_connection() as conn:
+            conn.set_trace_callback(None)
+            return {sql: [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")] for sql in statements}
+
+
+def assert_no_table_scan(plans):
+    for sql, plan in plans.items():
+        scans = [line for line in plan if line.startswith("SCAN ") and not line.startswith("SCAN (")]
+        assert not scans, f"{sql}\n{plan}"
+
+
+def plan_text(plans):
+    assert plans
+    return "\n".join(line for plan in plans.values() for line in plan)
+
+
+def test_single_date_uses_covering_index(history_db):
+    plans = query_plans(history_db.get_stats_for_date, "2025-02-14")
+    assert_no_table_scan(plans)
+    assert "SEARCH stats_history USING COVERING INDEX idx_stats_history_date_player (date=?)" in plan_text(plans)
+
+
+def test_date_range_uses_rollup_keys_and_covering_index(history_db):
+    # 2025-03 is a whole month, then whole weeks, then single days at both edges
+    plans = query_plans(history_db.get_stats_for_range, "2025-02-27", "2025-04-18")
+    assert_no_table_scan(plans)
+    text = plan_text(plans)
+    assert "SEARCH stats_monthly USING INDEX sqlite_autoindex_stats_monthly_1 (month=?)" in text
+    assert "SEARCH stats_weekly USING INDEX sqlite_autoindex_stats_weekly_1 (week_start=?)" in text
+    assert "SEARCH stats_history USING COVERING INDEX idx_stats_history_date_player (date=?)" in text
+
+
+def test_timeline_uses_history_and_rollup_keys(history_db):
+    for bucket, expected in (("day", "SEARCH stats_history USING COVERING INDEX idx_stats_history_date_player"),
+                             ("week", "SEARCH stats_weekly USING INDEX sqlite_autoindex_stats_weekly_1"),
+                             ("month", "SEARCH stats_monthly USING INDEX sqlite_autoindex_stats_monthly_1")):
+        plans = query_plans(history_db.get_players_timeline, list(PLAYERS), "2025-01-01", "2025-04-30", bucket)
+        assert_no_table_scan(plans)
+        assert expected in plan_text(plans)
+
+
+def test_server_leaderboard_uses_primary_key(history_db):
+    plans = query_plans(history_db.get_leaderboard_snapshot, "creative")
+    assert_no_table_scan(plans)
+    assert "SEARCH s USING PRIMARY KEY (server_id=?)" in plan_text(plans)
+
+
+def test_discord_lookup_uses_primary_key(history_db):
+    # The registry resolves the Discord name; only the primary key lookup reaches SQLite
+    plans = query_plans(history_db.get_player_stats, None, "KAZZPYR")
+    assert_no_table_scan(plans)
+    assert "SEARCH player_stats USING INDEX sqlite_autoindex_player_stats_1 (minecraft_username=?)" in plan_text(plans)
+
+
+def test_archived_range_uses_archive_key(history_db):
+    retention.retention_step(hot_days=30, today=datetime.date(2025, 5, 15)) # Archives January to March
+    # Archived weeks from Sunday 2025-02-16, then March's part of the week of 2025-03-30
+    plans = query_plans(history_db.get_stats_for_range, "2025-02-16", "2025-03-31")
+    assert_no_table_scan(plans)
+    text = plan_text(plans)
+    assert "SEARCH stats_history_archive USING INDEX sqlite_autoindex_stats_history_archive_1 (month=? AND week_start=?)" in text
+    assert "SEARCH stats_history_archive USING COVERING INDEX sqlite_autoindex_stats_history_archive_1" in text # MAX(month)
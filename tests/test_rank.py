@@ -0,0 +1,53 @@
+"""!rank standings through the database.db facade, on both storage backends."""
+import asyncio
+import pytest
+from database import db
+from database.memory_storage import MemoryStorage
+from database.rank_index import RankIndex, METRICS
+
+PLAYERS = ("LuigiTime34", "Block_Builder", "BurgersAreYumYum")
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request):
+    previous = db.current_storage()
+    if request.param == 'sqlite':
+        storage = db.use_storage(request.getfixturevalue('fresh_db'))
+    else:
+        storage = db.use_storage(MemoryStorage())
+        storage.initialize_database()
+    yield storage
+    db.use_storage(previous)
+
+
+def test_get_rank(storage):
+    for deaths, name in enumerate(PLAYERS):
+        for _ in range(deaths + 1):
+            storage.record_death(name)
+        storage.record_advancement(name)
+
+    rank, total, value, nearby = asyncio.run(db.get_rank("Block_Builder", 'deaths', 1))
+    assert value == 2
+    assert total >= len(PLAYERS)
+    assert [entry[1:] for entry in nearby] == [("LuigiTime34", 1), ("Block_Builder", 2), ("BurgersAreYumYum", 3)]
+    assert nearby[1][0] == rank
+
+    # Tied players share a rank
+    tied = {asyncio.run(db.get_rank(name, 'advancements'))[0] for name in PLAYERS}
+    assert tied == {1}
+    assert asyncio.run(db.get_rank("Nobody", 'deaths')) is None
+
+
+@pytest.mark.parametrize("batch", [2, 40]) # Moved one by one, and rebuilt (at least 1/REBUILD_SHARE of the players)
+def test_add_many_matches_add(batch):
+    rows = [(f"player_{i}", i % 7, i % 3, 60 * (i % 11)) for i in range(100)]
+    one_by_one, batched = RankIndex(), RankIndex()
+    one_by_one.load(rows)
+    batched.load(rows)
+    increments = [(f"player_{i}", 1, 0, 600) for i in range(0, batch * 2, 2)] + [("Nobody", 1, 1, 1)]
+    for name, d, a, p in increments:
+        one_by_one.add(name, d, a, p)
+    batched.add_many(increments)
+    for metric in METRICS:
+        assert batched.top(metric, 100) == one_by_one.top(metric, 100)
+        assert batched.rank("player_4", metric) == one_by_one.rank("player_4", metric)
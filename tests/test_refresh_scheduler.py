@@ -0,0 +1,94 @@
+"""Debouncing and coalescing in tasks/refresh_scheduler.py, on a virtual clock."""
+import asyncio
+import types
+import pytest
+from tasks import refresh_scheduler
+from tasks.refresh_scheduler import RefreshScheduler
+
+WINDOW = 5
+MAX_DELAY = 15
+
+
+@pytest.fixture
+def loop(virtual_clock, monkeypatch):
+    """The virtual clock, also behind the scheduler's time.monotonic()."""
+    monkeypatch.setattr(refresh_scheduler, 'time', types.SimpleNamespace(
+        monotonic=virtual_clock.time, perf_counter=virtual_clock.time, time=virtual_clock.time
+    ))
+    return virtual_clock
+
+
+def run(loop, triggers, refresh_seconds=0, flush_at=None):
+    """mark_dirty() at each of the `triggers` times, then wait for the refreshes to finish.
+    Returns (times the refreshes started, scheduler stats)."""
+    started = []
+
+    async def refresh():
+        started.append(loop.time())
+        await asyncio.sleep(refresh_seconds)
+
+    async def main():
+        scheduler = RefreshScheduler(refresh, window=WINDOW, max_delay=MAX_DELAY)
+        for at in triggers:
+            await asyncio.sleep(at - loop.time())
+            scheduler.mark_dirty()
+        if flush_at is not None:
+            await asyncio.sleep(flush_at - loop.time())
+            await scheduler.flush()
+        await asyncio.sleep(MAX_DELAY * 10)
+        await scheduler.flush()
+        return scheduler.stats()
+
+    stats = loop.run_until_complete(main())
+    return started, stats
+
+
+def test_a_burst_is_one_refresh(loop):
+    started, stats = run(loop, [0, 2, 4])
+    assert started == [4 + WINDOW] # Once the triggers stop for WINDOW seconds
+    assert (stats['triggers'], stats['refreshes'], stats['saved'], stats['pending']) == (3, 1, 2, False)
+
+
+def test_separate_bursts_refresh_separately(loop):
+    started, _ = run(loop, [0, 1, 20, 21])
+    assert started == [1 + WINDOW, 21 + WINDOW]
+
+
+def test_a_steady_stream_refreshes_every_max_delay(loop):
+    started, stats = run(loop, range(0, 40, 2))
+    # Never quiet for WINDOW seconds: each refresh is MAX_DELAY after the first trigger it shows
+    assert started == [0 + MAX_DELAY, 16 + MAX_DELAY, 38 + WINDOW]
+    assert stats['saved'] == 20 - 3
+
+
+def test_a_trigger_during_a_refresh_gets_a_trailing_one(loop):
+    started, stats = run(loop, [0, 7], refresh_seconds=10)
+    # The first refresh runs from 5 to 15; the change at 7 is already WINDOW old by then
+    assert started == [WINDOW, WINDOW + 10]
+    assert stats['refreshes'] == 2
+
+
+def test_flush_skips_the_wait(loop):
+    started, _ = run(loop, [0, 1], flush_at=2)
+    assert started == [2]
+
+
+def test_a_failed_refresh_is_counted_and_the_next_one_runs(loop):
+    calls = []
+
+    async def refresh():
+        calls.append(loop.time())
+        if len(calls) == 1:
+            raise RuntimeError("Discord is down")
+
+    async def main():
+        scheduler = RefreshScheduler(refresh, window=WINDOW, max_delay=MAX_DELAY)
+        scheduler.mark_dirty()
+        await asyncio.sleep(WINDOW * 2)
+        scheduler.mark_dirty()
+        await asyncio.sleep(WINDOW * 2)
+        return scheduler.stats()
+
+    stats = loop.run_until_complete(main())
+    assert calls == [WINDOW, WINDOW * 3]
+    assert (stats['refreshes'], stats['errors']) == (2, 1)
@@ -0,0 +1,115 @@
+"""Replaying the events log (database/replay.py) on a database that had stats before the log existed."""
+import calendar
+import sqlite3
+import pytest
+from database import queries
+from database.connection import read_connection, write_connection
+from database.memory_storage import MemoryStorage
+from database.replay import replay_events
+
+LUIGI, BLOCK = "LuigiTime34", "Block_Builder"
+
+
+def ts(date):
+    return calendar.timegm(tuple(int(part) for part in date.split("-")) + (12, 0, 0))
+
+
+@pytest.fixture
+def upgraded_db(db_dir, migrate_to):
+    """A schema version 10 stats.db with counters from before the events log, and some logged events,
+    then opened (and upgraded) by database.queries.
+    """
+    conn = sqlite3.connect("stats.db")
+    migrate_to(conn, 10)
+    conn.executemany("INSERT INTO player_stats VALUES (?, ?, ?, ?, ?)", [
+        (LUIGI, "luigi_is_better", 50, 20, 10000), # Mostly set by hand, no history behind it
+        (BLOCK, "kazzpyr", 2, 0, 500),
+    ])
+    conn.executemany("INSERT INTO server_stats VALUES (?, ?, ?, ?, ?)", [
+        ("main", LUIGI, 40, 20, 9700),
+        ("creative", LUIGI, 1, 0, 300), # player_stats has 9 deaths no server accounts for
+        ("main", BLOCK, 2, 0, 0),
+        ("creative", BLOCK, 0, 0, 500),
+    ])
+    conn.executemany(
+        "INSERT INTO stats_history (server_id, minecraft_username, date, deaths, advancements, playtime_seconds) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            ("main", LUIGI, "2024-01-05", 3, 1, 600),  # One of these deaths is in the log
+            ("creative", LUIGI, "2024-01-06", 1, 0, 300),
+            ("main", BLOCK, "2024-03-10", 2, 0, 0),    # All in the log
+            ("creative", BLOCK, "2024-03-10", 0, 0, 500),
+        ]
+    )
+    conn.execute("INSERT INTO stats_history_archive VALUES ('2023-11', ?, 5, 2, 1000)", (LUIGI,))
+    conn.execute("INSERT OR IGNORE INTO players (minecraft_username) VALUES (?), (?)", (LUIGI, BLOCK))
+    ids = dict(conn.execute("SELECT minecraft_username, id FROM players"))
+    conn.executemany("INSERT INTO events (event_type, player_id, ts, message_id, value, server_id) VALUES (?, ?, ?, ?, ?, ?)", [
+        (3, ids[LUIGI], ts("2024-01-05"), 1, 0, None),
+        (3, ids[BLOCK], ts("2024-03-10"), 2, 0, None),
+        (3, ids[BLOCK], ts("2024-03-10"), 3, 0, None),
+        (1, ids[BLOCK], ts("2024-03-10"), 4, 0, "creative"),
+        (2, ids[BLOCK], ts("2024-03-10") + 500, 5, 500, "creative"),
+    ])
+    conn.commit()
+    conn.close()
+    queries.initialize_database()
+    queries.rebuild_rollups()
+    return queries
+
+
+def aggregates():
+    """Everything a replay rebuilds, in comparable form (archived days are compared through stats_monthly)."""
+    with read_connection() as conn:
+        return {
+            'player_stats': conn.execute("SELECT * FROM player_stats ORDER BY 1").fetchall(),
+            'server_stats': conn.execute("SELECT * FROM server_stats WHERE deaths OR advancements OR playtime_seconds ORDER BY 1, 2").fetchall(),
+            'stats_history': conn.execute('''
+                SELECT server_id, minecraft_username, date, deaths, advancements, playtime_seconds FROM stats_history
+                WHERE date >= '2024-01-01' ORDER BY 1, 2, 3
+            ''').fetchall(),
+            'stats_monthly': conn.execute("SELECT * FROM stats_monthly ORDER BY 1, 2").fetchall(),
+        }
+
+
+def test_replay_keeps_counters_from_before_the_log(upgraded_db):
+    q = upgraded_db
+    before = aggregates()
+    assert replay_events(dry_run=True)['changes'] == {}
+
+    # Live events on top of the upgrade
+    q.record_death(LUIGI)
+    q.record_advancement(BLOCK, server_id="creative")
+    q.flush_pending_stats()
+    before = aggregates()
+
+    summary = replay_events()
+    assert summary['changes'] == {}
+    assert aggregates() == before
+    with read_connection() as conn:
+        # The archived month came back as history on its 1st, for retention to compact again
+        assert conn.execute("SELECT deaths, advancements, playtime_seconds FROM stats_history WHERE date = '2023-11-01'").fetchall() == [(5, 2, 1000)]
+
+
+def test_dry_run_reports_per_player_differences(upgraded_db):
+    with write_connection() as conn:
+        conn.execute("UPDATE player_stats SET deaths = deaths + 5, playtime_seconds = 7 WHERE minecraft_username = ?", (LUIGI,))
+    corrupted = aggregates()
+
+    summary = replay_events(dry_run=True)
+    assert summary['changes'] == {LUIGI: {'deaths': (55, 50), 'playtime': (7, 10000)}}
+    assert aggregates() == corrupted # Nothing written
+
+    assert replay_events()['changes'] == summary['changes']
+    assert replay_events(dry_run=True)['changes'] == {}
+
+
+def test_memory_replay_reports_no_changes_for_live_events():
+    storage = MemoryStorage()
+    storage.initialize_database()
+    storage.record_death(LUIGI)
+    storage.record_login(BLOCK, server_id="creative")
+    storage.record_logout(BLOCK, server_id="creative")
+    storage._players[LUIGI][1] += 3 # Corrupt a total
+    assert storage.replay_events(dry_run=True)['changes'] == {LUIGI: {'deaths': (4, 1)}}
+    storage.replay_events()
+    assert storage.get_player_stats(LUIGI)[2] == 1
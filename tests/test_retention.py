@@ -0,0 +1,160 @@
+"""Compacting old stats_history days into the archive (database/retention.py), and reading across both tiers."""
+import datetime
+import sqlite3
+import pytest
+from database import migrations, retention, rollups
+from database.connection import read_connection, write_connection
+
+LUIGI, BLOCK = "LuigiTime34", "Block_Builder"
+TODAY = datetime.date(2025, 6, 15)
+HOT_DAYS = 30 # Archive cutoff 2025-05-01
+
+
+def add_history(rows):
+    """Insert [(player, date, deaths, advancements, playtime, server_id)] the way a flush does."""
+    with write_connection() as conn:
+        rollups.upsert_history_rows(conn, rows)
+
+def compact(batch_size=1000):
+    """Run retention_step until it is caught up. Returns the number of steps taken."""
+    steps = 0
+    while retention.retention_step(batch_size, HOT_DAYS, TODAY):
+        steps += 1
+    return steps
+
+def table(sql):
+    with read_connection() as conn:
+        return conn.execute(sql).fetchall()
+
+def rollup_tables():
+    return table("SELECT * FROM stats_weekly ORDER BY 1, 2"), table("SELECT * FROM stats_monthly ORDER BY 1, 2")
+
+
+@pytest.fixture
+def tiered_db(fresh_db):
+    """fresh_db with daily history from February to mid June 2025 for two players on two servers."""
+    day, rows = datetime.date(2025, 2, 1), []
+    while day < TODAY:
+        i = day.toordinal()
+        rows.append((LUIGI, day.isoformat(), i % 3, i % 2, 60 * (i % 5), "main"))
+        rows.append((LUIGI, day.isoformat(), 1, 0, 30, "creative"))
+        if i % 4:
+            rows.append((BLOCK, day.isoformat(), i % 2, 1, 120, "creative"))
+        day += datetime.timedelta(days=1)
+    add_history(rows)
+    return fresh_db
+
+
+def test_archive_keeps_servers_and_weeks_apart(fresh_db):
+    add_history([
+        (LUIGI, "2025-03-03", 1, 0, 600, "main"),
+        (LUIGI, "2025-03-06", 2, 1, 300, "main"),      # Same week (Sunday 2025-03-02)
+        (LUIGI, "2025-03-06", 4, 0, 900, "creative"),
+        (BLOCK, "2025-03-31", 0, 2, 60, "creative"),   # Week of 2025-03-30, March part...
+        (BLOCK, "2025-04-01", 1, 0, 60, "creative"),   # ...and April part
+        (LUIGI, "2025-05-01", 1, 0, 30, "main"),       # Hot: stays a day row
+    ])
+    weekly, monthly = rollup_tables()
+    compact()
+
+    assert table('''
+        SELECT month, week_start, server_id, minecraft_username, deaths, advancements, playtime_seconds
+        FROM stats_history_archive ORDER BY 1, 2, 3
+    ''') == [
+        ("2025-03", "2025-03-02", "creative", LUIGI, 4, 0, 900),
+        ("2025-03", "2025-03-02", "main", LUIGI, 3, 1, 900),
+        ("2025-03", "2025-03-30", "creative", BLOCK, 0, 2, 60),
+        ("2025-04", "2025-03-30", "creative", BLOCK, 1, 0, 60),
+    ]
+    assert table("SELECT date FROM stats_history") == [("2025-05-01",)]
+    assert rollup_tables() == (weekly, monthly)
+
+
+def test_batches_move_whole_days(fresh_db):
+    add_history([(name, f"2025-03-{day:02}", 1, 0, 60, server)
+                 for day in range(1, 11) for name in (LUIGI, BLOCK) for server in ("main", "creative")])
+    assert compact(batch_size=3) > 1
+    assert table("SELECT server_id, minecraft_username, SUM(deaths) FROM stats_history_archive GROUP BY 1, 2 ORDER BY 1, 2") == [
+        ("creative", BLOCK, 10), ("creative", LUIGI, 10), ("main", BLOCK, 10), ("main", LUIGI, 10),
+    ]
+    assert table("SELECT COUNT(*) FROM stats_history") == [(0,)]
+
+
+def test_rebuild_keeps_archived_weeks(tiered_db):
+    q = tiered_db
+    before = rollup_tables()
+    compact()
+    assert table("SELECT MIN(date) FROM stats_history") == [("2025-05-01",)]
+    assert q.rebuild_rollups() == (len(before[0]), len(before[1]))
+    assert rollup_tables() == before
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2025-02-01", "2025-06-14"),   # Whole archived months, then hot weeks and days
+    ("2025-03-09", "2025-05-20"),   # Starts on an archived Sunday
+    ("2025-04-27", "2025-04-30"),   # An archived week's April part only
+    ("2025-03-30", "2025-04-05"),   # A whole archived week across two months
+    ("2025-04-06", "2025-05-03"),   # Archived weeks into hot days
+])
+def test_ranges_read_across_both_tiers(tiered_db, start, end):
+    q = tiered_db
+    expected = q.get_stats_for_range(start, end)
+    assert expected
+    compact()
+    assert q.get_stats_for_range(start, end) == expected
+    q.rebuild_rollups()
+    assert q.get_stats_for_range(start, end) == expected
+
+
+@pytest.mark.parametrize("start, end", [("2025-03-05", "2025-05-20"), ("2025-03-09", "2025-03-12")])
+def test_ranges_splitting_an_archived_week_are_refused(tiered_db, start, end):
+    q = tiered_db
+    assert q.get_stats_for_range(start, end)
+    compact()
+    assert q.get_stats_for_range(start, end) is None # Rather than a silently partial total
+
+
+def test_timelines_read_across_both_tiers(tiered_db):
+    q = tiered_db
+    players = [LUIGI, BLOCK]
+    expected = {bucket: q.get_players_timeline(players, "2025-02-01", "2025-06-14", bucket) for bucket in ('week', 'month')}
+    days, day_series = q.get_players_timeline(players, "2025-04-20", "2025-05-10", 'day')
+    compact()
+    q.rebuild_rollups()
+
+    for bucket, timeline in expected.items():
+        assert q.get_players_timeline(players, "2025-02-01", "2025-06-14", bucket) == timeline
+    # Archived days can't be told apart any more: None, not zero
+    assert q.get_players_timeline(players, "2025-04-20", "2025-05-10", 'day') == (days, {
+        name: {metric: [None] * 11 + values[11:] for metric, values in series.items()}
+        for name, series in day_series.items()
+    })
+    assert days[11] == "2025-05-01"
+
+
+def test_months_archived_without_weeks(migrate_to):
+    """Archive rows from before migration 13 only know their month: the weeks touching it keep
+    their stored rollup rows on a rebuild, and ranges can't split the month."""
+    conn = sqlite3.connect(":memory:")
+    migrate_to(conn, 12)
+    conn.execute("INSERT INTO stats_history_archive VALUES ('2025-03', 'main', ?, 3, 1, 600)", (LUIGI,))
+    conn.executemany("INSERT INTO stats_weekly VALUES (?, ?, ?, ?, ?)", [
+        ("2025-03-02", LUIGI, 2, 1, 500), ("2025-03-30", LUIGI, 1, 0, 100), ("2025-02-23", LUIGI, 9, 9, 9),
+    ])
+    conn.execute("INSERT INTO stats_history (server_id, minecraft_username, date, deaths, advancements, playtime_seconds) VALUES ('main', ?, '2025-02-20', 1, 1, 60)", (LUIGI,))
+    migrations.migrate(conn)
+
+    rollups.rebuild_rollups(conn)
+    assert conn.execute("SELECT * FROM stats_weekly ORDER BY 1").fetchall() == [
+        ("2025-02-16", LUIGI, 1, 1, 60),
+        ("2025-02-23", LUIGI, 9, 9, 9),   # Touches March: kept as it was
+        ("2025-03-02", LUIGI, 2, 1, 500),
+        ("2025-03-30", LUIGI, 1, 0, 100),
+    ]
+    assert conn.execute("SELECT * FROM stats_monthly ORDER BY 1").fetchall() == [
+        ("2025-02", LUIGI, 1, 1, 60), ("2025-03", LUIGI, 3, 1, 600),
+    ]
+    sql, params = rollups.range_query(conn, "2025-03-01", "2025-03-31")
+    assert conn.execute(sql, params).fetchall() == [(LUIGI, 3, 1, 600)]
+    with pytest.raises(ValueError):
+        rollups.range_query(conn, "2025-03-01", "2025-03-08")
@@ -0,0 +1,66 @@
+"""get_players_timeline bucketing over a month boundary, with some stats still buffered, on both storage backends."""
+import datetime
+import pytest
+from database import sqlite_storage
+from database.batcher import stats_batcher
+from database.memory_storage import MemoryStorage
+
+START, END = "2024-02-27", "2024-03-12" # A Tuesday in February to a Tuesday in March (2024 is a leap year)
+
+
+def noon(date):
+    return int(datetime.datetime.fromisoformat(date).replace(hour=12, tzinfo=datetime.timezone.utc).timestamp())
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request):
+    if request.param == 'sqlite':
+        request.getfixturevalue('fresh_db')
+        storage = sqlite_storage
+    else:
+        storage = MemoryStorage()
+        storage.initialize_database()
+    for name in ("Steve", "Alex"):
+        storage.add_player(name, f"{name}#0001")
+    storage.record_death("Steve", ts=noon("2024-02-24")) # Before the range, in the same month
+    storage.record_death("Steve", ts=noon("2024-02-27"))
+    storage.record_advancement("Steve", ts=noon("2024-02-29"))
+    storage.record_death("Steve", ts=noon("2024-03-01"))
+    storage.flush_pending_stats()
+    # Still in the batcher when the timeline is read
+    storage.record_login("Steve", ts=noon("2024-03-03"))
+    storage.record_logout("Steve", ts=noon("2024-03-03") + 600)
+    storage.record_death("Steve", ts=noon("2024-03-12"))
+    if request.param == 'sqlite':
+        assert stats_batcher.pending_by_date()
+    return storage
+
+
+def test_day_buckets(storage):
+    keys, series = storage.get_players_timeline(["Steve", "Alex", "Steve"], START, END, 'day')
+    assert keys[:4] == ["2024-02-27", "2024-02-28", "2024-02-29", "2024-03-01"]
+    assert (len(keys), keys[-1]) == (15, END)
+    assert list(series) == ["Steve", "Alex"]
+    steve = series["Steve"]
+    assert steve['deaths'] == [1, 0, 0, 1] + [0] * 10 + [1]
+    assert steve['advancements'] == [0, 0, 1] + [0] * 12
+    assert steve['playtime'] == [0] * 5 + [600] + [0] * 9
+    assert series["Alex"] == {'deaths': [0] * 15, 'advancements': [0] * 15, 'playtime': [0] * 15}
+
+
+def test_week_buckets_start_on_sunday(storage):
+    keys, series = storage.get_players_timeline(["Steve", "Alex"], START, END, 'week')
+    assert keys == ["2024-02-25", "2024-03-03", "2024-03-10"] # Whole weeks, across the month boundary
+    assert series["Steve"] == {'deaths': [2, 0, 1], 'advancements': [1, 0, 0], 'playtime': [0, 600, 0]}
+    assert series["Alex"] == {'deaths': [0] * 3, 'advancements': [0] * 3, 'playtime': [0] * 3}
+
+
+def test_month_buckets_hold_the_whole_month(storage):
+    keys, series = storage.get_players_timeline(["Steve"], START, END, 'month')
+    assert keys == ["2024-02", "2024-03"]
+    assert series["Steve"] == {'deaths': [2, 2], 'advancements': [1, 0], 'playtime': [0, 600]}
+
+
+def test_empty_selections(storage):
+    assert storage.get_players_timeline([], START, END, 'week') == (["2024-02-25", "2024-03-03", "2024-03-10"], {})
+    assert storage.get_players_timeline(["Steve"], END, START, 'day') == ([], {"Steve": {'deaths': [], 'advancements': [], 'playtime': []}})
@@ -0,0 +1,76 @@
+"""Importing a server's world stats files (ingest/world_stats.py) into its totals."""
+import json
+import pytest
+from database.memory_storage import MemoryStorage
+from database.replay import replay_events
+from ingest.world_stats import scan_world_stats, diff_world_stats, change_updates
+
+LUIGI, BLOCK = "LuigiTime34", "Block_Builder"
+UUIDS = {LUIGI: "00000000-0000-0000-0000-000000000001", BLOCK: "00000000-0000-0000-0000-000000000002"}
+
+
+@pytest.fixture
+def world(tmp_path):
+    """A world directory with stats files for LUIGI (modern format) and BLOCK (pre-1.13 format)."""
+    world = tmp_path / "world"
+    (world / "stats").mkdir(parents=True)
+    (tmp_path / "usercache.json").write_text(json.dumps([{"uuid": uuid, "name": name} for name, uuid in UUIDS.items()]))
+    (world / "stats" / f"{UUIDS[LUIGI]}.json").write_text(json.dumps(
+        {"stats": {"minecraft:custom": {"minecraft:deaths": 7, "minecraft:play_time": 72000}}}
+    ))
+    (world / "stats" / f"{UUIDS[BLOCK]}.json").write_text(json.dumps({"stat.deaths": 1, "stat.playOneMinute": 2400}))
+    return world
+
+
+def import_world(storage, world, server_id):
+    scan = scan_world_stats(str(world), workers=1)
+    changes = diff_world_stats(scan['stats'], storage.get_leaderboard_snapshot(server_id).players)
+    assert storage.bulk_update_history(change_updates(changes), server_id)
+    return changes
+
+
+def totals(storage, server_id=None):
+    snapshot = storage.get_leaderboard_snapshot(server_id)
+    return {name: (row[2], row[4]) for name, row in snapshot.by_player.items() if name in (LUIGI, BLOCK)}
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request):
+    if request.param == 'sqlite':
+        return request.getfixturevalue('fresh_db')
+    storage = MemoryStorage()
+    storage.initialize_database()
+    return storage
+
+
+def test_import_sets_the_servers_totals(storage, world):
+    storage.record_death(LUIGI, server_id="creative") # Not in the main world's files
+    storage.record_death(LUIGI)
+    storage.flush_pending_stats()
+
+    changes = import_world(storage, world, "main")
+    assert changes == [(BLOCK, 0, 1, 0, 120), (LUIGI, 1, 7, 0, 3600)]
+    assert totals(storage, "main") == {LUIGI: (7, 3600), BLOCK: (1, 120)}
+    assert totals(storage, "creative") == {LUIGI: (1, 0)}
+    assert totals(storage) == {LUIGI: (8, 3600), BLOCK: (1, 120)}
+
+    # Logged as adjustments: a replay keeps the import
+    replay = storage.replay_events if isinstance(storage, MemoryStorage) else replay_events
+    assert replay(dry_run=True)['changes'] == {}
+    replay()
+    assert totals(storage, "main") == {LUIGI: (7, 3600), BLOCK: (1, 120)}
+    assert totals(storage) == {LUIGI: (8, 3600), BLOCK: (1, 120)}
+
+    assert import_world(storage, world, "main") == [] # Nothing left to change
+
+
+def test_addhistory_totals_survive_replay(storage):
+    storage.record_death(LUIGI, server_id="creative")
+    assert storage.bulk_update_history({LUIGI: {'deaths': 10, 'advancements': 4}})
+    assert storage.get_player_stats(LUIGI)[2:4] == (10, 4)
+    assert totals(storage, "main")[LUIGI] == (9, 0) # The difference goes to the default server
+
+    replay = storage.replay_events if isinstance(storage, MemoryStorage) else replay_events
+    replay()
+    assert storage.get_player_stats(LUIGI)[2:4] == (10, 4)
+    assert totals(storage, "creative")[LUIGI] == (1, 0)
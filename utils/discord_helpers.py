@@ -1,32 +1,12 @@
+from database.player_registry import registry
+
 def get_minecraft_from_discord(discord_name):
-    """Get Minecraft username from Discord username."""
-    from database.connection import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT minecraft_username FROM player_stats WHERE LOWER(discord_username) = LOWER(?)",
-        (discord_name,)
-    )
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result[0] if result else None
+    """Get Minecraft username from Discord username (case-insensitive)."""
+    return registry.minecraft_from_discord(discord_name)
 
 def get_discord_from_minecraft(minecraft_username):
-    """Get Discord username from Minecraft username."""
-    from database.connection import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT discord_username FROM player_stats WHERE minecraft_username = ?",
-        (minecraft_username,)
-    )
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result[0] if result else None
+    """Get Discord username from Minecraft username (case-insensitive)."""
+    return registry.discord_from_minecraft(minecraft_username)
 
 def get_discord_user(bot, discord_name, guild): # <--- ADD 'guild' PARAMETER HERE
     """Get Discord user object from username within a specific guild."""
@@ -56,13 +36,5 @@ def get_player_display_names(minecraft_usernames, guild):
     return display_names
 
 def get_minecraft_to_discord_mapping():
-    """Get the current mapping of Minecraft usernames to Discord usernames from the database."""
-    from database.connection import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT minecraft_username, discord_username FROM player_stats")
-    mapping = {row[0]: row[1] for row in cursor.fetchall()}
-    
-    conn.close()
-    return mapping
+    """Get the current mapping of Minecraft usernames to Discord usernames."""
+    return registry.mapping()
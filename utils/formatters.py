@@ -1,3 +1,8 @@
+# Bar heights used by sparkline(), lowest first
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+SPARK_GAP = "·"            # Buckets with no data (archived days)
+
+
 def format_playtime(seconds):
     """Format seconds into a readable time string."""
     hours, remainder = divmod(seconds, 3600)
@@ -8,4 +13,18 @@ def format_playtime(seconds):
         result += f"{hours}h "
     result += f"{minutes}m"
     
-    return result.strip()
\ No newline at end of file
+    return result.strip()
+
+
+def sparkline(values):
+    """Render numbers as a one-line bar chart, e.g. [0, 2, 5, 1] -> "▁▄█▂". None (no data) is a gap."""
+    values = list(values)
+    if not values:
+        return ""
+    top = max((v for v in values if v is not None), default=0)
+    # Anything above zero gets at least the second bar so it stands out from empty buckets
+    return "".join(
+        SPARK_GAP if v is None else SPARK_CHARS[0] if v <= 0 or top <= 0
+        else SPARK_CHARS[max(1, round(v / top * (len(SPARK_CHARS) - 1)))]
+        for v in values
+    )